@@ -1,19 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from datetime import date
-from typing import Optional
+from typing import Literal, Optional
 
-from app.database import get_db
+from app.database import get_read_db
 from app.auth.dependencies import get_current_user
 from app.analytics.services import AnalyticsService
-from app.analytics.schemas import TimeSlotAnalytics, DailyAnalytics, TimeRangeAnalytics
+from app.analytics.schemas import TimeSlotAnalytics, DailyAnalytics, TimeRangeAnalytics, CompletionHeatmap
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 @router.get("/overview", response_model=TimeSlotAnalytics)
 def get_overview_analytics(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get overview analytics for the current user's time slots."""
     analytics_service = AnalyticsService(db)
@@ -23,7 +23,7 @@ def get_overview_analytics(
 def get_daily_analytics(
     date: date,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get analytics for a specific day."""
     analytics_service = AnalyticsService(db)
@@ -34,7 +34,7 @@ def get_range_analytics(
     start_date: date,
     end_date: date,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get analytics for a specific date range."""
     if start_date > end_date:
@@ -50,10 +50,20 @@ def get_range_analytics(
         end_date
     )
 
+@router.get("/heatmap", response_model=CompletionHeatmap)
+def get_completion_heatmap(
+    kind: Literal["task", "time_slot"] = "task",
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Get the current user's completions by local weekday and hour."""
+    analytics_service = AnalyticsService(db)
+    return analytics_service.get_completion_heatmap(current_user.id, kind)
+
 @router.get("/today", response_model=DailyAnalytics)
 def get_today_analytics(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get analytics for the current day."""
     today = date.today()
@@ -70,7 +80,7 @@ from .services import get_top_users_by_time_spent
 # router = APIRouter()
 
 @router.get("/top-users/{timeframe}")
-def top_users(timeframe: str, db: Session = Depends(get_db)):
+def top_users(timeframe: str, db: Session = Depends(get_read_db)):
     """
     Get top users by time spent for a given timeframe ('daily', 'weekly', 'monthly').
     """
@@ -25,4 +25,9 @@ class TimeRangeAnalytics(BaseModel):
     total_slots: int
     total_completed: int
     total_minutes: int
-    average_completion_rate: float
\ No newline at end of file
+    average_completion_rate: float
+
+class CompletionHeatmap(BaseModel):
+    kind: str
+    # 7 rows, Monday first, of 24 local hours
+    counts: List[List[int]]
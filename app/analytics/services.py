@@ -3,8 +3,8 @@ from sqlalchemy import func, and_
 from datetime import datetime, date, timedelta
 from typing import List, Optional
 
-from app.models import TimeSlot
-from app.analytics.schemas import TimeSlotAnalytics, DailyAnalytics, TimeRangeAnalytics
+from app.models import CompletionHour, TimeSlot
+from app.analytics.schemas import TimeSlotAnalytics, DailyAnalytics, TimeRangeAnalytics, CompletionHeatmap
 
 class AnalyticsService:
     def __init__(self, db: Session):
@@ -104,6 +104,16 @@ class AnalyticsService:
             total_minutes=total_minutes,
             average_completion_rate=round(avg_completion_rate, 2)
         )
+
+    def get_completion_heatmap(self, user_id: int, kind: str) -> CompletionHeatmap:
+        """Get the user's completions of one kind by local weekday and hour."""
+        counts = [[0] * 24 for _ in range(7)]
+        rows = self.db.query(CompletionHour.weekday, CompletionHour.hour, CompletionHour.count)\
+            .filter(CompletionHour.user_id == user_id, CompletionHour.kind == kind)\
+            .all()
+        for weekday, hour, count in rows:
+            counts[weekday][hour] = count
+        return CompletionHeatmap(kind=kind, counts=counts)
     
 
 # from sqlalchemy.orm import Session
@@ -8,7 +8,7 @@ from ..config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -37,4 +37,13 @@ async def get_current_verified_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Email not verified. Please verify your email first."
         )
-    return current_user 
\ No newline at end of file
+    return current_user 
+
+def is_admin(user) -> bool:
+    """Admins are users flagged is_admin or listed in settings.ADMIN_EMAILS"""
+    return bool(getattr(user, 'is_admin', False)) or user.email in settings.ADMIN_EMAILS
+
+def get_current_admin_user(current_user = Depends(get_current_user)):
+    if not is_admin(current_user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    return current_user
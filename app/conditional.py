@@ -0,0 +1,53 @@
+"""
+Conditional GETs for per-user read endpoints.
+
+Every flush that writes a row owned by a user advances that user's
+``users.data_version`` in the same transaction (see ``bump_data_versions`` in
+``app.models``). ``conditional_get`` builds a weak ETag from that version,
+the request path and query string, and the user's local date. The user row is already
+loaded by ``get_current_user``, so building the ETag costs no extra query.
+When ``If-None-Match`` matches, the dependency answers ``304 Not Modified``
+before the endpoint runs. That skips its queries and serialization.
+
+Use it as a route dependency so it runs before the endpoint's own:
+
+    @router.get("/", dependencies=[Depends(conditional_get)])
+
+Responses carry ``Cache-Control: private, no-cache``. Browsers then keep the
+body and revalidate it on every ``fetch``, without changes to the frontend.
+"""
+import hashlib
+
+from fastapi import Depends, HTTPException, Request, Response, status
+
+from .auth.dependencies import get_current_user
+from .models import User
+from .momentum.ledger import local_date
+
+CACHE_CONTROL = "private, no-cache"
+
+def data_version_etag(request: Request, user: User) -> str:
+    """Weak ETag for ``request`` at the user's current data version"""
+    # The date is part of the key because streaks and "today" views change at the user's midnight
+    key = f"{request.url.path}?{request.url.query}|{local_date(user.timezone).isoformat()}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return f'W/"{user.id}.{user.data_version or 0}.{digest}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against ``etag``"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+def conditional_get(request: Request, response: Response, current_user: User = Depends(get_current_user)) -> None:
+    """Answer 304 when the client's copy is current, otherwise tag the response"""
+    etag = data_version_etag(request, current_user)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        raise HTTPException(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -1,7 +1,45 @@
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./app.db"
+    # Async driver URL; derived from DATABASE_URL (sqlite -> sqlite+aiosqlite) when unset
+    ASYNC_DATABASE_URL: Optional[str] = None
+
+    # SQLite tuning, applied as PRAGMAs on every new connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 20000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    # Size of the separate read-only connection pool used by GET routes
+    SQLITE_READ_POOL_SIZE: int = 10
+
+    # Per-request SQL statistics (X-DB-Queries / X-DB-Time-ms headers)
+    SQL_QUERY_COUNTER_ENABLED: bool = True
+    # The same statement this many times in one request is logged as a probable N+1 loop
+    SQL_N_PLUS_ONE_THRESHOLD: int = 5
+
+    # Prometheus /metrics; set METRICS_DIR to a directory shared by all uvicorn workers
+    METRICS_ENABLED: bool = True
+    METRICS_DIR: Optional[str] = None
+    METRICS_FLUSH_INTERVAL_SECONDS: float = 5.0
+
+    # Users allowed to use admin endpoints and the request profiler (JSON list in env)
+    ADMIN_EMAILS: List[str] = []
+    # On-demand profiling of single requests (X-Profile: 1 header from an admin)
+    PROFILER_ENABLED: bool = True
+    PROFILER_DIR: str = "profiles"
+    PROFILER_INTERVAL_MS: float = 5.0
+    # Background worker applying recorded momentum events (app.momentum.outbox);
+    # disable it where scripts/drain_momentum_outbox.py runs from a scheduler instead
+    MOMENTUM_OUTBOX_WORKER_ENABLED: bool = True
+    MOMENTUM_OUTBOX_BATCH_SIZE: int = 200
+    MOMENTUM_OUTBOX_POLL_SECONDS: float = 5.0
+    # A failing event is retried this many times before it is parked as 'failed'
+    MOMENTUM_OUTBOX_MAX_ATTEMPTS: int = 5
+    # How long browsers and proxies may reuse /momentum/levels and /achievements/available
+    MOMENTUM_CATALOG_MAX_AGE: int = 3600
     SECRET_KEY: str = "your-secret-key"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 5
@@ -1,4 +1,9 @@
-from sqlalchemy import create_engine
+import inspect
+from typing import List
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -6,9 +11,88 @@ from .config import settings
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+def sqlite_pragmas(read_only: bool = False) -> List[str]:
+    """PRAGMA statements for the tuned SQLite profile configured in Settings."""
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT_MS)}",
+        f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size = -{int(settings.SQLITE_CACHE_SIZE_KB)}",
+        f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        # The journal mode is persisted in the database file, so the writer sets it
+        pragmas.insert(0, f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+    return pragmas
+
+def install_sqlite_pragmas(engine: Engine, pragmas: List[str]) -> None:
+    """Run ``pragmas`` on every new DBAPI connection of a SQLite engine."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+def create_write_engine(url: str) -> Engine:
+    """Engine of the writable connections on ``url``."""
+    write_engine = create_engine(url, connect_args={"check_same_thread": False})
+    install_sqlite_pragmas(write_engine, sqlite_pragmas())
+    return write_engine
+
+engine = create_write_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def create_read_engine(url: str) -> Engine:
+    """Engine of query_only connections on ``url``, pooled for the GET routes."""
+    read_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=settings.SQLITE_READ_POOL_SIZE
+    )
+    install_sqlite_pragmas(read_engine, sqlite_pragmas(read_only=True))
+    return read_engine
+
+# Separate pool of query_only connections, so GET routes read from the WAL
+# snapshot concurrently with the writer instead of queueing behind it
+read_engine = create_read_engine(SQLALCHEMY_DATABASE_URL)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+def _async_database_url(url: str) -> str:
+    """Derive the async driver URL (e.g. sqlite+aiosqlite) from the sync one."""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    sync_url = make_url(url)
+    if sync_url.get_backend_name() == "sqlite":
+        return sync_url.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    return url
+
+ASYNC_SQLALCHEMY_DATABASE_URL = _async_database_url(SQLALCHEMY_DATABASE_URL)
+
+def create_async_write_engine(url: str) -> AsyncEngine:
+    """Async counterpart of ``create_write_engine``."""
+    write_engine = create_async_engine(url)
+    install_sqlite_pragmas(write_engine.sync_engine, sqlite_pragmas())
+    return write_engine
+
+async_engine = create_async_write_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+# Objects stay usable after commit; an AsyncSession cannot lazily reload expired attributes
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+def create_async_read_engine(url: str) -> AsyncEngine:
+    """Async counterpart of ``create_read_engine``."""
+    async_read_engine = create_async_engine(url, pool_size=settings.SQLITE_READ_POOL_SIZE)
+    install_sqlite_pragmas(async_read_engine.sync_engine, sqlite_pragmas(read_only=True))
+    return async_read_engine
+
+async_read_engine = create_async_read_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -16,4 +100,31 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+async def resolve(result):
+    """
+    Await the result of a session call if it came from an AsyncSession.
+
+    Services call ``await resolve(self.db.execute(...))`` so the same code runs
+    on the sync ``SessionLocal`` (scripts, tests) and on ``AsyncSessionLocal``
+    (async routers) without blocking the event loop in the latter case.
+    """
+    if inspect.isawaitable(result):
+        return await result
+    return result
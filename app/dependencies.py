@@ -1,8 +1,8 @@
-from .database import SessionLocal
+from .database import SessionLocal, get_read_db, get_async_db, get_async_read_db
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from ..dependencies import get_db
+from ..dependencies import get_db, get_read_db, get_async_db
 from ..auth.dependencies import get_current_user
+from ..conditional import conditional_get
+from ..pagination import PageParams, page_params, decode_cursor, finish_page
 from . import services
 from . import schemas
 from ..users.schemas import User
@@ -18,58 +21,61 @@ def create_goal(
 ):
     return services.create_goal(db=db, goal=goal, user_id=current_user.id)
 
-@router.get("/", response_model=List[schemas.Goal])
+@router.get("/", response_model=List[schemas.Goal], dependencies=[Depends(conditional_get)])
 def read_goals(
-    db: Session = Depends(get_db),
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    return services.get_goals(db=db, user_id=current_user.id)
+    if not page.paginated:
+        return services.get_goals(db=db, user_id=current_user.id)
+    after_id = decode_cursor(page.cursor, [int])[0] if page.cursor else None
+    goals = services.get_goals(db=db, user_id=current_user.id, limit=page.size + 1, after_id=after_id)
+    return finish_page(response, goals, page.size, key=lambda goal: [goal.id])
 
 @router.patch("/{goal_id}", response_model=schemas.Goal)
 async def update_goal(
     goal_id: int,
     goal_update: schemas.GoalUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_goal = services.get_goal(db, goal_id=goal_id, user_id=current_user.id)
+    db_goal = await services.get_goal(db, goal_id=goal_id, user_id=current_user.id)
     if not db_goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     return await services.update_goal(db=db, goal=db_goal, goal_update=goal_update)
 
 @router.post("/{goal_id}/steps", response_model=schemas.GoalStep)
-def create_goal_step(
+async def create_goal_step(
     goal_id: int,
     step: schemas.GoalStepCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Verify goal exists and belongs to user
-    goal = services.get_goal(db, goal_id=goal_id, user_id=current_user.id)
+    goal = await services.get_goal(db, goal_id=goal_id, user_id=current_user.id)
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
-    return services.create_goal_step(db=db, step=step, goal_id=goal_id)
+    return await services.create_goal_step(db=db, step=step, goal_id=goal_id)
 
 @router.patch("/{goal_id}/steps/{step_id}", response_model=schemas.GoalStep)
 async def update_goal_step(
     goal_id: int,
     step_id: int,
     step_update: schemas.GoalStepUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Verify goal exists and belongs to user
-    goal = services.get_goal(db, goal_id=goal_id, user_id=current_user.id)
+    goal = await services.get_goal(db, goal_id=goal_id, user_id=current_user.id)
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     
     # Get the step
-    step = db.query(GoalStep).filter(
-        GoalStep.id == step_id,
-        GoalStep.goal_id == goal_id
-    ).first()
+    step = await services.get_goal_step(db, step_id=step_id, goal_id=goal_id)
     
     if not step:
         raise HTTPException(status_code=404, detail="Goal step not found")
     
-    return await services.update_goal_step(db=db, step=step, step_update=step_update) 
\ No newline at end of file
+    return await services.update_goal_step(db=db, goal=goal, step=step, step_update=step_update) 
\ No newline at end of file
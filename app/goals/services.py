@@ -1,15 +1,30 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from typing import Optional, Union
+from ..database import resolve
 from ..models import Goal, GoalStep
 from .schemas import GoalCreate, GoalUpdate, GoalStepCreate, GoalStepUpdate
 from datetime import datetime
-from ..momentum.services import MomentumService
+from ..momentum import outbox
 
-def get_goals(db: Session, user_id: int):
-    return db.query(Goal).filter(Goal.owner_id == user_id).all()
+def get_goals(db: Session, user_id: int, limit: Optional[int] = None, after_id: Optional[int] = None):
+    """Goals of a user in id order; ``limit``/``after_id`` give one keyset page"""
+    query = db.query(Goal).filter(Goal.owner_id == user_id)
+    if after_id is not None:
+        query = query.filter(Goal.id > after_id)
+    query = query.order_by(Goal.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
 
-def get_goal(db: Session, goal_id: int, user_id: int):
-    return db.query(Goal).filter(Goal.id == goal_id, Goal.owner_id == user_id).first()
+async def get_goal(db: Union[Session, AsyncSession], goal_id: int, user_id: int):
+    result = await resolve(db.execute(select(Goal).where(Goal.id == goal_id, Goal.owner_id == user_id)))
+    return result.scalars().first()
+
+async def get_goal_step(db: Union[Session, AsyncSession], step_id: int, goal_id: int):
+    result = await resolve(db.execute(select(GoalStep).where(GoalStep.id == step_id, GoalStep.goal_id == goal_id)))
+    return result.scalars().first()
 
 def create_goal(db: Session, goal: GoalCreate, user_id: int):
     db_goal = Goal(**goal.dict(), owner_id=user_id)
@@ -18,7 +33,7 @@ def create_goal(db: Session, goal: GoalCreate, user_id: int):
     db.refresh(db_goal)
     return db_goal
 
-async def update_goal(db: Session, goal: Goal, goal_update: GoalUpdate):
+async def update_goal(db: Union[Session, AsyncSession], goal: Goal, goal_update: GoalUpdate):
     old_completed = goal.completed
     
     # Update goal fields
@@ -27,13 +42,14 @@ async def update_goal(db: Session, goal: Goal, goal_update: GoalUpdate):
     
     # Check if goal was just completed
     if goal.completed and not old_completed:
-        momentum_service = MomentumService(db)
-        
+        goal.completed_at = datetime.utcnow()
+
         # Get goal streak information
         goals_streak = await _get_goal_streak(db, goal.owner_id)
         
         # Process goal completion event
-        await momentum_service.process_event(
+        outbox.record(
+            db,
             user_id=goal.owner_id,
             event_type='goal_completion',
             metadata={
@@ -46,20 +62,22 @@ async def update_goal(db: Session, goal: Goal, goal_update: GoalUpdate):
         
         # Process goal streak event if applicable
         if goals_streak > 0:
-            await momentum_service.process_event(
+            outbox.record(
+                db,
                 user_id=goal.owner_id,
                 event_type='goal_streak',
                 metadata={
+                    'goal_id': goal.id,
                     'streak': goals_streak,
                     'completion_time': datetime.utcnow()
                 }
             )
     
-    db.commit()
-    db.refresh(goal)
+    await resolve(db.commit())
+    await resolve(db.refresh(goal))
     return goal
 
-async def update_goal_step(db: Session, step: GoalStep, step_update: GoalStepUpdate):
+async def update_goal_step(db: Union[Session, AsyncSession], goal: Goal, step: GoalStep, step_update: GoalStepUpdate):
     old_completed = step.completed
     
     # Update step fields
@@ -68,11 +86,10 @@ async def update_goal_step(db: Session, step: GoalStep, step_update: GoalStepUpd
     
     # Check if step was just completed
     if step.completed and not old_completed:
-        momentum_service = MomentumService(db)
-        
         # Process goal step completion event
-        await momentum_service.process_event(
-            user_id=step.goal.owner_id,  # Assuming goal relationship is set up
+        outbox.record(
+            db,
+            user_id=goal.owner_id,
             event_type='goal_step_completion',
             metadata={
                 'step_id': step.id,
@@ -82,16 +99,18 @@ async def update_goal_step(db: Session, step: GoalStep, step_update: GoalStepUpd
             }
         )
     
-    db.commit()
-    db.refresh(step)
+    await resolve(db.commit())
+    await resolve(db.refresh(step))
     return step
 
-async def _get_goal_streak(db: Session, user_id: int) -> int:
+async def _get_goal_streak(db: Union[Session, AsyncSession], user_id: int) -> int:
     """Helper function to calculate the current goal completion streak"""
-    goals = db.query(Goal).filter(
+    # Goals completed before completed_at was recorded cannot be placed in a streak
+    goals = (await resolve(db.execute(select(Goal).where(
         Goal.owner_id == user_id,
-        Goal.completed == True
-    ).order_by(Goal.completed_at.desc()).all()
+        Goal.completed == True,
+        Goal.completed_at.isnot(None)
+    ).order_by(Goal.completed_at.desc())))).scalars().all()
     
     if not goals:
         return 0
@@ -109,9 +128,10 @@ async def _get_goal_streak(db: Session, user_id: int) -> int:
     
     return streak
 
-def create_goal_step(db: Session, step: GoalStepCreate, goal_id: int):
-    db_step = GoalStep(**step.dict(), goal_id=goal_id)
+async def create_goal_step(db: Union[Session, AsyncSession], step: GoalStepCreate, goal_id: int):
+    # GoalStepCreate names the goal too; the one in the path wins
+    db_step = GoalStep(title=step.title, goal_id=goal_id)
     db.add(db_step)
-    db.commit()
-    db.refresh(db_step)
+    await resolve(db.commit())
+    await resolve(db.refresh(db_step))
     return db_step 
\ No newline at end of file
@@ -1,20 +1,44 @@
 # app/main.py
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 from . import models, database
+from .migrations import run_migrations
+from .query_counter import QueryCounterMiddleware
+from .metrics import MetricsMiddleware, router as metrics_router
+from .profiler import ProfilerMiddleware, router as profiler_router
 from .web_router import router as web_router
 from .api_router import router as api_router
 from .analytics.router import router as analytics_router
 from .tafakur.router import router as tafakur_router
+from .momentum import catalog
+from .momentum.outbox import run_worker
 
 from .config import settings
 
 # Create database tables
 models.Base.metadata.create_all(bind=database.engine)
+# create_all does not touch existing tables, so indexes and other changes come from migrations
+run_migrations(database.engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Levels and achievements are served from memory (app.momentum.catalog)
+    async with database.AsyncSessionLocal() as db:
+        await catalog.load(db)
+    # Applies the momentum events that request handlers record (app.momentum.outbox)
+    worker = asyncio.create_task(run_worker()) if settings.MOMENTUM_OUTBOX_WORKER_ENABLED else None
+    yield
+    if worker is not None:
+        worker.cancel()
+        with suppress(asyncio.CancelledError):
+            await worker
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -27,11 +51,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Queries", "X-DB-Time-ms", "X-DB-N-Plus-One", "X-Profile-Id", "X-Next-Cursor"],
 )
 
 # Add session middleware - required for OAuth
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
 
+# Count SQL statements and DB time per request (X-DB-Queries / X-DB-Time-ms)
+if settings.SQL_QUERY_COUNTER_ENABLED:
+    app.add_middleware(QueryCounterMiddleware)
+
+# Profile single requests sent by an admin with X-Profile: 1
+if settings.PROFILER_ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+
+# Outermost, so latency includes the other middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 
 app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
 
@@ -43,6 +80,10 @@ app.include_router(web_router)
 app.include_router(api_router)
 app.include_router(analytics_router)
 app.include_router(tafakur_router, prefix="/api")
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router)
+if settings.PROFILER_ENABLED:
+    app.include_router(profiler_router)
 
 # The momentum scheduler has been moved to an external system (systemd timer or cron)
 # See the following files for details:
@@ -0,0 +1,264 @@
+"""
+Prometheus metrics for the HTTP layer and the database pools.
+
+``MetricsMiddleware`` records, per method and route template (e.g.
+``/api/time_slots/{slot_id}``), a request latency histogram, request counts
+by status, an error counter and the number of in-flight requests. Counters
+are updated on the event loop thread that runs the middleware, so they are
+plain dicts and lists with no locks on the hot path. In-flight requests are
+tracked by scope and grouped by route only when ``/metrics`` is scraped.
+
+With several uvicorn workers, set ``METRICS_DIR`` to a directory shared by
+the workers. Each worker then writes its snapshot there every
+``METRICS_FLUSH_INTERVAL_SECONDS``. ``/metrics`` sums the snapshots of all
+workers, and in-flight gauges only come from workers that are still alive.
+Snapshots are taken on the event loop but written and read in the threadpool,
+so the file I/O never blocks other requests.
+Clear the directory when the service is (re)deployed.
+"""
+import json
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+from . import database
+from .config import settings
+from .utils import route_template
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class MetricsRegistry:
+    """Request metrics of one worker process"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # (method, route) -> per-bucket counts, +Inf count, then the sum of durations
+        self.histograms: Dict[Tuple[str, str], List[float]] = {}
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.errors: Dict[Tuple[str, str], int] = {}
+        # id(scope) -> scope of requests being served
+        self.in_flight: Dict[int, dict] = {}
+
+    def observe(self, method: str, route: str, status: int, duration: float, error: bool) -> None:
+        key = (method, route)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect_left(self.buckets, duration)] += 1
+        histogram[-1] += duration
+
+        request_key = (method, route, str(status))
+        self.requests[request_key] = self.requests.get(request_key, 0) + 1
+        if error:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def snapshot(self) -> dict:
+        """JSON-serializable copy of the current values"""
+        in_flight: Dict[Tuple[str, str], int] = {}
+        for scope in list(self.in_flight.values()):
+            key = (scope.get("method", ""), route_template(scope))
+            in_flight[key] = in_flight.get(key, 0) + 1
+        return {
+            "pid": os.getpid(),
+            "buckets": list(self.buckets),
+            "histograms": [[m, r, list(v)] for (m, r), v in self.histograms.items()],
+            "requests": [[m, r, s, v] for (m, r, s), v in self.requests.items()],
+            "errors": [[m, r, v] for (m, r), v in self.errors.items()],
+            "in_flight": [[m, r, v] for (m, r), v in in_flight.items()],
+            "pools": [list(stat) for stat in pool_stats()],
+        }
+
+    def flush(self, directory: str) -> None:
+        """Atomically write this worker's snapshot to ``directory``"""
+        write_snapshot(self.snapshot(), directory)
+
+def write_snapshot(snapshot: dict, directory: str) -> None:
+    """Atomically write a worker's snapshot to ``directory``; safe to run in several threads at once"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"worker-{snapshot['pid']}.json")
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"worker-{snapshot['pid']}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def collect(local: dict, directory: Optional[str] = None) -> dict:
+    """Merge the local snapshot with the snapshots other workers wrote to ``directory``"""
+    snapshots = [local]
+    if directory and os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            if not (name.startswith("worker-") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if snapshot.get("pid") != local["pid"] and snapshot.get("buckets") == local["buckets"]:
+                snapshots.append(snapshot)
+
+    merged = {"buckets": local["buckets"], "histograms": {}, "requests": {}, "errors": {}, "in_flight": {}, "pools": {}}
+    for snapshot in snapshots:
+        for method, route, values in snapshot["histograms"]:
+            current = merged["histograms"].setdefault((method, route), [0] * len(values))
+            for i, value in enumerate(values):
+                current[i] += value
+        for method, route, status, value in snapshot["requests"]:
+            key = (method, route, status)
+            merged["requests"][key] = merged["requests"].get(key, 0) + value
+        for method, route, value in snapshot["errors"]:
+            merged["errors"][(method, route)] = merged["errors"].get((method, route), 0) + value
+        # Gauges of workers that exited are dropped, counters are kept
+        if snapshot is local or _pid_alive(snapshot["pid"]):
+            for method, route, value in snapshot["in_flight"]:
+                merged["in_flight"][(method, route)] = merged["in_flight"].get((method, route), 0) + value
+            for metric, pool, value in snapshot.get("pools", []):
+                merged["pools"][(metric, pool)] = merged["pools"].get((metric, pool), 0) + value
+    return merged
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+def pool_stats() -> Iterable[Tuple[str, str, int]]:
+    """(metric, pool name, value) for each database connection pool of this worker"""
+    engines = {
+        "write": database.engine,
+        "read": database.read_engine,
+        "async_write": database.async_engine.sync_engine,
+        "async_read": database.async_read_engine.sync_engine,
+    }
+    for name, engine in engines.items():
+        pool = engine.pool
+        for metric, attribute in (
+            ("db_pool_size", "size"),
+            ("db_pool_checked_out", "checkedout"),
+            ("db_pool_checked_in", "checkedin"),
+            ("db_pool_overflow", "overflow"),
+        ):
+            getter = getattr(pool, attribute, None)
+            if getter is not None:
+                yield metric, name, getter()
+
+def render(merged: dict) -> str:
+    """Render merged metrics in the Prometheus text exposition format"""
+    lines = [
+        "# HELP http_request_duration_seconds HTTP request latency by route template",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    buckets = merged["buckets"]
+    for (method, route), values in sorted(merged["histograms"].items()):
+        cumulative = 0
+        for le, count in zip(buckets + ["+Inf"], values[:-1]):
+            cumulative += count
+            le_label = le if le == "+Inf" else repr(float(le))
+            lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le=le_label)} {cumulative}")
+        lines.append(f"http_request_duration_seconds_sum{_labels(method=method, route=route)} {values[-1]}")
+        lines.append(f"http_request_duration_seconds_count{_labels(method=method, route=route)} {cumulative}")
+
+    lines += [
+        "# HELP http_requests_total HTTP requests by route template and status code",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route, status), value in sorted(merged["requests"].items()):
+        lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {value}")
+
+    lines += [
+        "# HELP http_request_errors_total HTTP requests that raised or returned a 5xx status",
+        "# TYPE http_request_errors_total counter",
+    ]
+    for (method, route), value in sorted(merged["errors"].items()):
+        lines.append(f"http_request_errors_total{_labels(method=method, route=route)} {value}")
+
+    lines += [
+        "# HELP http_requests_in_flight HTTP requests currently being served",
+        "# TYPE http_requests_in_flight gauge",
+    ]
+    for (method, route), value in sorted(merged["in_flight"].items()):
+        lines.append(f"http_requests_in_flight{_labels(method=method, route=route)} {value}")
+
+    described = set()
+    for (metric, pool), value in sorted(merged["pools"].items()):
+        if metric not in described:
+            lines.append(f"# TYPE {metric} gauge")
+            described.add(metric)
+        lines.append(f"{metric}{_labels(pool=pool)} {value}")
+    return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+class MetricsMiddleware:
+    """ASGI middleware feeding ``registry``"""
+
+    def __init__(self, app, registry: MetricsRegistry = registry, directory: Optional[str] = None,
+                 flush_interval: Optional[float] = None):
+        self.app = app
+        self.registry = registry
+        self.directory = directory if directory is not None else settings.METRICS_DIR
+        self.flush_interval = flush_interval if flush_interval is not None else settings.METRICS_FLUSH_INTERVAL_SECONDS
+        self._last_flush = 0.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+        self.registry.in_flight[id(scope)] = scope
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        error = True
+        try:
+            await self.app(scope, receive, send_with_status)
+            error = status_code >= 500
+        finally:
+            del self.registry.in_flight[id(scope)]
+            self.registry.observe(
+                scope["method"], route_template(scope), status_code,
+                time.perf_counter() - started, error
+            )
+            if self.directory and started - self._last_flush >= self.flush_interval:
+                self._last_flush = started
+                await run_in_threadpool(write_snapshot, self.registry.snapshot(), self.directory)
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    # async so the registry is read on the same thread that updates it
+    snapshot = registry.snapshot()
+    if settings.METRICS_DIR:
+        await run_in_threadpool(write_snapshot, snapshot, settings.METRICS_DIR)
+        merged = await run_in_threadpool(collect, snapshot, settings.METRICS_DIR)
+    else:
+        merged = collect(snapshot)
+    body = render(merged)
+    return PlainTextResponse(body, media_type=CONTENT_TYPE)
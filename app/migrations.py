@@ -0,0 +1,243 @@
+"""
+Versioned schema migrations.
+
+Each migration has a version, a name and an ``upgrade(connection)`` function.
+Applied versions are recorded in the ``schema_migrations`` table, so
+``run_migrations`` only runs the ones a database has not seen yet. Migrations
+must be safe to run on a database created by ``Base.metadata.create_all``,
+which already contains the current schema.
+
+Run them with ``python scripts/migrate.py``.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Set
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+# (index name, table, columns, unique)
+COMPOSITE_INDEXES = [
+    ("ix_time_slots_owner_start_time", "time_slots", ("owner_id", "start_time"), False),
+    ("ix_time_slots_owner_status", "time_slots", ("owner_id", "status"), False),
+    ("ix_tasks_owner_completed", "tasks", ("owner_id", "completed"), False),
+    ("uq_reflections_user_reflection_date", "reflections", ("user_id", "reflection_date"), True),
+    ("uq_streaks_user_streak_type", "streaks", ("user_id", "streak_type"), True),
+    ("uq_user_achievements_user_achievement", "user_achievements", ("user_id", "achievement_id"), True),
+]
+
+# Indexes on free-text columns that no query filters on
+TEXT_COLUMN_INDEXES = [
+    "ix_tasks_description",
+    "ix_goals_description",
+    "ix_time_slots_description",
+]
+
+# Which of the rows sharing a unique key to keep, first in this order: the
+# completed achievement, the furthest progress, the latest activity or edit
+KEEP_FIRST = {
+    "user_achievements": "completed DESC, progress DESC, completed_at DESC, id DESC",
+    "streaks": "last_activity_date DESC, current_count DESC, id DESC",
+    "reflections": "updated_at DESC, id DESC",
+}
+
+# Carry over what a removed duplicate has that the kept row needs
+MERGE_DUPLICATE = {
+    "streaks": "UPDATE streaks SET longest_count = MAX(COALESCE(longest_count, 0), "
+               "(SELECT COALESCE(longest_count, 0) FROM streaks WHERE id = :id)) WHERE id = :kept_id",
+    "reflections": "UPDATE reflection_tags SET reflection_id = :kept_id WHERE reflection_id = :id",
+}
+
+def _deduplicate(connection: Connection, table: str, columns) -> int:
+    """Delete the rows sharing ``columns`` with a row KEEP_FIRST keeps; returns the rows deleted"""
+    cols = ", ".join(columns)
+    duplicates = [dict(row._mapping) for row in connection.execute(text(
+        f"SELECT id, kept_id FROM ("
+        f"SELECT id, FIRST_VALUE(id) OVER (PARTITION BY {cols} ORDER BY {KEEP_FIRST[table]}) AS kept_id "
+        f"FROM {table}) WHERE id != kept_id"
+    ))]
+    if not duplicates:
+        return 0
+    if table in MERGE_DUPLICATE:
+        connection.execute(text(MERGE_DUPLICATE[table]), duplicates)
+    connection.execute(text(f"DELETE FROM {table} WHERE id = :id"), duplicates)
+    logger.warning("Deleted %d duplicate rows of %s on (%s)", len(duplicates), table, cols)
+    return len(duplicates)
+
+def _create_unique_index(connection: Connection, index_name: str, table: str, columns) -> None:
+    """Create a UNIQUE index, first deleting the duplicate rows that would break it"""
+    _deduplicate(connection, table, columns)
+    # Fails the migration if rows still collide; ON CONFLICT needs the index to be unique
+    connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})"))
+
+def create_composite_indexes(connection: Connection) -> None:
+    """Create the per-user composite indexes and drop the text-column ones"""
+    for index_name in TEXT_COLUMN_INDEXES:
+        connection.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+    for index_name, table, columns, unique in COMPOSITE_INDEXES:
+        if unique:
+            _create_unique_index(connection, index_name, table, columns)
+        else:
+            connection.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})"))
+
+    connection.execute(text("ANALYZE"))
+
+# Owner indexes for keyset pagination: SQLite appends the rowid to every
+# index entry, so (owner_id) alone serves "WHERE owner_id = ? AND id > ?
+# ORDER BY id" without a sort
+KEYSET_INDEXES = [
+    ("ix_tasks_owner_id", "tasks", ("owner_id",)),
+    ("ix_goals_owner_id", "goals", ("owner_id",)),
+]
+
+def create_keyset_indexes(connection: Connection) -> None:
+    """Create the owner indexes used by the paginated list endpoints"""
+    for index_name, table, columns in KEYSET_INDEXES:
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})"
+        ))
+    connection.execute(text("ANALYZE"))
+
+def _has_column(connection: Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in connection.execute(text(f"PRAGMA table_info({table})")))
+
+def add_user_data_version(connection: Connection) -> None:
+    """Add users.data_version, the per-user counter behind conditional GETs"""
+    if not _has_column(connection, "users", "data_version"):
+        connection.execute(text("ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"))
+
+def build_leaderboard(connection: Connection) -> None:
+    """Create leaderboard_entries and fill it for the users that already exist"""
+    from .models import LeaderboardEntry
+    from .momentum.leaderboard import rebuild_entries
+    LeaderboardEntry.__table__.create(connection, checkfirst=True)
+    rebuild_entries(connection)
+
+def build_leaderboard_rank_trees(connection: Connection) -> None:
+    """Create leaderboard_rank_nodes and fill it from leaderboard_entries"""
+    from .models import LeaderboardRankNode
+    from .momentum.leaderboard import rebuild_rank_trees
+    LeaderboardRankNode.__table__.create(connection, checkfirst=True)
+    rebuild_rank_trees(connection)
+
+def build_user_stats(connection: Connection) -> None:
+    """Create user_stats and fill it from tasks, time slots and reflections"""
+    from .models import UserStats
+    from .user_stats import rebuild
+    UserStats.__table__.create(connection, checkfirst=True)
+    rebuild(connection)
+
+def build_completion_hours(connection: Connection) -> None:
+    """Create completion_hours and seed it from already completed tasks and time slots"""
+    from .models import CompletionHour
+    from .user_stats import seed_completion_hours
+    CompletionHour.__table__.create(connection, checkfirst=True)
+    seed_completion_hours(connection)
+
+def create_momentum_events(connection: Connection) -> None:
+    """Create momentum_events, the outbox of app.momentum.outbox"""
+    from .models import MomentumEvent
+    MomentumEvent.__table__.create(connection, checkfirst=True)
+
+def build_points_ledger(connection: Connection) -> None:
+    """Create points_ledger and open it with each user's current points"""
+    from .models import PointsLedgerEntry
+    from .momentum.ledger import seed_opening_balances
+    for column in ("weekly_points_start", "monthly_points_start"):
+        if not _has_column(connection, "users", column):
+            connection.execute(text(f"ALTER TABLE users ADD COLUMN {column} DATE"))
+    PointsLedgerEntry.__table__.create(connection, checkfirst=True)
+    seed_opening_balances(connection)
+
+def add_user_momentum_version(connection: Connection) -> None:
+    """Add users.momentum_version; existing users are initialized again, once, on their next visit"""
+    if not _has_column(connection, "users", "momentum_version"):
+        connection.execute(text("ALTER TABLE users ADD COLUMN momentum_version INTEGER NOT NULL DEFAULT 0"))
+
+def add_user_utc_offset(connection: Connection) -> None:
+    """Add users.utc_offset_minutes and its index; the next hourly momentum check fills it"""
+    if not _has_column(connection, "users", "utc_offset_minutes"):
+        connection.execute(text("ALTER TABLE users ADD COLUMN utc_offset_minutes INTEGER"))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_users_utc_offset_timezone ON users (utc_offset_minutes, timezone)"
+    ))
+
+def add_goal_completed_at(connection: Connection) -> None:
+    """Add goals.completed_at, the completion time goal streaks are counted from"""
+    if not _has_column(connection, "goals", "completed_at"):
+        connection.execute(text("ALTER TABLE goals ADD COLUMN completed_at DATETIME"))
+
+def _is_unique_index(connection: Connection, table: str, index_name: str) -> bool:
+    return any(row[1] == index_name and row[2] for row in connection.execute(text(f"PRAGMA index_list({table})")))
+
+def make_indexes_unique(connection: Connection) -> None:
+    """
+    Rebuild as UNIQUE the uq_ indexes that composite_indexes created without
+    it on databases with duplicate rows, deleting the duplicates first
+    """
+    for index_name, table, columns, unique in COMPOSITE_INDEXES:
+        if unique and not _is_unique_index(connection, table, index_name):
+            connection.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+            _create_unique_index(connection, index_name, table, columns)
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "composite_indexes", create_composite_indexes),
+    Migration(2, "keyset_indexes", create_keyset_indexes),
+    Migration(3, "user_data_version", add_user_data_version),
+    Migration(4, "leaderboard_entries", build_leaderboard),
+    Migration(5, "leaderboard_rank_trees", build_leaderboard_rank_trees),
+    Migration(6, "user_stats", build_user_stats),
+    Migration(7, "completion_hours", build_completion_hours),
+    Migration(8, "momentum_events", create_momentum_events),
+    Migration(9, "points_ledger", build_points_ledger),
+    Migration(10, "user_momentum_version", add_user_momentum_version),
+    Migration(11, "user_utc_offset", add_user_utc_offset),
+    Migration(12, "goal_completed_at", add_goal_completed_at),
+    Migration(13, "unique_indexes", make_indexes_unique),
+]
+
+def _ensure_migrations_table(connection: Connection) -> None:
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR NOT NULL, "
+        "applied_at DATETIME NOT NULL)"
+    ))
+
+def applied_versions(connection: Connection) -> Set[int]:
+    """Versions already recorded in schema_migrations"""
+    _ensure_migrations_table(connection)
+    return set(connection.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+def run_migrations(engine: Engine) -> List[Migration]:
+    """
+    Apply pending migrations in version order, each in its own transaction.
+
+    Returns the migrations that were applied.
+    """
+    with engine.begin() as connection:
+        done = applied_versions(connection)
+
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        logger.info("Applying migration %04d_%s", migration.version, migration.name)
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                {"version": migration.version, "name": migration.name, "applied_at": datetime.utcnow()}
+            )
+        applied.append(migration)
+    return applied
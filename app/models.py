@@ -1,8 +1,8 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Float, event, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Float, event, Text, Index, text
+from sqlalchemy.orm import relationship, Session
 from datetime import datetime
 from .database import Base
-from sqlalchemy import Date
+from sqlalchemy import Date, select
 from .json_utils import serialize_json, deserialize_json
 from sqlalchemy.sql import func
 from datetime import date, datetime
@@ -27,30 +27,53 @@ class User(Base):
     total_points = Column(Integer, default=0)
     weekly_points = Column(Integer, default=0)
     monthly_points = Column(Integer, default=0)
+    # Local week and month weekly_points and monthly_points are for (app.momentum.ledger)
+    weekly_points_start = Column(Date, nullable=True)
+    monthly_points_start = Column(Date, nullable=True)
+    # Advanced by every write to the user's rows; drives ETags (app.conditional)
+    data_version = Column(Integer, default=0, server_default="0", nullable=False)
+    # Momentum rows created for the user, up to app.momentum.init_momentum.MOMENTUM_VERSION
+    momentum_version = Column(Integer, default=0, server_default="0", nullable=False)
+    # Minutes the timezone is ahead of UTC, kept current by the hourly checks (app.momentum.timezones)
+    utc_offset_minutes = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_users_utc_offset_timezone", "utc_offset_minutes", "timezone"),
+    )
+
 class Task(Base):
     __tablename__ = "tasks"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
-    description = Column(String, index=True)
+    description = Column(String)
     completed = Column(Boolean, default=False)
     time_spent = Column(Float, default=0.0)  # Time spent in hours
     owner_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="tasks")
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_tasks_owner_completed", "owner_id", "completed"),
+        Index("ix_tasks_owner_id", "owner_id"),
+    )
+
 class Goal(Base):
     __tablename__ = "goals"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
-    description = Column(String, index=True)
+    description = Column(String)
     completed = Column(Boolean, default=False)
-    steps = relationship("GoalStep", back_populates="goal")
+    completed_at = Column(DateTime, nullable=True)
+    steps = relationship("GoalStep", back_populates="goal", lazy="selectin")
     owner_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="goals")
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_goals_owner_id", "owner_id"),
+    )
+
 class GoalStep(Base):
     __tablename__ = "goal_steps"
     id = Column(Integer, primary_key=True, index=True)
@@ -66,7 +89,7 @@ class TimeSlot(Base):
     date = Column(Date, index=True)  # New column to store the date
     start_time = Column(DateTime, index=True)
     end_time = Column(DateTime, index=True)
-    description = Column(String, index=True)
+    description = Column(String)
     owner_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="time_slots")
 
@@ -74,6 +97,11 @@ class TimeSlot(Base):
     status = Column(String, default="not_started", nullable=False)  # New field
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_time_slots_owner_start_time", "owner_id", "start_time"),
+        Index("ix_time_slots_owner_status", "owner_id", "status"),
+    )
+
 class EmailVerification(Base):
     __tablename__ = "email_verifications"
     id = Column(Integer, primary_key=True, index=True)
@@ -107,6 +135,10 @@ class UserAchievement(Base):
     user = relationship("User", back_populates="achievements")
     achievement = relationship("Achievement")
 
+    __table_args__ = (
+        Index("uq_user_achievements_user_achievement", "user_id", "achievement_id", unique=True),
+    )
+
 class Streak(Base):
     __tablename__ = "streaks"
     id = Column(Integer, primary_key=True, index=True)
@@ -118,6 +150,98 @@ class Streak(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     user = relationship("User", back_populates="streaks")
 
+    __table_args__ = (
+        Index("uq_streaks_user_streak_type", "user_id", "streak_type", unique=True),
+    )
+
+class LeaderboardEntry(Base):
+    """Materialized leaderboard row of a user, kept current by app.momentum.leaderboard"""
+    __tablename__ = "leaderboard_entries"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    username = Column(String)
+    level = Column(Integer, default=1, nullable=False)
+    weekly_points = Column(Integer, default=0, nullable=False)
+    monthly_points = Column(Integer, default=0, nullable=False)
+    total_points = Column(Integer, default=0, nullable=False)
+    achievements_count = Column(Integer, default=0, nullable=False)
+    longest_streak = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        # Top-N of each board is a walk down its index
+        Index("ix_leaderboard_entries_weekly_points", "weekly_points"),
+        Index("ix_leaderboard_entries_monthly_points", "monthly_points"),
+        Index("ix_leaderboard_entries_total_points", "total_points"),
+    )
+
+class LeaderboardRankNode(Base):
+    """Node of a board's Fenwick tree over points, see app.momentum.leaderboard"""
+    __tablename__ = "leaderboard_rank_nodes"
+    board = Column(String, primary_key=True)
+    node = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+class UserStats(Base):
+    """Activity counters of a user, kept current by app.user_stats"""
+    __tablename__ = "user_stats"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    completed_tasks = Column(Integer, default=0, nullable=False)
+    completed_task_hours = Column(Float, default=0.0, nullable=False)
+    completed_time_slots = Column(Integer, default=0, nullable=False)
+    focused_sessions = Column(Integer, default=0, nullable=False)
+    focused_minutes = Column(Integer, default=0, nullable=False)
+    reflections = Column(Integer, default=0, nullable=False)
+    gratitude_entries = Column(Integer, default=0, nullable=False)
+    words_written = Column(Integer, default=0, nullable=False)
+
+class CompletionHour(Base):
+    """Completions of one kind by a user in one local weekday and hour, kept by app.user_stats"""
+    __tablename__ = "completion_hours"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    kind = Column(String, primary_key=True)  # 'task' or 'time_slot'
+    weekday = Column(Integer, primary_key=True)  # 0 is Monday
+    hour = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+class PointsLedgerEntry(Base):
+    """One change of a user's points; rows are only ever added, see app.momentum.ledger"""
+    __tablename__ = "points_ledger"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    event_type = Column(String, nullable=False)
+    source_type = Column(String, nullable=True)  # e.g. 'task', 'time_slot', 'achievement'
+    source_id = Column(Integer, nullable=True)
+    points = Column(Integer, nullable=False)  # Negative for reverts and deductions
+    reverts_id = Column(Integer, ForeignKey("points_ledger.id"), nullable=True)
+    awarded_at = Column(DateTime, nullable=False)  # UTC; a revert keeps the time of the award it reverts
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # Period sums read the points straight from the index
+        Index("ix_points_ledger_user_awarded_at", "user_id", "awarded_at", "points"),
+        Index("ix_points_ledger_user_source", "user_id", "event_type", "source_type", "source_id"),
+        # An award is reverted at most once
+        Index("uq_points_ledger_reverts_id", "reverts_id", unique=True),
+    )
+
+class MomentumEvent(Base):
+    """A momentum event recorded with the write that caused it, applied later by app.momentum.outbox"""
+    __tablename__ = "momentum_events"
+    id = Column(Integer, primary_key=True)  # Events of a user are applied in id order
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    event_type = Column(String, nullable=False)
+    payload = Column(Text, nullable=True)  # JSON metadata for _calculate_points
+    revert = Column(Boolean, default=False, nullable=False)
+    status = Column(String, default="pending", nullable=False)  # 'pending', 'processed' or 'failed'
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # The worker's scan; processed rows drop out of it
+        Index("ix_momentum_events_pending", "id", sqlite_where=text("status = 'pending'")),
+    )
+
 class Level(Base):
     __tablename__ = "levels"
     id = Column(Integer, primary_key=True, index=True)
@@ -148,11 +272,6 @@ def receive_before_update(mapper, connection, target):
     if isinstance(target.perks, dict):
         target.perks = serialize_json(target.perks)
 
-@event.listens_for(Level, 'load')
-def receive_load(target, context):
-    if target.perks:
-        target._perks_dict = deserialize_json(target.perks)
-
 class Reflection(Base):
     """Daily reflection/contemplation model"""
     __tablename__ = "reflections"
@@ -172,7 +291,12 @@ class Reflection(Base):
 
     # Relationships
     user = relationship("User", back_populates="reflections")
-    tags = relationship("ReflectionTag", back_populates="reflection", cascade="all, delete-orphan")
+    tags = relationship("ReflectionTag", back_populates="reflection", cascade="all, delete-orphan", lazy="selectin")
+
+    __table_args__ = (
+        # One reflection per user per day; create_reflection updates the existing one
+        Index("uq_reflections_user_reflection_date", "user_id", "reflection_date", unique=True),
+    )
 
 class ReflectionTag(Base):
     """Tags for reflections to enable categorization and searching"""
@@ -184,4 +308,39 @@ class ReflectionTag(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
-    reflection = relationship("Reflection", back_populates="tags")
\ No newline at end of file
+    reflection = relationship("Reflection", back_populates="tags")
+
+# Rows without an owner column belong to a user through their parent row
+_PARENT_OWNERS = {
+    GoalStep: ("goal_id", Goal.__table__, "owner_id"),
+    ReflectionTag: ("reflection_id", Reflection.__table__, "user_id"),
+}
+
+@event.listens_for(Session, "after_flush")
+def bump_data_versions(session, flush_context):
+    """Advance data_version of every user whose rows this flush wrote, in the same transaction"""
+    user_ids = set()
+    parent_ids = {}
+    for target in list(session.new) + list(session.dirty) + list(session.deleted):
+        if target in session.dirty and not session.is_modified(target):
+            continue
+        if isinstance(target, User):
+            user_ids.add(target.id)
+        elif type(target) in _PARENT_OWNERS:
+            parent_ids.setdefault(type(target), set()).add(getattr(target, _PARENT_OWNERS[type(target)][0]))
+        else:
+            user_ids.add(getattr(target, "owner_id", None) or getattr(target, "user_id", None))
+    user_ids.discard(None)
+
+    users = User.__table__
+    connection = session.connection()
+    if user_ids:
+        connection.execute(
+            users.update().where(users.c.id.in_(user_ids)).values(data_version=users.c.data_version + 1)
+        )
+    for model, ids in parent_ids.items():
+        parent_column, parent, owner_column = _PARENT_OWNERS[model]
+        owners = select(parent.c[owner_column]).where(parent.c.id.in_(ids))
+        connection.execute(
+            users.update().where(users.c.id.in_(owners)).values(data_version=users.c.data_version + 1)
+        )
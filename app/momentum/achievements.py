@@ -0,0 +1,176 @@
+"""
+Event-driven achievement evaluation.
+
+``RULES`` declares, for every achievement that events can unlock, the
+counter its criteria read and the event types that can change that counter.
+``EVENT_INDEX`` inverts it, so an event evaluates only the achievements that
+depend on it. A reflection, for example, no longer counts every completed
+task.
+
+Counters are computed at most once per evaluation, even when several
+achievements read the same one (Task Master and Goal Crusher both read
+completed tasks). Which catalog achievements a user already holds is loaded
+with one query and kept in ``Session.info`` for the rest of the request;
+held and uncataloged achievements are skipped without a query. Awards mark
+the achievement held; a rollback drops the cache.
+
+Counts of completed work and reflections come from the user's
+``user_stats`` row (app.user_stats), read once per evaluation. Early Riser
+reads the user's completion histogram (completion_hours).
+
+Achievements without a rule (Leaderboard Legend, which the scheduler awards)
+are never unlocked by events. Productivity Pioneer reads rows created this
+week, which no event tracks; task, goal and time slot events re-check it.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from .. import models, user_stats
+from . import catalog
+from .momentum import ACHIEVEMENTS
+
+TASK_EVENTS = frozenset({'task_completion', 'first_task_of_day', 'weekend_warrior'})
+TIME_SLOT_EVENTS = frozenset({'time_slot_completion', 'focused_session', 'early_bird', 'night_owl'})
+GOAL_EVENTS = frozenset({'goal_completion', 'goal_step_completion'})
+# Events after which update_streaks may have raised a longest streak
+STREAK_EVENTS = frozenset({'task_completion', 'first_task_of_day', 'goal_completion', 'focused_session'})
+REFLECTION_EVENTS = frozenset({'reflection_completion', 'reflection_streak', 'weekly_reflection'})
+
+@dataclass(frozen=True)
+class Rule:
+    counter: str
+    events: FrozenSet[str]
+    key: Optional[str] = None
+
+RULES: Dict[str, Rule] = {
+    'Task Master': Rule('completed_tasks', TASK_EVENTS),
+    'Goal Crusher': Rule('completed_tasks', TASK_EVENTS),
+    'Self-Aware': Rule('reflections', REFLECTION_EVENTS),
+    'Reflection Seeker': Rule('reflections', REFLECTION_EVENTS),
+    'Contemplation Master': Rule('reflections', REFLECTION_EVENTS),
+    'Deep Thinker': Rule('words_written', REFLECTION_EVENTS),
+    'Gratitude Attitude': Rule('gratitude_entries', REFLECTION_EVENTS),
+    'Time Wizard': Rule('completed_time_slots', TIME_SLOT_EVENTS),
+    'Deep Work Master': Rule('focused_sessions', TIME_SLOT_EVENTS),
+    'Reflection Streak': Rule('longest_streak', REFLECTION_EVENTS, key='reflection streak'),
+    'Streak Warrior': Rule('longest_streak', STREAK_EVENTS, key='streak warrior'),
+    'Weekly Wonder': Rule('longest_streak', STREAK_EVENTS, key='weekly wonder'),
+    'Early Riser': Rule('early_completed_tasks', TASK_EVENTS),
+    'Flow State Champion': Rule('completed_task_hours', TASK_EVENTS),
+    'Goal Strategist': Rule('complex_completed_goals', frozenset({'goal_completion'})),
+    'Productivity Pioneer': Rule('all_features_this_week', TASK_EVENTS | TIME_SLOT_EVENTS | GOAL_EVENTS),
+}
+
+ACHIEVEMENTS_BY_NAME = {achievement['name']: achievement for achievement in ACHIEVEMENTS}
+
+EVENT_INDEX: Dict[str, List[str]] = {}
+for _name, _rule in RULES.items():
+    for _event_type in _rule.events:
+        EVENT_INDEX.setdefault(_event_type, []).append(_name)
+
+HELD_KEY = "held_achievements"
+
+def affected(event_types: Optional[Iterable[str]]) -> List[str]:
+    """Achievements that events of ``event_types`` can unlock, in ACHIEVEMENTS order; None means all"""
+    if event_types is None:
+        names = set(RULES)
+    else:
+        names = {name for event_type in event_types for name in EVENT_INDEX.get(event_type, ())}
+    return [achievement['name'] for achievement in ACHIEVEMENTS if achievement['name'] in names]
+
+async def held(service, user_id: int) -> Dict[str, bool]:
+    """``{name: held}`` for every catalog achievement, loaded once per session"""
+    cache = service.db.info.setdefault(HELD_KEY, {})
+    if user_id not in cache:
+        result = await service._execute(select(models.UserAchievement.achievement_id).where(
+            models.UserAchievement.user_id == user_id,
+            models.UserAchievement.completed == True
+        ))
+        completed = set(result.scalars())
+        cache[user_id] = {
+            achievement.name: achievement.id in completed
+            for achievement in (await catalog.get(service.db)).achievements
+        }
+    return cache[user_id]
+
+def mark_held(db, user_id: int, name: str) -> None:
+    """Record an award in the session's held cache, if it is loaded"""
+    cached = db.info.get(HELD_KEY, {}).get(user_id)
+    if cached is not None:
+        cached[name] = True
+
+@event.listens_for(Session, "after_rollback")
+def _forget_held(session):
+    session.info.pop(HELD_KEY, None)
+
+async def _longest_streak(service, user_id: int, key: Optional[str]) -> int:
+    return await service._scalar(select(models.Streak.longest_count).where(
+        models.Streak.user_id == user_id,
+        models.Streak.streak_type == key
+    )) or 0
+
+async def _early_completed_tasks(service, user_id: int, key: Optional[str]) -> int:
+    """Tasks completed before 9 AM in the user's timezone, from the completion histogram"""
+    return await service._scalar(select(func.sum(models.CompletionHour.count)).where(
+        models.CompletionHour.user_id == user_id,
+        models.CompletionHour.kind == 'task',
+        models.CompletionHour.hour < 9
+    )) or 0
+
+async def _complex_completed_goals(service, user_id: int, key: Optional[str]) -> int:
+    """Completed goals with 5 or more steps"""
+    return await service._scalar(select(func.count()).select_from(
+        select(models.Goal.id).where(
+            models.Goal.owner_id == user_id,
+            models.Goal.completed == True
+        ).join(models.GoalStep).group_by(models.Goal.id).having(
+            func.count(models.GoalStep.id) >= 5
+        ).subquery()
+    ))
+
+async def _all_features_this_week(service, user_id: int, key: Optional[str]) -> int:
+    """1 if the user created a task, a goal and a time slot in the last 7 days"""
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    for model in (models.Task, models.Goal, models.TimeSlot):
+        recent = await service._scalar(select(model.id).where(
+            model.owner_id == user_id,
+            model.created_at >= week_ago
+        ).limit(1))
+        if recent is None:
+            return 0
+    return 1
+
+# Counters computed from source rows; the rest are user_stats columns
+COUNTERS = {
+    'longest_streak': _longest_streak,
+    'early_completed_tasks': _early_completed_tasks,
+    'complex_completed_goals': _complex_completed_goals,
+    'all_features_this_week': _all_features_this_week,
+}
+
+async def unlocked(service, user_id: int, event_types: Optional[Iterable[str]] = None) -> List[Dict]:
+    """Definitions of the achievements that ``event_types`` unlocked for the user and that they do not hold yet"""
+    names = affected(event_types)
+    if not names:
+        return []
+    statuses = await held(service, user_id)
+    names = [name for name in names if statuses.get(name) is False]
+    values = {}
+    stats = None
+    result = []
+    for name in names:
+        rule = RULES[name]
+        if (rule.counter, rule.key) not in values:
+            if rule.counter in user_stats.COUNTERS:
+                stats = stats or await user_stats.get(service.db, user_id)
+                values[rule.counter, rule.key] = stats[rule.counter]
+            else:
+                values[rule.counter, rule.key] = await COUNTERS[rule.counter](service, user_id, rule.key)
+        achievement = ACHIEVEMENTS_BY_NAME[name]
+        if values[rule.counter, rule.key] >= achievement['criteria_value']:
+            result.append(achievement)
+    return result
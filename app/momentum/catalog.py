@@ -0,0 +1,183 @@
+"""
+In-process catalog of levels and achievements.
+
+Levels and achievements are defined in app/momentum/momentum.py and change
+only with a deploy. The first ``get`` for a database loads their rows
+with one query each and keeps them in memory:
+
+- ``levels`` in points order, with ``perks`` parsed once;
+- ``levels_by_id`` / ``levels_by_number`` and ``achievements_by_id`` /
+  ``achievements_by_name``;
+- ``thresholds``, the sorted ``points_required``, so ``level_for(points)``
+  resolves a level with a bisect instead of a query per level.
+
+Definitions without a row are inserted by that first ``get``, through the
+caller's session. That catalog is not kept, so the next ``get`` after the
+caller commits reads the stored ids; the app loads it at startup (``load``).
+
+Entries are frozen copies, never ORM instances, so a request cannot change
+them or have them expire. Catalogs are kept per database, so tests and
+scripts that open another database never see this one's ids.
+
+``invalidate()`` drops every catalog. Commits that wrote ``Level`` or
+``Achievement`` rows through the ORM call it. Scripts changing those tables
+from another process (scripts/init_levels.py) are not seen: restart the app
+or call ``POST /api/momentum/admin/catalog/invalidate``.
+
+``etag`` hashes the catalog's contents; ``/momentum/levels`` and
+``/momentum/achievements/available`` answer with it and public cache
+headers, and with 304 when it matches.
+"""
+import hashlib
+import json
+from bisect import bisect_right
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import resolve
+from ..json_utils import deserialize_json, serialize_json
+from .momentum import ACHIEVEMENTS, LEVELS, AchievementCategory, CriteriaType
+
+@dataclass(frozen=True)
+class CatalogLevel:
+    id: int
+    level_number: int
+    points_required: int
+    title: str
+    perks: Dict[str, bool]
+
+@dataclass(frozen=True)
+class CatalogAchievement:
+    id: int
+    name: str
+    description: str
+    points: int
+    category: AchievementCategory
+    criteria_type: CriteriaType
+    criteria_value: int
+    icon_name: str
+
+class Catalog:
+    def __init__(self, levels: List[CatalogLevel], achievements: List[CatalogAchievement]):
+        self.levels = sorted(levels, key=lambda level: (level.points_required, level.level_number))
+        self.levels_by_id = {level.id: level for level in self.levels}
+        self.levels_by_number = {level.level_number: level for level in self.levels}
+        self.thresholds = [level.points_required for level in self.levels]
+
+        # Definition order first, as the momentum pages list them
+        order = {definition['name']: index for index, definition in enumerate(ACHIEVEMENTS)}
+        self.achievements = sorted(achievements, key=lambda achievement: (order.get(achievement.name, len(order)), achievement.id))
+        self.achievements_by_id = {achievement.id: achievement for achievement in self.achievements}
+        self.achievements_by_name = {achievement.name: achievement for achievement in self.achievements}
+
+        contents = json.dumps(
+            [[asdict(level) for level in self.levels], [asdict(achievement) for achievement in self.achievements]],
+            sort_keys=True, default=str
+        )
+        self.etag = f'W/"catalog.{hashlib.sha1(contents.encode()).hexdigest()[:16]}"'
+
+    def level_for(self, points: Optional[int]) -> Optional[CatalogLevel]:
+        """The highest level whose points_required ``points`` reach; the first level below all"""
+        if not self.levels:
+            return None
+        return self.levels[max(bisect_right(self.thresholds, points or 0) - 1, 0)]
+
+    def next_level(self, points: Optional[int]) -> Optional[CatalogLevel]:
+        """The lowest level ``points`` do not reach yet; None at the top"""
+        index = bisect_right(self.thresholds, points or 0)
+        return self.levels[index] if index < len(self.levels) else None
+
+_catalogs: Dict[Tuple, Catalog] = {}
+
+def _key(db: Union[Session, AsyncSession]) -> Tuple:
+    url = db.get_bind().engine.url
+    # sqlite:// and sqlite+aiosqlite:// on one file share a catalog
+    return url.get_backend_name(), url.host, url.port, url.database
+
+def invalidate() -> None:
+    """Drop every loaded catalog; the next ``get`` reloads from the database"""
+    _catalogs.clear()
+
+def _level(row) -> CatalogLevel:
+    perks = deserialize_json(row.perks)
+    if not isinstance(perks, dict):
+        definition = next((level for level in LEVELS if level['level_number'] == row.level_number), None)
+        perks = definition['perks'] if definition else {}
+    return CatalogLevel(row.id, row.level_number, row.points_required, row.title, perks)
+
+def _achievement(row) -> CatalogAchievement:
+    return CatalogAchievement(
+        row.id, row.name, row.description, row.points, AchievementCategory(row.category),
+        CriteriaType(row.criteria_type), row.criteria_value, row.icon_name
+    )
+
+async def _rows(db: Union[Session, AsyncSession]) -> Tuple[List, List]:
+    levels = models.Level.__table__
+    achievements = models.Achievement.__table__
+    return (
+        (await resolve(db.execute(select(levels)))).all(),
+        (await resolve(db.execute(select(achievements)))).all(),
+    )
+
+async def _insert_missing(db: Union[Session, AsyncSession], level_rows: List, achievement_rows: List) -> bool:
+    """Insert the definitions that have no row; True if there were any"""
+    level_numbers = {row.level_number for row in level_rows}
+    names = {row.name for row in achievement_rows}
+    missing_levels = [
+        {**level, 'perks': serialize_json(level['perks'])}
+        for level in LEVELS if level['level_number'] not in level_numbers
+    ]
+    missing_achievements = [achievement for achievement in ACHIEVEMENTS if achievement['name'] not in names]
+    if missing_levels:
+        await resolve(db.execute(models.Level.__table__.insert(), missing_levels))
+    if missing_achievements:
+        await resolve(db.execute(models.Achievement.__table__.insert(), missing_achievements))
+    return bool(missing_levels or missing_achievements)
+
+async def get(db: Union[Session, AsyncSession]) -> Catalog:
+    """The catalog of ``db``'s database, loaded with two queries the first time"""
+    key = _key(db)
+    catalog = _catalogs.get(key)
+    if catalog is not None:
+        return catalog
+
+    level_rows, achievement_rows = await _rows(db)
+    created = await _insert_missing(db, level_rows, achievement_rows)
+    if created:
+        level_rows, achievement_rows = await _rows(db)
+    catalog = Catalog([_level(row) for row in level_rows], [_achievement(row) for row in achievement_rows])
+    if not created:
+        # Rows inserted above are the caller's until it commits
+        _catalogs[key] = catalog
+    return catalog
+
+async def load(db: Union[Session, AsyncSession]) -> Catalog:
+    """Load the catalog at startup, committing rows for definitions that had none"""
+    await get(db)
+    await resolve(db.commit())
+    return await get(db)
+
+CHANGED_KEY = "catalog_changed"
+
+@event.listens_for(Session, "after_flush")
+def _note_catalog_writes(session, flush_context):
+    if any(
+        isinstance(instance, (models.Level, models.Achievement))
+        for instance in (*session.new, *session.dirty, *session.deleted)
+    ):
+        session.info[CHANGED_KEY] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    # After the commit, so a reload cannot read the rows from before it
+    if session.info.pop(CHANGED_KEY, False):
+        invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_catalog_writes(session):
+    session.info.pop(CHANGED_KEY, None)
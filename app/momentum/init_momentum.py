@@ -1,121 +1,194 @@
+"""
+Momentum initialization of a user.
+
+A user's momentum rows are their points, level 1, a ``user_achievements`` row
+per catalog achievement and a ``streaks`` row per streak type.
+``users.momentum_version`` records the ``MOMENTUM_VERSION`` they were created
+for: for an initialized user ``init_user_momentum`` costs one primary-key
+read. Otherwise it inserts whatever rows are missing, one INSERT ... ON
+CONFLICT DO NOTHING per table, and commits once. The conflict targets are
+the UNIQUE indexes of app.migrations (composite_indexes, unique_indexes),
+so the database must be migrated first. Bump ``MOMENTUM_VERSION``
+when achievements or streak types are added, so every user gets the new rows
+on their next visit. New streaks are dated the user's local yesterday, so
+the first activity counts as a new day (and starts the streak at 1).
+
+``init_all_users_momentum`` backfills every user not yet at
+``MOMENTUM_VERSION`` (after a deploy, scripts/init_momentum.py), in chunks of
+consecutive user ids. Each chunk is a few set-based statements (INSERT ...
+SELECT of the missing ``user_achievements`` and ``streaks`` rows, one UPDATE
+of the users, the missing leaderboard entries) and its own short
+transaction, so the write lock is released between chunks. A chunk stamps
+its users' version, so an interrupted backfill resumes where it stopped
+when run again.
+"""
+import logging
+from dataclasses import dataclass
+from sqlalchemy import DateTime, Date, String, case, func, literal, select, true, union_all
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Callable, List, Optional, Union
 from .. import models
-from .momentum import LEVELS, ACHIEVEMENTS
-from datetime import datetime
-from ..json_utils import serialize_json
+from ..database import resolve
+from . import catalog, leaderboard
+from .ledger import local_date
+from .momentum import ACHIEVEMENTS
+from .services import STREAK_EVENTS
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+MOMENTUM_VERSION = 1
+DEFAULT_BACKFILL_CHUNK_SIZE = 1000
 
-async def init_user_momentum(db: Session, user_id: int):
+@dataclass
+class BackfillReport:
+    users: int = 0
+    user_achievements: int = 0
+    streaks: int = 0
+    leaderboard_entries: int = 0
+
+async def _insert_missing(db: Union[Session, AsyncSession], model, key_columns, rows) -> None:
+    table = model.__table__
+    statement = insert(table).on_conflict_do_nothing(index_elements=[table.c[column] for column in key_columns])
+    await resolve(db.execute(statement, rows))
+
+async def init_user_momentum(db: Union[Session, AsyncSession], user_id: int):
     """Initialize momentum data for an existing user"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
+    version = (await resolve(db.execute(
+        select(models.User.momentum_version).where(models.User.id == user_id)
+    ))).scalar()
+    # None: no such user
+    if version is None or version >= MOMENTUM_VERSION:
         return
-        
-    # Initialize points if not set
+
+    user = await resolve(db.get(models.User, user_id))
+    levels = await catalog.get(db)
+
+    # Initialize points and level if not set
     if user.total_points is None:
         user.total_points = 0
     if user.weekly_points is None:
         user.weekly_points = 0
     if user.monthly_points is None:
         user.monthly_points = 0
-        
-    # Initialize level if not set
     if not user.current_level_id:
-        level_1 = db.query(models.Level).filter(models.Level.level_number == 1).first()
-        if not level_1:
-            # Create level 1 if it doesn't exist
-            perks = {
-                "can_create_goals": True,
-                "can_track_time": True,
-                "can_earn_achievements": True,
-                "can_view_analytics": True
-            }
-            level_1 = models.Level(
-                level_number=1,
-                points_required=0,
-                title=LEVELS[0]['title'],
-                perks=serialize_json(perks)
-            )
-            db.add(level_1)
-            db.commit()
-            db.refresh(level_1)
-        
-        user.current_level_id = level_1.id
-        db.commit()
-        
-    # Initialize all levels if they don't exist
-    for level_data in LEVELS:
-        level = db.query(models.Level).filter(
-            models.Level.level_number == level_data['level_number']
-        ).first()
-        
-        if not level:
-            level = models.Level(
-                level_number=level_data['level_number'],
-                points_required=level_data['points_required'],
-                title=level_data['title'],
-                perks=serialize_json(level_data['perks'])
-            )
-            db.add(level)
-            
-    db.commit()
-            
-    # Initialize achievements
-    for achievement_data in ACHIEVEMENTS:
-        achievement = db.query(models.Achievement).filter(
-            models.Achievement.name == achievement_data['name']
-        ).first()
-        
-        if not achievement:
-            achievement = models.Achievement(
-                name=achievement_data['name'],
-                description=achievement_data['description'],
-                points=achievement_data['points'],
-                category=achievement_data['category'],
-                criteria_type=achievement_data['criteria_type'],
-                criteria_value=achievement_data['criteria_value'],
-                icon_name=achievement_data['icon_name']
-            )
-            db.add(achievement)
-            db.commit()
-            db.refresh(achievement)
-            
-        # Create user achievement tracking if not exists
-        user_achievement = db.query(models.UserAchievement).filter(
-            models.UserAchievement.user_id == user_id,
-            models.UserAchievement.achievement_id == achievement.id
-        ).first()
-        
-        if not user_achievement:
-            user_achievement = models.UserAchievement(
-                user_id=user_id,
-                achievement_id=achievement.id,
-                progress=0,
-                completed=False
-            )
-            db.add(user_achievement)
-            
-    # Initialize streaks
-    streak_types = ['daily_tasks', 'weekly_goals', 'focused_sessions']
-    for streak_type in streak_types:
-        streak = db.query(models.Streak).filter(
-            models.Streak.user_id == user_id,
-            models.Streak.streak_type == streak_type
-        ).first()
-        
-        if not streak:
-            streak = models.Streak(
-                user_id=user_id,
-                streak_type=streak_type,
-                current_count=0,
-                longest_count=0,
-                last_activity_date=datetime.utcnow().date()
-            )
-            db.add(streak)
-            
-    db.commit()
-
-async def init_all_users_momentum(db: Session):
-    """Initialize momentum data for all existing users"""
-    users = db.query(models.User).all()
-    for user in users:
-        await init_user_momentum(db, user.id) 
\ No newline at end of file
+        user.current_level_id = levels.levels_by_number[1].id
+
+    await _insert_missing(db, models.UserAchievement, ["user_id", "achievement_id"], [
+        {
+            "user_id": user_id,
+            "achievement_id": levels.achievements_by_name[achievement['name']].id,
+            "progress": 0,
+            "completed": False
+        }
+        for achievement in ACHIEVEMENTS
+    ])
+    yesterday = local_date(user.timezone) - timedelta(days=1)
+    await _insert_missing(db, models.Streak, ["user_id", "streak_type"], [
+        {
+            "user_id": user_id,
+            "streak_type": streak_type,
+            "current_count": 0,
+            "longest_count": 0,
+            "last_activity_date": yesterday
+        }
+        for streak_type in STREAK_EVENTS
+    ])
+
+    user.momentum_version = MOMENTUM_VERSION
+    await leaderboard.record_user(db, user)
+    await resolve(db.commit())
+
+async def _backfill_chunk(db: Union[Session, AsyncSession], levels: catalog.Catalog, user_ids: List[int], report: BackfillReport) -> None:
+    users = models.User.__table__
+    achievements = models.Achievement.__table__
+    user_achievements = models.UserAchievement.__table__
+    streaks = models.Streak.__table__
+    now = datetime.utcnow()
+    chunk = users.c.id.in_(user_ids)
+
+    achievement_ids = [levels.achievements_by_name[achievement['name']].id for achievement in ACHIEVEMENTS]
+    result = await resolve(db.execute(user_achievements.insert().from_select(
+        ["user_id", "achievement_id", "progress", "completed"],
+        select(users.c.id, achievements.c.id, literal(0), literal(False))
+        # Every user of the chunk with every catalog achievement
+        .select_from(users.join(achievements, true()))
+        .where(
+            chunk,
+            achievements.c.id.in_(achievement_ids),
+            ~select(user_achievements.c.id).where(
+                user_achievements.c.user_id == users.c.id,
+                user_achievements.c.achievement_id == achievements.c.id
+            ).exists()
+        )
+    )))
+    report.user_achievements += result.rowcount
+
+    # The local yesterday of each timezone of the chunk
+    timezones = (await resolve(db.execute(select(users.c.timezone).where(chunk).distinct()))).scalars().all()
+    local_yesterdays = {
+        timezone_name: local_date(timezone_name, now) - timedelta(days=1) for timezone_name in timezones if timezone_name
+    }
+    yesterday = literal(local_date(None, now) - timedelta(days=1), Date)
+    if local_yesterdays:
+        yesterday = case(local_yesterdays, value=users.c.timezone, else_=yesterday)
+    types = union_all(*[select(literal(streak_type, String).label("streak_type")) for streak_type in STREAK_EVENTS]).subquery()
+    result = await resolve(db.execute(streaks.insert().from_select(
+        ["user_id", "streak_type", "current_count", "longest_count", "last_activity_date", "created_at"],
+        select(users.c.id, types.c.streak_type, literal(0), literal(0), yesterday, literal(now, DateTime))
+        .select_from(users.join(types, true()))
+        .where(
+            chunk,
+            ~select(streaks.c.id).where(
+                streaks.c.user_id == users.c.id,
+                streaks.c.streak_type == types.c.streak_type
+            ).exists()
+        )
+    )))
+    report.streaks += result.rowcount
+
+    await resolve(db.execute(users.update().where(chunk).values(
+        total_points=func.coalesce(users.c.total_points, 0),
+        weekly_points=func.coalesce(users.c.weekly_points, 0),
+        monthly_points=func.coalesce(users.c.monthly_points, 0),
+        current_level_id=func.coalesce(users.c.current_level_id, levels.levels_by_number[1].id),
+        momentum_version=MOMENTUM_VERSION,
+        # Their progress changed: ETags of app.conditional must too
+        data_version=users.c.data_version + 1
+    )))
+    report.leaderboard_entries += await leaderboard.record_missing(db, user_ids)
+    report.users += len(user_ids)
+
+async def init_all_users_momentum(
+    db: Union[Session, AsyncSession],
+    chunk_size: int = DEFAULT_BACKFILL_CHUNK_SIZE,
+    progress: Optional[Callable[[BackfillReport, int], None]] = None
+) -> BackfillReport:
+    """
+    Initialize momentum data for every user not at MOMENTUM_VERSION yet,
+    ``chunk_size`` users per transaction; ``progress(report, total)`` is
+    called after each chunk
+    """
+    users = models.User.__table__
+    pending = users.c.momentum_version < MOMENTUM_VERSION
+    levels = await catalog.load(db)
+    total = (await resolve(db.execute(select(func.count()).select_from(users).where(pending)))).scalar()
+    report = BackfillReport()
+    logger.info("Initializing momentum for %d users", total)
+
+    last_id = 0
+    while True:
+        user_ids = (await resolve(db.execute(
+            select(users.c.id).where(pending, users.c.id > last_id).order_by(users.c.id).limit(chunk_size)
+        ))).scalars().all()
+        if not user_ids:
+            break
+        await _backfill_chunk(db, levels, user_ids, report)
+        await resolve(db.commit())
+        last_id = user_ids[-1]
+        logger.info("Initialized momentum for %d of %d users", report.users, total)
+        if progress:
+            progress(report, total)
+    return report
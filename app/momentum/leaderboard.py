@@ -0,0 +1,272 @@
+"""
+Materialized leaderboard.
+
+``leaderboard_entries`` holds one row per user with everything a leaderboard
+row shows. MomentumService keeps it current whenever points, level,
+achievements or streaks change, in the same transaction as the change.
+Reading the top N of a board walks that board's points index and reads N
+rows, however many users there are.
+
+Ranks come from a Fenwick (binary indexed) tree per board over point
+values, stored in ``leaderboard_rank_nodes``. Node ``i`` holds the number of
+entries whose points fall in the range it covers. A points change updates at
+most 32 nodes, and "how many users are ahead of me" reads at most 32 nodes.
+Both take one statement, whatever the number of users. The tree is stored in
+the database and changed in the same transaction as the entry, so every
+worker sees the same ranks.
+
+``rebuild`` recomputes the entries and the trees from users, levels,
+user_achievements and streaks. Run it (``python scripts/rebuild_leaderboard.py``)
+after changing points outside the app, e.g. with ``scripts/rollback_momentum.py``.
+"""
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Union
+
+from sqlalchemy import bindparam, func, or_, select, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import resolve
+
+BOARD_COLUMNS = {
+    "weekly": models.LeaderboardEntry.weekly_points,
+    "monthly": models.LeaderboardEntry.monthly_points,
+    "all-time": models.LeaderboardEntry.total_points,
+}
+
+# Points map to tree indexes 1..RANK_TREE_SIZE; anything above shares the last one
+RANK_TREE_SIZE = 2 ** 31
+
+def board_column(timeframe: str):
+    """Points column of a board; unknown timeframes read the all-time board"""
+    return BOARD_COLUMNS.get(timeframe, models.LeaderboardEntry.total_points)
+
+def _board(timeframe: str) -> str:
+    return timeframe if timeframe in BOARD_COLUMNS else "all-time"
+
+def _index(points: int) -> int:
+    return min(max(points or 0, 0), RANK_TREE_SIZE - 1) + 1
+
+def _update_path(points: int) -> Iterator[int]:
+    """Nodes whose range covers ``points``"""
+    i = _index(points)
+    while i <= RANK_TREE_SIZE:
+        yield i
+        i += i & -i
+
+def _prefix_path(points: int) -> Iterator[int]:
+    """Nodes that together cover the points values 0..``points``"""
+    i = _index(points)
+    while i > 0:
+        yield i
+        i -= i & -i
+
+async def _add_to_trees(db: Union[Session, AsyncSession], deltas: Dict) -> None:
+    """Add ``{(board, node): delta}`` to the rank trees in one statement"""
+    rows = [{"board": board, "node": node, "count": delta} for (board, node), delta in deltas.items() if delta]
+    if not rows:
+        return
+    table = models.LeaderboardRankNode.__table__
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.board, table.c.node],
+        set_={"count": table.c.count + statement.excluded.count}
+    )
+    await resolve(db.execute(statement, rows))
+
+def _moves(old: Dict[str, Optional[int]], new: Dict[str, int]) -> Counter:
+    """Tree deltas for an entry whose board points change from ``old`` to ``new``"""
+    deltas = Counter()
+    for board, points in new.items():
+        if old.get(board) == points:
+            continue
+        if old.get(board) is not None:
+            for node in _update_path(old[board]):
+                deltas[board, node] -= 1
+        for node in _update_path(points):
+            deltas[board, node] += 1
+    return deltas
+
+def _points(entry: models.LeaderboardEntry) -> Dict[str, Optional[int]]:
+    return {board: getattr(entry, column.key) for board, column in BOARD_COLUMNS.items()}
+
+def _copy_user(entry: models.LeaderboardEntry, user: models.User, level: Optional[models.Level]) -> None:
+    entry.username = user.username
+    entry.level = level.level_number if level else 1
+    entry.weekly_points = user.weekly_points or 0
+    entry.monthly_points = user.monthly_points or 0
+    entry.total_points = user.total_points or 0
+
+async def _level(db: Union[Session, AsyncSession], user: models.User) -> Optional[models.Level]:
+    return await resolve(db.get(models.Level, user.current_level_id)) if user.current_level_id else None
+
+async def _entry(db: Union[Session, AsyncSession], user_id: int) -> models.LeaderboardEntry:
+    """The user's entry, created from the source tables the first time"""
+    entry = await resolve(db.get(models.LeaderboardEntry, user_id))
+    if entry is None:
+        user = await resolve(db.get(models.User, user_id))
+        achievements_count = (await resolve(db.execute(select(func.count()).select_from(models.UserAchievement).where(
+            models.UserAchievement.user_id == user_id,
+            models.UserAchievement.completed == True
+        )))).scalar()
+        longest_streak = (await resolve(db.execute(select(func.max(models.Streak.longest_count)).where(
+            models.Streak.user_id == user_id
+        )))).scalar()
+        entry = models.LeaderboardEntry(
+            user_id=user_id,
+            achievements_count=achievements_count or 0,
+            longest_streak=longest_streak or 0
+        )
+        _copy_user(entry, user, await _level(db, user))
+        db.add(entry)
+        await _add_to_trees(db, _moves({}, _points(entry)))
+    return entry
+
+async def record_user(db: Union[Session, AsyncSession], user: models.User) -> models.LeaderboardEntry:
+    """Copy the user's name, level and points into their entry"""
+    entry = await _entry(db, user.id)
+    old = _points(entry)
+    _copy_user(entry, user, await _level(db, user))
+    await _add_to_trees(db, _moves(old, _points(entry)))
+    return entry
+
+async def record_missing(db: Union[Session, AsyncSession], user_ids: List[int]) -> int:
+    """Create the entries of ``user_ids`` that have none, from the source tables; returns how many"""
+    users, levels, entries = models.User.__table__, models.Level.__table__, models.LeaderboardEntry.__table__
+    achievements, streaks = models.UserAchievement.__table__, models.Streak.__table__
+    result = await resolve(db.execute(
+        select(
+            users.c.id.label("user_id"),
+            users.c.username,
+            func.coalesce(levels.c.level_number, 1).label("level"),
+            func.coalesce(users.c.weekly_points, 0).label("weekly_points"),
+            func.coalesce(users.c.monthly_points, 0).label("monthly_points"),
+            func.coalesce(users.c.total_points, 0).label("total_points"),
+            select(func.count()).where(
+                achievements.c.user_id == users.c.id, achievements.c.completed == True
+            ).scalar_subquery().label("achievements_count"),
+            select(func.coalesce(func.max(streaks.c.longest_count), 0)).where(
+                streaks.c.user_id == users.c.id
+            ).scalar_subquery().label("longest_streak"),
+        )
+        .select_from(users.outerjoin(levels, levels.c.id == users.c.current_level_id))
+        .where(users.c.id.in_(user_ids), ~select(entries.c.user_id).where(entries.c.user_id == users.c.id).exists())
+    ))
+    rows = [dict(row._mapping) for row in result]
+    if rows:
+        await resolve(db.execute(entries.insert(), rows))
+        deltas = Counter()
+        for row in rows:
+            deltas.update(_moves({}, {board: row[column.key] for board, column in BOARD_COLUMNS.items()}))
+        await _add_to_trees(db, deltas)
+    return len(rows)
+
+async def record_points(db: Union[Session, AsyncSession], condition) -> int:
+    """
+    Copy the points of the users matching ``condition`` (on ``users``) into
+    their entries, in one statement for all the entries that differ; returns how many.
+    """
+    users, entries = models.User.__table__, models.LeaderboardEntry.__table__
+    keys = [column.key for column in BOARD_COLUMNS.values()]
+    result = await resolve(db.execute(
+        select(
+            entries.c.user_id,
+            *(entries.c[key].label(f"old_{key}") for key in keys),
+            *(func.coalesce(users.c[key], 0).label(key) for key in keys)
+        )
+        .join(users, users.c.id == entries.c.user_id)
+        .where(condition, or_(*(entries.c[key] != func.coalesce(users.c[key], 0) for key in keys)))
+    ))
+    rows = [row._mapping for row in result]
+    if rows:
+        await resolve(db.execute(
+            entries.update().where(entries.c.user_id == bindparam("entry_user_id")).values(
+                {key: bindparam(f"new_{key}") for key in keys}
+            ),
+            [{"entry_user_id": row["user_id"], **{f"new_{key}": row[key] for key in keys}} for row in rows]
+        ))
+        deltas = Counter()
+        for row in rows:
+            deltas.update(_moves(
+                {board: row[f"old_{column.key}"] for board, column in BOARD_COLUMNS.items()},
+                {board: row[column.key] for board, column in BOARD_COLUMNS.items()}
+            ))
+        await _add_to_trees(db, deltas)
+    return len(rows)
+
+async def record_achievement(db: Union[Session, AsyncSession], user_id: int) -> None:
+    """Count one more completed achievement"""
+    entry = await _entry(db, user_id)
+    entry.achievements_count = (entry.achievements_count or 0) + 1
+
+async def record_streak(db: Union[Session, AsyncSession], user_id: int, longest_count: int) -> None:
+    """Raise the entry's longest streak to ``longest_count`` if it is longer"""
+    entry = await _entry(db, user_id)
+    if longest_count > (entry.longest_streak or 0):
+        entry.longest_streak = longest_count
+
+async def top(db: Union[Session, AsyncSession], timeframe: str, limit: int) -> List[models.LeaderboardEntry]:
+    """The ``limit`` best entries of a board, highest points first"""
+    result = await resolve(db.execute(
+        select(models.LeaderboardEntry).order_by(board_column(timeframe).desc()).limit(limit)
+    ))
+    return result.scalars().all()
+
+async def rank(db: Union[Session, AsyncSession], timeframe: str, user_id: int) -> Optional[int]:
+    """
+    Position of the user on a board, 1 for the most points; users with equal
+    points share a position, as with SQL rank(). None if the user has no entry.
+    """
+    entry = await resolve(db.get(models.LeaderboardEntry, user_id))
+    if entry is None:
+        return None
+    board = _board(timeframe)
+    prefix = list(_prefix_path(getattr(entry, board_column(board).key)))
+    result = await resolve(db.execute(
+        select(models.LeaderboardRankNode.node, models.LeaderboardRankNode.count).where(
+            models.LeaderboardRankNode.board == board,
+            models.LeaderboardRankNode.node.in_(prefix + [RANK_TREE_SIZE])
+        )
+    ))
+    counts = dict(result.all())
+    at_or_below = sum(counts.get(node, 0) for node in prefix)
+    return counts.get(RANK_TREE_SIZE, 0) - at_or_below + 1
+
+def rebuild_rank_trees(connection: Connection) -> None:
+    """Recompute the rank trees from leaderboard_entries"""
+    connection.execute(text("DELETE FROM leaderboard_rank_nodes"))
+    deltas = Counter()
+    for board, column in BOARD_COLUMNS.items():
+        histogram = connection.execute(
+            select(column, func.count()).group_by(column)
+        ).all()
+        for points, count in histogram:
+            for node in _update_path(points):
+                deltas[board, node] += count
+    if deltas:
+        connection.execute(
+            models.LeaderboardRankNode.__table__.insert(),
+            [{"board": board, "node": node, "count": count} for (board, node), count in deltas.items()]
+        )
+
+def rebuild(connection: Connection) -> None:
+    """Recompute every entry and the rank trees from the source tables"""
+    rebuild_entries(connection)
+    rebuild_rank_trees(connection)
+
+def rebuild_entries(connection: Connection) -> None:
+    """Recompute every entry from the source tables"""
+    connection.execute(text("DELETE FROM leaderboard_entries"))
+    connection.execute(text(
+        "INSERT INTO leaderboard_entries (user_id, username, level, weekly_points, monthly_points, "
+        "total_points, achievements_count, longest_streak) "
+        "SELECT users.id, users.username, COALESCE(levels.level_number, 1), "
+        "COALESCE(users.weekly_points, 0), COALESCE(users.monthly_points, 0), COALESCE(users.total_points, 0), "
+        "(SELECT COUNT(*) FROM user_achievements "
+        " WHERE user_achievements.user_id = users.id AND user_achievements.completed = 1), "
+        "(SELECT COALESCE(MAX(streaks.longest_count), 0) FROM streaks WHERE streaks.user_id = users.id) "
+        "FROM users LEFT JOIN levels ON levels.id = users.current_level_id"
+    ))
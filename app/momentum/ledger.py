@@ -0,0 +1,276 @@
+"""
+Append-only points ledger.
+
+Every change of a user's points is a ``points_ledger`` row: the user, the
+event type, the source entity (task, goal step, time slot, achievement...),
+the signed points and the UTC time they were awarded. Rows are never updated
+or deleted. Reverting an award adds a row of its negated points that names it
+(``reverts_id``) and keeps its award time, so a revert takes back exactly what
+was given, from the week and month it was given in, whatever the point rules
+or the clock say now.
+
+``users.total_points``, ``weekly_points`` and ``monthly_points`` are rollups
+of the ledger: the sum of the user's rows, and of the rows awarded since the
+start of the user's current local week (Monday) and month.
+``weekly_points_start`` and ``monthly_points_start`` name the week and month
+the rollups are for (none: counted before the ledger, taken as the current
+ones). A rollup of an earlier period counts as 0 (``current``)
+and is recomputed from the ledger, with one range sum over the
+(user_id, awarded_at) index, the next time the user's points change
+(``roll_periods``), or by the daily job, one UPDATE per timezone
+(``roll_timezone``). No reset has to run at midnight for the totals to be
+right, and running one late or twice changes nothing.
+"""
+from datetime import date, datetime, time
+from typing import Dict, List, Optional, Tuple, Union
+
+import pytz
+
+from sqlalchemy import DateTime, case, func, literal, or_, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import resolve
+
+DEFAULT_TIMEZONE = "Asia/Kolkata"
+
+# Metadata key naming an event's source entity, most specific first
+SOURCE_KEYS = (
+    ("task_id", "task"),
+    ("step_id", "goal_step"),
+    ("goal_id", "goal"),
+    ("time_slot_id", "time_slot"),
+    ("reflection_id", "reflection"),
+)
+
+# Before the ledger existed; see seed_opening_balances
+OPENING_BALANCE = "opening_balance"
+OPENING_BALANCE_AT = datetime(1970, 1, 1)
+
+Source = Tuple[Optional[str], Optional[int]]
+
+def source(metadata: Optional[Dict]) -> Source:
+    """(source type, id) of an event from its metadata; (None, None) if it names none"""
+    for key, source_type in SOURCE_KEYS:
+        if (metadata or {}).get(key) is not None:
+            return source_type, metadata[key]
+    return None, None
+
+def local_date(timezone_name: Optional[str], now: Optional[datetime] = None) -> date:
+    """The local date at ``now`` (UTC)"""
+    local = (now or datetime.utcnow()).replace(tzinfo=pytz.UTC).astimezone(pytz.timezone(timezone_name or DEFAULT_TIMEZONE))
+    return local.date()
+
+def period_starts(timezone_name: Optional[str], now: Optional[datetime] = None) -> Tuple[date, date]:
+    """First day of the local week (Monday) and month at ``now`` (UTC)"""
+    today = local_date(timezone_name, now)
+    return date.fromordinal(today.toordinal() - today.weekday()), today.replace(day=1)
+
+def utc_start(day: date, timezone_name: Optional[str]) -> datetime:
+    """The UTC moment local ``day`` begins, as a naive datetime like the ledger's"""
+    local = pytz.timezone(timezone_name or DEFAULT_TIMEZONE).localize(datetime.combine(day, time.min))
+    return local.astimezone(pytz.UTC).replace(tzinfo=None)
+
+def current(user: models.User, now: Optional[datetime] = None) -> Dict[str, int]:
+    """The user's weekly and monthly points now, without writing; 0 for a rollup of a past period"""
+    week_start, month_start = period_starts(user.timezone, now)
+    return {
+        "weekly_points": (user.weekly_points or 0) if user.weekly_points_start in (None, week_start) else 0,
+        "monthly_points": (user.monthly_points or 0) if user.monthly_points_start in (None, month_start) else 0,
+    }
+
+async def window_sum(db: Union[Session, AsyncSession], user_id: int, since: Optional[datetime] = None) -> int:
+    """Points of the user's rows awarded at or after ``since`` (all rows if None)"""
+    table = models.PointsLedgerEntry.__table__
+    statement = select(func.coalesce(func.sum(table.c.points), 0)).where(table.c.user_id == user_id)
+    if since is not None:
+        statement = statement.where(table.c.awarded_at >= since)
+    return (await resolve(db.execute(statement))).scalar()
+
+async def awarded_since(db: Union[Session, AsyncSession], user_id: int, event_type: str, since: datetime) -> bool:
+    """Whether the user was awarded ``event_type`` at or after ``since``, reverted or not"""
+    table = models.PointsLedgerEntry.__table__
+    result = await resolve(db.execute(select(table.c.id).where(
+        table.c.user_id == user_id,
+        table.c.awarded_at >= since,
+        table.c.event_type == event_type,
+        table.c.points > 0
+    ).limit(1)))
+    return result.first() is not None
+
+async def roll_periods(db: Union[Session, AsyncSession], user: models.User, now: Optional[datetime] = None) -> None:
+    """Point the weekly and monthly rollups at the current local week and month"""
+    week_start, month_start = period_starts(user.timezone, now)
+    # Rollups without a period predate it and are taken as the current period's
+    if user.weekly_points_start not in (None, week_start):
+        user.weekly_points = await window_sum(db, user.id, utc_start(week_start, user.timezone))
+    user.weekly_points_start = week_start
+    if user.monthly_points_start not in (None, month_start):
+        user.monthly_points = await window_sum(db, user.id, utc_start(month_start, user.timezone))
+    user.monthly_points_start = month_start
+
+def in_timezone(timezone_name: Optional[str]):
+    """Condition on ``users`` matching the users whose timezone is ``timezone_name`` (None: unset)"""
+    users = models.User.__table__
+    return users.c.timezone.is_(None) if timezone_name is None else users.c.timezone == timezone_name
+
+async def roll_timezone(db: Union[Session, AsyncSession], timezone_name: Optional[str], now: Optional[datetime] = None) -> int:
+    """
+    ``roll_periods`` for every user of a timezone in one UPDATE, with the
+    window sums as correlated subqueries; returns the number of users rolled.
+    Users whose rollups are already for the current periods are not written.
+    """
+    users = models.User.__table__
+    table = models.PointsLedgerEntry.__table__
+    week_start, month_start = period_starts(timezone_name, now)
+
+    def rolled(points, start, period_start):
+        since = utc_start(period_start, timezone_name)
+        window = select(func.coalesce(func.sum(table.c.points), 0)).where(
+            table.c.user_id == users.c.id, table.c.awarded_at >= since
+        ).scalar_subquery()
+        # SET expressions read the row as it was before the UPDATE
+        return case((or_(start.is_(None), start == period_start), points), else_=window)
+
+    result = await resolve(db.execute(
+        users.update()
+        .where(
+            in_timezone(timezone_name),
+            or_(
+                users.c.weekly_points_start.is_(None), users.c.weekly_points_start != week_start,
+                users.c.monthly_points_start.is_(None), users.c.monthly_points_start != month_start
+            )
+        )
+        .values(
+            weekly_points=rolled(users.c.weekly_points, users.c.weekly_points_start, week_start),
+            weekly_points_start=week_start,
+            monthly_points=rolled(users.c.monthly_points, users.c.monthly_points_start, month_start),
+            monthly_points_start=month_start,
+            data_version=users.c.data_version + 1
+        )
+    ))
+    return result.rowcount
+
+async def _append(db: Union[Session, AsyncSession], rows: List[Dict]) -> None:
+    if rows:
+        await resolve(db.execute(models.PointsLedgerEntry.__table__.insert(), rows))
+
+async def award(
+    db: Union[Session, AsyncSession],
+    user: models.User,
+    entries: List[Tuple[str, Source, int]],
+    now: Optional[datetime] = None
+) -> int:
+    """Add ``(event type, source, points)`` awards to the ledger and the user's rollups"""
+    now = now or datetime.utcnow()
+    await roll_periods(db, user, now)
+    await _append(db, [
+        {
+            "user_id": user.id, "event_type": event_type, "source_type": source_type,
+            "source_id": source_id, "points": points, "awarded_at": now, "created_at": now,
+        }
+        for event_type, (source_type, source_id), points in entries
+    ])
+    total = sum(points for _, _, points in entries)
+    user.total_points = (user.total_points or 0) + total
+    user.weekly_points = (user.weekly_points or 0) + total
+    user.monthly_points = (user.monthly_points or 0) + total
+    return total
+
+async def _unreverted_award(db: Union[Session, AsyncSession], user_id: int, event_type: str, event_source: Source):
+    """The latest award of this event and source that has not been reverted yet"""
+    table = models.PointsLedgerEntry.__table__
+    reverts = table.alias("reverts")
+    source_type, source_id = event_source
+    result = await resolve(db.execute(
+        select(table.c.id, table.c.points, table.c.awarded_at)
+        .outerjoin(reverts, reverts.c.reverts_id == table.c.id)
+        .where(
+            table.c.user_id == user_id,
+            table.c.event_type == event_type,
+            table.c.source_type == source_type,
+            table.c.source_id == source_id,
+            table.c.points > 0,
+            table.c.reverts_id.is_(None),
+            reverts.c.id.is_(None)
+        )
+        .order_by(table.c.id.desc())
+        .limit(1)
+    ))
+    return result.first()
+
+async def revert(
+    db: Union[Session, AsyncSession],
+    user: models.User,
+    event_type: str,
+    event_source: Source,
+    fallback_points: Optional[int],
+    now: Optional[datetime] = None
+) -> int:
+    """
+    Take back the award of ``event_type`` for ``event_source``; returns the points taken.
+
+    An award recorded before the ledger, or an event without a source, cannot
+    be matched: ``fallback_points`` are taken instead, from the current
+    periods and never below zero, as before the ledger. With
+    ``fallback_points`` None nothing is taken then.
+    """
+    now = now or datetime.utcnow()
+    await roll_periods(db, user, now)
+    original = await _unreverted_award(db, user.id, event_type, event_source) if event_source[1] is not None else None
+    source_type, source_id = event_source
+
+    if original is None and fallback_points is None:
+        return 0
+    if original is None:
+        points = min(fallback_points, user.total_points or 0)
+        await _append(db, [{
+            "user_id": user.id, "event_type": event_type, "source_type": source_type, "source_id": source_id,
+            "points": -points, "awarded_at": now, "created_at": now,
+        }])
+        user.total_points = (user.total_points or 0) - points
+        user.weekly_points = max(0, (user.weekly_points or 0) - points)
+        user.monthly_points = max(0, (user.monthly_points or 0) - points)
+        return points
+
+    points = original.points
+    await _append(db, [{
+        "user_id": user.id, "event_type": event_type, "source_type": source_type, "source_id": source_id,
+        "points": -points, "reverts_id": original.id, "awarded_at": original.awarded_at, "created_at": now,
+    }])
+    user.total_points -= points
+    if original.awarded_at >= utc_start(user.weekly_points_start, user.timezone):
+        user.weekly_points -= points
+    if original.awarded_at >= utc_start(user.monthly_points_start, user.timezone):
+        user.monthly_points -= points
+    return points
+
+def seed_opening_balances(connection: Connection, now: Optional[datetime] = None) -> None:
+    """
+    Start the ledger of users that already have points: one opening_balance
+    row of their total, dated before any period, and the current week and
+    month as the periods of their existing weekly and monthly points.
+    """
+    users = models.User.__table__
+    table = models.PointsLedgerEntry.__table__
+    connection.execute(
+        table.insert().from_select(
+            ["user_id", "event_type", "points", "awarded_at", "created_at"],
+            select(
+                users.c.id, literal(OPENING_BALANCE), users.c.total_points,
+                literal(OPENING_BALANCE_AT, DateTime), literal(now or datetime.utcnow(), DateTime)
+            ).where(
+                users.c.total_points > 0,
+                # Users whose points are already in the ledger
+                ~select(table.c.id).where(table.c.user_id == users.c.id).exists()
+            )
+        )
+    )
+    # One statement per timezone, not per user
+    for (timezone_name,) in connection.execute(select(users.c.timezone).distinct()).all():
+        week_start, month_start = period_starts(timezone_name, now)
+        connection.execute(users.update().where(in_timezone(timezone_name)).values(
+            weekly_points_start=week_start, monthly_points_start=month_start
+        ))
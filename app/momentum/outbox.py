@@ -0,0 +1,203 @@
+"""
+Momentum event outbox.
+
+Request handlers do not run the momentum chain (points, streaks,
+achievements, level) inline. ``record`` adds a ``momentum_events`` row to
+the handler's session, so the event commits or rolls back with the write
+that caused it, and the response returns right after that commit.
+
+``drain`` applies pending events in batches. A user's events are read in id
+order, which is the order they committed, and applied in one transaction
+that also marks them processed, so every event is applied exactly once and
+never ahead of an earlier event of the same user. Consecutive awards go
+through one MomentumService.process_events call, as do consecutive reverts;
+they are not merged across each other because deductions stop at zero.
+
+If a user's events fail together they are applied one at a time up to the
+failing one, which is retried on the next drain. After
+MOMENTUM_OUTBOX_MAX_ATTEMPTS it is parked as 'failed' and the user's later
+events go on. Other users are never held up.
+
+``run_worker`` drains in the background of the app (started from the
+lifespan in app.main) and wakes up as soon as a session that recorded
+events commits. ``python scripts/drain_momentum_outbox.py`` drains from a
+cron job or systemd timer instead.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+from itertools import groupby
+from typing import Dict, List, Optional, Union
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+from ..database import resolve
+from .services import MomentumService
+
+logger = logging.getLogger(__name__)
+
+RECORDED_KEY = "momentum_events_recorded"
+
+def _encode(value):
+    # completion_time and friends are datetimes; _calculate_points reads their hour
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _decode(value: Dict):
+    if value.keys() == {"$datetime"}:
+        return datetime.fromisoformat(value["$datetime"])
+    return value
+
+def dump_metadata(metadata: Optional[Dict]) -> Optional[str]:
+    return json.dumps(metadata, default=_encode) if metadata else None
+
+def load_metadata(payload: Optional[str]) -> Dict:
+    return json.loads(payload, object_hook=_decode) if payload else {}
+
+def record(
+    db: Union[Session, AsyncSession],
+    user_id: int,
+    event_type: str,
+    metadata: Dict = None,
+    revert: bool = False
+) -> models.MomentumEvent:
+    """Add a momentum event, or the revert of one, to the caller's transaction"""
+    momentum_event = models.MomentumEvent(
+        user_id=user_id,
+        event_type=event_type,
+        payload=dump_metadata(metadata),
+        revert=revert
+    )
+    db.add(momentum_event)
+    db.info[RECORDED_KEY] = True
+    return momentum_event
+
+@event.listens_for(Session, "after_commit")
+def _wake_worker(session):
+    if session.info.pop(RECORDED_KEY, False):
+        notify()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_recorded(session):
+    session.info.pop(RECORDED_KEY, None)
+
+class _AlreadyClaimed(Exception):
+    """Another drain marked some of the events first"""
+
+async def _pending(db: Union[Session, AsyncSession], limit: int) -> List:
+    table = models.MomentumEvent.__table__
+    result = await resolve(db.execute(
+        select(table.c.id, table.c.user_id, table.c.event_type, table.c.payload, table.c.revert, table.c.attempts)
+        .where(table.c.status == "pending")
+        .order_by(table.c.id)
+        .limit(limit)
+    ))
+    return result.all()
+
+async def _apply(db: Union[Session, AsyncSession], user_id: int, rows: List) -> None:
+    """Apply ``rows`` of one user in order and mark them processed, in one transaction"""
+    table = models.MomentumEvent.__table__
+    service = MomentumService(db)
+    try:
+        async with service.unit_of_work():
+            # Marking first takes the write lock, so a concurrent drain sees them as taken
+            claimed = await resolve(db.execute(
+                table.update()
+                .where(table.c.id.in_([row.id for row in rows]), table.c.status == "pending")
+                .values(status="processed", processed_at=datetime.utcnow())
+            ))
+            if claimed.rowcount != len(rows):
+                raise _AlreadyClaimed()
+            for revert, run in groupby(rows, key=lambda row: row.revert):
+                events = [(row.event_type, load_metadata(row.payload)) for row in run]
+                if revert:
+                    await service.process_events(user_id, [], events)
+                else:
+                    await service.process_events(user_id, events)
+    except _AlreadyClaimed:
+        logger.info("Momentum events of user %s were applied by another drain", user_id)
+
+async def _fail(db: Union[Session, AsyncSession], row, error: Exception) -> None:
+    table = models.MomentumEvent.__table__
+    values = {"attempts": row.attempts + 1, "last_error": repr(error)}
+    if row.attempts + 1 >= settings.MOMENTUM_OUTBOX_MAX_ATTEMPTS:
+        values.update(status="failed", processed_at=datetime.utcnow())
+        logger.error("Momentum event %s of user %s parked after %d attempts", row.id, row.user_id, row.attempts + 1)
+    await resolve(db.execute(table.update().where(table.c.id == row.id).values(**values)))
+    await resolve(db.commit())
+
+async def _apply_one_by_one(db: Union[Session, AsyncSession], user_id: int, rows: List) -> None:
+    for row in rows:
+        try:
+            await _apply(db, user_id, [row])
+        except Exception as error:
+            logger.exception("Momentum event %s of user %s failed", row.id, user_id)
+            await _fail(db, row, error)
+            # The user's later events wait, so they never apply ahead of this one
+            return
+
+async def drain(db: Union[Session, AsyncSession], limit: Optional[int] = None) -> int:
+    """Apply up to ``limit`` pending events; returns how many were read"""
+    rows = await _pending(db, limit or settings.MOMENTUM_OUTBOX_BATCH_SIZE)
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row.user_id, []).append(row)
+
+    for user_id, user_rows in by_user.items():
+        if len(user_rows) > 1:
+            try:
+                await _apply(db, user_id, user_rows)
+                continue
+            except Exception:
+                logger.warning("Applying %d momentum events of user %s together failed", len(user_rows), user_id)
+        await _apply_one_by_one(db, user_id, user_rows)
+    return len(rows)
+
+# (loop, wake-up event) of the worker running in this process
+_worker: Optional[tuple] = None
+
+def notify() -> None:
+    """Wake this process's worker, if it runs; safe from any thread"""
+    worker = _worker
+    if worker is None:
+        return
+    loop, wakeup = worker
+    try:
+        loop.call_soon_threadsafe(wakeup.set)
+    except RuntimeError:
+        # The loop closed while shutting down
+        pass
+
+async def run_worker(session_factory=None, batch_size: Optional[int] = None, poll_seconds: Optional[float] = None) -> None:
+    """Drain until cancelled: right after a commit that recorded events, and every ``poll_seconds``"""
+    global _worker
+    if session_factory is None:
+        from ..database import AsyncSessionLocal as session_factory
+    batch_size = batch_size or settings.MOMENTUM_OUTBOX_BATCH_SIZE
+    poll_seconds = poll_seconds or settings.MOMENTUM_OUTBOX_POLL_SECONDS
+    wakeup = asyncio.Event()
+    _worker = (asyncio.get_running_loop(), wakeup)
+    try:
+        while True:
+            # Cleared before draining, so events committed meanwhile get another pass
+            wakeup.clear()
+            try:
+                async with session_factory() as db:
+                    read = await drain(db, batch_size)
+            except Exception:
+                logger.exception("Draining the momentum outbox failed")
+                read = 0
+            if read >= batch_size:
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        _worker = None
@@ -0,0 +1,558 @@
+"""
+Momentum replay.
+
+Rebuilds each user's momentum state (points ledger and point totals,
+streaks, achievements and level) from their tasks, goals, goal steps, time
+slots and reflections, under the rules now in app.momentum.momentum. Run it
+after changing those rules: ``python scripts/replay_momentum.py``, with
+``--dry-run`` to only report what would change.
+
+History does not keep when something was completed, so each completion is
+replayed at the best time on record: a task, goal or goal step when it was
+created, a time slot when it ended, a reflection when it was written. It
+yields the events the services record for that completion, with the same
+metadata, and all events go through the steps of
+MomentumService.process_event in chronological order: points, streaks,
+achievements, level. Achievement counters are counted over the replayed
+history, as user_stats counts them. Achievements that history cannot
+decide (Leaderboard Legend, and Productivity Pioneer, which reads the last
+seven days) keep their current status and their points.
+
+Users are replayed in chunks of ``chunk_size`` consecutive ids, computed in
+a process pool on read-only connections. The parent process writes each
+chunk in one transaction, replacing the users' ledger rows, then records it
+in the checkpoint file, so an interrupted run resumes after the chunks it
+wrote. Outbox events pending when the run started are marked processed for
+replayed users, since the replay covers the rows they were recorded for.
+Run it while the app is stopped or quiet: a user's writes between the
+computing and the writing of their chunk are overwritten.
+"""
+import json
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import pytz
+
+from sqlalchemy import bindparam, create_engine, func, select
+from sqlalchemy.engine import Connection, Engine
+
+from .. import models, user_stats
+from ..database import install_sqlite_pragmas, sqlite_pragmas
+from ..json_utils import serialize_json
+from . import achievements, leaderboard, ledger
+from .momentum import ACHIEVEMENTS, FOCUSED_SESSION_THRESHOLD, LEVELS, REFLECTION_STREAK_MILESTONES
+from .services import STREAK_EVENTS, MomentumService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Counters the replay counts over history; achievements reading others are kept as they are
+REPLAYED_COUNTERS = set(user_stats.COUNTERS) | {'longest_streak', 'early_completed_tasks', 'complex_completed_goals'}
+REPLAYED_ACHIEVEMENTS = [
+    name for name, rule in achievements.RULES.items() if rule.counter in REPLAYED_COUNTERS
+]
+
+@dataclass
+class Event:
+    """A momentum event at ``moment`` (naive UTC), with the counters its completion adds"""
+    moment: datetime
+    event_type: str
+    metadata: Dict
+    counts: Dict[str, float] = field(default_factory=dict)
+
+@dataclass
+class UserState:
+    """A user's momentum state, as stored or as replayed"""
+    total_points: int
+    weekly_points: int
+    monthly_points: int
+    level: int
+    # streak type: (current count, longest count, last activity date)
+    streaks: Dict[str, Tuple[int, int, Optional[date]]]
+    # held achievement name: completed_at
+    achievements: Dict[str, Optional[datetime]]
+    # (event type, source type, source id, points, awarded_at); an achievement's source id is its name
+    ledger: List[Tuple] = field(default_factory=list)
+
+@dataclass
+class ReplayReport:
+    users: int = 0
+    skipped_chunks: int = 0
+    # user id: what the replay changes (or would change, in a dry run)
+    changes: Dict[int, List[str]] = field(default_factory=dict)
+
+def _moment(*candidates: Optional[datetime]) -> datetime:
+    return next((moment for moment in candidates if moment is not None), ledger.OPENING_BALANCE_AT)
+
+def _local(moment: datetime, tz) -> datetime:
+    return moment.replace(tzinfo=pytz.UTC).astimezone(tz)
+
+def _run(runs: Dict, key, day: date) -> int:
+    """Length of the run of consecutive days ending at ``day``"""
+    last_day, length = runs.get(key, (None, 0))
+    length = length + 1 if last_day is not None and (day - last_day).days == 1 else 1
+    runs[key] = (day, length)
+    return length
+
+def history(timezone_name: Optional[str], tasks, goals, steps, slots, reflections) -> List[Event]:
+    """The user's momentum events in chronological order, as the services record them"""
+    tz = pytz.timezone(timezone_name or ledger.DEFAULT_TIMEZONE)
+    events = []
+    runs = {}
+
+    task_days = set()
+    for task in sorted(tasks, key=lambda task: (_moment(task.created_at), task.id)):
+        moment = _moment(task.created_at)
+        local = _local(moment, tz)
+        is_weekend = moment.weekday() >= 5
+        is_first_task = local.date() not in task_days
+        task_days.add(local.date())
+        counts = user_stats.TRACKED[models.Task][2](task)
+        if local.hour < 9:
+            counts['early_completed_tasks'] = 1
+        events.append(Event(moment, 'task_completion', {
+            'task_id': task.id, 'completion_time': moment, 'is_weekend': is_weekend,
+            'is_first_task': is_first_task, 'complexity': 1
+        }, counts))
+        if is_first_task:
+            events.append(Event(moment, 'first_task_of_day', {'task_id': task.id, 'completion_time': moment}))
+        if is_weekend:
+            events.append(Event(moment, 'weekend_warrior', {'task_id': task.id, 'completion_time': moment}))
+
+    for goal in sorted(goals, key=lambda goal: (_moment(goal.created_at), goal.id)):
+        moment = _moment(goal.created_at)
+        # Consecutive days with a completed goal, as goals.services._get_goal_streak counts them
+        streak = _run(runs, 'goals', moment.date())
+        events.append(Event(moment, 'goal_completion', {
+            'goal_id': goal.id, 'completion_time': moment, 'is_weekend': moment.weekday() >= 5,
+            'current_streak': streak
+        }, {'complex_completed_goals': 1} if goal.steps >= 5 else {}))
+        events.append(Event(moment, 'goal_streak', {'goal_id': goal.id, 'streak': streak, 'completion_time': moment}))
+
+    for step in steps:
+        moment = _moment(step.created_at)
+        events.append(Event(moment, 'goal_step_completion', {
+            'step_id': step.id, 'goal_id': step.goal_id, 'completion_time': moment, 'is_weekend': moment.weekday() >= 5
+        }))
+
+    for slot in slots:
+        moment = _moment(slot.end_time, slot.start_time, slot.created_at)
+        duration = int((slot.end_time - slot.start_time).total_seconds() / 60) if slot.start_time and slot.end_time else 0
+        completion = {'time_slot_id': slot.id, 'duration': duration, 'completion_time': moment}
+        events.append(Event(
+            moment, 'time_slot_completion', {**completion, 'is_weekend': moment.weekday() >= 5},
+            user_stats.TRACKED[models.TimeSlot][2](slot)
+        ))
+        if duration >= FOCUSED_SESSION_THRESHOLD:
+            events.append(Event(moment, 'focused_session', completion))
+        local = _local(moment, tz)
+        if 5 <= local.hour < 9:
+            events.append(Event(moment, 'early_bird', {'time_slot_id': slot.id, 'completion_time': local}))
+        elif 21 <= local.hour < 24:
+            events.append(Event(moment, 'night_owl', {'time_slot_id': slot.id, 'completion_time': local}))
+
+    for reflection in sorted(reflections, key=lambda reflection: reflection.reflection_date):
+        moment = _moment(reflection.created_at, datetime.combine(reflection.reflection_date, datetime.min.time()))
+        events.append(Event(
+            moment, 'reflection_completion', {'reflection_id': reflection.id},
+            user_stats.TRACKED[models.Reflection][2](reflection)
+        ))
+        streak = _run(runs, 'reflections', reflection.reflection_date)
+        if streak in REFLECTION_STREAK_MILESTONES:
+            events.append(Event(moment, 'reflection_streak', {'streak': streak}))
+
+    # Stable: events of one completion stay in the order above
+    events.sort(key=lambda event: event.moment)
+    return events
+
+def _advance_streak(streaks: Dict, streak_type: str, day: date) -> None:
+    """MomentumService.update_streaks for an event on local ``day``"""
+    if streak_type not in streaks:
+        streaks[streak_type] = (1, 1, day)
+        return
+    current, longest, last_day = streaks[streak_type]
+    if (day - last_day).days == 1:
+        current += 1
+        longest = max(longest, current)
+    elif (day - last_day).days > 1:
+        current = 1
+    streaks[streak_type] = (current, longest, day)
+
+def replay(
+    timezone_name: Optional[str],
+    events: List[Event],
+    stored: UserState,
+    now: datetime
+) -> UserState:
+    """The state ``events`` lead to, keeping what history cannot decide from ``stored``"""
+    tz = pytz.timezone(timezone_name or ledger.DEFAULT_TIMEZONE)
+    held = {
+        name: completed_at for name, completed_at in stored.achievements.items()
+        if name not in REPLAYED_ACHIEVEMENTS
+    }
+    rows = [
+        ("achievement", "achievement", name, achievements.ACHIEVEMENTS_BY_NAME[name]['points'], _moment(completed_at))
+        for name, completed_at in held.items() if name in achievements.ACHIEVEMENTS_BY_NAME
+    ]
+    streaks = {}
+    counters = defaultdict(float)
+
+    for event in events:
+        points = MomentumService._calculate_points(event.event_type, event.metadata)
+        rows.append((event.event_type, *ledger.source(event.metadata), points, event.moment))
+
+        for streak_type, streak_events in STREAK_EVENTS.items():
+            if event.event_type in streak_events:
+                _advance_streak(streaks, streak_type, _local(event.moment, tz).date())
+
+        for counter, count in event.counts.items():
+            counters[counter] += count
+
+        for name in achievements.affected([event.event_type]):
+            if name in held or name not in REPLAYED_ACHIEVEMENTS:
+                continue
+            rule = achievements.RULES[name]
+            if rule.counter == 'longest_streak':
+                value = (streaks.get(rule.key) or stored.streaks.get(rule.key) or (0, 0, None))[1]
+            else:
+                value = counters[rule.counter]
+            achievement = achievements.ACHIEVEMENTS_BY_NAME[name]
+            if value >= achievement['criteria_value']:
+                held[name] = event.moment
+                rows.append(("achievement", "achievement", name, achievement['points'], event.moment))
+
+    # Streaks not kept up are reset by the daily check_expired_streaks
+    yesterday = now.date() - timedelta(days=1)
+    streaks = {
+        streak_type: (0 if last_day < yesterday else current, longest, last_day)
+        for streak_type, (current, longest, last_day) in streaks.items()
+    }
+
+    week_start, month_start = ledger.period_starts(timezone_name, now)
+    week_from, month_from = ledger.utc_start(week_start, timezone_name), ledger.utc_start(month_start, timezone_name)
+    total = sum(row[3] for row in rows)
+    return UserState(
+        total_points=total,
+        weekly_points=sum(row[3] for row in rows if row[4] >= week_from),
+        monthly_points=sum(row[3] for row in rows if row[4] >= month_from),
+        level=max(level['level_number'] for level in LEVELS if level['points_required'] <= total),
+        streaks=streaks,
+        achievements=held,
+        ledger=rows,
+    )
+
+def diff(stored: UserState, replayed: UserState) -> List[str]:
+    """Readable differences between a stored and a replayed state"""
+    changes = []
+    for name in ("total_points", "weekly_points", "monthly_points", "level"):
+        old, new = getattr(stored, name), getattr(replayed, name)
+        if old != new:
+            changes.append(f"{name}: {old} -> {new}")
+    for streak_type in STREAK_EVENTS:
+        old = stored.streaks.get(streak_type, (0, 0, None))[:2]
+        new = replayed.streaks.get(streak_type, (0, 0, None))[:2]
+        if old != new:
+            changes.append(f"{streak_type} streak (current/longest): {old[0]}/{old[1]} -> {new[0]}/{new[1]}")
+    gained = sorted(replayed.achievements.keys() - stored.achievements.keys())
+    lost = sorted(stored.achievements.keys() - replayed.achievements.keys())
+    if gained:
+        changes.append(f"achievements gained: {', '.join(gained)}")
+    if lost:
+        changes.append(f"achievements lost: {', '.join(lost)}")
+    return changes
+
+def _by_user(rows: Iterable, column: str = "user_id") -> Dict[int, List]:
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[getattr(row, column)].append(row)
+    return grouped
+
+def replay_users(connection: Connection, user_ids: List[int], now: datetime) -> Dict[int, Tuple[UserState, UserState]]:
+    """``{user id: (stored state, replayed state)}``, reading each source table once"""
+    users, levels = models.User.__table__, models.Level.__table__
+    tasks, goals, steps = models.Task.__table__, models.Goal.__table__, models.GoalStep.__table__
+    slots, reflections = models.TimeSlot.__table__, models.Reflection.__table__
+    streaks, held = models.Streak.__table__, models.UserAchievement.__table__
+
+    user_rows = connection.execute(
+        select(
+            users.c.id, users.c.timezone, users.c.total_points, users.c.weekly_points, users.c.monthly_points,
+            users.c.weekly_points_start, users.c.monthly_points_start, levels.c.level_number
+        ).outerjoin(levels, levels.c.id == users.c.current_level_id).where(users.c.id.in_(user_ids))
+    ).all()
+    user_tasks = _by_user(connection.execute(
+        select(tasks.c.id, tasks.c.owner_id, tasks.c.created_at, tasks.c.completed, tasks.c.time_spent)
+        .where(tasks.c.owner_id.in_(user_ids), tasks.c.completed == True)
+    ), "owner_id")
+    step_counts = select(steps.c.goal_id, func.count().label("steps")).group_by(steps.c.goal_id).subquery()
+    user_goals = _by_user(connection.execute(
+        select(goals.c.id, goals.c.owner_id, goals.c.created_at, func.coalesce(step_counts.c.steps, 0).label("steps"))
+        .outerjoin(step_counts, step_counts.c.goal_id == goals.c.id)
+        .where(goals.c.owner_id.in_(user_ids), goals.c.completed == True)
+    ), "owner_id")
+    user_steps = _by_user(connection.execute(
+        select(steps.c.id, steps.c.goal_id, steps.c.created_at, goals.c.owner_id)
+        .join(goals, goals.c.id == steps.c.goal_id)
+        .where(goals.c.owner_id.in_(user_ids), steps.c.completed == True)
+    ), "owner_id")
+    user_slots = _by_user(connection.execute(
+        select(slots.c.id, slots.c.owner_id, slots.c.status, slots.c.start_time, slots.c.end_time, slots.c.created_at)
+        .where(slots.c.owner_id.in_(user_ids), slots.c.status == "completed")
+    ), "owner_id")
+    user_reflections = _by_user(connection.execute(
+        select(
+            reflections.c.id, reflections.c.user_id, reflections.c.reflection_date, reflections.c.created_at,
+            *(reflections.c[name] for name in user_stats.REFLECTION_TEXT)
+        ).where(reflections.c.user_id.in_(user_ids))
+    ))
+    user_streaks = _by_user(connection.execute(
+        select(streaks.c.user_id, streaks.c.streak_type, streaks.c.current_count, streaks.c.longest_count,
+               streaks.c.last_activity_date)
+        .where(streaks.c.user_id.in_(user_ids))
+    ))
+    user_held = _by_user(connection.execute(
+        select(held.c.user_id, models.Achievement.name, held.c.completed_at)
+        .join(models.Achievement.__table__, models.Achievement.id == held.c.achievement_id)
+        .where(held.c.user_id.in_(user_ids), held.c.completed == True)
+    ))
+
+    states = {}
+    for user in user_rows:
+        current = ledger.current(user, now)
+        stored = UserState(
+            total_points=user.total_points or 0,
+            weekly_points=current["weekly_points"],
+            monthly_points=current["monthly_points"],
+            level=user.level_number or 1,
+            streaks={
+                row.streak_type: (row.current_count or 0, row.longest_count or 0, row.last_activity_date)
+                for row in user_streaks[user.id]
+            },
+            achievements={row.name: row.completed_at for row in user_held[user.id]},
+        )
+        events = history(
+            user.timezone, user_tasks[user.id], user_goals[user.id], user_steps[user.id],
+            user_slots[user.id], user_reflections[user.id]
+        )
+        states[user.id] = (stored, replay(user.timezone, events, stored, now))
+    return states
+
+def _catalog(connection: Connection) -> Tuple[Dict[int, int], Dict[str, int]]:
+    """Ids of the catalog levels and achievements, creating the missing ones"""
+    levels, catalog = models.Level.__table__, models.Achievement.__table__
+    level_ids = dict(connection.execute(select(levels.c.level_number, levels.c.id)).all())
+    missing = [level for level in LEVELS if level['level_number'] not in level_ids]
+    if missing:
+        connection.execute(levels.insert(), [
+            {
+                "level_number": level['level_number'], "points_required": level['points_required'],
+                "title": level['title'], "perks": serialize_json(level['perks'])
+            }
+            for level in missing
+        ])
+        level_ids = dict(connection.execute(select(levels.c.level_number, levels.c.id)).all())
+    achievement_ids = dict(connection.execute(select(catalog.c.name, catalog.c.id)).all())
+    missing = [achievement for achievement in ACHIEVEMENTS if achievement['name'] not in achievement_ids]
+    if missing:
+        connection.execute(catalog.insert(), [
+            {
+                key: achievement[key]
+                for key in ("name", "description", "points", "category", "criteria_type", "criteria_value", "icon_name")
+            }
+            for achievement in missing
+        ])
+        achievement_ids = dict(connection.execute(select(catalog.c.name, catalog.c.id)).all())
+    return level_ids, achievement_ids
+
+def _upsert(connection: Connection, table, keys: Tuple[str, str], rows: List[Dict]) -> None:
+    """Update ``rows`` that exist by their ``keys`` and insert the others"""
+    if not rows:
+        return
+    user_column, other_column = (table.c[key] for key in keys)
+    existing = set(connection.execute(
+        select(user_column, other_column).where(user_column.in_({row[keys[0]] for row in rows}))
+    ).all())
+    updates = [row for row in rows if (row[keys[0]], row[keys[1]]) in existing]
+    inserts = [row for row in rows if (row[keys[0]], row[keys[1]]) not in existing]
+    if updates:
+        connection.execute(
+            table.update()
+            .where(user_column == bindparam("b_" + keys[0]), other_column == bindparam("b_" + keys[1]))
+            .values({column: bindparam("b_" + column) for column in updates[0] if column not in keys}),
+            [{"b_" + column: value for column, value in row.items()} for row in updates]
+        )
+    if inserts:
+        connection.execute(table.insert(), inserts)
+
+def write(connection: Connection, states: Dict[int, UserState], now: datetime, horizon: int) -> None:
+    """Store replayed states, replacing the users' ledger rows"""
+    user_ids = list(states)
+    level_ids, achievement_ids = _catalog(connection)
+    users, points_ledger = models.User.__table__, models.PointsLedgerEntry.__table__
+
+    connection.execute(points_ledger.delete().where(points_ledger.c.user_id.in_(user_ids)))
+    rows = [
+        {
+            "user_id": user_id, "event_type": event_type, "source_type": source_type,
+            "source_id": achievement_ids[source_id] if event_type == "achievement" else source_id,
+            "points": points, "awarded_at": awarded_at, "created_at": now,
+        }
+        for user_id, state in states.items()
+        for event_type, source_type, source_id, points, awarded_at in state.ledger
+    ]
+    if rows:
+        connection.execute(points_ledger.insert(), rows)
+
+    timezones = dict(connection.execute(select(users.c.id, users.c.timezone).where(users.c.id.in_(user_ids))).all())
+    connection.execute(
+        users.update().where(users.c.id == bindparam("b_id")).values(
+            total_points=bindparam("b_total_points"),
+            weekly_points=bindparam("b_weekly_points"),
+            monthly_points=bindparam("b_monthly_points"),
+            weekly_points_start=bindparam("b_weekly_points_start"),
+            monthly_points_start=bindparam("b_monthly_points_start"),
+            current_level_id=bindparam("b_current_level_id"),
+        ),
+        [
+            {
+                "b_id": user_id,
+                "b_total_points": state.total_points,
+                "b_weekly_points": state.weekly_points,
+                "b_monthly_points": state.monthly_points,
+                **dict(zip(("b_weekly_points_start", "b_monthly_points_start"),
+                           ledger.period_starts(timezones[user_id], now))),
+                "b_current_level_id": level_ids[state.level],
+            }
+            for user_id, state in states.items()
+        ]
+    )
+
+    _upsert(connection, models.Streak.__table__, ("user_id", "streak_type"), [
+        {
+            "user_id": user_id, "streak_type": streak_type, "current_count": current,
+            "longest_count": longest, "last_activity_date": last_day,
+        }
+        for user_id, state in states.items()
+        for streak_type in STREAK_EVENTS
+        for current, longest, last_day in [state.streaks.get(streak_type, (0, 0, None))]
+    ])
+    _upsert(connection, models.UserAchievement.__table__, ("user_id", "achievement_id"), [
+        {
+            "user_id": user_id, "achievement_id": achievement_ids[name],
+            "progress": achievements.ACHIEVEMENTS_BY_NAME[name]['criteria_value'] if name in state.achievements else 0,
+            "completed": name in state.achievements, "completed_at": state.achievements.get(name),
+        }
+        for user_id, state in states.items()
+        for name in REPLAYED_ACHIEVEMENTS
+    ])
+
+    events = models.MomentumEvent.__table__
+    connection.execute(
+        events.update()
+        .where(events.c.user_id.in_(user_ids), events.c.status == "pending", events.c.id <= horizon)
+        .values(status="processed", processed_at=now)
+    )
+
+def _load_checkpoint(path: str, chunk_size: int) -> Set[int]:
+    if not os.path.exists(path):
+        return set()
+    with open(path) as checkpoint:
+        data = json.load(checkpoint)
+    if data["chunk_size"] != chunk_size:
+        raise ValueError(f"{path} was written with --chunk-size {data['chunk_size']}, not {chunk_size}")
+    return set(data["done"])
+
+def _save_checkpoint(path: str, chunk_size: int, done: Set[int]) -> None:
+    # Written aside and renamed, so a crash never leaves half a file
+    with open(path + ".tmp", "w") as checkpoint:
+        json.dump({"chunk_size": chunk_size, "done": sorted(done)}, checkpoint)
+    os.replace(path + ".tmp", path)
+
+# Read-only engine of each pool process, by URL
+_worker_engines: Dict[str, Engine] = {}
+
+def _replay_in_worker(url: str, user_ids: List[int], now: datetime) -> Dict[int, Tuple[UserState, UserState]]:
+    if url not in _worker_engines:
+        _worker_engines[url] = create_engine(url, connect_args={"check_same_thread": False})
+        install_sqlite_pragmas(_worker_engines[url], sqlite_pragmas(read_only=True))
+    with _worker_engines[url].connect() as connection:
+        return replay_users(connection, user_ids, now)
+
+def _computed(
+    engine: Engine,
+    chunks: Dict[int, List[int]],
+    now: datetime,
+    processes: Optional[int]
+) -> Iterator[Tuple[int, Dict[int, Tuple[UserState, UserState]]]]:
+    """(chunk, states) as chunks finish, in a process pool unless ``processes`` is 1"""
+    if processes == 1 or len(chunks) <= 1:
+        for chunk, user_ids in chunks.items():
+            with engine.connect() as connection:
+                states = replay_users(connection, user_ids, now)
+            yield chunk, states
+        return
+    url = engine.url.render_as_string(hide_password=False)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {
+            executor.submit(_replay_in_worker, url, user_ids, now): chunk
+            for chunk, user_ids in chunks.items()
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+def run(
+    engine: Engine,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    processes: Optional[int] = None,
+    checkpoint: Optional[str] = None,
+    dry_run: bool = False,
+    user_ids: Optional[List[int]] = None,
+    now: Optional[datetime] = None
+) -> ReplayReport:
+    """
+    Replay all users (or ``user_ids``). Chunks listed in ``checkpoint`` are
+    skipped, and the file is removed once every chunk is written. A dry run
+    computes and reports the changes without writing anything.
+    """
+    now = now or datetime.utcnow()
+    users = models.User.__table__
+    with engine.connect() as connection:
+        statement = select(users.c.id).order_by(users.c.id)
+        if user_ids is not None:
+            statement = statement.where(users.c.id.in_(user_ids))
+        ids = connection.execute(statement).scalars().all()
+        horizon = connection.execute(select(func.max(models.MomentumEvent.id))).scalar() or 0
+
+    chunks = {chunk: list(members) for chunk, members in groupby(ids, key=lambda user_id: user_id // chunk_size)}
+    done = _load_checkpoint(checkpoint, chunk_size) if checkpoint and not dry_run else set()
+    report = ReplayReport(skipped_chunks=len(done & chunks.keys()))
+    pending = {chunk: members for chunk, members in chunks.items() if chunk not in done}
+    logger.info("Replaying %d users in %d chunks (%d already done)", len(ids), len(chunks), report.skipped_chunks)
+
+    for chunk, states in _computed(engine, pending, now, processes):
+        for user_id, (stored, replayed) in states.items():
+            changes = diff(stored, replayed)
+            if changes:
+                report.changes[user_id] = changes
+        if not dry_run:
+            with engine.begin() as connection:
+                write(connection, {user_id: replayed for user_id, (_, replayed) in states.items()}, now, horizon)
+            if checkpoint:
+                done.add(chunk)
+                _save_checkpoint(checkpoint, chunk_size, done)
+        report.users += len(states)
+        logger.info("Replayed %d of %d users, %d changed", report.users, len(ids), len(report.changes))
+
+    if not dry_run:
+        with engine.begin() as connection:
+            leaderboard.rebuild(connection)
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+    return report
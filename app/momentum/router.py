@@ -1,34 +1,44 @@
 # router.py
 
-from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import logging
 
-from . import schemas
+from . import catalog, schemas
+from .init_momentum import MOMENTUM_VERSION, init_user_momentum
 from .services import MomentumService
-from ..dependencies import get_db
-from ..auth.dependencies import get_current_user
+from ..dependencies import get_async_db, get_async_read_db
+from ..auth.dependencies import get_current_user, is_admin
+from ..conditional import conditional_get, etag_matches
+from ..config import settings
 from ..models import User
 
 router = APIRouter(prefix="/momentum", tags=["momentum"])
 
 logger = logging.getLogger(__name__)
 
-@router.get("/progress", response_model=schemas.UserProgress)
+async def initialize_momentum(user_id: int, session_factory=None) -> None:
+    """Background task initializing the user's momentum data, in its own writable session"""
+    if session_factory is None:
+        from ..database import AsyncSessionLocal as session_factory
+    try:
+        async with session_factory() as db:
+            await init_user_momentum(db, user_id)
+    except Exception:
+        logger.exception("Initializing the momentum of user %s failed", user_id)
+
+@router.get("/progress", response_model=schemas.UserProgress, dependencies=[Depends(conditional_get)])
 async def get_user_progress(
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get current user's progress information"""
 
     try:
-        # Ensure the user's momentum data is initialized before getting progress
-        from app.momentum.init_momentum import init_user_momentum
-        await init_user_momentum(db, current_user.id)
-
         momentum_service = MomentumService(db)
-        return await momentum_service.get_user_progress(current_user.id)
+        progress = await momentum_service.get_user_progress(current_user.id)
     except Exception as e:
         # Log the error and return a user-friendly error
         logger.error(f"Error getting user progress: {str(e)}")
@@ -36,31 +46,64 @@ async def get_user_progress(
             status_code=500,
             detail="Failed to retrieve momentum progress. If this persists, please contact support."
         )
+    if (current_user.momentum_version or 0) < MOMENTUM_VERSION:
+        # Initialized after the response is sent, like the missing achievements of /achievements
+        background_tasks.add_task(initialize_momentum, current_user.id)
+    return progress
 
 @router.get("/leaderboard", response_model=List[schemas.LeaderboardEntry])
 async def get_leaderboard(
     timeframe: str = Query("weekly", enum=["weekly", "monthly", "all-time"]),
     limit: int = Query(10, ge=1, le=100),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get leaderboard data for specified timeframe"""
     momentum_service = MomentumService(db)
     return await momentum_service.get_leaderboard(timeframe, limit, current_user.id)
 
-@router.get("/achievements", response_model=List[schemas.UserAchievement])
+@router.get("/leaderboard/rank", response_model=schemas.LeaderboardRank)
+async def get_leaderboard_rank(
+    timeframe: str = Query("weekly", enum=["weekly", "monthly", "all-time"]),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Get current user's position on the leaderboard for specified timeframe"""
+    momentum_service = MomentumService(db)
+    return await momentum_service.get_leaderboard_rank(current_user.id, timeframe)
+
+async def create_missing_achievements(user_id: int, session_factory=None) -> None:
+    """
+    Background task creating the user's missing achievement rows. It opens
+    its own writable session: the request's is closed by the time it runs,
+    and is on the read-only pool.
+    """
+    if session_factory is None:
+        from ..database import AsyncSessionLocal as session_factory
+    try:
+        async with session_factory() as db:
+            await MomentumService(db).create_missing_achievements(user_id)
+    except Exception:
+        logger.exception("Creating the missing achievements of user %s failed", user_id)
+
+@router.get("/achievements", response_model=List[schemas.UserAchievement], dependencies=[Depends(conditional_get)])
 async def get_user_achievements(
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get all achievements and their status for current user"""
     momentum_service = MomentumService(db)
-    return await momentum_service.get_user_achievements(current_user.id)
+    achievements = await momentum_service.get_user_achievements(current_user.id)
+    if len(achievements) < len((await catalog.get(db)).achievements):
+        # Created after the response is sent; they are listed from the next request on
+        background_tasks.add_task(create_missing_achievements, current_user.id)
+    return achievements
 
-@router.get("/streaks", response_model=List[schemas.Streak])
+@router.get("/streaks", response_model=List[schemas.Streak], dependencies=[Depends(conditional_get)])
 async def get_user_streaks(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all active streaks for current user"""
     momentum_service = MomentumService(db)
@@ -69,9 +112,12 @@ async def get_user_streaks(
 @router.get("/stats", response_model=schemas.MomentumStats)
 async def get_momentum_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Get comprehensive momentum statistics for current user"""
+    """
+    Get comprehensive momentum statistics for current user
+    Not conditional: leaderboard_position changes when other users earn points
+    """
     momentum_service = MomentumService(db)
     return await momentum_service.get_momentum_stats(current_user.id)
 
@@ -80,40 +126,62 @@ async def process_momentum_event(
     event_type: str = Query(..., description="Type of momentum event"),
     metadata: Optional[dict] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Process a momentum event and return updated stats"""
     momentum_service = MomentumService(db)
     return await momentum_service.process_event(current_user.id, event_type, metadata)
 
-@router.get("/levels", response_model=List[schemas.Level])
+async def catalog_get(request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db)) -> None:
+    """Answer 304 when the client's copy of the catalog is current, otherwise tag the response"""
+    current = await catalog.get(db)
+    headers = {"ETag": current.etag, "Cache-Control": f"public, max-age={settings.MOMENTUM_CATALOG_MAX_AGE}"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, current.etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+@router.get("/levels", response_model=List[schemas.Level], dependencies=[Depends(catalog_get)])
 async def get_levels(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get all available levels and their requirements"""
     momentum_service = MomentumService(db)
     return await momentum_service.get_levels()
 
-@router.get("/achievements/available", response_model=List[schemas.Achievement])
+@router.get("/achievements/available", response_model=List[schemas.Achievement], dependencies=[Depends(catalog_get)])
 async def get_available_achievements(
     category: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get all available achievements, optionally filtered by category"""
     momentum_service = MomentumService(db)
     return await momentum_service.get_available_achievements(category)
 
+@router.post("/admin/catalog/invalidate", response_model=dict)
+async def invalidate_catalog(current_user: User = Depends(get_current_user)):
+    """
+    Admin endpoint to reload levels and achievements from the database,
+    after scripts changed them while the app was running
+    """
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    catalog.invalidate()
+    
+    return {"status": "success", "message": "Catalog will be reloaded"}
+
 @router.post("/admin/run-scheduled-checks", response_model=dict)
 async def run_scheduled_checks(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Admin endpoint to manually trigger the scheduled checks for weekly/monthly goals
     This can also be called by a cron job or scheduler
     """
     # Check admin status (implement proper authorization as needed)
-    if not getattr(current_user, 'is_admin', False):
+    if not is_admin(current_user):
         raise HTTPException(status_code=403, detail="Not authorized")
     
     momentum_service = MomentumService(db)
@@ -125,11 +193,11 @@ async def run_scheduled_checks(
 async def check_perfect_week(
     user_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Check if a user has completed a perfect week and award points if applicable"""
     # Only allow users to check their own perfect week status or admins
-    if current_user.id != user_id and not getattr(current_user, 'is_admin', False):
+    if current_user.id != user_id and not is_admin(current_user):
         raise HTTPException(status_code=403, detail="Not authorized")
     
     momentum_service = MomentumService(db)
@@ -144,13 +212,13 @@ async def check_perfect_week(
 @router.post("/admin/check-leaderboard-achievements", response_model=dict)
 async def check_leaderboard_achievements(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Admin endpoint to manually check for leaderboard achievements and award them if applicable
     """
     # Check admin status
-    if not getattr(current_user, 'is_admin', False):
+    if not is_admin(current_user):
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # Import the function from the scheduler
@@ -164,13 +232,13 @@ async def check_leaderboard_achievements(
 @router.post("/admin/check-expired-streaks", response_model=dict)
 async def check_expired_streaks(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Admin endpoint to manually check for expired streaks and reset them
     """
     # Check admin status
-    if not getattr(current_user, 'is_admin', False):
+    if not is_admin(current_user):
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # Import the function from the scheduler
@@ -185,11 +253,11 @@ async def check_expired_streaks(
 async def get_streaks(
     user_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all streaks for a specific user"""
     # Only allow users to view their own streaks or admins
-    if current_user.id != user_id and not getattr(current_user, 'is_admin', False):
+    if current_user.id != user_id and not is_admin(current_user):
         raise HTTPException(status_code=403, detail="Not authorized")
     
     momentum_service = MomentumService(db)
@@ -6,9 +6,12 @@ import time
 from datetime import datetime, timedelta
 import pytz
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from ..database import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, select
+from typing import Iterable, Optional, Union
+from ..database import SessionLocal, resolve
 from .services import MomentumService
+from . import leaderboard, ledger, timezones
 from .. import models
 
 logger = logging.getLogger(__name__)
@@ -48,7 +51,7 @@ async def run_daily_checks():
     finally:
         db.close()
 
-async def check_leaderboard_achievements(db: Session, momentum_service: MomentumService):
+async def check_leaderboard_achievements(db: Union[Session, AsyncSession], momentum_service: MomentumService):
     """
     Check if any users have achieved #1 on the weekly leaderboard
     and award the Leaderboard Legend achievement
@@ -57,9 +60,9 @@ async def check_leaderboard_achievements(db: Session, momentum_service: Momentum
     
     try:
         # Get the top user on the weekly leaderboard
-        top_user = db.query(models.User).order_by(
+        top_user = (await resolve(db.execute(select(models.User).order_by(
             models.User.weekly_points.desc()
-        ).first()
+        ).limit(1)))).scalars().first()
         
         if not top_user or top_user.weekly_points < 100:
             # Don't award if no users or if points are too low (to prevent awarding in inactive weeks)
@@ -67,38 +70,38 @@ async def check_leaderboard_achievements(db: Session, momentum_service: Momentum
             return
             
         # Get the Leaderboard Legend achievement
-        leaderboard_achievement = db.query(models.Achievement).filter(
+        leaderboard_achievement = (await resolve(db.execute(select(models.Achievement).where(
             models.Achievement.name == 'Leaderboard Legend'
-        ).first()
+        )))).scalars().first()
         
         if not leaderboard_achievement:
             logger.error("Leaderboard Legend achievement not found in database")
             return
             
-        # Check if user already has this achievement
-        existing = db.query(models.UserAchievement).filter(
+        # Check if user already has this achievement (the row may exist to track progress)
+        user_achievement = (await resolve(db.execute(select(models.UserAchievement).where(
             models.UserAchievement.user_id == top_user.id,
-            models.UserAchievement.achievement_id == leaderboard_achievement.id,
-            models.UserAchievement.completed == True
-        ).first()
+            models.UserAchievement.achievement_id == leaderboard_achievement.id
+        )))).scalars().first()
         
-        if existing:
+        if user_achievement and user_achievement.completed:
             logger.info(f"User {top_user.id} already has Leaderboard Legend achievement")
             return
             
         # Award the achievement
         logger.info(f"Awarding Leaderboard Legend achievement to user {top_user.id}")
         
-        # Create the user achievement
-        user_achievement = models.UserAchievement(
-            user_id=top_user.id,
-            achievement_id=leaderboard_achievement.id,
-            progress=1,
-            completed=True,
-            completed_at=datetime.utcnow()
-        )
-        db.add(user_achievement)
-        db.commit()
+        if not user_achievement:
+            user_achievement = models.UserAchievement(
+                user_id=top_user.id,
+                achievement_id=leaderboard_achievement.id
+            )
+            db.add(user_achievement)
+        user_achievement.progress = 1
+        user_achievement.completed = True
+        user_achievement.completed_at = datetime.utcnow()
+        await leaderboard.record_achievement(db, top_user.id)
+        await resolve(db.commit())
         
         # Award points for the achievement
         await momentum_service.award_points(top_user.id, leaderboard_achievement.points)
@@ -107,33 +110,85 @@ async def check_leaderboard_achievements(db: Session, momentum_service: Momentum
     except Exception as e:
         logger.error(f"Error checking leaderboard achievements: {str(e)}")
 
-async def check_expired_streaks(db: Session, momentum_service: MomentumService):
+async def check_expired_streaks(
+    db: Union[Session, AsyncSession],
+    momentum_service: MomentumService,
+    timezones: Optional[Iterable[Optional[str]]] = None,
+    now: Optional[datetime] = None
+):
     """
-    Check for streaks that haven't been maintained and reset them
+    Check for streaks that haven't been maintained and reset them, by each
+    user's local date; only for the users of ``timezones`` if given
     """
     logger.info("Checking for expired streaks")
     
     try:
-        # Get the current date in UTC
-        today_utc = datetime.utcnow().date()
-        
-        # Find all streaks where the last activity was more than 1 day ago
-        expired_streaks = db.query(models.Streak).filter(
-            models.Streak.current_count > 0,
-            models.Streak.last_activity_date < today_utc - timedelta(days=1)
-        ).all()
-        
-        for streak in expired_streaks:
-            # Reset the streak but keep the longest count
-            logger.info(f"Resetting expired streak for user {streak.user_id}, type: {streak.streak_type}")
-            streak.current_count = 0
-            # Don't update last_activity_date to avoid immediately restarting the streak
+        now = now or datetime.utcnow()
+        if timezones is None:
+            timezones = await momentum_service.active_timezones()
+        users, streaks = models.User.__table__, models.Streak.__table__
+        reset = 0
+        
+        for timezone_name in timezones:
+            # Streaks whose last activity was more than 1 day ago, in the users' local date
+            yesterday = ledger.local_date(timezone_name, now) - timedelta(days=1)
+            expired = and_(streaks.c.current_count > 0, streaks.c.last_activity_date < yesterday)
+            # Streaks are part of the user's data (app.conditional)
+            await resolve(db.execute(users.update().where(
+                ledger.in_timezone(timezone_name),
+                users.c.id.in_(select(streaks.c.user_id).where(expired))
+            ).values(data_version=users.c.data_version + 1)))
+            # Reset the streaks but keep the longest count; last_activity_date
+            # stays so the streak does not restart immediately
+            result = await resolve(db.execute(streaks.update().where(
+                expired,
+                streaks.c.user_id.in_(select(users.c.id).where(ledger.in_timezone(timezone_name)))
+            ).values(current_count=0)))
+            reset += result.rowcount
             
-        db.commit()
-        logger.info(f"Reset {len(expired_streaks)} expired streaks")
+        await resolve(db.commit())
+        logger.info(f"Reset {reset} expired streaks")
     except Exception as e:
         logger.error(f"Error checking expired streaks: {str(e)}")
 
+async def hourly_checks(db: Union[Session, AsyncSession], now: Optional[datetime] = None):
+    """
+    Run the daily checks for the users whose local day started in the hour
+    up to ``now`` (UTC), found by their UTC offset (app.momentum.timezones):
+    - Roll weekly and monthly points over, check for perfect week and month
+    - Reset expired streaks
+    - On Sundays at 00:00 UTC, check for leaderboard achievements
+    """
+    # Runs may start a few minutes late; the hour they are for is what counts
+    now = (now or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+    momentum_service = MomentumService(db)
+    
+    refreshed = await timezones.refresh_offsets(db, now)
+    await resolve(db.commit())
+    if refreshed:
+        logger.info(f"Updated the UTC offset of {refreshed} users")
+    
+    midnight = await timezones.at_midnight(db, now)
+    logger.info(f"Timezones at local midnight: {', '.join(str(name) for name in midnight) or 'none'}")
+    if midnight:
+        await momentum_service.schedule_weekly_and_monthly_checks(now, midnight)
+        await check_expired_streaks(db, momentum_service, midnight, now)
+    
+    if now.weekday() == 6 and now.hour == 0:
+        await check_leaderboard_achievements(db, momentum_service)
+
+async def run_hourly_checks():
+    """Run the hourly checks; schedule this at the start of every hour"""
+    db = SessionLocal()
+    try:
+        logger.info("Starting hourly momentum checks")
+        await hourly_checks(db)
+        logger.info("Hourly momentum checks completed successfully")
+    except Exception as e:
+        logger.error(f"Error running hourly momentum checks: {str(e)}")
+    finally:
+        db.close()
+
 async def schedule_daily_checks():
     """
     Schedule daily checks to run at a specified time every day
@@ -159,11 +214,19 @@ async def schedule_daily_checks():
         # Run the daily checks
         await run_daily_checks()
 
-async def initialize_scheduler():
+async def schedule_hourly_checks():
+    """Run the hourly checks at the start of every hour"""
+    while True:
+        now = datetime.utcnow()
+        target_time = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        await asyncio.sleep((target_time - now).total_seconds())
+        await run_hourly_checks()
+
+async def initialize_scheduler(hourly: bool = False):
     """
     Initialize the scheduler when the application starts
     This function should be called when the application starts
     """
     # Start the scheduler in a background task
-    asyncio.create_task(schedule_daily_checks())
+    asyncio.create_task(schedule_hourly_checks() if hourly else schedule_daily_checks())
     logger.info("Momentum scheduler initialized") 
\ No newline at end of file
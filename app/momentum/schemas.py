@@ -112,10 +112,26 @@ class LeaderboardEntry(BaseModel):
     class Config:
         from_attributes = True
 
+class LeaderboardRank(BaseModel):
+    timeframe: str
+    rank: Optional[int] = None
+    points: int
+
+class ActivityStats(BaseModel):
+    completed_tasks: int = 0
+    completed_task_hours: float = 0.0
+    completed_time_slots: int = 0
+    focused_sessions: int = 0
+    focused_minutes: int = 0
+    reflections: int = 0
+    gratitude_entries: int = 0
+    words_written: int = 0
+
 class MomentumStats(BaseModel):
     total_achievements: int
     total_points: int
     current_streaks: Dict[str, int]
     level_progress: float
     recent_awards: List[UserAchievement]
-    leaderboard_position: Optional[int]
\ No newline at end of file
+    leaderboard_position: Optional[int]
+    activity: ActivityStats = ActivityStats()
\ No newline at end of file
@@ -1,106 +1,287 @@
 # services.py
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
-from sqlalchemy import func
+from contextlib import asynccontextmanager
+from sqlalchemy import case, func, literal, select
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict
-from .. import models
-from . import schemas
-from .momentum import POINT_EVENTS, ACHIEVEMENTS, LEVELS, CriteriaType
-import json
+from typing import Optional, Iterable, List, Dict, Tuple, Union
+from .. import models, user_stats
+from ..database import resolve
+from . import achievements, catalog, leaderboard, ledger, schemas
+from .momentum import POINT_EVENTS
 from fastapi import HTTPException
 import pytz
 
 logger = logging.getLogger(__name__)
 
+# Event types that advance each streak
+STREAK_EVENTS = {
+    'daily_tasks': ['task_completion', 'first_task_of_day'],
+    'weekly_goals': ['goal_completion'],
+    'focused_sessions': ['focused_session']
+}
+
 class MomentumService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Union[Session, AsyncSession], autocommit: bool = True):
+        """
+        With ``autocommit=False`` the service only flushes, leaving the commit
+        to the caller so its writes join the caller's transaction. Otherwise
+        each public method commits on its own, and process_event,
+        process_events, revert_event and unit_of_work commit once.
+        """
         self.db = db
+        self.autocommit = autocommit
+
+    async def _execute(self, statement):
+        """Execute a statement on the sync or async session"""
+        return await resolve(self.db.execute(statement))
+
+    async def _first(self, statement):
+        return (await self._execute(statement)).scalars().first()
+
+    async def _all(self, statement):
+        return (await self._execute(statement)).scalars().all()
+
+    async def _scalar(self, statement):
+        return (await self._execute(statement)).scalar()
+
+    async def _commit(self):
+        if self.autocommit:
+            await resolve(self.db.commit())
+        else:
+            await resolve(self.db.flush())
+
+    async def _refresh(self, instance):
+        """
+        Reload an instance the last commit expired. After a flush the instance
+        is current, except a user's current_level after current_level_id changed.
+        """
+        if self.autocommit:
+            await resolve(self.db.refresh(instance))
+        elif isinstance(instance, models.User):
+            await resolve(self.db.refresh(instance, ["current_level"]))
+
+    async def _get_user(self, user_id: int) -> Optional[models.User]:
+        # Served from the identity map while a unit of work has not committed
+        return await resolve(self.db.get(models.User, user_id))
+
+    @asynccontextmanager
+    async def unit_of_work(self):
+        """
+        Run the enclosed momentum calls as one transaction: steps only flush,
+        and the transaction commits once at the end (or rolls back on error).
+
+        Nested units join the outermost one, so process_event inside a unit
+        started by the caller for a whole user action commits with it. A
+        service created with ``autocommit=False`` never commits; its caller does.
+        """
+        if not self.autocommit:
+            yield self
+            return
+        self.autocommit = False
+        try:
+            yield self
+            await resolve(self.db.commit())
+        except BaseException:
+            await resolve(self.db.rollback())
+            raise
+        finally:
+            self.autocommit = True
 
     async def process_event(self, user_id: int, event_type: str, metadata: Dict = None) -> Dict:
         """Process a momentum event and return updated user stats"""
-        metadata = metadata or {}
-        points = self._calculate_points(event_type, metadata)
+        async with self.unit_of_work():
+            metadata = metadata or {}
+            points = self._calculate_points(event_type, metadata)
         
-        # Award points and update stats
-        user_stats = await self.award_points(user_id, points)
+            # Award points and update stats
+            user_stats = await self.award_points(user_id, points, event_type, ledger.source(metadata))
         
-        # Update streaks
-        streak_updates = await self.update_streaks(user_id, event_type)
+            # Update streaks
+            streak_updates = await self.update_streaks(user_id, event_type)
         
-        # Check achievements
-        new_achievements = await self.check_achievements(user_id)
+            # Check achievements
+            new_achievements = await self.check_achievements(user_id, [event_type])
         
-        # Check for level up
-        level_up = await self.check_level_up(user_id)
+            # Check for level up
+            level_up = await self.check_level_up(user_id)
         
-        return {
-            "points_awarded": points,
-            "user_stats": user_stats,
-            "streak_updates": streak_updates,
-            "new_achievements": new_achievements,
-            "level_up": level_up
-        }
+            return {
+                "points_awarded": points,
+                "user_stats": user_stats,
+                "streak_updates": streak_updates,
+                "new_achievements": new_achievements,
+                "level_up": level_up
+            }
+
+    async def process_events(
+        self,
+        user_id: int,
+        events: List[Tuple[str, Dict]],
+        reverted: List[Tuple[str, Dict]] = ()
+    ) -> Dict:
+        """
+        Process several momentum events (and reverts) of one user at once.
+
+        Points are summed and applied in one update, each affected streak is
+        updated once, and achievements and level are checked once, instead of
+        running the whole chain per event as process_event does. The user is
+        read once; every step after that gets it from the identity map.
+        """
+        async with self.unit_of_work():
+            events = await self._first_task_of_day(user_id, events)
+            points_deducted = 0
+            if reverted:
+                points_deducted, _ = await self._take_points(user_id, [
+                    (event_type, ledger.source(metadata), self._fallback_points(event_type, metadata or {}))
+                    for event_type, metadata in reverted
+                ])
+            awards = [
+                (event_type, ledger.source(metadata), self._calculate_points(event_type, metadata or {}))
+                for event_type, metadata in events
+            ]
+            points_awarded = sum(points for _, _, points in awards)
+            user_stats = await self._add_points(user_id, awards)
+
+            streak_updates = {}
+            for event_type in dict.fromkeys(event_type for event_type, _ in events):
+                streak_updates.update(await self.update_streaks(user_id, event_type))
+
+            new_achievements = await self.check_achievements(user_id, {event_type for event_type, _ in events}) if events else []
+            level_up = await self.check_level_up(user_id)
+
+            return {
+                "points_awarded": points_awarded,
+                "points_deducted": points_deducted,
+                "user_stats": user_stats,
+                "streak_updates": streak_updates,
+                "new_achievements": new_achievements,
+                "level_up": level_up
+            }
+
+    async def _first_task_of_day(self, user_id: int, events: List[Tuple[str, Dict]]) -> List[Tuple[str, Dict]]:
+        """
+        Keep the first_task_of_day event only if the user has none in the
+        ledger for their local day yet, and only the first of ``events``.
+        Requests record one for every completion: they cannot know which
+        completion the worker applies first. The task_completion of the kept
+        one gets the first task multiplier.
+        """
+        if not any(event_type == 'first_task_of_day' for event_type, _ in events):
+            return events
+        user = await self._get_user(user_id)
+        today_start = ledger.utc_start(ledger.local_date(user.timezone), user.timezone)
+        awarded = await ledger.awarded_since(self.db, user_id, 'first_task_of_day', today_start)
+
+        kept, first_task_id = [], None
+        for event_type, metadata in events:
+            if event_type == 'first_task_of_day':
+                if awarded:
+                    continue
+                awarded = True
+                first_task_id = (metadata or {}).get('task_id')
+            kept.append((event_type, metadata))
+        return [
+            (event_type, {**metadata, 'is_first_task': True})
+            if event_type == 'task_completion' and first_task_id is not None and (metadata or {}).get('task_id') == first_task_id
+            else (event_type, metadata)
+            for event_type, metadata in kept
+        ]
 
     async def revert_event(self, user_id: int, event_type: str, metadata: Dict = None) -> Dict:
         """
         Revert a momentum event (e.g., when a completed task or time slot is uncompleted or deleted)
-        This removes the points that were previously awarded for the event
+        This removes the points that were previously awarded for the event: the
+        ledger entry of the same event and source, or the points the event would
+        earn now if there is none (see app.momentum.ledger)
         """
-        metadata = metadata or {}
-        points = self._calculate_points(event_type, metadata)
+        async with self.unit_of_work():
+            metadata = metadata or {}
         
-        # Deduct points 
-        user_stats = await self.deduct_points(user_id, points)
+            # Deduct points 
+            points, user_stats = await self._take_points(
+                user_id, [(event_type, ledger.source(metadata), self._fallback_points(event_type, metadata))]
+            )
         
-        # We don't revert streaks as that would be complex and potentially confusing to users
-        # Instead we simply stop incrementing them on future events if the streak is broken
+            # We don't revert streaks as that would be complex and potentially confusing to users
+            # Instead we simply stop incrementing them on future events if the streak is broken
         
-        return {
-            "points_deducted": points,
-            "user_stats": user_stats,
-            "message": f"Reverted {event_type} event, deducted {points} points"
-        }
+            return {
+                "points_deducted": points,
+                "user_stats": user_stats,
+                "message": f"Reverted {event_type} event, deducted {points} points"
+            }
+
+    def _fallback_points(self, event_type: str, metadata: Dict) -> Optional[int]:
+        """
+        Points a revert takes when no award of its source matches: what the
+        event would earn now, or none for ``if_awarded`` reverts of bonuses
+        that may never have been given
+        """
+        if metadata.get('if_awarded'):
+            return None
+        return self._calculate_points(event_type, metadata)
 
     async def deduct_points(self, user_id: int, points: int) -> Dict:
         """Deduct points from user's various point counters, ensuring they don't go below zero"""
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
+        _, user_stats = await self._take_points(user_id, [("deduction", (None, None), points)])
+        return user_stats
+
+    async def _take_points(self, user_id: int, reverts: List[Tuple[str, ledger.Source, Optional[int]]]) -> Tuple[int, Dict]:
+        """
+        Revert ``(event type, source, points if unmatched)`` awards in the ledger;
+        returns the points taken and the user's new counters
+        """
+        user = await self._get_user(user_id)
         
-        # Deduct points, ensuring we don't go below zero
-        user.total_points = max(0, user.total_points - points)
-        user.weekly_points = max(0, user.weekly_points - points)
-        user.monthly_points = max(0, user.monthly_points - points)
+        points = 0
+        for event_type, source, fallback_points in reverts:
+            points += await ledger.revert(self.db, user, event_type, source, fallback_points)
         
         # Check if level should be adjusted
-        current_level = user.current_level
+        levels = await catalog.get(self.db)
+        current_level = levels.levels_by_id.get(user.current_level_id)
+        demoted = False
         if current_level and current_level.level_number > 1:
-            # Get previous level
-            previous_level = self.db.query(models.Level).filter(
-                models.Level.level_number == current_level.level_number - 1
-            ).first()
+            previous_level = levels.levels_by_number.get(current_level.level_number - 1)
             
             # If user's points are now below current level requirement, demote them
             if user.total_points < current_level.points_required and previous_level:
                 user.current_level_id = previous_level.id
+                demoted = True
         
-        self.db.commit()
+        await leaderboard.record_user(self.db, user)
+        await self._commit()
+        # Inside a unit of work the loaded user stays current unless the level changed
+        if self.autocommit or demoted:
+            await self._refresh(user)
         
-        return {
+        return points, {
             "total_points": user.total_points,
             "weekly_points": user.weekly_points,
             "monthly_points": user.monthly_points,
             "current_level": user.current_level.level_number if user.current_level else 1
         }
 
-    async def award_points(self, user_id: int, points: int) -> Dict:
+    async def award_points(
+        self,
+        user_id: int,
+        points: int,
+        event_type: str = "points",
+        source: ledger.Source = (None, None)
+    ) -> Dict:
         """Award points to user and update various point counters"""
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
-        user.total_points += points
-        user.weekly_points += points
-        user.monthly_points += points
+        return await self._add_points(user_id, [(event_type, source, points)])
+
+    async def _add_points(self, user_id: int, awards: List[Tuple[str, ledger.Source, int]]) -> Dict:
+        """Record ``(event type, source, points)`` awards in the ledger and the user's counters"""
+        user = await self._get_user(user_id)
+        await ledger.award(self.db, user, awards)
+        await leaderboard.record_user(self.db, user)
         
-        self.db.commit()
+        await self._commit()
         
         return {
             "total_points": user.total_points,
@@ -108,40 +289,24 @@ class MomentumService:
             "monthly_points": user.monthly_points
         }
 
-    async def check_achievements(self, user_id: int) -> List[schemas.Achievement]:
-        """Check and award any newly completed achievements"""
-        new_achievements = []
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
-        
-        for achievement in ACHIEVEMENTS:
-            # Get the achievement record from the database
-            db_achievement = self.db.query(models.Achievement).filter(
-                models.Achievement.name == achievement['name']
-            ).first()
-            
-            if not db_achievement:
-                continue
-                
-            # Check if user already has this achievement completed
-            user_achievement = self.db.query(models.UserAchievement).filter(
-                models.UserAchievement.user_id == user_id,
-                models.UserAchievement.achievement_id == db_achievement.id,
-                models.UserAchievement.completed == True
-            ).first()
-            
-            if not user_achievement:
-                if await self._check_achievement_criteria(user_id, achievement):
-                    new_achievement = await self._award_achievement(user_id, achievement)
-                    new_achievements.append(new_achievement)
-        
-        return new_achievements
+    async def check_achievements(self, user_id: int, event_types: Optional[Iterable[str]] = None) -> List[schemas.Achievement]:
+        """
+        Check and award any newly completed achievements.
+
+        Only achievements that depend on ``event_types`` are evaluated
+        (all of them when None), see achievements.RULES.
+        """
+        return [
+            await self._award_achievement(user_id, achievement)
+            for achievement in await achievements.unlocked(self, user_id, event_types)
+        ]
 
     async def update_streaks(self, user_id: int, event_type: str) -> Dict:
         """Update user streaks based on activity"""
         streak_updates = {}
         
         # Get the user to access their timezone
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
+        user = await self._get_user(user_id)
         if not user:
             return streak_updates
             
@@ -153,16 +318,12 @@ class MomentumService:
         current_date = user_local_time.date()
         
         # Update relevant streak
-        for streak_type, events in {
-            'daily_tasks': ['task_completion', 'first_task_of_day'],
-            'weekly_goals': ['goal_completion'],
-            'focused_sessions': ['focused_session']
-        }.items():
+        for streak_type, events in STREAK_EVENTS.items():
             if event_type in events:
-                streak = self.db.query(models.Streak).filter(
+                streak = await self._first(select(models.Streak).where(
                     models.Streak.user_id == user_id,
                     models.Streak.streak_type == streak_type
-                ).first()
+                ))
                 
                 if not streak:
                     streak = models.Streak(
@@ -173,7 +334,8 @@ class MomentumService:
                         last_activity_date=current_date
                     )
                     self.db.add(streak)
-                    self.db.commit()
+                    await leaderboard.record_streak(self.db, user_id, 1)
+                    await self._commit()
                     streak_updates[streak_type] = {'current': 1, 'longest': 1, 'increased': True}
                 else:
                     last_date = streak.last_activity_date
@@ -188,6 +350,7 @@ class MomentumService:
                         streak.current_count += 1
                         if streak.current_count > streak.longest_count:
                             streak.longest_count = streak.current_count
+                            await leaderboard.record_streak(self.db, user_id, streak.longest_count)
                         streak_updates[streak_type] = {
                             'current': streak.current_count, 
                             'longest': streak.longest_count,
@@ -204,101 +367,52 @@ class MomentumService:
                         }
                     
                     streak.last_activity_date = current_date
-                    self.db.commit()
+                    await self._commit()
         
         return streak_updates
 
     async def check_level_up(self, user_id: int) -> Optional[schemas.Level]:
         """Check if user has leveled up and update if necessary"""
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
+        user = await self._get_user(user_id)
+        levels = await catalog.get(self.db)
         
         # Initialize user's level if not set
-        if not user.current_level_id or not user.current_level:
-            level_1 = self.db.query(models.Level).filter(
-                models.Level.level_number == 1
-            ).first()
-            
-            if not level_1:
-                # Create level 1 if it doesn't exist
-                perks = {
-                    "can_create_goals": True,
-                    "can_track_time": True,
-                    "can_earn_achievements": True,
-                    "can_view_analytics": True
-                }
-                level_1 = models.Level(
-                    level_number=1,
-                    points_required=0,
-                    title=LEVELS[0]['title'],
-                    perks=json.dumps(perks)
-                )
-                self.db.add(level_1)
-                self.db.commit()
-                self.db.refresh(level_1)
-            
-            user.current_level_id = level_1.id
-            self.db.commit()
-            self.db.refresh(user)
-        
-        current_level = user.current_level
+        current_level = levels.levels_by_id.get(user.current_level_id)
         if not current_level:
-            logger.error(f"Failed to initialize current_level for user {user_id}")
+            current_level = levels.levels_by_number.get(1)
+            if not current_level:
+                logger.error(f"Failed to initialize current_level for user {user_id}")
+                return None
+            user.current_level_id = current_level.id
+            await leaderboard.record_user(self.db, user)
+            await self._commit()
+            await self._refresh(user)
+        
+        # Straight to the highest level the points reach, not one level per call
+        level = levels.level_for(user.total_points)
+        if level.level_number <= current_level.level_number:
             return None
         
-        for level in LEVELS:
-            if (level['level_number'] > current_level.level_number and 
-                user.total_points >= level['points_required']):
-                # Get or create the level in the database
-                db_level = self.db.query(models.Level).filter(
-                    models.Level.level_number == level['level_number']
-                ).first()
-                
-                if not db_level:
-                    db_level = models.Level(
-                        level_number=level['level_number'],
-                        points_required=level['points_required'],
-                        title=level['title'],
-                        perks=json.dumps(level['perks'])
-                    )
-                    self.db.add(db_level)
-                    self.db.commit()
-                    self.db.refresh(db_level)
-                
-                user.current_level_id = db_level.id
-                self.db.commit()
-                self.db.refresh(user)
-                
-                # Ensure perks is properly formatted before conversion
-                if isinstance(db_level.perks, str):
-                    try:
-                        db_level.perks = json.loads(db_level.perks)
-                    except json.JSONDecodeError:
-                        db_level.perks = {
-                            "can_create_goals": True,
-                            "can_track_time": True,
-                            "can_earn_achievements": True,
-                            "can_view_analytics": True
-                        }
-                elif db_level.perks is None:
-                    db_level.perks = {
-                        "can_create_goals": True,
-                        "can_track_time": True,
-                        "can_earn_achievements": True,
-                        "can_view_analytics": True
-                    }
-                
-                return schemas.Level(
-                    id=db_level.id,
-                    level_number=db_level.level_number,
-                    points_required=db_level.points_required,
-                    title=db_level.title,
-                    perks=db_level.perks
-                )
-        return None
+        user.current_level_id = level.id
+        await leaderboard.record_user(self.db, user)
+        await self._commit()
+        await self._refresh(user)
+        
+        return schemas.Level(
+            id=level.id,
+            level_number=level.level_number,
+            points_required=level.points_required,
+            title=level.title,
+            perks=level.perks
+        )
 
     async def get_user_progress(self, user_id: int) -> schemas.UserProgress:
-        """Get detailed progress information for a user"""
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
+        """
+        Get detailed progress information for a user. Read-only: a user whose
+        momentum is not initialized yet (see init_user_momentum) is shown at
+        level 1 with no points.
+        """
+        user = await self._get_user(user_id)
         
         # Handle case when user is not found
         if user is None:
@@ -308,78 +422,15 @@ class MomentumService:
                 detail=f"User with ID {user_id} not found. User must be properly registered before accessing momentum data."
             )
 
-        # Initialize user's points if not set
-        if user.total_points is None:
-            user.total_points = 0
-            user.weekly_points = 0
-            user.monthly_points = 0
-            self.db.commit()
-        
-        # Initialize user's level if not set
-        if not user.current_level_id:
-            level_1 = self.db.query(models.Level).filter(
-                models.Level.level_number == 1
-            ).first()
-            
-            if not level_1:
-                # Create level 1 if it doesn't exist
-                perks = {
-                    "can_create_goals": True,
-                    "can_track_time": True,
-                    "can_earn_achievements": True,
-                    "can_view_analytics": True
-                }
-                level_1 = models.Level(
-                    level_number=1,
-                    points_required=0,
-                    title=LEVELS[0]['title'],
-                    perks=json.dumps(perks)  # Serialize perks to JSON string
-                )
-                self.db.add(level_1)
-                self.db.commit()
-                self.db.refresh(level_1)
-            
-            user.current_level_id = level_1.id
-            self.db.commit()
-            self.db.refresh(user)
-        
-        # Ensure current level perks is properly formatted
-        current_level = user.current_level
-        if current_level.perks is None:
-            current_level.perks = json.dumps({
-                "can_create_goals": True,
-                "can_track_time": True,
-                "can_earn_achievements": True,
-                "can_view_analytics": True
-            })
-            self.db.commit()
-        
-        # Convert perks from JSON string to dict if needed
-        if isinstance(current_level.perks, str):
-            try:
-                perks_dict = json.loads(current_level.perks)
-            except json.JSONDecodeError:
-                perks_dict = {
-                    "can_create_goals": True,
-                    "can_track_time": True,
-                    "can_earn_achievements": True,
-                    "can_view_analytics": True
-                }
-        else:
-            perks_dict = current_level.perks or {
-                "can_create_goals": True,
-                "can_track_time": True,
-                "can_earn_achievements": True,
-                "can_view_analytics": True
-            }
+        total_points = user.total_points or 0
+        levels = await catalog.get(self.db)
+        current_level = levels.levels_by_id.get(user.current_level_id) or levels.levels_by_number[1]
         
         # Get next level information
-        next_level = self.db.query(models.Level).filter(
-            models.Level.points_required > user.total_points
-        ).order_by(models.Level.points_required.asc()).first()
+        next_level = levels.next_level(total_points)
         
         # Calculate progress to next level
-        points_to_next = next_level.points_required - user.total_points if next_level else 0
+        points_to_next = next_level.points_required - total_points if next_level else 0
         
         # If at max level, set total_points_in_level to something reasonable
         if next_level:
@@ -388,15 +439,15 @@ class MomentumService:
             # For max level, use a multiple of current level's points to show better progress
             max_level_points = current_level.points_required
             # If reached max level with substantial points beyond requirement, show appropriate percentage
-            if user.total_points > max_level_points:
+            if total_points > max_level_points:
                 # Use points beyond requirement to calculate percentage within max level
-                excess_points = user.total_points - max_level_points
+                excess_points = total_points - max_level_points
                 # Set total_points_in_level to a value that will show meaningful progress
                 total_points_in_level = max_level_points  # This gives 100% when user has double the requirement
             else:
                 total_points_in_level = 1  # Default fallback, should not happen much
         
-        points_earned_in_level = user.total_points - current_level.points_required
+        points_earned_in_level = total_points - current_level.points_required
         
         # Ensure completion percentage is between 0-100
         if next_level:
@@ -406,26 +457,18 @@ class MomentumService:
             completion_percentage = 100
         
         # Get recent achievements
-        recent_achievements = self.db.query(models.UserAchievement).filter(
+        recent_achievements = await self._all(select(models.UserAchievement).options(
+            selectinload(models.UserAchievement.achievement)
+        ).where(
             models.UserAchievement.user_id == user_id,
             models.UserAchievement.completed == True
-        ).order_by(models.UserAchievement.completed_at.desc()).limit(5).all()
-        
-        # Initialize achievements if none exist
-        if not recent_achievements:
-            await self.get_user_achievements(user_id)
-            recent_achievements = []
+        ).order_by(models.UserAchievement.completed_at.desc()).limit(5))
         
         # Get active streaks
-        active_streaks = self.db.query(models.Streak).filter(
+        active_streaks = await self._all(select(models.Streak).where(
             models.Streak.user_id == user_id,
             models.Streak.current_count > 0
-        ).all()
-        
-        # Initialize streaks if none exist
-        if not active_streaks:
-            await self.get_user_streaks(user_id)
-            active_streaks = []
+        ))
         
         # Create Level model with properly formatted data
         level_model = schemas.Level(
@@ -433,32 +476,24 @@ class MomentumService:
             level_number=current_level.level_number,
             points_required=current_level.points_required,
             title=current_level.title,
-            perks=perks_dict
+            perks=current_level.perks
         )
         
         # Create Next Level model if available
         next_level_model = None
         if next_level:
-            if isinstance(next_level.perks, str):
-                try:
-                    next_perks_dict = json.loads(next_level.perks)
-                except json.JSONDecodeError:
-                    next_perks_dict = perks_dict.copy()
-            else:
-                next_perks_dict = next_level.perks or perks_dict.copy()
-            
             next_level_model = schemas.Level(
                 id=next_level.id,
                 level_number=next_level.level_number,
                 points_required=next_level.points_required,
                 title=next_level.title,
-                perks=next_perks_dict
+                perks=next_level.perks
             )
         
         return schemas.UserProgress(
             current_level=level_model,
             next_level=next_level_model,
-            total_points=user.total_points,
+            total_points=total_points,
             points_to_next_level=points_to_next,
             completion_percentage=completion_percentage,
             recent_achievements=recent_achievements,
@@ -471,72 +506,47 @@ class MomentumService:
         limit: int = 10,
         user_id: Optional[int] = None
     ) -> List[schemas.LeaderboardEntry]:
-        """Get leaderboard data with optional user context"""
-        if timeframe == "weekly":
-            points_column = models.User.weekly_points
-        elif timeframe == "monthly":
-            points_column = models.User.monthly_points
-        else:
-            points_column = models.User.total_points
-            
-        leaderboard = self.db.query(
-            models.User.id.label('user_id'),
-            models.User.username,
-            points_column.label('points'),
-            models.Level.level_number.label('level'),
-            func.count(models.UserAchievement.id).label('achievements_count'),
-            func.max(models.Streak.longest_count).label('longest_streak')
-        ).join(
-            models.Level,
-            models.User.current_level_id == models.Level.id
-        ).outerjoin(
-            models.UserAchievement,
-            models.User.id == models.UserAchievement.user_id
-        ).outerjoin(
-            models.Streak,
-            models.User.id == models.Streak.user_id
-        ).group_by(
-            models.User.id,
-            models.User.username,
-            points_column,
-            models.Level.level_number
-        ).order_by(points_column.desc()).limit(limit).all()
-        
-        # Convert SQLAlchemy Row objects to dictionaries with proper field names
-        leaderboard_entries = []
-        for entry in leaderboard:
-            entry_dict = {
-                'user_id': entry.user_id,
-                'username': entry.username,
-                'points': entry.points or 0,  # Handle None values
-                'level': entry.level,
-                'achievements_count': entry.achievements_count or 0,
-                'longest_streak': entry.longest_streak or 0
-            }
-            leaderboard_entries.append(schemas.LeaderboardEntry(**entry_dict))
-        
-        return leaderboard_entries
+        """Top ``limit`` users of a board, read from the materialized leaderboard"""
+        return [
+            schemas.LeaderboardEntry(
+                user_id=entry.user_id,
+                username=entry.username or "",
+                points=getattr(entry, leaderboard.board_column(timeframe).key),
+                level=entry.level,
+                achievements_count=entry.achievements_count,
+                longest_streak=entry.longest_streak
+            )
+            for entry in await leaderboard.top(self.db, timeframe, limit)
+        ]
+
+    async def get_leaderboard_rank(self, user_id: int, timeframe: str = "weekly") -> schemas.LeaderboardRank:
+        """User's position and points on one board"""
+        entry = await self._first(select(models.LeaderboardEntry).where(models.LeaderboardEntry.user_id == user_id))
+        return schemas.LeaderboardRank(
+            timeframe=timeframe,
+            rank=await leaderboard.rank(self.db, timeframe, user_id),
+            points=getattr(entry, leaderboard.board_column(timeframe).key) if entry else 0
+        )
 
     async def get_momentum_stats(self, user_id: int) -> schemas.MomentumStats:
         """Get comprehensive momentum statistics for a user"""
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
+        user = await self._get_user(user_id)
         
         # Get achievement stats
-        total_achievements = self.db.query(func.count(models.UserAchievement.id)).filter(
+        total_achievements = await self._scalar(select(func.count(models.UserAchievement.id)).where(
             models.UserAchievement.user_id == user_id,
             models.UserAchievement.completed == True
-        ).scalar()
+        ))
         
         # Get current streaks
-        streaks = self.db.query(models.Streak).filter(
+        streaks = await self._all(select(models.Streak).where(
             models.Streak.user_id == user_id
-        ).all()
+        ))
         current_streaks = {streak.streak_type: streak.current_count for streak in streaks}
         
         # Calculate level progress
-        next_level = self.db.query(models.Level).filter(
-            models.Level.points_required > user.total_points
-        ).order_by(models.Level.points_required.asc()).first()
+        levels = await catalog.get(self.db)
+        next_level = levels.next_level(user.total_points)
         
         if next_level:
             level_progress = (user.total_points - user.current_level.points_required) / (
@@ -546,10 +556,12 @@ class MomentumService:
             level_progress = 1.0
             
         # Get recent awards
-        recent_awards = self.db.query(models.UserAchievement).filter(
+        recent_awards = await self._all(select(models.UserAchievement).options(
+            selectinload(models.UserAchievement.achievement)
+        ).where(
             models.UserAchievement.user_id == user_id,
             models.UserAchievement.completed == True
-        ).order_by(models.UserAchievement.completed_at.desc()).limit(5).all()
+        ).order_by(models.UserAchievement.completed_at.desc()).limit(5))
         
         # Get leaderboard position
         leaderboard_position = await self._get_leaderboard_position(user_id)
@@ -560,39 +572,16 @@ class MomentumService:
             current_streaks=current_streaks,
             level_progress=level_progress,
             recent_awards=recent_awards,
-            leaderboard_position=leaderboard_position
+            leaderboard_position=leaderboard_position,
+            activity=schemas.ActivityStats(**await user_stats.get(self.db, user_id))
         )
 
     async def _get_leaderboard_position(self, user_id: int) -> Optional[int]:
-        """Helper method to get user's position on the leaderboard"""
-        subquery = self.db.query(
-            models.User.id,
-            func.rank().over(
-                order_by=models.User.total_points.desc()
-            ).label('rank')
-        ).subquery()
-        
-        result = self.db.query(subquery.c.rank).filter(
-            subquery.c.id == user_id
-        ).first()
-        
-        return result[0] if result else None
-
-    async def _check_achievement_criteria(self, user_id: int, achievement: Dict) -> bool:
-        """Helper method to check if achievement criteria are met"""
-        if achievement['criteria_type'] == CriteriaType.COUNT:
-            return await self._check_count_criteria(user_id, achievement)
-        elif achievement['criteria_type'] == CriteriaType.STREAK:
-            return await self._check_streak_criteria(user_id, achievement)
-        elif achievement['criteria_type'] == CriteriaType.TIME:
-            return await self._check_time_criteria(user_id, achievement)
-        elif achievement['criteria_type'] == CriteriaType.SPECIFIC_TIME:
-            return await self._check_specific_time_criteria(user_id, achievement)
-        elif achievement['criteria_type'] == CriteriaType.COMPOUND:
-            return await self._check_compound_criteria(user_id, achievement)
-        return False
-    
-    def _calculate_points(self, event_type: str, metadata: Dict) -> int:
+        """Helper method to get user's position on the all-time leaderboard"""
+        return await leaderboard.rank(self.db, "all-time", user_id)
+
+    @staticmethod
+    def _calculate_points(event_type: str, metadata: Dict) -> int:
         """
         Calculate points for a given event type with metadata
         Returns the total points earned for the event
@@ -681,18 +670,16 @@ class MomentumService:
     
     async def get_levels(self) -> List[schemas.Level]:
         """Retrieve all levels and their requirements."""
-        # Simulate fetching data from the LEVELS constant.
-        levels = [
+        return [
             schemas.Level(
-                id=index + 1,  # Assigning a unique ID to each level
-                level_number=level['level_number'],
-                points_required=level['points_required'],
-                title=level['title'],
-                perks=level['perks']
+                id=level.id,
+                level_number=level.level_number,
+                points_required=level.points_required,
+                title=level.title,
+                perks=level.perks
             )
-            for index, level in enumerate(LEVELS)
+            for level in (await catalog.get(self.db)).levels
         ]
-        return levels
     
     async def get_available_achievements(self, category: Optional[schemas.AchievementCategory] = None) -> List[schemas.Achievement]:
         """
@@ -701,139 +688,16 @@ class MomentumService:
         :param category: Optional category to filter achievements.
         :return: List of achievements matching the filter.
         """
-        # Filter achievements by category if provided
-        filtered_achievements = [
-            schemas.Achievement(
-                id=index + 1,  # Assign unique ID to each achievement
-                name=achievement['name'],
-                description=achievement['description'],
-                points=achievement['points'],
-                category=achievement['category'],
-                criteria_type=achievement['criteria_type'],
-                criteria_value=achievement['criteria_value'],
-                icon_name=achievement['icon_name'],
-            )
-            for index, achievement in enumerate(ACHIEVEMENTS)
-            if category is None or achievement['category'] == category
+        return [
+            schemas.Achievement.model_validate(achievement, from_attributes=True)
+            for achievement in (await catalog.get(self.db)).achievements
+            if category is None or achievement.category == category
         ]
-        return filtered_achievements
-
-    async def _check_count_criteria(self, user_id: int, achievement: Dict) -> bool:
-        """Check if count-based achievement criteria are met"""
-        if achievement['category'] == 'productivity':
-            count = self.db.query(models.Task).filter(
-                models.Task.owner_id == user_id,
-                models.Task.completed == True
-            ).count()
-        elif achievement['category'] == 'time_management':
-            count = self.db.query(models.TimeSlot).filter(
-                models.TimeSlot.owner_id == user_id,
-                models.TimeSlot.status == 'completed'
-            ).count()
-        else:
-            count = 0
-        return count >= achievement['criteria_value']
-
-    async def _check_streak_criteria(self, user_id: int, achievement: Dict) -> bool:
-        """Check if streak-based achievement criteria are met"""
-        streak = self.db.query(models.Streak).filter(
-            models.Streak.user_id == user_id,
-            models.Streak.streak_type == achievement['name'].lower()
-        ).first()
-        
-        if not streak:
-            return False
-            
-        return streak.longest_count >= achievement['criteria_value']
-
-    async def _check_time_criteria(self, user_id: int, achievement: Dict) -> bool:
-        """Check if time-based achievement criteria are met"""
-        total_time = self.db.query(func.sum(models.Task.time_spent)).filter(
-            models.Task.owner_id == user_id,
-            models.Task.completed == True
-        ).scalar() or 0
-        
-        return total_time >= achievement['criteria_value']
-
-    async def _check_specific_time_criteria(self, user_id: int, achievement: Dict) -> bool:
-        """Check if specific time-based achievement criteria are met"""
-        # Get user timezone
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
-        user_timezone = user.timezone if user and user.timezone else "Asia/Kolkata"
-        
-        if achievement['name'] == 'Early Riser':
-            # For Early Riser, we need to check tasks completed before 9 AM in the user's timezone
-            # This is complex with SQLite which doesn't handle timezones well
-            # We'll use a more manual approach to ensure accuracy
-            
-            # Get all completed tasks for this user
-            completed_tasks = self.db.query(models.Task).filter(
-                models.Task.owner_id == user_id,
-                models.Task.completed == True
-            ).all()
-            
-            # Count how many were completed before 9 AM in user's timezone
-            early_morning_count = 0
-            for task in completed_tasks:
-                if task.created_at:
-                    # Convert UTC time to user's timezone
-                    task_time_utc = task.created_at.replace(tzinfo=pytz.UTC)
-                    task_time_local = task_time_utc.astimezone(pytz.timezone(user_timezone))
-                    
-                    # Check if hour is before 9 AM
-                    if task_time_local.hour < 9:
-                        early_morning_count += 1
-            
-            return early_morning_count >= achievement['criteria_value']
-            
-        return False
-
-    async def _check_compound_criteria(self, user_id: int, achievement: Dict) -> bool:
-        """Check if compound achievement criteria are met"""
-        if achievement['name'] == 'Goal Strategist':
-            # Count goals with 5+ steps that are completed
-            complex_goals = self.db.query(models.Goal).filter(
-                models.Goal.owner_id == user_id,
-                models.Goal.completed == True
-            ).join(models.GoalStep).group_by(models.Goal.id).having(
-                func.count(models.GoalStep.id) >= 5
-            ).count()
-            return complex_goals >= achievement['criteria_value']
-            
-        elif achievement['name'] == 'Productivity Pioneer':
-            # Check if user has used all features in a week
-            week_ago = datetime.utcnow() - timedelta(days=7)
-            has_tasks = self.db.query(models.Task).filter(
-                models.Task.owner_id == user_id,
-                models.Task.created_at >= week_ago
-            ).first() is not None
-            
-            has_goals = self.db.query(models.Goal).filter(
-                models.Goal.owner_id == user_id,
-                models.Goal.created_at >= week_ago
-            ).first() is not None
-            
-            has_time_slots = self.db.query(models.TimeSlot).filter(
-                models.TimeSlot.owner_id == user_id,
-                models.TimeSlot.created_at >= week_ago
-            ).first() is not None
-            
-            return has_tasks and has_goals and has_time_slots
-            
-        elif achievement['name'] == 'Leaderboard Legend':
-            # Skip the manual check, this is now handled by the scheduler
-            # This prevents the achievement from being awarded twice
-            # and ensures it only happens at the end of the week
-            return False
-            
-        return False
 
     async def _award_achievement(self, user_id: int, achievement: Dict) -> schemas.Achievement:
         """Award an achievement to a user"""
         # Get or create achievement record
-        db_achievement = self.db.query(models.Achievement).filter(
-            models.Achievement.name == achievement['name']
-        ).first()
+        db_achievement = (await catalog.get(self.db)).achievements_by_name.get(achievement['name'])
         
         if not db_achievement:
             db_achievement = models.Achievement(
@@ -846,46 +710,47 @@ class MomentumService:
                 icon_name=achievement['icon_name']
             )
             self.db.add(db_achievement)
-            self.db.commit()
-            self.db.refresh(db_achievement)
+            await self._commit()
+            await self._refresh(db_achievement)
         
-        # Check if user already has this achievement to prevent duplicates
-        existing = self.db.query(models.UserAchievement).filter(
+        # (user_id, achievement_id) is unique; init_user_momentum may already have
+        # created the row to track progress
+        user_achievement = await self._first(select(models.UserAchievement).where(
             models.UserAchievement.user_id == user_id,
-            models.UserAchievement.achievement_id == db_achievement.id,
-            models.UserAchievement.completed == True
-        ).first()
+            models.UserAchievement.achievement_id == db_achievement.id
+        ))
         
-        if existing:
-            # Return the existing achievement without creating a duplicate
+        if user_achievement and user_achievement.completed:
+            # Return the existing achievement without awarding it twice
             return schemas.Achievement.from_orm(db_achievement)
         
-        # Create user achievement record
-        user_achievement = models.UserAchievement(
-            user_id=user_id,
-            achievement_id=db_achievement.id,
-            progress=achievement['criteria_value'],
-            completed=True,
-            completed_at=datetime.utcnow()
-        )
-        self.db.add(user_achievement)
+        if not user_achievement:
+            user_achievement = models.UserAchievement(
+                user_id=user_id,
+                achievement_id=db_achievement.id
+            )
+            self.db.add(user_achievement)
+        user_achievement.progress = achievement['criteria_value']
+        user_achievement.completed = True
+        user_achievement.completed_at = datetime.utcnow()
+        achievements.mark_held(self.db, user_id, achievement['name'])
         
         # Award points to user
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
-        user.total_points += achievement['points']
-        user.weekly_points += achievement['points']
-        user.monthly_points += achievement['points']
+        user = await self._get_user(user_id)
+        await ledger.award(self.db, user, [("achievement", ("achievement", db_achievement.id), achievement['points'])])
+        await leaderboard.record_achievement(self.db, user_id)
+        await leaderboard.record_user(self.db, user)
         
-        self.db.commit()
-        self.db.refresh(user_achievement)
+        await self._commit()
+        await self._refresh(user_achievement)
         
         return schemas.Achievement.from_orm(db_achievement)
 
     async def get_user_streaks(self, user_id: int) -> List[schemas.Streak]:
         """Get all active streaks for a user"""
-        streaks = self.db.query(models.Streak).filter(
+        streaks = await self._all(select(models.Streak).where(
             models.Streak.user_id == user_id
-        ).all()
+        ))
         
         if not streaks:
             # Initialize default streaks if none exist
@@ -903,235 +768,207 @@ class MomentumService:
                 self.db.add(streak)
                 streaks.append(streak)
             
-            self.db.commit()
+            await self._commit()
             for streak in streaks:
-                self.db.refresh(streak)
+                await self._refresh(streak)
         
         return [schemas.Streak.from_orm(streak) for streak in streaks]
 
     async def get_user_achievements(self, user_id: int) -> List[schemas.UserAchievement]:
-        """Get all achievements and their status for a user"""
-        # First, ensure all achievements exist in the database
-        for achievement_data in ACHIEVEMENTS:
-            achievement = self.db.query(models.Achievement).filter(
-                models.Achievement.name == achievement_data['name']
-            ).first()
-            
-            if not achievement:
-                achievement = models.Achievement(
-                    name=achievement_data['name'],
-                    description=achievement_data['description'],
-                    points=achievement_data['points'],
-                    category=achievement_data['category'],
-                    criteria_type=achievement_data['criteria_type'],
-                    criteria_value=achievement_data['criteria_value'],
-                    icon_name=achievement_data['icon_name']
-                )
-                self.db.add(achievement)
-                self.db.commit()
-                self.db.refresh(achievement)
-            
-            # Create user achievement tracking if not exists
-            user_achievement = self.db.query(models.UserAchievement).filter(
-                models.UserAchievement.user_id == user_id,
-                models.UserAchievement.achievement_id == achievement.id
-            ).first()
-            
-            if not user_achievement:
-                user_achievement = models.UserAchievement(
+        """
+        The user's progress on every catalog achievement, in one query: the
+        achievements themselves come from the catalog. Achievements the user
+        has no tracking row for yet are left out; create_missing_achievements
+        adds them.
+        """
+        levels = await catalog.get(self.db)
+        table = models.UserAchievement.__table__
+        rows = (await self._execute(select(table).where(table.c.user_id == user_id).order_by(table.c.id))).all()
+        return [
+            schemas.UserAchievement(
+                id=row.id,
+                user_id=row.user_id,
+                achievement_id=row.achievement_id,
+                progress=row.progress or 0,
+                completed=bool(row.completed),
+                completed_at=row.completed_at,
+                achievement=schemas.Achievement.model_validate(levels.achievements_by_id[row.achievement_id], from_attributes=True)
+            )
+            for row in rows if row.achievement_id in levels.achievements_by_id
+        ]
+
+    async def create_missing_achievements(self, user_id: int) -> None:
+        """Create the user's tracking rows for catalog achievements that have none, in one statement"""
+        catalog_table = models.Achievement.__table__
+        table = models.UserAchievement.__table__
+        users = models.User.__table__
+        result = await self._execute(table.insert().from_select(
+            ["user_id", "achievement_id", "progress", "completed"],
+            select(literal(user_id), catalog_table.c.id, literal(0), literal(False)).where(
+                catalog_table.c.id.in_(list((await catalog.get(self.db)).achievements_by_id)),
+                ~select(table.c.id).where(table.c.user_id == user_id, table.c.achievement_id == catalog_table.c.id).exists()
+            )
+        ))
+        if result.rowcount:
+            # Not an ORM flush, so bump_data_versions does not see it; the user's ETags must change
+            await self._execute(users.update().where(users.c.id == user_id).values(data_version=users.c.data_version + 1))
+        await self._commit()
+
+    async def _perfect_period_users(self, condition, timezone_name: Optional[str], first_day, last_day, minimum_tasks: int) -> Dict[int, int]:
+        """
+        ``{user id: task count}`` of the active users matching ``condition``
+        who completed every task planned between the local days ``first_day``
+        and ``last_day``, and planned at least ``minimum_tasks``; one query
+        """
+        tasks, users = models.Task.__table__, models.User.__table__
+        task_count = func.count(tasks.c.id)
+        result = await self._execute(
+            select(tasks.c.owner_id, task_count)
+            .select_from(tasks.join(users, users.c.id == tasks.c.owner_id))
+            .where(
+                condition,
+                users.c.is_active == True,
+                # Tasks have no due date; a task is planned for the day it was created
+                tasks.c.created_at >= ledger.utc_start(first_day, timezone_name),
+                tasks.c.created_at < ledger.utc_start(last_day + timedelta(days=1), timezone_name)
+            )
+            .group_by(tasks.c.owner_id)
+            .having(
+                task_count >= minimum_tasks,
+                func.sum(case((tasks.c.completed == True, 0), else_=1)) == 0
+            )
+        )
+        return dict(result.all())
+
+    @staticmethod
+    def _week(today) -> Tuple:
+        """Monday and Sunday of ``today``'s week"""
+        start_of_week = today - timedelta(days=today.weekday())
+        return start_of_week, start_of_week + timedelta(days=6)
+
+    @staticmethod
+    def _month(today) -> Tuple:
+        """First and last day of ``today``'s month"""
+        start_of_month = today.replace(day=1)
+        end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return start_of_month, end_of_month
+
+    async def _award_perfect_periods(self, event_type: str, period: str, users: Dict[int, int], first_day, last_day) -> None:
+        """Send ``event_type`` to each of ``users``, ``{user id: task count}``"""
+        for user_id, task_count in users.items():
+            try:
+                await self.process_event(
                     user_id=user_id,
-                    achievement_id=achievement.id,
-                    progress=0,
-                    completed=False
+                    event_type=event_type,
+                    metadata={
+                        f'{period}_start': first_day.isoformat(),
+                        f'{period}_end': last_day.isoformat(),
+                        'completion_time': datetime.utcnow(),
+                        'task_count': task_count
+                    }
                 )
-                self.db.add(user_achievement)
-        
-        self.db.commit()
-        
-        # Get all user achievements with their related achievement data
-        user_achievements = self.db.query(models.UserAchievement).filter(
-            models.UserAchievement.user_id == user_id
-        ).join(
-            models.Achievement
-        ).all()
-        
-        return [schemas.UserAchievement.from_orm(ua) for ua in user_achievements]
+            except Exception as e:
+                logger.error(f"Error awarding {event_type} to user {user_id}: {str(e)}")
 
     async def check_perfect_week(self, user_id: int) -> bool:
         """Check if user has completed all planned tasks for the week"""
-        # Get the user to access their timezone
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
+        user = await self._get_user(user_id)
         if not user:
             return False
-            
-        user_timezone = pytz.timezone(user.timezone if user.timezone else "Asia/Kolkata")
-        
-        # Calculate the start and end of the week in user's timezone
-        now_utc = datetime.utcnow().replace(tzinfo=pytz.UTC)
-        user_local_time = now_utc.astimezone(user_timezone)
-        today = user_local_time.date()
-        
-        # Get start of week (Monday) and end of week (Sunday)
-        start_of_week = today - timedelta(days=today.weekday())
-        end_of_week = start_of_week + timedelta(days=6)
-        
-        # Check if all planned tasks for the week are completed
-        planned_tasks = self.db.query(models.Task).filter(
-            models.Task.owner_id == user_id,
-            models.Task.due_date >= start_of_week,
-            models.Task.due_date <= end_of_week
-        ).all()
-        
-        # If no tasks planned, return False
-        if not planned_tasks:
-            return False
-            
-        # Check if all tasks are completed
-        all_completed = all(task.completed for task in planned_tasks)
-        
-        # If all weekly tasks are completed, grant a perfect week achievement
-        if all_completed:
-            # Process the perfect_week event
-            await self.process_event(
-                user_id=user_id, 
-                event_type='perfect_week',
-                metadata={
-                    'week_start': start_of_week.isoformat(),
-                    'week_end': end_of_week.isoformat(),
-                    'completion_time': datetime.utcnow(),
-                    'task_count': len(planned_tasks)
-                }
-            )
-            return True
-            
-        return False
+
+        today = ledger.local_date(user.timezone)
+        start_of_week, end_of_week = self._week(today)
+        perfect = await self._perfect_period_users(
+            models.User.id == user_id, user.timezone, start_of_week, end_of_week, 1
+        )
+        await self._award_perfect_periods('perfect_week', 'week', perfect, start_of_week, end_of_week)
+        return bool(perfect)
 
     async def check_perfect_month(self, user_id: int) -> bool:
-        """Check if user has completed all planned tasks for the month"""
-        # Get the user to access their timezone
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
+        """Check if user has completed all planned tasks for the month, and at least 10 of them"""
+        user = await self._get_user(user_id)
         if not user:
             return False
-            
-        user_timezone = pytz.timezone(user.timezone if user.timezone else "Asia/Kolkata")
-        
-        # Calculate the start and end of the month in user's timezone
-        now_utc = datetime.utcnow().replace(tzinfo=pytz.UTC)
-        user_local_time = now_utc.astimezone(user_timezone)
-        today = user_local_time.date()
-        
-        # Get start and end of the month
-        start_of_month = today.replace(day=1)
-        # Calculate the last day of the month
-        if today.month == 12:
-            end_of_month = today.replace(year=today.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            end_of_month = today.replace(month=today.month + 1, day=1) - timedelta(days=1)
-        
-        # Check if all planned tasks for the month are completed
-        planned_tasks = self.db.query(models.Task).filter(
-            models.Task.owner_id == user_id,
-            models.Task.due_date >= start_of_month,
-            models.Task.due_date <= end_of_month
-        ).all()
-        
-        # If no tasks planned, return False
-        if not planned_tasks:
-            return False
-            
-        # Check if all tasks are completed
-        all_completed = all(task.completed for task in planned_tasks)
-        
-        # Check if there are enough completed tasks (at least 10 for a perfect month)
-        if all_completed and len(planned_tasks) >= 10:
-            # Process the perfect_month event
-            await self.process_event(
-                user_id=user_id, 
-                event_type='perfect_month',
-                metadata={
-                    'month_start': start_of_month.isoformat(),
-                    'month_end': end_of_month.isoformat(),
-                    'completion_time': datetime.utcnow(),
-                    'task_count': len(planned_tasks)
-                }
-            )
-            return True
-            
-        return False
 
-    async def schedule_weekly_and_monthly_checks(self):
+        today = ledger.local_date(user.timezone)
+        start_of_month, end_of_month = self._month(today)
+        perfect = await self._perfect_period_users(
+            models.User.id == user_id, user.timezone, start_of_month, end_of_month, 10
+        )
+        await self._award_perfect_periods('perfect_month', 'month', perfect, start_of_month, end_of_month)
+        return bool(perfect)
+
+    async def schedule_weekly_and_monthly_checks(
+        self, now: Optional[datetime] = None, timezones: Optional[Iterable[Optional[str]]] = None
+    ):
         """
-        Run weekly and monthly checks for all users
+        Run weekly and monthly checks for all users, or only for the users of
+        ``timezones`` (see app.momentum.scheduler.run_hourly_checks)
         This method should be scheduled to run once a day
-        
-        The checks are:
-        - Reset weekly points on Monday (for each user's timezone)
-        - Reset monthly points on the first day of the month (for each user's timezone)
-        - Check for perfect week on Sunday
-        - Check for perfect month on the last day of the month
+
+        Users are handled in buckets of one timezone, which share a local date.
+        For each bucket:
+        - On Sunday, one query finds the users with a perfect week
+        - On the last day of the month, one query finds those with a perfect month
+        - One UPDATE rolls weekly and monthly points over to the current week
+          and month, and one statement copies them into the leaderboard
+
+        The number of statements grows with the number of timezones (and of
+        perfect weeks and months awarded), not with the number of users.
         """
-        # Get all active users
-        users = self.db.query(models.User).filter(models.User.is_active == True).all()
-        
-        # Get the current UTC time
-        now_utc = datetime.utcnow().replace(tzinfo=pytz.UTC)
-        
-        for user in users:
+        now = now or datetime.utcnow()
+        if timezones is None:
+            timezones = await self.active_timezones()
+
+        for timezone_name in timezones:
+            bucket = ledger.in_timezone(timezone_name)
+            today = ledger.local_date(timezone_name, now)
             try:
-                # Get user's timezone
-                user_timezone = pytz.timezone(user.timezone if user.timezone else "Asia/Kolkata")
-                
-                # Convert UTC time to user's local time
-                user_local_time = now_utc.astimezone(user_timezone)
-                today = user_local_time.date()
-                
-                # If today is Sunday in user's timezone, check for perfect week
-                if today.weekday() == 6:  # Sunday is 6
-                    await self.check_perfect_week(user.id)
-                
-                # If today is the last day of the month in user's timezone, check for perfect month
-                tomorrow = today + timedelta(days=1)
-                if tomorrow.day == 1:  # Tomorrow is the first day of a new month
-                    await self.check_perfect_month(user.id)
-                
-                # Reset points if needed
-                await self.reset_periodic_points(user.id, today)
-                
+                # If today is Sunday in the bucket's timezone, check for perfect week
+                if today.weekday() == 6:
+                    start_of_week, end_of_week = self._week(today)
+                    perfect = await self._perfect_period_users(bucket, timezone_name, start_of_week, end_of_week, 1)
+                    await self._award_perfect_periods('perfect_week', 'week', perfect, start_of_week, end_of_week)
+
+                # If tomorrow is the first day of a new month, check for perfect month
+                if (today + timedelta(days=1)).day == 1:
+                    start_of_month, end_of_month = self._month(today)
+                    perfect = await self._perfect_period_users(bucket, timezone_name, start_of_month, end_of_month, 10)
+                    await self._award_perfect_periods('perfect_month', 'month', perfect, start_of_month, end_of_month)
+
+                # Roll points over to the new week or month, if any
+                if await ledger.roll_timezone(self.db, timezone_name, now):
+                    await leaderboard.record_points(self.db, bucket)
+                await self._commit()
+
             except Exception as e:
-                logger.error(f"Error processing scheduled checks for user {user.id}: {str(e)}")
-                continue
-    
+                logger.error(f"Error processing scheduled checks for timezone {timezone_name}: {str(e)}")
+                await resolve(self.db.rollback())
+
+    async def active_timezones(self) -> List[Optional[str]]:
+        """The distinct timezones of active users"""
+        users = models.User.__table__
+        result = await self._execute(select(users.c.timezone).where(users.c.is_active == True).distinct())
+        return result.scalars().all()
+
     async def reset_periodic_points(self, user_id: int, today=None):
         """
-        Reset weekly and monthly points when appropriate
+        Move the user's weekly and monthly points to the current week and month
+        
+        The ledger already counts points from the start of the user's local week
+        and month (see app.momentum.ledger), so this only refreshes the cached
+        totals and the user's leaderboard row. It is safe to run late or twice.
         
         Args:
             user_id: The ID of the user
             today: Optional date to use instead of current date (for testing)
         """
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
+        user = await self._get_user(user_id)
         if not user:
             return
         
-        if today is None:
-            # Get the current UTC time
-            now_utc = datetime.utcnow().replace(tzinfo=pytz.UTC)
-            
-            # Get user's timezone
-            user_timezone = pytz.timezone(user.timezone if user.timezone else "Asia/Kolkata")
-            
-            # Convert UTC time to user's local time
-            user_local_time = now_utc.astimezone(user_timezone)
-            today = user_local_time.date()
-        
-        # Reset weekly points on Monday in user's timezone
-        if today.weekday() == 0:  # Monday is 0
-            user.weekly_points = 0
-            logger.info(f"Reset weekly points for user {user_id}")
-        
-        # Reset monthly points on the first day of the month in user's timezone
-        if today.day == 1:
-            user.monthly_points = 0
-            logger.info(f"Reset monthly points for user {user_id}")
+        now = ledger.utc_start(today, user.timezone) if today is not None else None
+        await ledger.roll_periods(self.db, user, now)
         
-        self.db.commit()
\ No newline at end of file
+        await leaderboard.record_user(self.db, user)
+        await self._commit()
\ No newline at end of file
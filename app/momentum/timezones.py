@@ -0,0 +1,86 @@
+"""
+Timezones that just crossed local midnight.
+
+The hourly momentum checks (``scheduler.run_hourly_checks``) process each
+user once a day, in the hour their local day starts. Users are found by
+``users.utc_offset_minutes``, the minutes their timezone is ahead of UTC,
+through the (utc_offset_minutes, timezone) index: local midnight fell in
+the hour before ``now`` for the offsets of ``midnight_offsets(now)``.
+
+Offsets change with daylight saving time and with users' timezones, so
+each run first moves the stale ones to the current offset
+(``refresh_offsets``): one scan of the index for the distinct
+(offset, timezone) pairs, and one UPDATE per pair that changed.
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+
+import pytz
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import resolve
+from .ledger import DEFAULT_TIMEZONE, in_timezone
+
+MINUTES_PER_DAY = 24 * 60
+# UTC-12:00 to UTC+14:00
+MIN_OFFSET, MAX_OFFSET = -12 * 60, 14 * 60
+
+def utc_offset_minutes(timezone_name: Optional[str], now: Optional[datetime] = None) -> int:
+    """Minutes the timezone is ahead of UTC at ``now`` (UTC)"""
+    local = (now or datetime.utcnow()).replace(tzinfo=pytz.UTC).astimezone(pytz.timezone(timezone_name or DEFAULT_TIMEZONE))
+    return int(local.utcoffset().total_seconds()) // 60
+
+def midnight_offsets(now: datetime, minutes: int = 60) -> List[Tuple[int, int]]:
+    """
+    ``[low, high)`` ranges of the UTC offsets whose local midnight fell in the
+    ``minutes`` up to ``now`` (UTC): at ``now`` their local time is in
+    [00:00, 00:00 + ``minutes``)
+    """
+    elapsed = now.hour * 60 + now.minute
+    ranges = []
+    # Offsets span less than two days: today's and tomorrow's midnights cover them
+    for day in (0, 1):
+        low = day * MINUTES_PER_DAY - elapsed
+        high = low + minutes
+        if high > MIN_OFFSET and low <= MAX_OFFSET:
+            ranges.append((max(low, MIN_OFFSET), min(high, MAX_OFFSET + 1)))
+    return ranges
+
+async def refresh_offsets(db: Union[Session, AsyncSession], now: Optional[datetime] = None) -> int:
+    """Set every user's utc_offset_minutes to their timezone's offset at ``now``; returns the users changed"""
+    users = models.User.__table__
+    pairs = (await resolve(db.execute(
+        select(users.c.utc_offset_minutes, users.c.timezone).distinct()
+    ))).all()
+    changed = 0
+    for offset, timezone_name in pairs:
+        try:
+            current = utc_offset_minutes(timezone_name, now)
+        except pytz.UnknownTimeZoneError:
+            continue
+        if offset == current:
+            continue
+        stale = users.c.utc_offset_minutes.is_(None) if offset is None else users.c.utc_offset_minutes == offset
+        result = await resolve(db.execute(
+            users.update().where(stale, in_timezone(timezone_name)).values(utc_offset_minutes=current)
+        ))
+        changed += result.rowcount
+    return changed
+
+async def at_midnight(db: Union[Session, AsyncSession], now: datetime) -> List[Optional[str]]:
+    """Timezones of the active users whose local midnight fell in the hour up to ``now``"""
+    users = models.User.__table__
+    ranges = midnight_offsets(now)
+    if not ranges:
+        return []
+    result = await resolve(db.execute(
+        select(users.c.timezone).distinct().where(
+            or_(*(and_(users.c.utc_offset_minutes >= low, users.c.utc_offset_minutes < high) for low, high in ranges)),
+            users.c.is_active == True
+        )
+    ))
+    return result.scalars().all()
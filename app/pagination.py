@@ -0,0 +1,65 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+A cursor is the sort key of the last row of a page, JSON-encoded and
+base64url'd so clients treat it as opaque. List endpoints take ``limit`` and
+``cursor`` query parameters. When there are more rows, they return the
+cursor of the next page in the ``X-Next-Cursor`` response header, so the
+body stays the plain list that existing clients parse. Without ``limit``
+and ``cursor``, endpoints behave as before.
+"""
+import base64
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence
+
+from fastapi import HTTPException, Query, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    """Opaque cursor for a sort key; dates and datetimes are stored in ISO format"""
+    values = [value.isoformat() if hasattr(value, "isoformat") else value for value in key]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, types: Sequence[Callable[[Any], Any]]) -> List[Any]:
+    """Sort key of a cursor, each value converted with the matching entry of ``types``"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("cursor does not match this list")
+        return [convert(value) for convert, value in zip(types, values)]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+@dataclass
+class PageParams:
+    limit: Optional[int]
+    cursor: Optional[str]
+
+    @property
+    def paginated(self) -> bool:
+        return self.limit is not None or self.cursor is not None
+
+    @property
+    def size(self) -> int:
+        return self.limit or DEFAULT_PAGE_SIZE
+
+def page_params(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; enables cursor pagination"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page")
+) -> PageParams:
+    return PageParams(limit=limit, cursor=cursor)
+
+def finish_page(response: Response, rows: List[Any], limit: int, key: Callable[[Any], Sequence[Any]]) -> List[Any]:
+    """
+    Trim rows fetched with ``limit + 1`` to the page and, if there was an
+    extra row, set the next-page cursor from the key of the last row kept.
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key(rows[-1]))
+    return rows
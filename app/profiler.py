@@ -0,0 +1,148 @@
+"""
+On-demand profiling of single live requests.
+
+An admin sends a request with ``X-Profile: 1`` (or ``?profile=1``).
+``ProfilerMiddleware`` runs that request under ``SamplingProfiler``, which
+samples the Python stacks of all threads every ``PROFILER_INTERVAL_MS``. It
+writes the samples in the collapsed-stack format used by flamegraph.pl and
+speedscope to ``PROFILER_DIR``, and returns the profile id in the
+``X-Profile-Id`` response header. ``GET /admin/profiles/{profile_id}``
+(admins only) downloads it.
+
+Sampling covers the event loop thread, the threadpool running sync handlers,
+and the aiosqlite worker threads, so the time spent in SQLite shows up too.
+Samples whose innermost frame is waiting (selector, lock, queue) are
+dropped. Other requests served at the same time can appear in the profile.
+Only one request is profiled at a time.
+"""
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from urllib.parse import parse_qs
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+from .auth.dependencies import get_current_admin_user
+from .auth.services import get_token_email
+from .config import settings
+
+# Innermost frames of threads that are blocked rather than working
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+PROFILE_ID_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+class SamplingProfiler:
+    """Collects collapsed stacks of all threads at a fixed interval"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)).replace(";", ","))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """One ``frame;frame;frame count`` line per distinct stack"""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+def _wants_profile(scope) -> bool:
+    if Headers(scope=scope).get("x-profile", "").lower() in ("1", "true", "yes"):
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("profile", [""])[0].lower() in ("1", "true", "yes")
+
+def _requested_by_admin(scope) -> bool:
+    authorization = Headers(scope=scope).get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    return get_token_email(token) in settings.ADMIN_EMAILS
+
+class ProfilerMiddleware:
+    """ASGI middleware that profiles requests flagged by an admin"""
+
+    def __init__(self, app, directory: Optional[str] = None, interval_ms: Optional[float] = None):
+        self.app = app
+        self.directory = directory
+        self.interval = (interval_ms or settings.PROFILER_INTERVAL_MS) / 1000
+        self._busy = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._busy or not _wants_profile(scope) or not _requested_by_admin(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._busy = True
+        profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{scope['method'].lower()}"
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile_id
+            await send(message)
+
+        profiler = SamplingProfiler(self.interval)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            self._busy = False
+            directory = self.directory or settings.PROFILER_DIR
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f"{profile_id}.collapsed"), "w") as f:
+                f.write(profiler.collapsed())
+
+router = APIRouter(prefix="/admin/profiles", tags=["admin"])
+
+@router.get("/{profile_id}", response_class=PlainTextResponse)
+def get_profile(profile_id: str, current_user = Depends(get_current_admin_user)):
+    """Collapsed stacks of a profiled request, ready for flamegraph.pl or speedscope"""
+    path = os.path.join(settings.PROFILER_DIR, f"{profile_id}.collapsed")
+    if not PROFILE_ID_RE.match(profile_id) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    with open(path) as f:
+        return f.read()
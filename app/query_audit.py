@@ -0,0 +1,305 @@
+"""
+Query-plan audit for the service layer.
+
+Runs the functions in ``app/*/services.py`` against a seeded SQLite database,
+records every statement they send, and captures ``EXPLAIN QUERY PLAN`` for
+each one. Plans are flagged for:
+
+- ``full-scan``: a table is scanned without an index
+- ``temp-btree``: ORDER BY / GROUP BY / DISTINCT needs a temporary B-tree
+- ``not-covering``: an aggregate reads table rows an index could have covered
+- ``expr-predicate``: a WHERE clause wraps a column in a function, so no index applies
+
+The report only contains SQL text, plans and flags (no timings or bound
+values), so it can be diffed between releases. Run it with
+``python scripts/audit_query_plans.py``.
+"""
+import asyncio
+import os
+import re
+import tempfile
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import models
+from .database import Base, resolve
+from .migrations import run_migrations
+
+AUDITED_PREFIXES = ("SELECT", "UPDATE", "DELETE", "WITH")
+AGGREGATE_RE = re.compile(r"^SELECT\s+(count|sum|max|min|avg)\(", re.IGNORECASE)
+EXPR_PREDICATE_RE = re.compile(r"\b(date|datetime|strftime|lower|upper|coalesce|julianday)\(\s*\w+\.\w+", re.IGNORECASE)
+
+@dataclass
+class PlanEntry:
+    statement: str
+    plan: List[str]
+    flags: List[str]
+
+@dataclass
+class ScenarioResult:
+    name: str
+    entries: List[PlanEntry] = field(default_factory=list)
+    error: Optional[str] = None
+
+def flag_plan(statement: str, plan: List[str]) -> List[str]:
+    """Return the audit flags for one statement and its plan lines"""
+    flags = []
+    for line in plan:
+        detail = line.strip()
+        if detail.startswith("SCAN ") and "COVERING INDEX" not in detail and not detail.startswith("SCAN CONSTANT"):
+            flags.append(f"full-scan {detail.split()[1]}")
+        if "USE TEMP B-TREE" in detail:
+            flags.append("temp-btree")
+        if (
+            AGGREGATE_RE.match(statement)
+            and detail.startswith("SEARCH ")
+            and "USING INDEX" in detail
+            and "COVERING" not in detail
+        ):
+            flags.append(f"not-covering {detail.split()[1]}")
+
+    where = statement.upper().split(" WHERE ", 1)
+    if len(where) == 2 and EXPR_PREDICATE_RE.search(statement[len(where[0]):]):
+        flags.append("expr-predicate")
+    return sorted(set(flags))
+
+def explain(engine: Engine, statement: str, parameters) -> List[str]:
+    """EXPLAIN QUERY PLAN a statement, indenting each line by its depth in the plan tree"""
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        connection.close()
+
+    depth = {0: -1}
+    lines = []
+    for node_id, parent_id, _, detail in rows:
+        depth[node_id] = depth.get(parent_id, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+@contextmanager
+def capture_statements(engine: Engine):
+    """Collect (statement, parameters) for every auditable statement sent to ``engine``"""
+    captured: List[Tuple[str, tuple]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(AUDITED_PREFIXES):
+            if executemany:
+                parameters = parameters[0] if parameters else ()
+            captured.append((" ".join(statement.split()), parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def seed_database(db: Session, users: int = 50, rows_per_user: int = 20) -> None:
+    """Fill the database with enough per-user rows for realistic plans"""
+    from .momentum.init_momentum import init_user_momentum
+
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    for i in range(users):
+        user = models.User(
+            email=f"audit{i}@example.com",
+            username=f"audit{i}",
+            hashed_password="",
+            total_points=i * 10,
+            weekly_points=i * 3,
+            monthly_points=i * 5,
+        )
+        db.add(user)
+        db.flush()
+        for j in range(rows_per_user):
+            start = now - timedelta(days=j, hours=i % 5)
+            db.add(models.Task(title=f"Task {j}", completed=j % 3 == 0, owner_id=user.id))
+            goal = models.Goal(
+                title=f"Goal {j}", completed=j % 4 == 0, completed_at=start if j % 4 == 0 else None, owner_id=user.id
+            )
+            goal.steps.append(models.GoalStep(title=f"Step {j}"))
+            db.add(goal)
+            db.add(models.TimeSlot(
+                date=start.date(),
+                start_time=start,
+                end_time=start + timedelta(hours=1),
+                report_minutes=30,
+                status=("completed", "in_progress", "not_started")[j % 3],
+                owner_id=user.id,
+            ))
+            db.add(models.Reflection(user_id=user.id, reflection_date=start.date() - timedelta(days=j), highlights="audit"))
+    db.commit()
+
+    for user_id in db.execute(select(models.User.id)).scalars().all():
+        asyncio.run(init_user_momentum(db, user_id))
+
+def _scenarios() -> List[Tuple[str, Callable]]:
+    """(name, callable(db, user_id)) for every service entry point"""
+    from .analytics.services import AnalyticsService, get_top_users_by_time_spent
+    from .goals import services as goal_services
+    from .goals.schemas import GoalStepCreate, GoalStepUpdate
+    from .momentum.init_momentum import init_user_momentum
+    from .momentum.services import MomentumService
+    from .tafakur import schemas as tafakur_schemas
+    from .tafakur.services import TafakurService
+    from .tasks import services as task_services
+    from .tasks.schemas import TaskUpdate
+    from .time_slots import services as time_slot_services
+    from .time_slots.schemas import TimeSlotUpdate
+    from .users import services as user_services
+
+    today = date.today()
+
+    async def first_owned(db, model, owner_column, user_id, **filters):
+        statement = select(model).where(owner_column == user_id).filter_by(**filters)
+        return (await resolve(db.execute(statement))).scalars().first()
+
+    async def update_task(db, user_id):
+        task = await first_owned(db, models.Task, models.Task.owner_id, user_id, completed=False)
+        return await task_services.update_task(db, task, TaskUpdate(completed=True))
+
+    async def update_time_slot(db, user_id):
+        slot = await first_owned(db, models.TimeSlot, models.TimeSlot.owner_id, user_id, status="not_started")
+        return await time_slot_services.update_time_slot(db, slot, TimeSlotUpdate(status="completed"))
+
+    async def update_goal(db, user_id):
+        goal = await first_owned(db, models.Goal, models.Goal.owner_id, user_id, completed=False)
+        # GoalUpdate has no completed field either
+        return await goal_services.update_goal(db, goal, SimpleNamespace(dict=lambda **kwargs: {"completed": True}))
+
+    async def create_goal_step(db, user_id):
+        goal = await first_owned(db, models.Goal, models.Goal.owner_id, user_id)
+        return await goal_services.create_goal_step(db, GoalStepCreate(title="Audit step", goal_id=goal.id), goal.id)
+
+    async def update_goal_step(db, user_id):
+        goal = await first_owned(db, models.Goal, models.Goal.owner_id, user_id)
+        step = await goal_services.get_goal_step(db, goal.steps[0].id, goal.id)
+        # GoalStepUpdate has no completed field, so mark the step and apply an empty update
+        step.completed = True
+        return await goal_services.update_goal_step(db, goal, step, GoalStepUpdate())
+
+    async def create_reflection(db, user_id):
+        return await TafakurService(db).create_reflection(user_id, tafakur_schemas.ReflectionCreate(
+            reflection_date=today + timedelta(days=1), highlights="audit", tags=["audit"]
+        ))
+
+    return [
+        ("analytics.get_user_analytics", lambda db, u: AnalyticsService(db).get_user_analytics(u)),
+        ("analytics.get_daily_analytics", lambda db, u: AnalyticsService(db).get_daily_analytics(u, today)),
+        ("analytics.get_top_users_by_time_spent", lambda db, u: get_top_users_by_time_spent(db, "weekly")),
+        ("goals.get_goals", lambda db, u: goal_services.get_goals(db, u)),
+        ("goals.get_goal", lambda db, u: goal_services.get_goal(db, 1, u)),
+        ("goals.update_goal", update_goal),
+        ("goals.create_goal_step", create_goal_step),
+        ("goals.update_goal_step", update_goal_step),
+        ("momentum.init_user_momentum", lambda db, u: init_user_momentum(db, u)),
+        ("momentum.get_user_progress", lambda db, u: MomentumService(db).get_user_progress(u)),
+        ("momentum.get_momentum_stats", lambda db, u: MomentumService(db).get_momentum_stats(u)),
+        ("momentum.get_leaderboard", lambda db, u: MomentumService(db).get_leaderboard("weekly", 10, u)),
+        ("momentum.get_user_achievements", lambda db, u: MomentumService(db).get_user_achievements(u)),
+        ("momentum.get_user_streaks", lambda db, u: MomentumService(db).get_user_streaks(u)),
+        ("momentum.get_levels", lambda db, u: MomentumService(db).get_levels()),
+        ("momentum.get_available_achievements", lambda db, u: MomentumService(db).get_available_achievements()),
+        ("momentum.check_perfect_week", lambda db, u: MomentumService(db).check_perfect_week(u)),
+        ("momentum.check_perfect_month", lambda db, u: MomentumService(db).check_perfect_month(u)),
+        ("momentum.process_event", lambda db, u: MomentumService(db).process_event(
+            u, "task_completion", {"completion_time": datetime.utcnow(), "is_weekend": False}
+        )),
+        ("momentum.revert_event", lambda db, u: MomentumService(db).revert_event(
+            u, "task_completion", {"completion_time": datetime.utcnow()}
+        )),
+        ("tafakur.get_reflections", lambda db, u: TafakurService(db).get_reflections(u)),
+        ("tafakur.get_reflection_by_date", lambda db, u: TafakurService(db).get_reflection_by_date(u, today)),
+        ("tafakur.create_reflection", create_reflection),
+        ("tafakur.get_reflection_streak", lambda db, u: TafakurService(db).get_reflection_streak(u)),
+        ("tafakur.get_insights", lambda db, u: TafakurService(db).get_insights(u)),
+        ("tasks.get_tasks", lambda db, u: task_services.get_tasks(db, u)),
+        ("tasks.get_task", lambda db, u: task_services.get_task(db, 1, u)),
+        ("tasks.update_task", update_task),
+        ("time_slots.get_time_slots", lambda db, u: time_slot_services.get_time_slots(db, u, today)),
+        ("time_slots.get_time_slot", lambda db, u: time_slot_services.get_time_slot(db, 1, u)),
+        ("time_slots.update_time_slot", update_time_slot),
+        ("users.get_user_by_email", lambda db, u: user_services.get_user_by_email(db, "audit1@example.com")),
+        ("users.get_user_by_username", lambda db, u: user_services.get_user_by_username(db, "audit1")),
+    ]
+
+def run_scenario(engine: Engine, SessionFactory, name: str, func: Callable, user_id: int) -> ScenarioResult:
+    """Run one service call and explain every distinct statement it sent"""
+    result = ScenarioResult(name=name)
+    db = SessionFactory()
+    with capture_statements(engine) as captured:
+        try:
+            outcome = func(db, user_id)
+            if asyncio.iscoroutine(outcome):
+                asyncio.run(outcome)
+        except Exception as e:
+            result.error = "".join(traceback.format_exception_only(type(e), e)).strip().splitlines()[0]
+            db.rollback()
+        finally:
+            db.close()
+
+    seen = set()
+    for statement, parameters in captured:
+        if statement in seen:
+            continue
+        seen.add(statement)
+        plan = explain(engine, statement, parameters)
+        result.entries.append(PlanEntry(statement, plan, flag_plan(statement, plan)))
+    return result
+
+def run_audit(database_path: Optional[str] = None, users: int = 50, rows_per_user: int = 20) -> List[ScenarioResult]:
+    """
+    Seed a fresh database (a temporary file unless ``database_path`` is given),
+    apply migrations and audit every service scenario against it.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = database_path or os.path.join(tmp, "audit.db")
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        try:
+            Base.metadata.create_all(bind=engine)
+            SessionFactory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            db = SessionFactory()
+            try:
+                seed_database(db, users, rows_per_user)
+            finally:
+                db.close()
+            run_migrations(engine)
+
+            return [run_scenario(engine, SessionFactory, name, func, 1) for name, func in _scenarios()]
+        finally:
+            engine.dispose()
+
+def format_report(results: List[ScenarioResult]) -> str:
+    """Render the audit as stable plain text"""
+    lines = ["# Query plan audit", ""]
+    totals: Dict[str, int] = Counter()
+    for result in results:
+        lines.append(f"## {result.name}")
+        if result.error:
+            lines.append(f"ERROR {result.error}")
+        for entry in result.entries:
+            lines.append(entry.statement)
+            lines.extend(f"    {line}" for line in entry.plan)
+            lines.append(f"    flags: {', '.join(entry.flags) if entry.flags else '-'}")
+            for flag in entry.flags:
+                totals[flag.split()[0]] += 1
+        lines.append("")
+
+    lines.append("## Summary")
+    lines.append(f"statements: {sum(len(r.entries) for r in results)}")
+    lines.append(f"errors: {sum(1 for r in results if r.error)}")
+    for flag in sorted(totals):
+        lines.append(f"{flag}: {totals[flag]}")
+    return "\n".join(lines) + "\n"
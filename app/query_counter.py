@@ -0,0 +1,112 @@
+"""
+Per-request SQL statistics.
+
+``before_cursor_execute``/``after_cursor_execute`` hooks on every Engine add
+each statement to the stats of the request being served, which
+``QueryCounterMiddleware`` keeps in a context variable. The middleware reports
+the totals as ``X-DB-Queries`` and ``X-DB-Time-ms`` response headers. When the
+same statement shape runs ``SQL_N_PLUS_ONE_THRESHOLD`` or more times in one
+request, it logs a probable N+1 loop and sets ``X-DB-N-Plus-One`` to the
+number of such shapes.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from .config import settings
+from .utils import route_template
+
+logger = logging.getLogger(__name__)
+
+# "IN (?, ?, ?)" differs per call only in its length
+_IN_LIST_RE = re.compile(r"\(\?(?:,\s*\?)+\)")
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so repeated executions of the same query compare equal"""
+    return _IN_LIST_RE.sub("(?...)", " ".join(statement.split()))
+
+class RequestQueryStats:
+    """Statement count, total DB time and statement shapes for one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statement shapes executed at least ``threshold`` times, most frequent first"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+_current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+def current_query_stats() -> Optional[RequestQueryStats]:
+    """Stats of the request being served, or None outside a request"""
+    return _current_stats.get()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_counter_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    starts = conn.info.get("query_counter_start")
+    if stats is not None and starts:
+        stats.record(statement, time.perf_counter() - starts.pop())
+
+def install_query_counter() -> None:
+    """Attach the counting hooks to every Engine (sync engines behind async ones included)"""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+class QueryCounterMiddleware:
+    """ASGI middleware that collects SQL statistics per HTTP request"""
+
+    def __init__(self, app, n_plus_one_threshold: int = None):
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold or settings.SQL_N_PLUS_ONE_THRESHOLD
+        install_query_counter()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = _current_stats.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Queries"] = str(stats.count)
+                headers["X-DB-Time-ms"] = f"{stats.total_time * 1000:.2f}"
+                repeated = stats.repeated(self.n_plus_one_threshold)
+                if repeated:
+                    headers["X-DB-N-Plus-One"] = str(len(repeated))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current_stats.reset(token)
+            self._report_n_plus_one(scope, stats)
+
+    def _report_n_plus_one(self, scope, stats: RequestQueryStats) -> None:
+        path = route_template(scope)
+        for shape, count in stats.repeated(self.n_plus_one_threshold):
+            logger.warning(
+                "Probable N+1 in %s %s: statement ran %d times: %s",
+                scope.get("method"), path, count, shape[:300]
+            )
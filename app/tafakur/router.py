@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import date, datetime, timedelta
 
-from app.database import get_db
+from app.database import get_async_db, get_async_read_db
 from app.auth.dependencies import get_current_user
 from app.models import User
 from app.tafakur import schemas, services
+from app.conditional import conditional_get
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, finish_page
 
 router = APIRouter(
     prefix="/tafakur",
@@ -18,59 +20,63 @@ router = APIRouter(
 async def create_reflection(
     reflection: schemas.ReflectionCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new reflection for the current day"""
     tafakur_service = services.TafakurService(db)
     return await tafakur_service.create_reflection(current_user.id, reflection)
 
-@router.get("/reflections", response_model=List[schemas.Reflection])
+@router.get("/reflections", response_model=List[schemas.Reflection], dependencies=[Depends(conditional_get)])
 async def get_reflections(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
     from_date: Optional[date] = None,
     to_date: Optional[date] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Get all reflections for the current user"""
+    """Get reflections for the current user, newest first; follow X-Next-Cursor for older pages"""
     tafakur_service = services.TafakurService(db)
-    return tafakur_service.get_reflections(
+    reflections = await tafakur_service.get_reflections(
         user_id=current_user.id,
         skip=skip,
-        limit=limit,
+        limit=limit + 1,
         from_date=from_date,
-        to_date=to_date
+        to_date=to_date,
+        before_date=decode_cursor(cursor, [date.fromisoformat])[0] if cursor else None
     )
+    return finish_page(response, reflections, limit, key=lambda reflection: [reflection.reflection_date])
 
 @router.get("/reflections/today", response_model=Optional[schemas.Reflection])
 async def get_today_reflection(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get today's reflection if it exists"""
     tafakur_service = services.TafakurService(db)
-    return tafakur_service.get_reflection_by_date(current_user.id, date.today())
+    return await tafakur_service.get_reflection_by_date(current_user.id, date.today())
 
 @router.get("/reflections/date/{reflection_date}", response_model=Optional[schemas.Reflection])
 async def get_reflection_by_date(
     reflection_date: date,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get a reflection for a specific date"""
     tafakur_service = services.TafakurService(db)
-    return tafakur_service.get_reflection_by_date(current_user.id, reflection_date)
+    return await tafakur_service.get_reflection_by_date(current_user.id, reflection_date)
 
 @router.get("/reflections/{reflection_id}", response_model=schemas.Reflection)
 async def get_reflection(
     reflection_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get a specific reflection by ID"""
     tafakur_service = services.TafakurService(db)
-    reflection = tafakur_service.get_reflection(current_user.id, reflection_id)
+    reflection = await tafakur_service.get_reflection(current_user.id, reflection_id)
     if not reflection:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -83,11 +89,11 @@ async def update_reflection(
     reflection_id: int,
     reflection_update: schemas.ReflectionUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a specific reflection"""
     tafakur_service = services.TafakurService(db)
-    reflection = tafakur_service.update_reflection(
+    reflection = await tafakur_service.update_reflection(
         current_user.id, 
         reflection_id, 
         reflection_update
@@ -103,11 +109,11 @@ async def update_reflection(
 async def delete_reflection(
     reflection_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a specific reflection"""
     tafakur_service = services.TafakurService(db)
-    success = tafakur_service.delete_reflection(current_user.id, reflection_id)
+    success = await tafakur_service.delete_reflection(current_user.id, reflection_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -118,22 +124,22 @@ async def delete_reflection(
 @router.get("/streak", response_model=schemas.ReflectionStreak)
 async def get_reflection_streak(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get current reflection streak information"""
     tafakur_service = services.TafakurService(db)
-    return tafakur_service.get_reflection_streak(current_user.id)
+    return await tafakur_service.get_reflection_streak(current_user.id)
 
 @router.get("/insights", response_model=schemas.ReflectionInsight)
 async def get_insights(
     from_date: Optional[date] = Query(None, description="Start date for insights analysis"),
     to_date: Optional[date] = Query(None, description="End date for insights analysis"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get insights and analytics from user's reflections"""
     tafakur_service = services.TafakurService(db)
-    return tafakur_service.get_insights(
+    return await tafakur_service.get_insights(
         user_id=current_user.id,
         from_date=from_date,
         to_date=to_date
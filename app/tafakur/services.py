@@ -1,61 +1,81 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, and_, select, delete
 from datetime import date, datetime, timedelta
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
 from collections import Counter
 import re
 
+from app.database import resolve
 from app.tafakur import schemas
 from app.models import Reflection, ReflectionTag
-from app.momentum.services import MomentumService
+from app.momentum import outbox
 from app.momentum.momentum import REFLECTION_STREAK_MILESTONES 
 
 class TafakurService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Union[Session, AsyncSession]):
         self.db = db
 
+    async def _execute(self, statement):
+        """Execute a statement on the sync or async session"""
+        return await resolve(self.db.execute(statement))
+
     # --- CRUD Operations ---
     
-    def get_reflection(self, user_id: int, reflection_id: int) -> Optional[schemas.Reflection]:
+    async def get_reflection(self, user_id: int, reflection_id: int) -> Optional[schemas.Reflection]:
         """Get a single reflection by ID for a user"""
-        return self.db.query(Reflection).filter(
+        result = await self._execute(select(Reflection).where(
             Reflection.id == reflection_id,
             Reflection.user_id == user_id
-        ).first()
+        ))
+        return result.scalars().first()
     
-    def get_reflection_by_date(self, user_id: int, reflection_date: date) -> Optional[schemas.Reflection]:
+    async def get_reflection_by_date(self, user_id: int, reflection_date: date) -> Optional[schemas.Reflection]:
         """Get a reflection for a specific date"""
-        return self.db.query(Reflection).filter(
+        result = await self._execute(select(Reflection).where(
             Reflection.user_id == user_id,
             Reflection.reflection_date == reflection_date
-        ).first()
+        ))
+        return result.scalars().first()
     
-    def get_reflections(
+    async def get_reflections(
         self, 
         user_id: int, 
         skip: int = 0, 
         limit: int = 100,
         from_date: Optional[date] = None,
-        to_date: Optional[date] = None
+        to_date: Optional[date] = None,
+        before_date: Optional[date] = None
     ) -> List[schemas.Reflection]:
-        """Get all reflections for a user with optional date filtering"""
-        query = self.db.query(Reflection).filter(Reflection.user_id == user_id)
+        """
+        Get all reflections for a user with optional date filtering, newest first.
+        
+        ``before_date`` (the last date of the previous page) seeks past earlier
+        pages through the (user_id, reflection_date) index instead of OFFSET.
+        """
+        query = select(Reflection).where(Reflection.user_id == user_id)
         
         if from_date:
-            query = query.filter(Reflection.reflection_date >= from_date)
+            query = query.where(Reflection.reflection_date >= from_date)
         
         if to_date:
-            query = query.filter(Reflection.reflection_date <= to_date)
+            query = query.where(Reflection.reflection_date <= to_date)
+        
+        if before_date:
+            query = query.where(Reflection.reflection_date < before_date)
+        else:
+            query = query.offset(skip)
         
-        return query.order_by(desc(Reflection.reflection_date)).offset(skip).limit(limit).all()
+        result = await self._execute(query.order_by(desc(Reflection.reflection_date)).limit(limit))
+        return result.scalars().all()
     
     async def create_reflection(self, user_id: int, reflection: schemas.ReflectionCreate) -> schemas.Reflection:
         """Create a new reflection"""
         # Check if reflection already exists for this date
-        existing = self.get_reflection_by_date(user_id, reflection.reflection_date)
+        existing = await self.get_reflection_by_date(user_id, reflection.reflection_date)
         if existing:
             # Update instead of creating new
-            return self.update_reflection(user_id, existing.id, schemas.ReflectionUpdate(**reflection.dict()))
+            return await self.update_reflection(user_id, existing.id, schemas.ReflectionUpdate(**reflection.dict()))
         
         # Create new reflection
         db_reflection = Reflection(
@@ -70,8 +90,7 @@ class TafakurService:
             private=reflection.private
         )
         self.db.add(db_reflection)
-        self.db.commit()
-        self.db.refresh(db_reflection)
+        await resolve(self.db.flush())
         
         # Process tags if provided
         if reflection.tags:
@@ -81,26 +100,25 @@ class TafakurService:
                     tag_name=tag_name.lower().strip()
                 )
                 self.db.add(tag)
-            
-            self.db.commit()
-            self.db.refresh(db_reflection)
         
-        # Update reflection streak
-        self._update_streak(user_id)
+        # Award momentum points if applicable; the events commit with the reflection
+        await self._award_reflection_points(user_id, db_reflection.id)
+        await resolve(self.db.commit())
+        await resolve(self.db.refresh(db_reflection))
         
-        # Award momentum points if applicable
-        await self._award_reflection_points(user_id)
+        # Update reflection streak
+        await self._update_streak(user_id)
         
         return db_reflection
     
-    def update_reflection(
+    async def update_reflection(
         self, 
         user_id: int, 
         reflection_id: int, 
         reflection_update: schemas.ReflectionUpdate
     ) -> Optional[schemas.Reflection]:
         """Update an existing reflection"""
-        db_reflection = self.get_reflection(user_id, reflection_id)
+        db_reflection = await self.get_reflection(user_id, reflection_id)
         if not db_reflection:
             return None
         
@@ -114,9 +132,9 @@ class TafakurService:
         # Update tags if provided
         if tags_data is not None:
             # Remove existing tags
-            self.db.query(ReflectionTag).filter(
+            await self._execute(delete(ReflectionTag).where(
                 ReflectionTag.reflection_id == reflection_id
-            ).delete()
+            ))
             
             # Add new tags
             for tag_name in tags_data:
@@ -126,35 +144,35 @@ class TafakurService:
                 )
                 self.db.add(tag)
         
-        self.db.commit()
-        self.db.refresh(db_reflection)
+        await resolve(self.db.commit())
+        await resolve(self.db.refresh(db_reflection))
         return db_reflection
     
-    def delete_reflection(self, user_id: int, reflection_id: int) -> bool:
+    async def delete_reflection(self, user_id: int, reflection_id: int) -> bool:
         """Delete a reflection"""
-        db_reflection = self.get_reflection(user_id, reflection_id)
+        db_reflection = await self.get_reflection(user_id, reflection_id)
         if not db_reflection:
             return False
         
-        self.db.delete(db_reflection)
-        self.db.commit()
+        await resolve(self.db.delete(db_reflection))
+        await resolve(self.db.commit())
         
         # Update streak after deletion
-        self._update_streak(user_id)
+        await self._update_streak(user_id)
         
         return True
     
     # --- Analytics and Insights ---
     
-    def get_reflection_streak(self, user_id: int) -> schemas.ReflectionStreak:
+    async def get_reflection_streak(self, user_id: int) -> schemas.ReflectionStreak:
         """Get the current and longest streak of daily reflections"""
         # Get all reflection dates for the user
-        reflection_dates = [
-            r.reflection_date for r in self.db.query(Reflection.reflection_date)
-            .filter(Reflection.user_id == user_id)
+        result = await self._execute(
+            select(Reflection.reflection_date)
+            .where(Reflection.user_id == user_id)
             .order_by(Reflection.reflection_date)
-            .all()
-        ]
+        )
+        reflection_dates = list(result.scalars().all())
         
         if not reflection_dates:
             return schemas.ReflectionStreak(
@@ -199,7 +217,7 @@ class TafakurService:
             last_reflection_date=last_date
         )
     
-    def get_insights(
+    async def get_insights(
         self, 
         user_id: int, 
         from_date: Optional[date] = None, 
@@ -214,7 +232,7 @@ class TafakurService:
             from_date = to_date - timedelta(days=30)
         
         # Get reflections in the date range
-        reflections = self.get_reflections(
+        reflections = await self.get_reflections(
             user_id=user_id,
             from_date=from_date,
             to_date=to_date,
@@ -244,7 +262,7 @@ class TafakurService:
         common_tags = [{"tag": tag, "count": count} for tag, count in tag_counts.most_common(10)]
         
         # Get streak information
-        streak_info = self.get_reflection_streak(user_id)
+        streak_info = await self.get_reflection_streak(user_id)
         
         # Get word frequency analysis
         word_frequency = self._analyze_word_frequency(reflections)
@@ -264,27 +282,25 @@ class TafakurService:
     
     # --- Helper Methods ---
     
-    def _update_streak(self, user_id: int) -> None:
+    async def _update_streak(self, user_id: int) -> None:
         """Update the user's reflection streak after changes"""
         # Implementation is internal to the service, so we reuse the public method
-        self.get_reflection_streak(user_id)
+        await self.get_reflection_streak(user_id)
     
-    async def _award_reflection_points(self, user_id: int) -> None:
-        """Award momentum points for completing reflections"""
-        # Try to get MomentumService to award points
+    async def _award_reflection_points(self, user_id: int, reflection_id: Optional[int] = None) -> None:
+        """Record the momentum events of completing a reflection; the caller commits them"""
         try:
-            
-            momentum_service = MomentumService(self.db)
             # Award points for completing a reflection
-            await momentum_service.process_event(user_id, "reflection_completion")
+            outbox.record(self.db, user_id, "reflection_completion", {"reflection_id": reflection_id})
             
             # Check if this completes a streak achievement
-            streak_info = self.get_reflection_streak(user_id)
+            streak_info = await self.get_reflection_streak(user_id)
             
             # If reflection streak hits certain thresholds, award bonus points
             for milestone in REFLECTION_STREAK_MILESTONES:
                 if streak_info.current_streak == milestone:
-                    await momentum_service.process_event(
+                    outbox.record(
+                        self.db,
                         user_id, 
                         "reflection_streak", 
                         {"streak": milestone}
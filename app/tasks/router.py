@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from typing import List
-from ..dependencies import get_db
+from ..dependencies import get_db, get_read_db, get_async_db
+from ..database import resolve
 from ..auth.dependencies import get_current_user
+from ..conditional import conditional_get
+from ..pagination import PageParams, page_params, decode_cursor, finish_page
 from . import services
 from . import schemas
 from ..users.schemas import User
@@ -17,21 +22,40 @@ def create_task(
 ):
     return services.create_task(db=db, task=task, user_id=current_user.id)
 
-@router.get("/", response_model=List[schemas.Task])
+@router.post("/batch", response_model=schemas.TaskBatchResult)
+async def batch_tasks(
+    batch: schemas.TaskBatch,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Create, update, complete and delete many tasks in one transaction"""
+    try:
+        return await services.apply_task_batch(db=db, batch=batch, user_id=current_user.id)
+    except Exception:
+        await resolve(db.rollback())
+        raise
+
+@router.get("/", response_model=List[schemas.Task], dependencies=[Depends(conditional_get)])
 def read_tasks(
-    db: Session = Depends(get_db),
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    return services.get_tasks(db=db, user_id=current_user.id)
+    if not page.paginated:
+        return services.get_tasks(db=db, user_id=current_user.id)
+    after_id = decode_cursor(page.cursor, [int])[0] if page.cursor else None
+    tasks = services.get_tasks(db=db, user_id=current_user.id, limit=page.size + 1, after_id=after_id)
+    return finish_page(response, tasks, page.size, key=lambda task: [task.id])
 
 @router.patch("/{task_id}", response_model=schemas.Task)
 async def update_task(
     task_id: int,
     task_update: schemas.TaskUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_task = services.get_task(db, task_id=task_id, user_id=current_user.id)
+    db_task = await services.get_task(db, task_id=task_id, user_id=current_user.id)
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
     return await services.update_task(db=db, task=db_task, task_update=task_update)
@@ -39,15 +63,11 @@ async def update_task(
 @router.delete("/{task_id}", status_code=204)
 async def delete_task(
     task_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Check if task exists and belongs to current user
-    from ..models import Task
-    db_task = db.query(Task).filter(
-        Task.id == task_id,
-        Task.owner_id == current_user.id
-    ).first()
+    db_task = await services.get_task(db, task_id=task_id, user_id=current_user.id)
     
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -55,27 +75,27 @@ async def delete_task(
     try:
         # If the task was completed, we need to revert the points
         if db_task.completed:
-            from ..momentum.services import MomentumService
+            from ..momentum import outbox
             from datetime import datetime
             
-            momentum_service = MomentumService(db)
-            
             # Revert task completion event
-            await momentum_service.revert_event(
+            outbox.record(
+                db,
                 user_id=db_task.owner_id,
                 event_type='task_completion',
                 metadata={
                     'task_id': db_task.id,
-                    'completion_time': db_task.updated_at or datetime.utcnow(),
-                    'is_weekend': (db_task.updated_at or datetime.utcnow()).weekday() >= 5,
+                    'completion_time': datetime.utcnow(),
+                    'is_weekend': datetime.utcnow().weekday() >= 5,
                     'complexity': getattr(db_task, 'complexity', 1)  # Default to 1 if complexity not set
-                }
+                },
+                revert=True
             )
         
         # Now delete the task
-        db.delete(db_task)
-        db.commit()
+        await resolve(db.delete(db_task))
+        await resolve(db.commit())
         return None
     except Exception as e:
-        db.rollback()
+        await resolve(db.rollback())
         raise HTTPException(status_code=400, detail=str(e)) 
\ No newline at end of file
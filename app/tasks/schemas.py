@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class TaskBase(BaseModel):
@@ -16,6 +16,8 @@ class TaskCreate(TaskBase):
 class TaskUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
+    completed: Optional[bool] = None
+    time_spent: Optional[float] = None
     due_date: Optional[datetime] = None
     priority: Optional[str] = None
     status: Optional[str] = None
@@ -34,4 +36,21 @@ class Task(TaskBase):
     completed_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+MAX_BATCH_SIZE = 500
+
+class TaskBatchUpdate(TaskUpdate):
+    id: int
+
+class TaskBatch(BaseModel):
+    create: List[TaskCreate] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+    update: List[TaskBatchUpdate] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+    complete: List[int] = Field(default_factory=list, max_length=MAX_BATCH_SIZE, description="Ids of tasks to mark completed")
+    delete: List[int] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+
+class TaskBatchResult(BaseModel):
+    created: List[Task]
+    updated: List[Task]
+    deleted: List[int]
+
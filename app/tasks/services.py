@@ -1,15 +1,27 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Optional, Union
+from ..database import resolve
 from ..models import Task
-from .schemas import TaskCreate, TaskUpdate
+from .schemas import TaskBatch, TaskCreate, TaskUpdate
 from datetime import datetime
-from ..momentum.services import MomentumService
+from fastapi import HTTPException
+from ..momentum import outbox
 
-def get_tasks(db: Session, user_id: int):
-    return db.query(Task).filter(Task.owner_id == user_id).all()
+def get_tasks(db: Session, user_id: int, limit: Optional[int] = None, after_id: Optional[int] = None):
+    """Tasks of a user in id order; ``limit``/``after_id`` give one keyset page"""
+    query = db.query(Task).filter(Task.owner_id == user_id)
+    if after_id is not None:
+        query = query.filter(Task.id > after_id)
+    query = query.order_by(Task.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
 
-def get_task(db: Session, task_id: int, user_id: int):
-    return db.query(Task).filter(Task.id == task_id, Task.owner_id == user_id).first()
+async def get_task(db: Union[Session, AsyncSession], task_id: int, user_id: int):
+    result = await resolve(db.execute(select(Task).where(Task.id == task_id, Task.owner_id == user_id)))
+    return result.scalars().first()
 
 def create_task(db: Session, task: TaskCreate, user_id: int):
     db_task = Task(**task.dict(), owner_id=user_id)
@@ -18,7 +30,7 @@ def create_task(db: Session, task: TaskCreate, user_id: int):
     db.refresh(db_task)
     return db_task
 
-async def update_task(db: Session, task: Task, task_update: TaskUpdate):
+async def update_task(db: Union[Session, AsyncSession], task: Task, task_update: TaskUpdate):
     old_completed = task.completed
     
     # Update task fields
@@ -27,12 +39,12 @@ async def update_task(db: Session, task: Task, task_update: TaskUpdate):
     if task_update.time_spent is not None:
         task.time_spent = task_update.time_spent
     
-    momentum_service = MomentumService(db)
-    
+    # Momentum events commit with the task; the outbox worker applies them
     # Check if task was uncompleted
     if old_completed and task_update.completed is False:
         # Revert task completion event
-        await momentum_service.revert_event(
+        outbox.record(
+            db,
             user_id=task.owner_id,
             event_type='task_completion',
             metadata={
@@ -40,64 +52,135 @@ async def update_task(db: Session, task: Task, task_update: TaskUpdate):
                 'completion_time': datetime.utcnow(),
                 'is_weekend': datetime.utcnow().weekday() >= 5,
                 'complexity': getattr(task, 'complexity', 1)  # Default to 1 if complexity not set
-            }
+            },
+            revert=True
         )
         
-        # If this was completed on a weekend, also revert weekend warrior bonus
-        if getattr(task, 'completed_at', None) and task.completed_at.weekday() >= 5:
-            await momentum_service.revert_event(
-                user_id=task.owner_id,
-                event_type='weekend_warrior',
-                metadata={
-                    'completion_time': task.completed_at
-                }
-            )
+        # Take back the weekend warrior bonus if the completion earned one;
+        # the ledger knows, by the task's source, whatever day it is now
+        outbox.record(
+            db,
+            user_id=task.owner_id,
+            event_type='weekend_warrior',
+            metadata={
+                'task_id': task.id,
+                'if_awarded': True
+            },
+            revert=True
+        )
     
     # Check if task was just completed
     elif task.completed and not old_completed:
-        # Check if this is the first task completed today
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        completed_today = db.query(Task).filter(
-            Task.owner_id == task.owner_id,
-            Task.completed == True,
-            func.date(Task.updated_at) == func.date(datetime.utcnow())
-        ).count()
-        
-        is_first_task = completed_today == 0
-        
         # Process task completion event
-        await momentum_service.process_event(
+        outbox.record(
+            db,
             user_id=task.owner_id,
             event_type='task_completion',
             metadata={
                 'task_id': task.id,
                 'completion_time': datetime.utcnow(),
                 'is_weekend': datetime.utcnow().weekday() >= 5,
-                'is_first_task': is_first_task,
                 'complexity': getattr(task, 'complexity', 1)  # Default to 1 if complexity not set
             }
         )
         
-        # Award first task of day bonus if applicable
-        if is_first_task:
-            await momentum_service.process_event(
-                user_id=task.owner_id,
-                event_type='first_task_of_day',
-                metadata={
-                    'completion_time': datetime.utcnow()
-                }
-            )
+        # Claim the first task of day bonus; the outbox worker awards it only
+        # to the first completion of the user's day it applies
+        outbox.record(
+            db,
+            user_id=task.owner_id,
+            event_type='first_task_of_day',
+            metadata={
+                'task_id': task.id,
+                'completion_time': datetime.utcnow()
+            }
+        )
         
         # Award weekend warrior bonus if applicable
         if datetime.utcnow().weekday() >= 5:
-            await momentum_service.process_event(
+            outbox.record(
+                db,
                 user_id=task.owner_id,
                 event_type='weekend_warrior',
                 metadata={
+                    'task_id': task.id,
                     'completion_time': datetime.utcnow()
                 }
             )
     
-    db.commit()
-    db.refresh(task)
-    return task 
\ No newline at end of file
+    await resolve(db.commit())
+    await resolve(db.refresh(task))
+    return task 
+
+def _task_columns(values: dict) -> dict:
+    """Keep the fields the tasks table has; TaskCreate/TaskUpdate carry more"""
+    return {key: value for key, value in values.items() if key in Task.__table__.columns}
+
+async def apply_task_batch(db: Union[Session, AsyncSession], batch: TaskBatch, user_id: int) -> dict:
+    """
+    Apply creates, updates, completions and deletes in one transaction, with
+    the momentum events of the whole batch; the outbox worker applies them
+    with one evaluation of achievements and level.
+
+    Completing a task, through ``complete`` or an update, or uncompleting it
+    awards or reverts points like update_task. All referenced tasks must
+    belong to the user, otherwise nothing is applied.
+    """
+    ids = {update.id for update in batch.update} | set(batch.complete) | set(batch.delete)
+    tasks = {}
+    if ids:
+        rows = (await resolve(db.execute(select(Task).where(Task.id.in_(ids), Task.owner_id == user_id)))).scalars().all()
+        tasks = {task.id: task for task in rows}
+    missing = sorted(ids - tasks.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Tasks not found: {missing}")
+
+    now = datetime.utcnow()
+    completion = {'completion_time': now, 'is_weekend': now.weekday() >= 5, 'complexity': 1}
+    old_completed = {task_id: bool(task.completed) for task_id, task in tasks.items()}
+    events, reverted = [], []
+
+    created = [Task(**_task_columns(task.model_dump()), owner_id=user_id) for task in batch.create]
+    db.add_all(created)
+
+    for update in batch.update:
+        for key, value in _task_columns(update.model_dump(exclude_unset=True, exclude={"id"})).items():
+            setattr(tasks[update.id], key, value)
+    for task_id in batch.complete:
+        tasks[task_id].completed = True
+
+    deleted = list(dict.fromkeys(batch.delete))
+    for task_id in deleted:
+        if old_completed[task_id]:
+            reverted.append(('task_completion', {**completion, 'task_id': task_id}))
+        await resolve(db.delete(tasks[task_id]))
+
+    newly_completed = []
+    for task_id, task in tasks.items():
+        if task_id in deleted or bool(task.completed) == old_completed[task_id]:
+            continue
+        if old_completed[task_id]:
+            reverted.append(('task_completion', {**completion, 'task_id': task_id}))
+        else:
+            newly_completed.append(task)
+    # A claim, like update_task's; the worker decides whether it is the day's first
+    if newly_completed:
+        events.append(('first_task_of_day', {'task_id': newly_completed[0].id, 'completion_time': now}))
+    for task in newly_completed:
+        events.append(('task_completion', {**completion, 'task_id': task.id}))
+        if completion['is_weekend']:
+            events.append(('weekend_warrior', {'task_id': task.id, 'completion_time': now}))
+
+    # Momentum events commit with the batch, after any the user recorded
+    # before; the outbox worker applies them in that order
+    for event_type, metadata in reverted:
+        outbox.record(db, user_id=user_id, event_type=event_type, metadata=metadata, revert=True)
+    for event_type, metadata in events:
+        outbox.record(db, user_id=user_id, event_type=event_type, metadata=metadata)
+
+    await resolve(db.commit())
+    for task in created:
+        await resolve(db.refresh(task))
+    updated = [task for task_id, task in tasks.items() if task_id not in deleted]
+    return {"created": created, "updated": updated, "deleted": deleted}
+
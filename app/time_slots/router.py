@@ -1,25 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import date, datetime
-from ..dependencies import get_db
+from ..dependencies import get_db, get_read_db, get_async_db
+from ..database import resolve
 from ..auth.dependencies import get_current_user
+from ..conditional import conditional_get
+from ..pagination import PageParams, page_params, decode_cursor, finish_page
 from . import services
 from . import schemas
 from ..users.schemas import User
 from ..models import TimeSlot
-from ..momentum.services import MomentumService
-from ..momentum.momentum import FOCUSED_SESSION_THRESHOLD
 
 router = APIRouter(prefix="/time_slots", tags=["time_slots"])
 
-@router.get("/", response_model=List[schemas.TimeSlot])
+@router.get("/", response_model=List[schemas.TimeSlot], dependencies=[Depends(conditional_get)])
 def read_time_slots(
+    response: Response,
     date: Optional[date] = Query(None, description="Filter time slots by date"),
-    db: Session = Depends(get_db),
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    if not page.paginated:
+        return services.get_time_slots(db=db, user_id=current_user.id, date=date)
+    after = tuple(decode_cursor(page.cursor, [datetime.fromisoformat, int])) if page.cursor else None
+    slots = services.get_time_slots(db=db, user_id=current_user.id, date=date, limit=page.size + 1, after=after)
+    return finish_page(response, slots, page.size, key=lambda slot: [slot.start_time, slot.id])
+
+@router.post("/batch", response_model=schemas.TimeSlotBatchResult)
+async def batch_time_slots(
+    batch: schemas.TimeSlotBatch,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    return services.get_time_slots(db=db, user_id=current_user.id, date=date)
+    """Create, update, complete and delete many time slots in one transaction"""
+    try:
+        return await services.apply_time_slot_batch(db=db, batch=batch, owner_id=current_user.id)
+    except Exception:
+        await resolve(db.rollback())
+        raise
 
 @router.post("/", response_model=schemas.TimeSlot)
 def create_time_slot(
@@ -33,10 +54,10 @@ def create_time_slot(
 async def update_time_slot(
     slot_id: int,
     update: schemas.TimeSlotUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    slot = services.get_time_slot(db, slot_id, current_user.id)
+    slot = await services.get_time_slot(db, slot_id, current_user.id)
     if not slot:
         raise HTTPException(status_code=404, detail="Time slot not found")
     return await services.update_time_slot(db, slot, update)
@@ -45,14 +66,11 @@ async def update_time_slot(
 async def update_time_slot(
     slot_id: int,
     slot_update: schemas.TimeSlotUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Check if time slot exists and belongs to current user
-    db_slot = db.query(TimeSlot).filter(
-        TimeSlot.id == slot_id,
-        TimeSlot.owner_id == current_user.id
-    ).first()
+    db_slot = await services.get_time_slot(db, slot_id, current_user.id)
     
     if not db_slot:
         raise HTTPException(
@@ -66,14 +84,11 @@ async def update_time_slot(
 @router.delete("/{slot_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_time_slot(
     slot_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Check if time slot exists and belongs to current user
-    db_slot = db.query(TimeSlot).filter(
-        TimeSlot.id == slot_id,
-        TimeSlot.owner_id == current_user.id
-    ).first()
+    db_slot = await services.get_time_slot(db, slot_id, current_user.id)
     
     if not db_slot:
         raise HTTPException(
@@ -82,41 +97,10 @@ async def delete_time_slot(
         )
     
     try:
-        # If the time slot was completed, we need to revert the points
-        if db_slot.status == "completed":
-            momentum_service = MomentumService(db)
-            
-            # Calculate duration in minutes
-            duration = int((db_slot.end_time - db_slot.start_time).total_seconds() / 60)
-            
-            # Revert time slot completion event
-            await momentum_service.revert_event(
-                user_id=db_slot.owner_id,
-                event_type='time_slot_completion',
-                metadata={
-                    'duration': duration,
-                    'completion_time': db_slot.updated_at or datetime.now(datetime.UTC),
-                    'is_weekend': (db_slot.updated_at or datetime.now(datetime.UTC)).weekday() >= 5
-                }
-            )
-            
-            # If it was a focused session, revert that too
-            if duration >= FOCUSED_SESSION_THRESHOLD:
-                await momentum_service.revert_event(
-                    user_id=db_slot.owner_id,
-                    event_type='focused_session',
-                    metadata={
-                        'duration': duration,
-                        'completion_time': db_slot.updated_at or datetime.now(datetime.UTC)
-                    }
-                )
-        
-        # Now delete the time slot
-        db.delete(db_slot)
-        db.commit()
+        await services.delete_time_slot(db, db_slot)
         return None
     except Exception as e:
-        db.rollback()
+        await resolve(db.rollback())
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel,Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class TimeSlotBase(BaseModel):
@@ -30,4 +30,21 @@ class TimeSlot(TimeSlotBase):
     updated_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+MAX_BATCH_SIZE = 500
+
+class TimeSlotBatchUpdate(TimeSlotUpdate):
+    id: int
+
+class TimeSlotBatch(BaseModel):
+    create: List[TimeSlotCreate] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+    update: List[TimeSlotBatchUpdate] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+    complete: List[int] = Field(default_factory=list, max_length=MAX_BATCH_SIZE, description="Ids of time slots to mark completed")
+    delete: List[int] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+
+class TimeSlotBatchResult(BaseModel):
+    created: List[TimeSlot]
+    updated: List[TimeSlot]
+    deleted: List[int]
+
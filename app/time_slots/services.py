@@ -1,20 +1,45 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, tuple_
 from . import schemas
 from .. import models
-from typing import Optional
+from ..database import resolve
+from typing import Optional, Tuple, Union
 from datetime import date, timedelta, datetime, timezone
-from ..momentum.services import MomentumService
+from ..momentum import outbox
 from ..momentum.momentum import FOCUSED_SESSION_THRESHOLD
+from fastapi import HTTPException
 import pytz
 
-def get_time_slots(db: Session, user_id: int, date: Optional[date] = None):
+def get_time_slots(
+    db: Session,
+    user_id: int,
+    date: Optional[date] = None,
+    limit: Optional[int] = None,
+    after: Optional[Tuple[datetime, int]] = None
+):
+    """
+    Time slots of a user, optionally on one date. With ``limit``/``after``
+    (the (start_time, id) of the previous page's last row) they come as a
+    keyset page ordered by start_time, id.
+    """
     query = db.query(models.TimeSlot).filter(models.TimeSlot.owner_id == user_id)
     if date:
         query = query.filter(models.TimeSlot.start_time >= date, models.TimeSlot.end_time < date + timedelta(days=1))
+    if limit is None and after is None:
+        return query.all()
+    if after is not None:
+        query = query.filter(tuple_(models.TimeSlot.start_time, models.TimeSlot.id) > tuple_(*after))
+    query = query.order_by(models.TimeSlot.start_time, models.TimeSlot.id)
+    if limit is not None:
+        query = query.limit(limit)
     return query.all()
 
-def get_time_slot(db: Session, slot_id: int, user_id: int):
-    return db.query(models.TimeSlot).filter(models.TimeSlot.id == slot_id, models.TimeSlot.owner_id == user_id).first()
+async def get_time_slot(db: Union[Session, AsyncSession], slot_id: int, user_id: int):
+    result = await resolve(db.execute(
+        select(models.TimeSlot).where(models.TimeSlot.id == slot_id, models.TimeSlot.owner_id == user_id)
+    ))
+    return result.scalars().first()
 
 def create_time_slot(db: Session, time_slot: schemas.TimeSlotCreate, owner_id: int):
     db_time_slot = models.TimeSlot(**time_slot.model_dump(), owner_id=owner_id)  # Updated for Pydantic v2
@@ -23,46 +48,54 @@ def create_time_slot(db: Session, time_slot: schemas.TimeSlotCreate, owner_id: i
     db.refresh(db_time_slot)
     return db_time_slot
 
-async def update_time_slot(db: Session, time_slot: models.TimeSlot, update: schemas.TimeSlotUpdate):
+async def update_time_slot(db: Union[Session, AsyncSession], time_slot: models.TimeSlot, update: schemas.TimeSlotUpdate):
     old_status = time_slot.status
     
     # Update the time slot
     for key, value in update.model_dump(exclude_unset=True).items():  # Updated for Pydantic v2
         setattr(time_slot, key, value)
     
-    momentum_service = MomentumService(db)
+    # Momentum events commit with the time slot; the outbox worker applies them
     duration = int((time_slot.end_time - time_slot.start_time).total_seconds() / 60)
     # Check if status changed from completed to something else (task was uncompleted)
     if old_status == "completed" and update.status and update.status != "completed":
         # Revert time slot completion event
-        await momentum_service.revert_event(
+        outbox.record(
+            db,
             user_id=time_slot.owner_id,
             event_type='time_slot_completion',
             metadata={
+                'time_slot_id': time_slot.id,
                 'duration': duration,
                 'completion_time': datetime.now(timezone.utc),
                 'is_weekend': datetime.now(timezone.utc).weekday() >= 5
-            }
+            },
+            revert=True
         )
         
         # If it was a focused session, revert that too
         if duration >= FOCUSED_SESSION_THRESHOLD:
-            await momentum_service.revert_event(
+            outbox.record(
+                db,
                 user_id=time_slot.owner_id,
                 event_type='focused_session',
                 metadata={
+                    'time_slot_id': time_slot.id,
                     'duration': duration,
                     'completion_time': datetime.now(timezone.utc)
-                }
+                },
+                revert=True
             )
     
     # Check if status changed to completed
     elif update.status == "completed" and old_status != "completed":
         # Process time slot completion event
-        await momentum_service.process_event(
+        outbox.record(
+            db,
             user_id=time_slot.owner_id,
             event_type='time_slot_completion',
             metadata={
+                'time_slot_id': time_slot.id,
                 'duration': duration,
                 'completion_time': datetime.now(timezone.utc),
                 'is_weekend': datetime.now(timezone.utc).weekday() >= 5
@@ -70,10 +103,12 @@ async def update_time_slot(db: Session, time_slot: models.TimeSlot, update: sche
         )
         
         if duration >= FOCUSED_SESSION_THRESHOLD:
-            await momentum_service.process_event(
+            outbox.record(
+                db,
                 user_id=time_slot.owner_id,
                 event_type='focused_session',
                 metadata={
+                    'time_slot_id': time_slot.id,
                     'duration': duration,
                     'completion_time': datetime.now(timezone.utc)
                 }
@@ -81,7 +116,9 @@ async def update_time_slot(db: Session, time_slot: models.TimeSlot, update: sche
         
         # Check for early bird or night owl bonus
         # Get the user object to access their timezone
-        user = db.query(models.User).filter(models.User.id == time_slot.owner_id).first()
+        user = (await resolve(db.execute(
+            select(models.User).where(models.User.id == time_slot.owner_id)
+        ))).scalars().first()
         user_timezone = pytz.timezone(user.timezone if user and user.timezone else "Asia/Kolkata")
         
         # Get current time in user's timezone
@@ -90,18 +127,111 @@ async def update_time_slot(db: Session, time_slot: models.TimeSlot, update: sche
         hour = user_local_time.hour
         
         if 5 <= hour < 9:
-            await momentum_service.process_event(
+            outbox.record(
+                db,
                 user_id=time_slot.owner_id,
                 event_type='early_bird',
-                metadata={'completion_time': user_local_time}
+                metadata={'time_slot_id': time_slot.id, 'completion_time': user_local_time}
             )
         elif 21 <= hour < 24:
-            await momentum_service.process_event(
+            outbox.record(
+                db,
                 user_id=time_slot.owner_id,
                 event_type='night_owl',
-                metadata={'completion_time': user_local_time}
+                metadata={'time_slot_id': time_slot.id, 'completion_time': user_local_time}
             )
     
-    db.commit()
-    db.refresh(time_slot)
-    return time_slot
\ No newline at end of file
+    await resolve(db.commit())
+    await resolve(db.refresh(time_slot))
+    return time_slot
+
+def _completion_events(time_slot: models.TimeSlot, now: datetime):
+    """Momentum events of completing a time slot, as update_time_slot processes them"""
+    duration = int((time_slot.end_time - time_slot.start_time).total_seconds() / 60)
+    completion = {'time_slot_id': time_slot.id, 'duration': duration, 'completion_time': now}
+    events = [('time_slot_completion', {**completion, 'is_weekend': now.weekday() >= 5})]
+    if duration >= FOCUSED_SESSION_THRESHOLD:
+        events.append(('focused_session', completion))
+    return events
+
+async def delete_time_slot(db: Union[Session, AsyncSession], time_slot: models.TimeSlot) -> None:
+    """Delete a time slot, reverting the points of its completion if it was completed"""
+    if time_slot.status == "completed":
+        for event_type, metadata in _completion_events(time_slot, datetime.now(timezone.utc)):
+            outbox.record(db, user_id=time_slot.owner_id, event_type=event_type, metadata=metadata, revert=True)
+    await resolve(db.delete(time_slot))
+    await resolve(db.commit())
+
+async def apply_time_slot_batch(db: Union[Session, AsyncSession], batch: schemas.TimeSlotBatch, owner_id: int) -> dict:
+    """
+    Apply creates, updates, completions and deletes in one transaction, with
+    the momentum events of the whole batch; the outbox worker applies them
+    with one evaluation of achievements and level.
+
+    Status changes to or from "completed", through ``complete`` or an update,
+    award or revert points like update_time_slot. All referenced time slots
+    must belong to the user, otherwise nothing is applied.
+    """
+    ids = {update.id for update in batch.update} | set(batch.complete) | set(batch.delete)
+    slots = {}
+    if ids:
+        rows = (await resolve(db.execute(select(models.TimeSlot).where(
+            models.TimeSlot.id.in_(ids), models.TimeSlot.owner_id == owner_id
+        )))).scalars().all()
+        slots = {slot.id: slot for slot in rows}
+    missing = sorted(ids - slots.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Time slots not found: {missing}")
+
+    now = datetime.now(timezone.utc)
+    old_status = {slot_id: slot.status for slot_id, slot in slots.items()}
+    events, reverted = [], []
+
+    created = [models.TimeSlot(**time_slot.model_dump(), owner_id=owner_id) for time_slot in batch.create]
+    db.add_all(created)
+
+    for update in batch.update:
+        for key, value in update.model_dump(exclude_unset=True, exclude={"id"}).items():
+            setattr(slots[update.id], key, value)
+    for slot_id in batch.complete:
+        slots[slot_id].status = "completed"
+
+    deleted = list(dict.fromkeys(batch.delete))
+    for slot_id in deleted:
+        if old_status[slot_id] == "completed":
+            reverted.extend(_completion_events(slots[slot_id], now))
+        await resolve(db.delete(slots[slot_id]))
+
+    newly_completed = []
+    for slot_id, slot in slots.items():
+        if slot_id in deleted or slot.status == old_status[slot_id]:
+            continue
+        if old_status[slot_id] == "completed":
+            reverted.extend(_completion_events(slot, now))
+        elif slot.status == "completed":
+            events.extend(_completion_events(slot, now))
+            newly_completed.append(slot)
+
+    if newly_completed:
+        user = (await resolve(db.execute(select(models.User).where(models.User.id == owner_id)))).scalars().first()
+        user_local_time = now.astimezone(pytz.timezone(user.timezone if user and user.timezone else "Asia/Kolkata"))
+        # One bonus per slot, naming it like update_time_slot does
+        for slot in newly_completed:
+            if 5 <= user_local_time.hour < 9:
+                events.append(('early_bird', {'time_slot_id': slot.id, 'completion_time': user_local_time}))
+            elif 21 <= user_local_time.hour < 24:
+                events.append(('night_owl', {'time_slot_id': slot.id, 'completion_time': user_local_time}))
+
+    # Momentum events commit with the batch, after any the user recorded
+    # before; the outbox worker applies them in that order
+    for event_type, metadata in reverted:
+        outbox.record(db, user_id=owner_id, event_type=event_type, metadata=metadata, revert=True)
+    for event_type, metadata in events:
+        outbox.record(db, user_id=owner_id, event_type=event_type, metadata=metadata)
+
+    await resolve(db.commit())
+    for time_slot in created:
+        await resolve(db.refresh(time_slot))
+    updated = [slot for slot_id, slot in slots.items() if slot_id not in deleted]
+    return {"created": created, "updated": updated, "deleted": deleted}
+
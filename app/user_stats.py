@@ -0,0 +1,260 @@
+"""
+Per-user activity counters.
+
+``user_stats`` holds one row per user with the counts that achievements and
+dashboards read: completed tasks and their hours, completed time slots,
+focused sessions (completed slots of FOCUSED_SESSION_THRESHOLD minutes or
+more) and their minutes, reflections, reflections with gratitude, and words
+written in reflections. Reading them is one primary-key lookup instead of
+COUNT(*)/SUM() over the user's rows.
+
+``completion_hours`` is a histogram of the user's task and time slot
+completions by local weekday and hour, taken in the user's timezone at the
+moment a completion is recorded. Time-of-day achievements and the analytics
+heatmap read at most 7 * 24 rows of it. It counts completion events:
+uncompleting or deleting a row later does not remove its completion, since
+the moment it was completed is not kept anywhere else.
+
+Every flush that inserts, changes or deletes a task, time slot or reflection
+adds the difference it makes to the owner's counters, in the same
+transaction. This covers the task, goal, time slot and tafakur services and
+their batch endpoints alike. ``rebuild`` recomputes the table from the
+source rows; run it (``python scripts/rebuild_user_stats.py``) after writing
+those rows outside the ORM. The histogram cannot be recomputed;
+``seed_completion_hours`` approximates it for rows completed before it existed.
+"""
+import re
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, Union
+
+import pytz
+
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import resolve
+from .momentum.momentum import FOCUSED_SESSION_THRESHOLD
+
+COUNTERS = (
+    "completed_tasks",
+    "completed_task_hours",
+    "completed_time_slots",
+    "focused_sessions",
+    "focused_minutes",
+    "reflections",
+    "gratitude_entries",
+    "words_written",
+)
+
+WORD = re.compile(r'\b\w+\b')
+REFLECTION_TEXT = ("highlights", "challenges", "gratitude", "lessons", "tomorrow_goals")
+
+def _task(task) -> Dict[str, float]:
+    if not task.completed:
+        return {}
+    return {"completed_tasks": 1, "completed_task_hours": task.time_spent or 0}
+
+def _time_slot(slot) -> Dict[str, int]:
+    if slot.status != "completed":
+        return {}
+    counts = {"completed_time_slots": 1}
+    if slot.start_time and slot.end_time:
+        # Truncated to whole minutes, as update_time_slot does for momentum
+        minutes = int((slot.end_time - slot.start_time).total_seconds() / 60)
+        if minutes >= FOCUSED_SESSION_THRESHOLD:
+            counts.update(focused_sessions=1, focused_minutes=minutes)
+    return counts
+
+def _reflection(reflection) -> Dict[str, int]:
+    return {
+        "reflections": 1,
+        "gratitude_entries": 1 if (reflection.gratitude or "").strip() else 0,
+        "words_written": sum(len(WORD.findall(getattr(reflection, field) or "")) for field in REFLECTION_TEXT),
+    }
+
+# model: (owner column, columns the counts read, counts of one row)
+TRACKED = {
+    models.Task: ("owner_id", ("completed", "time_spent"), _task),
+    models.TimeSlot: ("owner_id", ("status", "start_time", "end_time"), _time_slot),
+    models.Reflection: ("user_id", REFLECTION_TEXT, _reflection),
+}
+
+# Counter whose increase is a completion, and the histogram kind it goes to
+COMPLETIONS = {"completed_tasks": "task", "completed_time_slots": "time_slot"}
+
+OLD_COUNTS_KEY = "user_stats_old_counts"
+
+def _add(deltas: Dict, user_id, counts: Dict, sign: int) -> None:
+    if user_id is None:
+        return
+    user_deltas = deltas.setdefault(user_id, {})
+    for counter, value in counts.items():
+        user_deltas[counter] = user_deltas.get(counter, 0) + sign * value
+
+def _add_completions(completions: Dict, user_id, old: Dict, new: Dict) -> None:
+    if user_id is None:
+        return
+    for counter, kind in COMPLETIONS.items():
+        if new.get(counter, 0) > old.get(counter, 0):
+            completions[user_id, kind] = completions.get((user_id, kind), 0) + 1
+
+def _committed(session: Session, target):
+    """``target`` with the column values it had before this flush"""
+    owner_column, columns, _ = TRACKED[type(target)]
+    state = inspect(target)
+    values = {}
+    unknown = []
+    for column in (owner_column, *columns):
+        history = state.attrs[column].history
+        if history.deleted:
+            values[column] = history.deleted[0]
+        elif history.added:
+            # Set without the old value having been loaded
+            unknown.append(column)
+        else:
+            values[column] = getattr(target, column)
+    if unknown:
+        table = type(target).__table__
+        row = session.connection().execute(
+            select(*[table.c[column] for column in unknown]).where(table.c.id == target.id)
+        ).one()
+        values.update(row._mapping)
+    return SimpleNamespace(**values)
+
+@event.listens_for(Session, "before_flush")
+def _remember_old_counts(session, flush_context, instances):
+    """Record what changed and deleted rows counted before the flush rewrites them"""
+    old_counts = session.info[OLD_COUNTS_KEY] = {}
+    for target in list(session.dirty) + list(session.deleted):
+        if type(target) not in TRACKED:
+            continue
+        owner_column, columns, counts = TRACKED[type(target)]
+        if target not in session.deleted and not any(
+            inspect(target).attrs[column].history.has_changes() for column in (owner_column, *columns)
+        ):
+            continue
+        old = _committed(session, target)
+        old_counts[target] = (getattr(old, owner_column), counts(old))
+
+@event.listens_for(Session, "after_flush")
+def apply_user_stats(session, flush_context):
+    """Add the counts this flush changed to the owners' user_stats rows"""
+    old_counts = session.info.pop(OLD_COUNTS_KEY, {})
+    deltas = {}
+    completions = {}
+    for target in session.new:
+        if type(target) in TRACKED:
+            owner_column, _, counts = TRACKED[type(target)]
+            new = counts(target)
+            _add(deltas, getattr(target, owner_column), new, 1)
+            _add_completions(completions, getattr(target, owner_column), {}, new)
+    for target, (user_id, old) in old_counts.items():
+        _add(deltas, user_id, old, -1)
+        if target not in session.deleted:
+            owner_column, _, counts = TRACKED[type(target)]
+            new = counts(target)
+            _add(deltas, getattr(target, owner_column), new, 1)
+            _add_completions(completions, getattr(target, owner_column), old, new)
+    connection = session.connection()
+    _apply(connection, deltas)
+    _record_completions(connection, completions, datetime.utcnow())
+
+def _apply(connection: Connection, deltas: Dict) -> None:
+    rows = [
+        {"user_id": user_id, **{counter: user_deltas.get(counter, 0) for counter in COUNTERS}}
+        for user_id, user_deltas in deltas.items()
+        if any(user_deltas.values())
+    ]
+    if not rows:
+        return
+    table = models.UserStats.__table__
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={counter: table.c[counter] + statement.excluded[counter] for counter in COUNTERS}
+    )
+    connection.execute(statement, rows)
+
+def _local_time(moment: datetime, timezone_name) -> datetime:
+    return moment.replace(tzinfo=pytz.UTC).astimezone(pytz.timezone(timezone_name or "Asia/Kolkata"))
+
+def _add_to_histogram(connection: Connection, counts: Dict) -> None:
+    """Add ``{(user_id, kind, weekday, hour): count}`` to completion_hours in one statement"""
+    if not counts:
+        return
+    table = models.CompletionHour.__table__
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.kind, table.c.weekday, table.c.hour],
+        set_={"count": table.c.count + statement.excluded.count}
+    )
+    connection.execute(statement, [
+        {"user_id": user_id, "kind": kind, "weekday": weekday, "hour": hour, "count": count}
+        for (user_id, kind, weekday, hour), count in counts.items()
+    ])
+
+def _record_completions(connection: Connection, completions: Dict, now: datetime) -> None:
+    """Count ``{(user_id, kind): count}`` completions at ``now`` (UTC) in each user's local hour"""
+    if not completions:
+        return
+    users = models.User.__table__
+    timezones = dict(connection.execute(
+        select(users.c.id, users.c.timezone).where(users.c.id.in_({user_id for user_id, _ in completions}))
+    ).all())
+    counts = {}
+    for (user_id, kind), count in completions.items():
+        local = _local_time(now, timezones.get(user_id))
+        counts[user_id, kind, local.weekday(), local.hour] = count
+    _add_to_histogram(connection, counts)
+
+async def get(db: Union[Session, AsyncSession], user_id: int) -> Dict[str, float]:
+    """The user's counters; zeros for a user without activity"""
+    table = models.UserStats.__table__
+    result = await resolve(db.execute(
+        select(*[table.c[counter] for counter in COUNTERS]).where(table.c.user_id == user_id)
+    ))
+    row = result.first()
+    return dict(row._mapping) if row else dict.fromkeys(COUNTERS, 0)
+
+def seed_completion_hours(connection: Connection) -> None:
+    """
+    Fill completion_hours from rows completed before it existed: tasks by
+    their created_at (what Early Riser used to count), time slots by their
+    end time, both in the user's timezone like live completions.
+    """
+    tasks, slots, users = models.Task.__table__, models.TimeSlot.__table__, models.User.__table__
+    counts = {}
+
+    def add(user_id, kind, local):
+        key = (user_id, kind, local.weekday(), local.hour)
+        counts[key] = counts.get(key, 0) + 1
+
+    for user_id, created_at, timezone_name in connection.execute(
+        select(tasks.c.owner_id, tasks.c.created_at, users.c.timezone)
+        .join(users, users.c.id == tasks.c.owner_id)
+        .where(tasks.c.completed == True, tasks.c.created_at.is_not(None))
+    ):
+        add(user_id, "task", _local_time(created_at, timezone_name))
+    for user_id, end_time, timezone_name in connection.execute(
+        select(slots.c.owner_id, slots.c.end_time, users.c.timezone)
+        .join(users, users.c.id == slots.c.owner_id)
+        .where(slots.c.status == "completed", slots.c.end_time.is_not(None))
+    ):
+        add(user_id, "time_slot", _local_time(end_time, timezone_name))
+    connection.execute(text("DELETE FROM completion_hours"))
+    _add_to_histogram(connection, counts)
+
+def rebuild(connection: Connection) -> None:
+    """Recompute every user's counters from tasks, time slots and reflections"""
+    deltas = {}
+    for model, (owner_column, columns, counts) in TRACKED.items():
+        table = model.__table__
+        for row in connection.execute(select(table.c[owner_column], *[table.c[column] for column in columns])):
+            _add(deltas, row[0], counts(row), 1)
+    connection.execute(text("DELETE FROM user_stats"))
+    _apply(connection, deltas)
@@ -6,4 +6,12 @@ def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+def route_template(scope) -> str:
+    """The path template (e.g. /api/tasks/{task_id}) of the route that handled an ASGI scope"""
+    # Newer FastAPI resolves included routers lazily; scope["route"] then holds
+    # the route as declared on its own router, without the include prefixes
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    path = getattr(context, "path", None) or getattr(scope.get("route"), "path", None)
+    return path or "unmatched"
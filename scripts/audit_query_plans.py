@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+Script to audit the query plans of every service query.
+Seeds a temporary database, runs the service functions against it and
+prints EXPLAIN QUERY PLAN output with flags for full scans, temp B-trees,
+non-covering aggregates and function-wrapped predicates.
+
+Save the report per release and diff it to catch plan regressions:
+    python scripts/audit_query_plans.py --output query_plans.txt
+"""
+import argparse
+import sys
+import os
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.query_audit import run_audit, format_report
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit EXPLAIN QUERY PLAN for all service queries")
+    parser.add_argument("--output", help="Write the report to this file instead of stdout")
+    parser.add_argument("--database", help="SQLite file to seed and keep (default: temporary file)")
+    parser.add_argument("--users", type=int, default=50, help="Number of seeded users")
+    parser.add_argument("--rows-per-user", type=int, default=20, help="Tasks, goals, time slots and reflections per user")
+    parser.add_argument("--fail-on", default="", help="Comma separated flags (e.g. full-scan,temp-btree) that make the command exit 1")
+    args = parser.parse_args()
+
+    results = run_audit(args.database, args.users, args.rows_per_user)
+    report = format_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report, end="")
+
+    fail_on = {flag.strip() for flag in args.fail_on.split(",") if flag.strip()}
+    found = {flag.split()[0] for result in results for entry in result.entries for flag in entry.flags}
+    if fail_on & found:
+        print(f"Found flagged plans: {', '.join(sorted(fail_on & found))}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
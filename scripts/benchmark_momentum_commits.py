@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Benchmark commits and latency of one momentum-awarding user action.
+
+The action is a task completion with its first-task-of-day and weekend
+warrior bonuses: three events. It runs three ways:
+
+- per-step: every step of every event commits on its own (award_points,
+  update_streaks, check_achievements, check_level_up), the way
+  process_event ran before it became one unit of work;
+- per-event: each process_event call commits once;
+- per-action: one MomentumService.unit_of_work around the three events
+  commits once, as the outbox worker does for a user's pending events.
+
+Commits are counted on the engine. Each commit is an fsync under the
+production SQLite profile from app.database.
+
+Usage:
+    python scripts/benchmark_momentum_commits.py --actions 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, sqlite_pragmas, install_sqlite_pragmas
+from app import models
+from app.momentum.init_momentum import init_user_momentum
+from app.momentum.services import MomentumService
+
+ACTION = [
+    ("task_completion", {"is_first_task": True, "is_weekend": True}),
+    ("first_task_of_day", {}),
+    ("weekend_warrior", {}),
+]
+
+async def per_step(db, user_id):
+    service = MomentumService(db)
+    for event_type, metadata in ACTION:
+        await service.award_points(user_id, service._calculate_points(event_type, metadata))
+        await service.update_streaks(user_id, event_type)
+        await service.check_achievements(user_id, [event_type])
+        await service.check_level_up(user_id)
+
+async def per_event(db, user_id):
+    service = MomentumService(db)
+    for event_type, metadata in ACTION:
+        await service.process_event(user_id, event_type, metadata)
+
+async def per_action(db, user_id):
+    service = MomentumService(db)
+    async with service.unit_of_work():
+        for event_type, metadata in ACTION:
+            await service.process_event(user_id, event_type, metadata)
+
+MODES = {"per-step": per_step, "per-event": per_event, "per-action": per_action}
+
+def run_mode(name, actions):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        install_sqlite_pragmas(engine, sqlite_pragmas())
+        Base.metadata.create_all(bind=engine)
+        commits = [0]
+        event.listen(engine, "commit", lambda conn: commits.__setitem__(0, commits[0] + 1))
+
+        db = sessionmaker(bind=engine)()
+        user = models.User(email="bench@example.com", username="bench", hashed_password="")
+        db.add(user)
+        db.commit()
+        asyncio.run(init_user_momentum(db, user.id))
+
+        async def run():
+            latencies = []
+            for _ in range(actions):
+                started = time.perf_counter()
+                await MODES[name](db, user.id)
+                latencies.append(time.perf_counter() - started)
+            return latencies
+
+        commits[0] = 0
+        latencies = asyncio.run(run())
+        db.close()
+        engine.dispose()
+
+    return {
+        "mode": name,
+        "commits_per_action": commits[0] / actions,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark commits per momentum-awarding user action")
+    parser.add_argument("--actions", type=int, default=200, help="Number of actions per mode")
+    args = parser.parse_args()
+
+    print(f"{'mode':<12}{'commits/action':>16}{'p50 ms':>10}{'mean ms':>10}")
+    for name in MODES:
+        result = run_mode(name, args.actions)
+        print(
+            f"{result['mode']:<12}{result['commits_per_action']:>16.1f}"
+            f"{result['p50_ms']:>10.2f}{result['mean_ms']:>10.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
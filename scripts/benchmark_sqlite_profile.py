@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Benchmark dashboard read throughput while momentum point writes are happening.
+
+One writer thread keeps awarding points in short transactions (the pattern of
+MomentumService.award_points) while reader threads run the weekly leaderboard
+query. The run is repeated for SQLite's default profile (rollback journal,
+synchronous=FULL, one shared pool) and for the tuned profile from
+app.database (WAL, Settings pragmas, separate query_only read pool).
+
+Usage:
+    python scripts/benchmark_sqlite_profile.py --seconds 5 --readers 4 --users 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+
+from app.database import Base, sqlite_pragmas, install_sqlite_pragmas
+from app import models  # noqa: F401  (registers the tables on Base.metadata)
+
+LEADERBOARD_SQL = text(
+    "SELECT id, username, weekly_points FROM users "
+    "ORDER BY weekly_points DESC LIMIT 10"
+)
+AWARD_SQL = text(
+    "UPDATE users SET total_points = total_points + :points, "
+    "weekly_points = weekly_points + :points, monthly_points = monthly_points + :points "
+    "WHERE id = :user_id"
+)
+
+PROFILES = {
+    "default": {
+        "writer": ["PRAGMA journal_mode = DELETE", "PRAGMA synchronous = FULL"],
+        "reader": None,  # reads share the writer's engine
+    },
+    "tuned": {
+        "writer": sqlite_pragmas(),
+        "reader": sqlite_pragmas(read_only=True),
+    },
+}
+
+def build_engines(path, profile):
+    url = f"sqlite:///{path}"
+    writer = create_engine(url, connect_args={"check_same_thread": False})
+    install_sqlite_pragmas(writer, profile["writer"])
+    if profile["reader"] is None:
+        return writer, writer
+    reader = create_engine(url, connect_args={"check_same_thread": False}, pool_size=16)
+    install_sqlite_pragmas(reader, profile["reader"])
+    return writer, reader
+
+def seed(engine, user_count):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO users (email, username, hashed_password, is_active, "
+                "total_points, weekly_points, monthly_points) "
+                "VALUES (:email, :username, '', 1, 0, 0, 0)"
+            ),
+            [
+                {"email": f"user{i}@example.com", "username": f"user{i}"}
+                for i in range(user_count)
+            ],
+        )
+
+def run_profile(name, seconds, readers, user_count):
+    with tempfile.TemporaryDirectory() as tmp:
+        writer, reader = build_engines(os.path.join(tmp, "bench.db"), PROFILES[name])
+        seed(writer, user_count)
+
+        stop = threading.Event()
+        writes = [0]
+        read_latencies = [[] for _ in range(readers)]
+        errors = [0]
+
+        def write_loop():
+            rng = random.Random(0)
+            while not stop.is_set():
+                try:
+                    with writer.begin() as conn:
+                        conn.execute(AWARD_SQL, {"points": rng.randint(1, 20), "user_id": rng.randint(1, user_count)})
+                    writes[0] += 1
+                except Exception:
+                    errors[0] += 1
+
+        def read_loop(latencies):
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    with reader.connect() as conn:
+                        conn.execute(LEADERBOARD_SQL).all()
+                    latencies.append(time.perf_counter() - started)
+                except Exception:
+                    errors[0] += 1
+
+        threads = [threading.Thread(target=write_loop)]
+        threads += [threading.Thread(target=read_loop, args=(read_latencies[i],)) for i in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        reader.dispose()
+        writer.dispose()
+
+    latencies = sorted(l for per_thread in read_latencies for l in per_thread)
+    return {
+        "profile": name,
+        "reads_per_sec": len(latencies) / seconds,
+        "writes_per_sec": writes[0] / seconds,
+        "read_p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "read_p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+        "errors": errors[0],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reads under concurrent writes per SQLite profile")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each profile run")
+    parser.add_argument("--readers", type=int, default=4, help="Number of concurrent reader threads")
+    parser.add_argument("--users", type=int, default=2000, help="Number of seeded users")
+    args = parser.parse_args()
+
+    print(f"{'profile':<10}{'reads/s':>12}{'writes/s':>12}{'read p50 ms':>14}{'read p99 ms':>14}{'errors':>8}")
+    for name in PROFILES:
+        result = run_profile(name, args.seconds, args.readers, args.users)
+        print(
+            f"{result['profile']:<10}{result['reads_per_sec']:>12.0f}{result['writes_per_sec']:>12.0f}"
+            f"{result['read_p50_ms']:>14.2f}{result['read_p99_ms']:>14.2f}{result['errors']:>8}"
+        )
+
+if __name__ == "__main__":
+    main()
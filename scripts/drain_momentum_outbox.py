@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+Script to apply the pending momentum events of the outbox (momentum_events).
+The app drains it in the background; run this from a cron job or systemd
+timer where MOMENTUM_OUTBOX_WORKER_ENABLED is false, or by hand to apply a
+backlog.
+
+Usage:
+    python scripts/drain_momentum_outbox.py --batch-size 200
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import os
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.database import SessionLocal
+from app.momentum import outbox
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("drain-momentum-outbox")
+
+async def main(batch_size: int):
+    """Drain batches until fewer than a full batch is pending"""
+    db = SessionLocal()
+    total = 0
+    try:
+        while True:
+            read = await outbox.drain(db, batch_size)
+            total += read
+            if read < batch_size:
+                break
+    finally:
+        db.close()
+    logger.info(f"Read {total} pending momentum events")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending momentum events")
+    parser.add_argument("--batch-size", type=int, default=settings.MOMENTUM_OUTBOX_BATCH_SIZE, help="Events read per batch")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size))
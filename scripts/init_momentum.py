@@ -1,3 +1,19 @@
+#!/usr/bin/env python
+"""
+Script to initialize momentum data (points, level 1, achievement tracking
+and streaks) for every user not initialized for the current momentum
+version (see app/momentum/init_momentum.py). Run it after a deploy that adds
+achievements or streak types, or after importing users.
+
+Users are processed in chunks of consecutive ids, each in its own short
+transaction. An interrupted run continues where it stopped when started
+again.
+
+Usage:
+    python scripts/init_momentum.py
+    python scripts/init_momentum.py --chunk-size 5000
+"""
+import argparse
 import asyncio
 import sys
 import os
@@ -6,14 +22,18 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database import SessionLocal
-from app.momentum.init_momentum import init_all_users_momentum
+from app.momentum.init_momentum import DEFAULT_BACKFILL_CHUNK_SIZE, init_all_users_momentum
+
+def print_progress(report, total):
+    print(f"  {report.users}/{total} users: {report.user_achievements} achievement rows, "
+          f"{report.streaks} streaks, {report.leaderboard_entries} leaderboard entries created")
 
-async def main():
+async def main(args):
     """Initialize momentum data for all existing users"""
     db = SessionLocal()
     try:
         print("Initializing momentum data for all users...")
-        await init_all_users_momentum(db)
+        await init_all_users_momentum(db, chunk_size=args.chunk_size, progress=print_progress)
         print("Momentum data initialization completed successfully!")
     except Exception as e:
         print(f"Error initializing momentum data: {str(e)}")
@@ -21,4 +41,6 @@ async def main():
         db.close()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Initialize momentum data for all users")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_BACKFILL_CHUNK_SIZE, help="Users per transaction")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Script to apply pending schema migrations from app/migrations.py.
+Replaces the hand-run SQL upgrade files; already applied versions are
+skipped, so it is safe to run on every deploy.
+"""
+import argparse
+import logging
+import sys
+import os
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine
+from app.migrations import MIGRATIONS, applied_versions, run_migrations
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("migrate")
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--status", action="store_true", help="List migrations and whether they are applied")
+    args = parser.parse_args()
+
+    if args.status:
+        with engine.begin() as connection:
+            done = applied_versions(connection)
+        for migration in MIGRATIONS:
+            state = "applied" if migration.version in done else "pending"
+            print(f"{migration.version:04d}_{migration.name}: {state}")
+        return
+
+    applied = run_migrations(engine)
+    if applied:
+        for migration in applied:
+            logger.info(f"Applied {migration.version:04d}_{migration.name}")
+    else:
+        logger.info("Database is up to date")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+"""
+Script to recompute the materialized leaderboard from users, levels,
+user_achievements and streaks. Run it after changing points or achievements
+outside the app, e.g. with rollback_momentum.py.
+"""
+import logging
+import sys
+import os
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine
+from app.momentum.leaderboard import rebuild
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("rebuild_leaderboard")
+
+def main():
+    with engine.begin() as connection:
+        rebuild(connection)
+    logger.info("Leaderboard rebuilt")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+"""
+Script to recompute the per-user activity counters (user_stats) from tasks,
+time slots and reflections. Run it after writing those rows outside the app,
+e.g. with plain SQL.
+"""
+import logging
+import sys
+import os
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine
+from app.user_stats import rebuild
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("rebuild_user_stats")
+
+def main():
+    with engine.begin() as connection:
+        rebuild(connection)
+    logger.info("User stats rebuilt")
+
+if __name__ == "__main__":
+    main()
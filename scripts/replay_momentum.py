@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Script to rebuild users' momentum points, streaks, achievements and level
+from their tasks, goals, time slots and reflections, under the current point
+rules (see app/momentum/replay.py). Run it after changing the rules in
+app/momentum/momentum.py, while the app is stopped or quiet.
+
+An interrupted run resumes from its checkpoint file when started again with
+the same --chunk-size.
+
+Usage:
+    python scripts/replay_momentum.py --dry-run
+    python scripts/replay_momentum.py --processes 4 --chunk-size 500
+    python scripts/replay_momentum.py --user 12 --user 15
+"""
+import argparse
+import logging
+import sys
+import os
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine
+from app.momentum import replay
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("replay-momentum")
+
+def main(args):
+    report = replay.run(
+        engine,
+        chunk_size=args.chunk_size,
+        processes=args.processes,
+        checkpoint=args.checkpoint,
+        dry_run=args.dry_run,
+        user_ids=args.user
+    )
+    for user_id, changes in sorted(report.changes.items()):
+        print(f"User {user_id}:")
+        for change in changes:
+            print(f"  {change}")
+    verb = "would change" if args.dry_run else "changed"
+    logger.info(f"Replayed {report.users} users, {verb} {len(report.changes)}; {report.skipped_chunks} chunks resumed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild momentum state from history")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    parser.add_argument("--chunk-size", type=int, default=replay.DEFAULT_CHUNK_SIZE, help="Consecutive user ids per chunk")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--checkpoint", default="momentum_replay.checkpoint.json", help="File recording written chunks")
+    parser.add_argument("--user", type=int, action="append", help="Replay only this user id (repeatable)")
+    main(parser.parse_args())
@@ -24,6 +24,7 @@ async def reset_user_points(conn, cursor, user_id=None):
             """,
             (user_id,)
         )
+        cursor.execute("DELETE FROM points_ledger WHERE user_id = ?", (user_id,))
         print(f"Reset points for user ID {user_id}")
     else:
         cursor.execute(
@@ -32,6 +33,7 @@ async def reset_user_points(conn, cursor, user_id=None):
             SET total_points = 0, weekly_points = 0, monthly_points = 0
             """
         )
+        cursor.execute("DELETE FROM points_ledger")
         print("Reset points for all users")
 
 async def reset_user_levels(conn, cursor, user_id=None):
@@ -166,7 +168,7 @@ async def purge_momentum_data(conn, cursor, keep_structure=True):
         
     else:
         # Delete all data but keep the tables
-        tables_to_clear = ['levels', 'achievements', 'user_achievements', 'streaks']
+        tables_to_clear = ['levels', 'achievements', 'user_achievements', 'streaks', 'points_ledger']
         for table in tables_to_clear:
             cursor.execute(f"DELETE FROM {table}")
             print(f"Cleared all data from {table}")
@@ -3,7 +3,12 @@
 Script to run all momentum scheduler checks.
 This can be executed by a cron job or systemd timer instead of
 using the in-process scheduler.
+
+Usage:
+    python scripts/run_momentum_checks.py           # every user, once a day
+    python scripts/run_momentum_checks.py --hourly  # users at local midnight, every hour
 """
+import argparse
 import asyncio
 import logging
 import sys
@@ -15,7 +20,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import necessary modules
 from app.database import SessionLocal
-from app.momentum.scheduler import run_daily_checks
+from app.momentum.scheduler import run_daily_checks, run_hourly_checks
 
 # Set up logging
 logging.basicConfig(
@@ -28,15 +33,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger("momentum-checks")
 
-async def main():
+async def main(hourly: bool):
     """Run all momentum checks"""
     try:
         logger.info(f"Starting momentum checks at {datetime.now()}")
-        await run_daily_checks()
+        await (run_hourly_checks() if hourly else run_daily_checks())
         logger.info(f"Completed momentum checks at {datetime.now()}")
     except Exception as e:
         logger.error(f"Error running momentum checks: {str(e)}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the momentum scheduler checks")
+    parser.add_argument("--hourly", action="store_true",
+                        help="Only check the users whose local day just started; run at the start of every hour")
+    asyncio.run(main(parser.parse_args().hourly)) 
\ No newline at end of file
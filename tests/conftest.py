@@ -1,11 +1,17 @@
+import os
 import pytest
+import pytest_asyncio
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from fastapi.testclient import TestClient
 from datetime import datetime, date, timedelta
 import uuid
-from app.models import Reflection, ReflectionTag
 
+# Tests drain the momentum outbox themselves; set before app.config is imported
+os.environ.setdefault("MOMENTUM_OUTBOX_WORKER_ENABLED", "false")
+
+from app.models import Reflection, ReflectionTag
 
 from app.main import app
 from app import models
@@ -14,6 +20,7 @@ from app.config import settings
 
 # Testing database URL - using SQLite in-memory
 TEST_DATABASE_URL = "sqlite:///./test.db"
+TEST_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
 @pytest.fixture(scope="session", autouse=True)
 def setup_database():
@@ -42,6 +49,19 @@ def db_session(test_engine):
         session.rollback()
         session.close()
 
+@pytest_asyncio.fixture(scope="function")
+async def async_session_factory(test_engine):
+    """An AsyncSession factory on the test database, configured like AsyncSessionLocal"""
+    engine = create_async_engine(TEST_ASYNC_DATABASE_URL)
+    yield async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    await engine.dispose()
+
+@pytest_asyncio.fixture(scope="function")
+async def async_db_session(async_session_factory):
+    """Create an AsyncSession on the test database, configured like AsyncSessionLocal"""
+    async with async_session_factory() as session:
+        yield session
+
 @pytest.fixture(scope="function")
 def client(db_session):
     """Create a test client using the test database"""
@@ -53,8 +73,12 @@ def client(db_session):
             pass
 
     # Apply the overridden dependency
-    from app.database import get_db
+    from app.database import get_db, get_read_db, get_async_db, get_async_read_db
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    # Services run on either session type, so async routes share the test session
+    app.dependency_overrides[get_async_db] = override_get_db
+    app.dependency_overrides[get_async_read_db] = override_get_db
 
     # Return a test client instance
     with TestClient(app) as client:
@@ -0,0 +1,79 @@
+import pytest
+
+from app import models
+from app.momentum import achievements
+from app.momentum.services import MomentumService
+from app.query_audit import capture_statements
+
+def _selects(captured, table):
+    return [statement for statement, _ in captured if statement.startswith("SELECT") and f"FROM {table}" in statement]
+
+@pytest.mark.momentum
+@pytest.mark.service
+class TestAchievementEngine:
+    """Tests for event-driven achievement evaluation"""
+
+    def test_event_index(self):
+        """Test that events map only to the achievements that depend on them"""
+        assert achievements.affected(["reflection_completion"]) == [
+            "Self-Aware", "Reflection Seeker", "Contemplation Master", "Reflection Streak",
+            "Deep Thinker", "Gratitude Attitude"
+        ]
+        assert "Time Wizard" not in achievements.affected(["task_completion"])
+        assert achievements.affected(["perfect_week"]) == []
+        assert "Leaderboard Legend" not in achievements.affected(None)
+
+    @pytest.mark.asyncio
+    async def test_reflection_does_not_count_tasks(self, db_session, test_user_with_momentum):
+        """Test that a reflection event evaluates no task or time slot counters"""
+        service = MomentumService(db_session)
+        with capture_statements(db_session.get_bind()) as captured:
+            await service.check_achievements(test_user_with_momentum.id, ["reflection_completion"])
+
+        assert _selects(captured, "tasks") == []
+        assert _selects(captured, "time_slots") == []
+
+    @pytest.mark.asyncio
+    async def test_shared_counter_and_held_set(self, db_session, test_user_with_momentum):
+        """Test that achievements reading one counter query it once and held ones are skipped"""
+        user_id = test_user_with_momentum.id
+        db_session.add_all([models.Task(title=f"Task {i}", owner_id=user_id, completed=True) for i in range(3)])
+        db_session.commit()
+        service = MomentumService(db_session)
+
+        with capture_statements(db_session.get_bind()) as captured:
+            await service.check_achievements(user_id, ["task_completion"])
+            await service.check_achievements(user_id, ["task_completion"])
+        # Task Master, Goal Crusher and Flow State Champion share one user_stats read
+        assert len(_selects(captured, "user_stats")) == 2
+        assert [statement for statement in _selects(captured, "tasks") if "count(*)" in statement] == []
+        # Held achievements are read once; their names come from the catalog
+        assert len(_selects(captured, "user_achievements")) == 1
+        assert _selects(captured, "achievements") == []
+
+        statuses = await achievements.held(service, user_id)
+        statuses["Task Master"] = statuses["Goal Crusher"] = statuses["Flow State Champion"] = True
+        with capture_statements(db_session.get_bind()) as captured:
+            await service.check_achievements(user_id, ["task_completion"])
+        assert _selects(captured, "user_stats") == []
+
+    @pytest.mark.asyncio
+    async def test_award_updates_held_set(self, db_session, test_user_with_momentum):
+        """Test that an unlocked achievement is awarded once and then held"""
+        user_id = test_user_with_momentum.id
+        db_session.add(models.TimeSlot(owner_id=user_id, status="completed"))
+        db_session.commit()
+        wizard = achievements.ACHIEVEMENTS_BY_NAME["Time Wizard"]
+        service = MomentumService(db_session)
+
+        original = wizard["criteria_value"]
+        wizard["criteria_value"] = 1
+        try:
+            first = await service.check_achievements(user_id, ["time_slot_completion"])
+            second = await service.check_achievements(user_id, ["time_slot_completion"])
+        finally:
+            wizard["criteria_value"] = original
+
+        assert [achievement.name for achievement in first] == ["Time Wizard"]
+        assert second == []
+        assert (await achievements.held(service, user_id))["Time Wizard"] is True
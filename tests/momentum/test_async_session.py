@@ -0,0 +1,69 @@
+import pytest
+from datetime import date
+
+from app import models
+from app.momentum.services import MomentumService
+from app.momentum.init_momentum import init_user_momentum
+from app.tafakur.services import TafakurService
+from app.tafakur.schemas import ReflectionCreate
+
+@pytest.mark.momentum
+@pytest.mark.service
+class TestAsyncSession:
+    """Tests for running the momentum services on an AsyncSession"""
+
+    @pytest.mark.asyncio
+    async def test_init_and_progress(self, async_db_session, test_user):
+        """Test initializing momentum and reading progress through an AsyncSession"""
+        await init_user_momentum(async_db_session, test_user.id)
+
+        momentum_service = MomentumService(async_db_session)
+        progress = await momentum_service.get_user_progress(test_user.id)
+
+        assert progress.current_level.level_number == 1
+        assert progress.next_level is not None
+        assert progress.total_points == 0
+
+    @pytest.mark.asyncio
+    async def test_process_event_and_level_up(self, async_db_session, test_user_with_momentum):
+        """Test that points, level-ups and reverts work without lazy loads"""
+        momentum_service = MomentumService(async_db_session)
+
+        result = await momentum_service.process_event(test_user_with_momentum.id, "perfect_month")
+        assert result["points_awarded"] > 0
+        assert result["level_up"] is not None
+        assert result["level_up"].level_number == 2
+
+        user = await momentum_service._get_user(test_user_with_momentum.id)
+        assert user.current_level.level_number == 2
+
+        stats = await momentum_service.deduct_points(test_user_with_momentum.id, user.total_points)
+        assert stats["total_points"] == 0
+        assert stats["current_level"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stats_and_achievements(self, async_db_session, test_user_with_momentum):
+        """Test read endpoints that serialize relationships"""
+        momentum_service = MomentumService(async_db_session)
+
+        achievements = await momentum_service.get_user_achievements(test_user_with_momentum.id)
+        assert len(achievements) > 0
+        assert all(a.achievement.name for a in achievements)
+
+        stats = await momentum_service.get_momentum_stats(test_user_with_momentum.id)
+        assert stats.leaderboard_position is not None
+
+    @pytest.mark.asyncio
+    @pytest.mark.integration
+    async def test_create_reflection(self, async_db_session, test_user_with_momentum):
+        """Test creating a reflection with tags through an AsyncSession"""
+        tafakur_service = TafakurService(async_db_session)
+
+        reflection = await tafakur_service.create_reflection(
+            test_user_with_momentum.id,
+            ReflectionCreate(reflection_date=date.today(), mood="Good", tags=["async"])
+        )
+
+        assert [tag.tag_name for tag in reflection.tags] == ["async"]
+        streak = await tafakur_service.get_reflection_streak(test_user_with_momentum.id)
+        assert streak.current_streak == 1
@@ -0,0 +1,68 @@
+import pytest
+from fastapi import status
+
+from app import models
+from app.momentum import catalog
+from app.momentum.momentum import LEVELS
+from app.momentum.services import MomentumService
+
+@pytest.mark.momentum
+@pytest.mark.service
+class TestCatalog:
+    """Tests for the in-process catalog of levels and achievements"""
+
+    @pytest.mark.asyncio
+    async def test_level_up_skips_to_the_highest_level_reached(self, db_session, test_user_with_momentum):
+        """Test that points reaching several levels at once move the user to the highest of them"""
+        levels = await catalog.get(db_session)
+        third = levels.levels_by_number[3]
+        user = test_user_with_momentum
+        user.total_points = third.points_required + 1
+        db_session.commit()
+
+        level = await MomentumService(db_session).check_level_up(user.id)
+
+        assert (level.id, level.level_number) == (third.id, 3)
+        assert levels.level_for(third.points_required - 1).level_number == 2
+        assert levels.next_level(third.points_required).level_number == 4
+        assert levels.next_level(LEVELS[-1]['points_required']) is None
+
+    @pytest.mark.asyncio
+    async def test_commit_of_a_level_change_reloads_the_catalog(self, db_session):
+        """Test that a committed Level write invalidates the catalog and a rolled back one does not"""
+        before = await catalog.get(db_session)
+        level = db_session.query(models.Level).filter(models.Level.level_number == 1).one()
+        title = level.title
+
+        level.title = "Rolled back"
+        db_session.flush()
+        db_session.rollback()
+        assert await catalog.get(db_session) is before
+
+        try:
+            level.title = "Renamed"
+            db_session.commit()
+            after = await catalog.get(db_session)
+            assert after is not before
+            assert after.levels_by_number[1].title == "Renamed"
+            assert after.etag != before.etag
+        finally:
+            level.title = title
+            db_session.commit()
+
+    def test_catalog_endpoints_are_cacheable(self, client):
+        """Test that the levels and achievements lists carry public cache headers and answer 304"""
+        for path in ["/api/momentum/levels", "/api/momentum/achievements/available"]:
+            response = client.get(path)
+            assert response.status_code == status.HTTP_200_OK
+            assert response.headers["Cache-Control"].startswith("public, max-age=")
+            etag = response.headers["ETag"]
+
+            response = client.get(path, headers={"If-None-Match": etag})
+            assert response.status_code == status.HTTP_304_NOT_MODIFIED
+            assert response.headers["ETag"] == etag
+
+        catalog.invalidate()
+        response = client.get("/api/momentum/levels", headers={"If-None-Match": etag})
+        # Reloaded with the same rows: a different catalog, the same ETag
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
@@ -4,7 +4,7 @@ from datetime import datetime, timedelta
 
 from app import models
 from app.momentum.momentum import LEVELS, ACHIEVEMENTS
-from app.momentum.init_momentum import init_user_momentum, init_all_users_momentum
+from app.momentum.init_momentum import MOMENTUM_VERSION, init_user_momentum, init_all_users_momentum
 
 @pytest.mark.momentum
 @pytest.mark.model
@@ -156,4 +156,105 @@ class TestInitMomentum:
         # Verify points are initialized even for inactive users (since we directly called init_user_momentum)
         assert inactive_user.total_points == 0
         assert inactive_user.weekly_points == 0
-        assert inactive_user.monthly_points == 0 
\ No newline at end of file
+        assert inactive_user.monthly_points == 0 
+
+    def test_initialized_user_costs_one_read(self, db_session, test_user_with_momentum):
+        """Test that initializing an initialized user reads its momentum version and nothing else"""
+        from app.query_audit import capture_statements
+        assert test_user_with_momentum.momentum_version == MOMENTUM_VERSION
+
+        with capture_statements(db_session.get_bind()) as captured:
+            asyncio.run(init_user_momentum(db_session, test_user_with_momentum.id))
+
+        assert len(captured) == 1
+        assert captured[0][0].startswith("SELECT users.momentum_version")
+
+    def test_new_achievement_version_adds_missing_rows(self, db_session, test_user_with_momentum):
+        """Test that a user of an older momentum version gets the rows they miss, keeping existing ones"""
+        user_id = test_user_with_momentum.id
+        kept = db_session.query(models.UserAchievement).filter(models.UserAchievement.user_id == user_id).first()
+        kept.progress = 4
+        db_session.query(models.Streak).filter(
+            models.Streak.user_id == user_id, models.Streak.streak_type == 'weekly_goals'
+        ).delete()
+        test_user_with_momentum.momentum_version = MOMENTUM_VERSION - 1
+        db_session.commit()
+
+        asyncio.run(init_user_momentum(db_session, user_id))
+
+        db_session.refresh(kept)
+        assert kept.progress == 4
+        assert db_session.query(models.Streak).filter(models.Streak.user_id == user_id).count() == 3
+        assert test_user_with_momentum.momentum_version == MOMENTUM_VERSION
+
+    def test_backfill_is_chunked_and_resumable(self, db_session, test_user, additional_users):
+        """Test that the backfill commits chunk by chunk and skips users a previous run initialized"""
+        reports = []
+        first = asyncio.run(init_all_users_momentum(db_session, chunk_size=2, progress=lambda report, total: reports.append(report.users)))
+        assert first.users >= 4
+        assert reports == list(range(2, first.users, 2)) + [first.users]
+
+        db_session.refresh(test_user)
+        assert test_user.momentum_version == MOMENTUM_VERSION
+        assert db_session.get(models.LeaderboardEntry, test_user.id) is not None
+
+        # A second run only processes the users still behind
+        test_user.momentum_version = 0
+        db_session.query(models.Streak).filter(models.Streak.user_id == test_user.id).delete()
+        db_session.commit()
+        second = asyncio.run(init_all_users_momentum(db_session))
+        assert (second.users, second.streaks, second.user_achievements) == (1, 3, 0)
+
+    def test_streaks_start_on_local_yesterday(self, db_session, test_user):
+        """Test that new streaks are dated the user's local yesterday, so today's first activity counts"""
+        from app.momentum.ledger import local_date
+        test_user.timezone = "Pacific/Kiritimati"
+        db_session.commit()
+
+        asyncio.run(init_user_momentum(db_session, test_user.id))
+
+        dates = {streak.last_activity_date for streak in db_session.query(models.Streak).filter(models.Streak.user_id == test_user.id)}
+        assert dates == {local_date("Pacific/Kiritimati") - timedelta(days=1)}
+
+    def test_init_after_migrating_duplicate_rows(self, tmp_path):
+        """Test that initializing works on a legacy database whose duplicate rows the migrations removed"""
+        from sqlalchemy import create_engine, text
+        from sqlalchemy.orm import sessionmaker
+        from app.database import Base
+        from app.migrations import run_migrations
+
+        from app.momentum import catalog
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        try:
+            Base.metadata.create_all(bind=engine)
+            db = Session()
+            try:
+                achievement_id = asyncio.run(catalog.load(db)).achievements_by_name[ACHIEVEMENTS[0]["name"]].id
+            finally:
+                db.close()
+            with engine.begin() as conn:
+                conn.execute(text("DROP INDEX uq_user_achievements_user_achievement"))
+                conn.execute(text("DROP INDEX uq_streaks_user_streak_type"))
+                conn.execute(text("INSERT INTO users (id, email, username, momentum_version) VALUES (1, 'old@example.com', 'old', 0)"))
+                conn.execute(text(
+                    "INSERT INTO user_achievements (user_id, achievement_id, progress, completed) "
+                    "VALUES (1, :id, 0, 0), (1, :id, 3, 0)"
+                ), {"id": achievement_id})
+                conn.execute(text(
+                    "INSERT INTO streaks (user_id, streak_type, current_count, longest_count) "
+                    "VALUES (1, 'daily_tasks', 1, 1), (1, 'daily_tasks', 0, 0)"
+                ))
+            run_migrations(engine)
+
+            db = Session()
+            try:
+                asyncio.run(init_user_momentum(db, 1))
+                assert db.get(models.User, 1).momentum_version == MOMENTUM_VERSION
+                assert db.query(models.UserAchievement).filter(models.UserAchievement.user_id == 1).count() == len(ACHIEVEMENTS)
+                assert db.query(models.Streak).filter(models.Streak.user_id == 1).count() == 3
+            finally:
+                db.close()
+        finally:
+            engine.dispose()
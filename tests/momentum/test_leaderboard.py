@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy import func, select
+
+from app import models
+from app.momentum import leaderboard
+from app.momentum.services import MomentumService
+
+def _entries(db_session, user_ids):
+    db_session.expire_all()
+    return {
+        entry.user_id: (entry.level, entry.weekly_points, entry.monthly_points, entry.total_points,
+                        entry.achievements_count, entry.longest_streak)
+        for entry in db_session.query(models.LeaderboardEntry).filter(models.LeaderboardEntry.user_id.in_(user_ids))
+    }
+
+@pytest.mark.momentum
+@pytest.mark.service
+class TestLeaderboard:
+    """Tests for the materialized leaderboard"""
+
+    @pytest.mark.asyncio
+    async def test_points_changes_update_entry(self, db_session, test_user_with_momentum):
+        """Test that awarding, deducting and achievements keep the entry equal to a rebuild"""
+        user_id = test_user_with_momentum.id
+        service = MomentumService(db_session)
+
+        await service.award_points(user_id, 40)
+        await service.deduct_points(user_id, 15)
+        await service.update_streaks(user_id, 'task_completion')
+        await service._award_achievement(user_id, {
+            'name': 'Task Master', 'description': '', 'points': 500, 'category': 'productivity',
+            'criteria_type': 'count', 'criteria_value': 100, 'icon_name': 'trophy'
+        })
+        await service.check_level_up(user_id)
+        maintained = _entries(db_session, [user_id])
+
+        with db_session.get_bind().begin() as connection:
+            leaderboard.rebuild(connection)
+
+        assert maintained[user_id][3] == 525
+        assert maintained[user_id][4] == 1
+        assert maintained == _entries(db_session, [user_id])
+
+    @pytest.mark.asyncio
+    async def test_top_reads_the_board_in_order(self, db_session, test_user_with_momentum, additional_users):
+        """Test that each board lists users by its own points column"""
+        service = MomentumService(db_session)
+        for user in additional_users:
+            await service.check_level_up(user.id)
+        await service.award_points(additional_users[0].id, 0)
+        await service.award_points(test_user_with_momentum.id, 10_000)
+
+        for timeframe in ("weekly", "monthly", "all-time"):
+            board = await service.get_leaderboard(timeframe, limit=2)
+            assert board[0].user_id == test_user_with_momentum.id
+            points = [entry.points for entry in await service.get_leaderboard(timeframe, limit=50)]
+            assert points == sorted(points, reverse=True)
+
+    @pytest.mark.asyncio
+    async def test_rank_matches_window_rank(self, db_session, test_user_with_momentum, additional_users):
+        """Test that tree ranks equal SQL rank() on every board after points changes"""
+        service = MomentumService(db_session)
+        users = [test_user_with_momentum, *additional_users]
+        for user in users:
+            await service.check_level_up(user.id)
+        for user, points in zip(users, (30, 70, 30, 5)):
+            await service.award_points(user.id, points)
+        await service.deduct_points(users[1].id, 40)
+
+        for timeframe, column in leaderboard.BOARD_COLUMNS.items():
+            expected = dict(db_session.execute(select(
+                models.LeaderboardEntry.user_id,
+                func.rank().over(order_by=column.desc())
+            )).all())
+            for user in users:
+                assert await leaderboard.rank(db_session, timeframe, user.id) == expected[user.id]
+
+    @pytest.mark.asyncio
+    async def test_rebuild_keeps_ranks(self, db_session, test_user_with_momentum):
+        """Test that rebuilding the trees gives the same ranks as incremental maintenance"""
+        await MomentumService(db_session).award_points(test_user_with_momentum.id, 12)
+        before = [await leaderboard.rank(db_session, board, test_user_with_momentum.id) for board in leaderboard.BOARD_COLUMNS]
+
+        with db_session.get_bind().begin() as connection:
+            leaderboard.rebuild(connection)
+        db_session.expire_all()
+
+        after = [await leaderboard.rank(db_session, board, test_user_with_momentum.id) for board in leaderboard.BOARD_COLUMNS]
+        assert after == before
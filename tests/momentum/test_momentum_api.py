@@ -1,6 +1,24 @@
 import pytest
 from fastapi.testclient import TestClient
 from fastapi import status
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.database import install_sqlite_pragmas, sqlite_pragmas
+
+TEST_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+
+def _async_sessions(read_only: bool = False):
+    """AsyncSession factory on the test database, query_only like the read pool if ``read_only``"""
+    engine = create_async_engine(TEST_ASYNC_DATABASE_URL, poolclass=NullPool)
+    install_sqlite_pragmas(engine.sync_engine, sqlite_pragmas(read_only=read_only))
+    return async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+@pytest.fixture
+def background_sessions(monkeypatch):
+    """Background tasks open their writable sessions on the test database"""
+    import app.database
+    monkeypatch.setattr(app.database, "AsyncSessionLocal", _async_sessions())
 
 @pytest.mark.momentum
 @pytest.mark.api
@@ -45,6 +63,17 @@ class TestMomentumAPI:
             assert "points" in entry
             assert "level" in entry
     
+    def test_get_leaderboard_rank(self, authenticated_client):
+        """Test getting the current user's leaderboard rank"""
+        for timeframe in ("weekly", "monthly", "all-time"):
+            response = authenticated_client.get("/api/momentum/leaderboard/rank", params={"timeframe": timeframe})
+            
+            assert response.status_code == status.HTTP_200_OK
+            data = response.json()
+            assert data["timeframe"] == timeframe
+            assert data["rank"] >= 1
+            assert data["points"] >= 0
+    
     def test_get_achievements(self, authenticated_client):
         """Test getting user achievements endpoint"""
         response = authenticated_client.get("/api/momentum/achievements")
@@ -63,6 +92,69 @@ class TestMomentumAPI:
             assert "progress" in achievement
             assert "completed" in achievement
     
+    def test_missing_achievement_rows_are_created_after_the_response(self, authenticated_client, db_session, test_user_with_momentum, background_sessions):
+        """Test that achievements without a tracking row are added in the background and listed next time"""
+        from app import models
+        from app.momentum.momentum import ACHIEVEMENTS
+        db_session.query(models.UserAchievement).filter(
+            models.UserAchievement.user_id == test_user_with_momentum.id
+        ).delete()
+        db_session.commit()
+
+        first = authenticated_client.get("/api/momentum/achievements")
+        assert (first.status_code, first.json()) == (status.HTTP_200_OK, [])
+
+        # Creating them changed the user's data version, so the old copy is not current;
+        # they were written by another session, so reload the user like a new request would
+        db_session.expire_all()
+        second = authenticated_client.get("/api/momentum/achievements", headers={"If-None-Match": first.headers["ETag"]})
+        assert second.status_code == status.HTTP_200_OK
+        assert sorted(entry["achievement"]["name"] for entry in second.json()) == sorted(a['name'] for a in ACHIEVEMENTS)
+
+    def test_progress_initializes_momentum_after_the_response(self, authenticated_client, db_session, test_user, background_sessions):
+        """Test that /progress reads from the query_only pool and initializes momentum in the background"""
+        from app import models
+        from app.database import get_async_read_db
+        from app.main import app
+        from app.momentum.init_momentum import MOMENTUM_VERSION
+        read_sessions = _async_sessions(read_only=True)
+
+        async def read_db():
+            async with read_sessions() as db:
+                yield db
+
+        app.dependency_overrides[get_async_read_db] = read_db
+        response = authenticated_client.get("/api/momentum/progress")
+
+        assert response.status_code == status.HTTP_200_OK, response.text
+        assert (response.json()["current_level"]["level_number"], response.json()["total_points"]) == (1, 0)
+        db_session.expire_all()
+        assert db_session.get(models.User, test_user.id).momentum_version == MOMENTUM_VERSION
+        assert db_session.query(models.Streak).filter(models.Streak.user_id == test_user.id).count() > 0
+
+    def test_missing_achievement_rows_are_created_from_a_read_session(self, authenticated_client, db_session, test_user_with_momentum, background_sessions):
+        """Test that the background task writes through its own session when the route reads from the query_only pool"""
+        from app import models
+        from app.database import get_async_read_db
+        from app.main import app
+        from app.momentum.momentum import ACHIEVEMENTS
+        user_id = test_user_with_momentum.id
+        db_session.query(models.UserAchievement).filter(models.UserAchievement.user_id == user_id).delete()
+        db_session.commit()
+        read_sessions = _async_sessions(read_only=True)
+
+        async def read_db():
+            async with read_sessions() as db:
+                yield db
+
+        app.dependency_overrides[get_async_read_db] = read_db
+        response = authenticated_client.get("/api/momentum/achievements")
+
+        assert (response.status_code, response.json()) == (status.HTTP_200_OK, [])
+        db_session.expire_all()
+        created = db_session.query(models.UserAchievement).filter(models.UserAchievement.user_id == user_id).count()
+        assert created == len(ACHIEVEMENTS)
+    
     def test_get_streaks(self, authenticated_client):
         """Test getting user streaks endpoint"""
         response = authenticated_client.get("/api/momentum/streaks")
@@ -3,6 +3,7 @@ import asyncio
 from datetime import datetime, date, timedelta
 
 from app import models
+from app.momentum import outbox
 from app.momentum.services import MomentumService
 from app.momentum.momentum import POINT_EVENTS
 
@@ -115,7 +116,23 @@ class TestMomentumService:
         db_session.refresh(user_achievement)
         assert user_achievement.progress >= achievement.criteria_value
         assert user_achievement.completed == True
-    
+
+    @pytest.mark.asyncio
+    @pytest.mark.model
+    async def test_award_achievement_completes_tracking_row(self, db_session, test_user_with_momentum, momentum_service):
+        """Test that awarding an achievement completes the row created by init instead of adding one"""
+        from app.momentum.momentum import ACHIEVEMENTS
+
+        await momentum_service._award_achievement(test_user_with_momentum.id, ACHIEVEMENTS[0])
+        await momentum_service._award_achievement(test_user_with_momentum.id, ACHIEVEMENTS[0])
+
+        rows = db_session.query(models.UserAchievement).join(models.Achievement).filter(
+            models.UserAchievement.user_id == test_user_with_momentum.id,
+            models.Achievement.name == ACHIEVEMENTS[0]['name']
+        ).all()
+        assert len(rows) == 1
+        assert rows[0].completed == True
+
     @pytest.mark.asyncio
     async def test_get_leaderboard(self, db_session, test_user_with_momentum, additional_users, momentum_service):
         """Test getting leaderboard data"""
@@ -414,6 +431,7 @@ class TestMomentumService:
         # Mark the time slot as completed
         update = TimeSlotUpdate(status="completed")
         await update_time_slot(db_session, time_slot, update)
+        await outbox.drain(db_session)
         
         # Verify points were awarded
         db_session.refresh(test_user_with_momentum)
@@ -427,6 +445,7 @@ class TestMomentumService:
         # Now change the status back to "in_progress" (which should revert the points)
         revert_update = TimeSlotUpdate(status="in_progress")
         await update_time_slot(db_session, time_slot, revert_update)
+        await outbox.drain(db_session)
 
         # Verify points were reverted
         db_session.refresh(test_user_with_momentum)
@@ -438,4 +457,17 @@ class TestMomentumService:
         
         # Note: The revert_event method is not correctly calculating the exact points to deduct
         # This is likely due to time-based bonuses being calculated differently at revert time
-        # For a more robust test, we would need to store the exact metadata used during the original event 
\ No newline at end of file
+        # For a more robust test, we would need to store the exact metadata used during the original event 
+
+    @pytest.mark.asyncio
+    async def test_user_achievements_in_one_query(self, db_session, test_user_with_momentum, momentum_service):
+        """Test that listing a user's achievements reads only their tracking rows"""
+        from app.query_audit import capture_statements
+        await momentum_service.get_user_achievements(test_user_with_momentum.id)
+
+        with capture_statements(db_session.get_bind()) as captured:
+            achievements = await momentum_service.get_user_achievements(test_user_with_momentum.id)
+
+        assert len(captured) == 1
+        assert len(achievements) == len({a.achievement_id for a in achievements}) > 0
+        assert all(a.achievement.name for a in achievements)
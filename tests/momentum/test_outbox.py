@@ -0,0 +1,116 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import status
+
+from app import models
+from app.momentum import outbox
+
+def _events(db_session, user_id):
+    return db_session.query(models.MomentumEvent).filter(models.MomentumEvent.user_id == user_id)\
+        .order_by(models.MomentumEvent.id).all()
+
+def _points(db_session, user_id):
+    db_session.expire_all()
+    return db_session.get(models.User, user_id).total_points
+
+@pytest.mark.momentum
+@pytest.mark.service
+class TestMomentumOutbox:
+    """Tests for recording momentum events and applying them in the background"""
+
+    def test_events_commit_with_the_write(self, db_session, test_user_with_momentum):
+        """Test that a recorded event commits or rolls back with the caller's transaction"""
+        user_id = test_user_with_momentum.id
+        outbox.record(db_session, user_id, "task_completion")
+        db_session.rollback()
+        assert _events(db_session, user_id) == []
+
+        outbox.record(db_session, user_id, "early_bird", {"completion_time": datetime(2024, 3, 4, 6, 30)})
+        db_session.commit()
+
+        [recorded] = _events(db_session, user_id)
+        assert recorded.status == "pending"
+        assert outbox.load_metadata(recorded.payload) == {"completion_time": datetime(2024, 3, 4, 6, 30)}
+
+    @pytest.mark.asyncio
+    async def test_drain_applies_a_users_events_in_order(self, db_session, test_user_with_momentum):
+        """Test that a revert after an award is applied after it"""
+        user_id = test_user_with_momentum.id
+        test_user_with_momentum.total_points = 0
+        outbox.record(db_session, user_id, "task_completion")
+        outbox.record(db_session, user_id, "task_completion", revert=True)
+        outbox.record(db_session, user_id, "first_task_of_day")
+        db_session.commit()
+
+        await outbox.drain(db_session)
+
+        # Deducting before awarding would stop at zero and leave 3 + 2
+        assert _points(db_session, user_id) == 2
+        assert [event.status for event in _events(db_session, user_id)] == ["processed"] * 3
+
+    @pytest.mark.asyncio
+    async def test_failing_event_holds_only_its_user(self, db_session, test_user_with_momentum, additional_users, monkeypatch):
+        """Test that a failing event stops its user's later events until it is parked"""
+        user_id = test_user_with_momentum.id
+        other = next(user for user in additional_users if user.total_points is not None)
+        other_before = other.total_points
+        outbox.record(db_session, user_id, "task_completion")
+        outbox.record(db_session, user_id, "early_bird", {"completion_time": "not a datetime"})
+        outbox.record(db_session, user_id, "first_task_of_day")
+        outbox.record(db_session, other.id, "task_completion")
+        db_session.commit()
+        before = _points(db_session, user_id)
+
+        await outbox.drain(db_session)
+
+        first, failing, later = _events(db_session, user_id)
+        assert (first.status, failing.status, later.status) == ("processed", "pending", "pending")
+        assert failing.attempts == 1 and "hour" in failing.last_error
+        assert _points(db_session, user_id) == before + 3
+        assert _points(db_session, other.id) == other_before + 3
+
+        monkeypatch.setattr(outbox.settings, "MOMENTUM_OUTBOX_MAX_ATTEMPTS", 2)
+        await outbox.drain(db_session)
+        await outbox.drain(db_session)
+
+        first, failing, later = _events(db_session, user_id)
+        assert (failing.status, later.status) == ("failed", "processed")
+        assert _points(db_session, user_id) == before + 3 + 2
+
+    @pytest.mark.asyncio
+    async def test_worker_wakes_up_on_commit(self, db_session, async_session_factory, test_user_with_momentum):
+        """Test that the worker applies an event as soon as it commits, without waiting for the poll"""
+        user_id = test_user_with_momentum.id
+        worker = asyncio.create_task(outbox.run_worker(async_session_factory, poll_seconds=60))
+        try:
+            await asyncio.sleep(0.2)
+            outbox.record(db_session, user_id, "task_completion")
+            db_session.commit()
+
+            for _ in range(50):
+                await asyncio.sleep(0.1)
+                db_session.expire_all()
+                if _events(db_session, user_id)[0].status == "processed":
+                    break
+            assert _events(db_session, user_id)[0].status == "processed"
+        finally:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+
+    @pytest.mark.api
+    def test_update_returns_before_momentum(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that completing a time slot records its events instead of applying them"""
+        user_id = test_user_with_momentum.id
+        before = test_user_with_momentum.total_points
+        slot = models.TimeSlot(owner_id=user_id, start_time=datetime(2024, 3, 4, 9), end_time=datetime(2024, 3, 4, 10))
+        db_session.add(slot)
+        db_session.commit()
+
+        response = authenticated_client.patch(f"/api/time_slots/{slot.id}", json={"status": "completed"})
+
+        assert response.status_code == status.HTTP_200_OK
+        recorded = _events(db_session, user_id)
+        assert recorded[0].event_type == "time_slot_completion"
+        assert _points(db_session, user_id) == before
@@ -0,0 +1,171 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+
+from app import models
+from app.momentum import leaderboard, ledger, outbox
+from app.momentum.services import MomentumService
+
+def _rows(db_session, user_id):
+    return db_session.query(models.PointsLedgerEntry).filter(models.PointsLedgerEntry.user_id == user_id)\
+        .order_by(models.PointsLedgerEntry.id).all()
+
+@pytest.mark.momentum
+@pytest.mark.service
+class TestPointsLedger:
+    """Tests for the append-only points ledger and the rollups over it"""
+
+    @pytest.mark.asyncio
+    async def test_revert_takes_back_the_award(self, db_session, test_user_with_momentum):
+        """Test that a revert takes back what was awarded, not what the event would earn now"""
+        user_id = test_user_with_momentum.id
+        service = MomentumService(db_session)
+        await service.award_points(user_id, 100)
+
+        await service.process_event(user_id, "goal_completion", {"goal_id": 7, "is_weekend": True})
+        awarded = db_session.get(models.User, user_id).total_points
+        # Not a weekend any more: recomputing would give 15 instead of the 16 awarded
+        result = await service.revert_event(user_id, "goal_completion", {"goal_id": 7, "is_weekend": False})
+
+        assert result["points_deducted"] == 16
+        assert db_session.get(models.User, user_id).total_points == awarded - 16
+        award, revert = [row for row in _rows(db_session, user_id) if row.event_type == "goal_completion"]
+        assert (award.source_type, award.source_id, award.points) == ("goal", 7, 16)
+        assert (revert.points, revert.reverts_id, revert.awarded_at) == (-16, award.id, award.awarded_at)
+
+        # Nothing left to revert for the goal: it falls back to the event's points
+        result = await service.revert_event(user_id, "goal_completion", {"goal_id": 7})
+        assert result["points_deducted"] == 15
+        assert _rows(db_session, user_id)[-1].reverts_id is None
+
+    @pytest.mark.asyncio
+    async def test_revert_of_last_weeks_award_keeps_this_week(self, db_session, test_user_with_momentum):
+        """Test that reverting an award of an earlier week leaves this week's points alone"""
+        user = test_user_with_momentum
+        before = user.total_points
+        # Mondays at noon in Kolkata
+        last_week, this_week = datetime(2024, 3, 4, 6, 30), datetime(2024, 3, 11, 6, 30)
+
+        await ledger.award(db_session, user, [("task_completion", ("task", 1), 10)], last_week)
+        await ledger.award(db_session, user, [("task_completion", ("task", 2), 15)], this_week)
+        taken = await ledger.revert(db_session, user, "task_completion", ("task", 1), 10, this_week)
+        db_session.commit()
+
+        assert taken == 10
+        assert user.total_points == before + 15
+        assert (user.weekly_points, user.weekly_points_start) == (15, date(2024, 3, 11))
+        # Both were awarded in March, and only one is left
+        assert (user.monthly_points, user.monthly_points_start) == (15, date(2024, 3, 1))
+
+    @pytest.mark.asyncio
+    async def test_past_period_rollup_is_recomputed(self, db_session, test_user_with_momentum):
+        """Test that points of a past week count as 0 and are recomputed when points change"""
+        user = test_user_with_momentum
+        await ledger.award(db_session, user, [("task_completion", ("task", 1), 10)], datetime(2024, 3, 4, 6, 30))
+        db_session.commit()
+        next_week = datetime(2024, 3, 12, 6, 30)
+
+        assert ledger.current(user, next_week) == {"weekly_points": 0, "monthly_points": 10}
+
+        await MomentumService(db_session).reset_periodic_points(user.id, date(2024, 4, 1))
+        assert (user.weekly_points, user.monthly_points) == (0, 0)
+        assert (user.weekly_points_start, user.monthly_points_start) == (date(2024, 4, 1), date(2024, 4, 1))
+        # Running the rollover again changes nothing
+        await MomentumService(db_session).reset_periodic_points(user.id, date(2024, 4, 1))
+        assert (user.weekly_points, user.monthly_points) == (0, 0)
+
+    @pytest.mark.asyncio
+    async def test_scheduled_checks_run_per_timezone(self, db_session):
+        """Test that the daily job rolls over and awards perfect weeks by each timezone's local date"""
+        # Monday 01:00 in Auckland, Sunday 05:00 in Los Angeles
+        now = datetime(2024, 3, 10, 12, 0)
+        tuesday = datetime(2024, 3, 5, 20, 0)
+        users = {}
+        for name, timezone_name, completed in [
+            ("auckland", "Pacific/Auckland", True), ("la_perfect", "America/Los_Angeles", True),
+            ("la_pending", "America/Los_Angeles", False),
+        ]:
+            user = models.User(email=f"schedule_{name}@example.com", username=f"schedule_{name}", timezone=timezone_name,
+                               total_points=0, weekly_points=0, monthly_points=0)
+            db_session.add(user)
+            db_session.flush()
+            db_session.add_all([
+                models.Task(title="a", owner_id=user.id, completed=True, created_at=tuesday),
+                models.Task(title="b", owner_id=user.id, completed=completed, created_at=tuesday),
+            ])
+            await ledger.award(db_session, user, [("task_completion", ("task", 1), 10)], tuesday)
+            await leaderboard.record_user(db_session, user)
+            users[name] = user
+        db_session.commit()
+
+        await MomentumService(db_session).schedule_weekly_and_monthly_checks(now)
+
+        db_session.expire_all()
+        auckland = db_session.get(models.User, users["auckland"].id)
+        assert (auckland.weekly_points, auckland.weekly_points_start) == (0, date(2024, 3, 11))
+        assert (auckland.monthly_points, auckland.monthly_points_start) == (10, date(2024, 3, 1))
+        assert db_session.get(models.LeaderboardEntry, auckland.id).weekly_points == 0
+        # Sunday only in Los Angeles, where only the user who completed every task gets a perfect week
+        perfect = {
+            user_id for user_id, in db_session.query(models.PointsLedgerEntry.user_id)
+            .filter(models.PointsLedgerEntry.event_type == "perfect_week")
+        }
+        assert users["la_perfect"].id in perfect
+        assert not {users["auckland"].id, users["la_pending"].id} & perfect
+
+        # Rolled over already: a second run writes no user
+        assert await ledger.roll_timezone(db_session, "Pacific/Auckland", now) == 0
+
+    @pytest.mark.api
+    def test_deleting_a_completed_time_slot_reverts_it(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that deleting a completed time slot takes back its completion awards"""
+        user_id = test_user_with_momentum.id
+        slot = models.TimeSlot(owner_id=user_id, start_time=datetime(2024, 3, 1, 9), end_time=datetime(2024, 3, 1, 11))
+        db_session.add(slot)
+        db_session.commit()
+        assert authenticated_client.patch(f"/api/time_slots/{slot.id}", json={"status": "completed"}).status_code == 200
+        asyncio.run(outbox.drain(db_session))
+
+        assert authenticated_client.delete(f"/api/time_slots/{slot.id}").status_code == 204
+        asyncio.run(outbox.drain(db_session))
+
+        db_session.expire_all()
+        rows = [row for row in _rows(db_session, user_id) if row.source_type == "time_slot"]
+        awards = {row.id: row for row in rows if row.points > 0}
+        reverts = [row for row in rows if row.points < 0]
+        assert {row.event_type for row in awards.values()} >= {"time_slot_completion", "focused_session"}
+        # Every completion award of the slot is taken back exactly
+        for event_type in ("time_slot_completion", "focused_session"):
+            revert = next(row for row in reverts if row.event_type == event_type)
+            assert revert.points == -awards[revert.reverts_id].points
+
+    @pytest.mark.api
+    def test_uncompleting_a_task_reverts_its_awards_by_source(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that uncompleting a task takes back the weekend bonus it earned, and nothing for one it did not"""
+        user_id = test_user_with_momentum.id
+        weekend = models.Task(title="Saturday", owner_id=user_id, completed=True)
+        weekday = models.Task(title="Monday", owner_id=user_id, completed=True)
+        db_session.add_all([weekend, weekday])
+        db_session.commit()
+        # Completed on a Saturday and a Monday, whatever day the revert happens on
+        asyncio.run(MomentumService(db_session).process_events(user_id, [
+            ("task_completion", {"task_id": weekend.id, "is_weekend": True}),
+            ("weekend_warrior", {"task_id": weekend.id}),
+            ("task_completion", {"task_id": weekday.id, "is_weekend": False}),
+        ]))
+        before = db_session.get(models.User, user_id).total_points
+
+        for task in (weekend, weekday):
+            assert authenticated_client.patch(f"/api/tasks/{task.id}", json={"completed": False}).status_code == 200
+        asyncio.run(outbox.drain(db_session))
+
+        db_session.expire_all()
+        rows = _rows(db_session, user_id)
+        reverts = [(row.event_type, row.source_id) for row in rows if row.points < 0]
+        assert sorted(reverts) == sorted([
+            ("task_completion", weekend.id), ("weekend_warrior", weekend.id), ("task_completion", weekday.id)
+        ])
+        assert all(row.reverts_id is not None for row in rows if row.points < 0)
+        awarded = sum(row.points for row in rows if row.points > 0 and row.source_type == "task")
+        assert db_session.get(models.User, user_id).total_points == before - awarded
@@ -5,6 +5,7 @@ from datetime import datetime, timedelta, date
 
 from app import models
 from app.momentum.init_momentum import init_user_momentum, init_all_users_momentum
+from app.momentum import outbox
 from app.momentum.services import MomentumService
 from app.tafakur.schemas import ReflectionCreate
 from app.tafakur.services import TafakurService
@@ -124,6 +125,8 @@ class TestPreExistingUsers:
         
         # Create reflection
         reflection = await tafakur_service.create_reflection(pre_existing_user.id, reflection_data)
+        # Momentum is applied by the outbox worker
+        await outbox.drain(db_session)
         
         # Refresh user
         db_session.refresh(pre_existing_user)
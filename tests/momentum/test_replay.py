@@ -0,0 +1,104 @@
+import json
+import uuid
+from datetime import date, datetime
+
+import pytest
+
+from app import models
+from app.momentum import replay
+from app.momentum.momentum import ACHIEVEMENTS
+
+NOW = datetime(2024, 3, 6, 12, 0)
+SELF_AWARE = next(achievement['points'] for achievement in ACHIEVEMENTS if achievement['name'] == 'Self-Aware')
+
+@pytest.fixture
+def user_with_history(db_session):
+    """A user with completed tasks and a reflection, and no momentum recorded for them"""
+    suffix = str(uuid.uuid4())[:8]
+    user = models.User(email=f"replay_{suffix}@example.com", username=f"replay_{suffix}", timezone="Asia/Kolkata",
+                       total_points=0, weekly_points=0, monthly_points=0)
+    db_session.add(user)
+    db_session.flush()
+    db_session.add_all([
+        # 08:30, 15:30 and 09:30 in Kolkata
+        models.Task(title="a", owner_id=user.id, completed=True, created_at=datetime(2024, 3, 4, 3, 0)),
+        models.Task(title="b", owner_id=user.id, completed=True, created_at=datetime(2024, 3, 4, 10, 0)),
+        models.Task(title="c", owner_id=user.id, completed=True, created_at=datetime(2024, 3, 5, 4, 0)),
+        models.Task(title="d", owner_id=user.id, completed=False, created_at=datetime(2024, 3, 5, 5, 0)),
+        models.Reflection(user_id=user.id, reflection_date=date(2024, 3, 5), highlights="Shipped",
+                          created_at=datetime(2024, 3, 5, 15, 0)),
+    ])
+    db_session.commit()
+    return user
+
+def _ledger(db_session, user_id):
+    return db_session.query(models.PointsLedgerEntry).filter(models.PointsLedgerEntry.user_id == user_id).all()
+
+@pytest.mark.momentum
+@pytest.mark.service
+class TestReplay:
+    """Tests for rebuilding momentum state from history"""
+
+    def test_dry_run_reports_without_writing(self, db_session, test_engine, user_with_history):
+        """Test that a dry run lists the differences and changes nothing"""
+        report = replay.run(test_engine, processes=1, dry_run=True, user_ids=[user_with_history.id], now=NOW)
+
+        # First tasks of the day earn 3 + 2, the other 3; the reflection 5 and Self-Aware
+        assert report.users == 1
+        assert f"total_points: 0 -> {13 + 5 + SELF_AWARE}" in report.changes[user_with_history.id]
+        assert "achievements gained: Self-Aware" in report.changes[user_with_history.id]
+        db_session.expire_all()
+        assert db_session.get(models.User, user_with_history.id).total_points == 0
+        assert _ledger(db_session, user_with_history.id) == []
+
+    def test_replay_writes_state_and_is_idempotent(self, db_session, test_engine, user_with_history):
+        """Test that a replay stores points, ledger, streaks and achievements, and a second one changes nothing"""
+        user_id = user_with_history.id
+        replay.run(test_engine, processes=1, user_ids=[user_id], now=NOW)
+
+        db_session.expire_all()
+        user = db_session.get(models.User, user_id)
+        rows = _ledger(db_session, user_id)
+        assert user.total_points == sum(row.points for row in rows) == 13 + 5 + SELF_AWARE
+        assert (user.weekly_points, user.weekly_points_start) == (user.total_points, date(2024, 3, 4))
+        assert sorted(row.event_type for row in rows).count("first_task_of_day") == 2
+        streak = db_session.query(models.Streak).filter_by(user_id=user_id, streak_type="daily_tasks").one()
+        assert (streak.current_count, streak.longest_count, streak.last_activity_date) == (2, 2, date(2024, 3, 5))
+        held = db_session.query(models.UserAchievement).join(models.Achievement).filter(
+            models.UserAchievement.user_id == user_id, models.UserAchievement.completed == True
+        ).all()
+        assert [user_achievement.achievement.name for user_achievement in held] == ["Self-Aware"]
+        entry = db_session.get(models.LeaderboardEntry, user_id)
+        assert (entry.total_points, entry.achievements_count) == (user.total_points, 1)
+
+        report = replay.run(test_engine, processes=1, dry_run=True, user_ids=[user_id], now=NOW)
+        assert report.changes == {}
+
+    def test_resumes_from_checkpoint(self, db_session, test_engine, user_with_history, tmp_path):
+        """Test that chunks in the checkpoint are skipped and the file is removed once the run completes"""
+        checkpoint = tmp_path / "replay.json"
+        checkpoint.write_text(json.dumps({"chunk_size": 10, "done": [user_with_history.id // 10]}))
+
+        with pytest.raises(ValueError):
+            replay.run(test_engine, chunk_size=20, processes=1, checkpoint=str(checkpoint),
+                       user_ids=[user_with_history.id], now=NOW)
+
+        report = replay.run(test_engine, chunk_size=10, processes=1, checkpoint=str(checkpoint),
+                            user_ids=[user_with_history.id], now=NOW)
+
+        assert (report.users, report.skipped_chunks) == (0, 1)
+        assert not checkpoint.exists()
+        db_session.expire_all()
+        assert db_session.get(models.User, user_with_history.id).total_points == 0
+
+    def test_chunks_run_in_a_process_pool(self, db_session, test_engine, user_with_history, additional_users):
+        """Test that chunks computed in worker processes are all written"""
+        user_ids = [user_with_history.id, additional_users[0].id]
+
+        report = replay.run(test_engine, chunk_size=1, processes=2, user_ids=user_ids, now=NOW)
+
+        assert report.users == 2
+        db_session.expire_all()
+        assert db_session.get(models.User, user_with_history.id).total_points == 13 + 5 + SELF_AWARE
+        # No history: the points set by the fixture go
+        assert db_session.get(models.User, additional_users[0].id).total_points == 0
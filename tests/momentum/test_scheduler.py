@@ -0,0 +1,50 @@
+from datetime import date, datetime
+
+import pytest
+
+from app import models
+from app.momentum import scheduler, timezones
+
+@pytest.mark.momentum
+@pytest.mark.service
+class TestHourlyChecks:
+    """Tests for the hourly checks of timezones at local midnight"""
+
+    def test_midnight_offsets(self):
+        """Test that each hour selects the UTC offsets whose local day just started"""
+        assert timezones.midnight_offsets(datetime(2024, 3, 10, 0, 0)) == [(0, 60)]
+        # 00:00 to 00:59 in Dhaka (+06:00), not 23:30 in Kolkata (+05:30)
+        assert timezones.midnight_offsets(datetime(2024, 3, 10, 18, 0)) == [(360, 420)]
+        # Both sides of the date line
+        assert timezones.midnight_offsets(datetime(2024, 3, 10, 12, 0)) == [(-720, -660), (720, 780)]
+
+    @pytest.mark.asyncio
+    async def test_only_users_at_local_midnight_are_checked(self, db_session):
+        """Test that an hourly run refreshes offsets and checks only the users whose day just started"""
+        users = {}
+        for name, timezone_name in [("dhaka", "Asia/Dhaka"), ("new_york", "America/New_York")]:
+            user = models.User(email=f"hourly_{name}@example.com", username=f"hourly_{name}", timezone=timezone_name,
+                               total_points=0, weekly_points=0, monthly_points=0,
+                               weekly_points_start=date(2024, 3, 4), monthly_points_start=date(2024, 3, 1))
+            db_session.add(user)
+            db_session.flush()
+            db_session.add(models.Streak(user_id=user.id, streak_type="daily_tasks", current_count=3,
+                                         longest_count=3, last_activity_date=date(2024, 3, 9)))
+            users[name] = user
+        db_session.commit()
+
+        # 00:20 on Monday in Dhaka, 14:20 on Sunday in New York (daylight saving time since 07:00 UTC)
+        await scheduler.hourly_checks(db_session, datetime(2024, 3, 10, 18, 20))
+
+        db_session.expire_all()
+        dhaka, new_york = (db_session.get(models.User, users[name].id) for name in ("dhaka", "new_york"))
+        assert (dhaka.utc_offset_minutes, new_york.utc_offset_minutes) == (360, -240)
+        assert dhaka.weekly_points_start == date(2024, 3, 11)
+        assert new_york.weekly_points_start == date(2024, 3, 4)
+        streaks = {streak.user_id: streak.current_count for streak in db_session.query(models.Streak).filter(
+            models.Streak.user_id.in_([dhaka.id, new_york.id])
+        )}
+        assert streaks == {dhaka.id: 0, new_york.id: 3}
+
+        # The offsets are current: the next run changes none
+        assert await timezones.refresh_offsets(db_session, datetime(2024, 3, 10, 19, 0)) == 0
@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import event
+
+from app import models
+from app.momentum.services import MomentumService
+
+@pytest.fixture
+def commits(db_session):
+    """Count commits of the test session"""
+    count = []
+    listener = lambda session: count.append(session)
+    event.listen(db_session, "after_commit", listener)
+    yield count
+    event.remove(db_session, "after_commit", listener)
+
+@pytest.mark.momentum
+@pytest.mark.service
+class TestUnitOfWork:
+    """Tests for running momentum updates as one transaction"""
+
+    @pytest.mark.asyncio
+    async def test_process_event_commits_once(self, db_session, test_user_with_momentum, commits):
+        """Test that points, streaks, achievements and level of one event commit together"""
+        result = await MomentumService(db_session).process_event(test_user_with_momentum.id, "task_completion")
+
+        assert len(commits) == 1
+        assert result["points_awarded"] > 0
+
+    @pytest.mark.asyncio
+    async def test_user_action_commits_once(self, db_session, test_user_with_momentum, commits):
+        """Test that a completion and its bonus events commit once"""
+        before = test_user_with_momentum.total_points
+        service = MomentumService(db_session)
+        async with service.unit_of_work():
+            for event_type in ("task_completion", "first_task_of_day", "weekend_warrior"):
+                await service.process_event(test_user_with_momentum.id, event_type)
+
+        assert len(commits) == 1
+        assert service.autocommit is True
+        db_session.expire_all()
+        assert db_session.get(models.User, test_user_with_momentum.id).total_points == before + 3 + 2 + 10
+
+    @pytest.mark.asyncio
+    async def test_failed_action_rolls_back(self, db_session, test_user_with_momentum, commits):
+        """Test that an error inside a unit of work discards every step of it"""
+        before = test_user_with_momentum.total_points
+        service = MomentumService(db_session)
+        with pytest.raises(RuntimeError):
+            async with service.unit_of_work():
+                await service.process_event(test_user_with_momentum.id, "task_completion")
+                raise RuntimeError("bonus failed")
+
+        assert commits == []
+        db_session.expire_all()
+        assert db_session.get(models.User, test_user_with_momentum.id).total_points == before
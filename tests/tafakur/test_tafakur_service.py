@@ -2,6 +2,7 @@ import pytest
 from datetime import date, datetime, timedelta
 import random
 
+from app.momentum import outbox
 from app.tafakur.services import TafakurService
 from app.models import Reflection, ReflectionTag
 from app.tafakur.schemas import ReflectionCreate, ReflectionUpdate, ReflectionStreak
@@ -16,12 +17,13 @@ class TestTafakurService:
         """Create a TafakurService instance"""
         return TafakurService(db_session)
     
-    def test_get_reflection_by_date(self, tafakur_service, user_with_reflection):
+    @pytest.mark.asyncio
+    async def test_get_reflection_by_date(self, tafakur_service, user_with_reflection):
         """Test retrieving a reflection by date"""
         user, reflection = user_with_reflection
         
         # Get the reflection using the service
-        result = tafakur_service.get_reflection_by_date(user.id, date.today())
+        result = await tafakur_service.get_reflection_by_date(user.id, date.today())
         
         # Verify we got the correct reflection
         assert result is not None
@@ -29,12 +31,13 @@ class TestTafakurService:
         assert result.reflection_date == date.today()
         assert result.user_id == user.id
     
-    def test_get_reflection_by_id(self, tafakur_service, user_with_reflection):
+    @pytest.mark.asyncio
+    async def test_get_reflection_by_id(self, tafakur_service, user_with_reflection):
         """Test retrieving a reflection by ID"""
         user, reflection = user_with_reflection
         
         # Get the reflection using the service
-        result = tafakur_service.get_reflection(user.id, reflection.id)
+        result = await tafakur_service.get_reflection(user.id, reflection.id)
         
         # Verify we got the correct reflection
         assert result is not None
@@ -42,8 +45,9 @@ class TestTafakurService:
         assert result.mood == reflection.mood
         assert result.highlights == reflection.highlights
     
+    @pytest.mark.asyncio
     @pytest.mark.model
-    def test_get_reflections_with_date_filtering(self, db_session, tafakur_service, test_user_with_momentum):
+    async def test_get_reflections_with_date_filtering(self, db_session, tafakur_service, test_user_with_momentum):
         """Test retrieving reflections with date filtering"""
         # Create reflections for different dates
         today = date.today()
@@ -77,21 +81,21 @@ class TestTafakurService:
         db_session.commit()
         
         # Test filtering by from_date
-        result = tafakur_service.get_reflections(
+        result = await tafakur_service.get_reflections(
             user_id=test_user_with_momentum.id,
             from_date=yesterday
         )
         assert len(result) == 2  # Today and yesterday
         
         # Test filtering by to_date
-        result = tafakur_service.get_reflections(
+        result = await tafakur_service.get_reflections(
             user_id=test_user_with_momentum.id,
             to_date=yesterday
         )
         assert len(result) == 2  # Yesterday and last week
         
         # Test filtering by from_date and to_date
-        result = tafakur_service.get_reflections(
+        result = await tafakur_service.get_reflections(
             user_id=test_user_with_momentum.id,
             from_date=yesterday,
             to_date=yesterday
@@ -129,7 +133,8 @@ class TestTafakurService:
         assert "productivity" in tag_names
         assert "focus" in tag_names
     
-    def test_update_reflection(self, db_session, tafakur_service, user_with_reflection):
+    @pytest.mark.asyncio
+    async def test_update_reflection(self, db_session, tafakur_service, user_with_reflection):
         """Test updating a reflection"""
         user, reflection = user_with_reflection
         
@@ -141,7 +146,7 @@ class TestTafakurService:
         )
         
         # Update the reflection
-        result = tafakur_service.update_reflection(user.id, reflection.id, update_data)
+        result = await tafakur_service.update_reflection(user.id, reflection.id, update_data)
         
         # Verify the reflection was updated correctly
         assert result is not None
@@ -157,12 +162,13 @@ class TestTafakurService:
         tag_names = [tag.tag_name for tag in result.tags]
         assert "health" in tag_names
     
-    def test_delete_reflection(self, db_session, tafakur_service, user_with_reflection):
+    @pytest.mark.asyncio
+    async def test_delete_reflection(self, db_session, tafakur_service, user_with_reflection):
         """Test deleting a reflection"""
         user, reflection = user_with_reflection
         
         # Delete the reflection
-        result = tafakur_service.delete_reflection(user.id, reflection.id)
+        result = await tafakur_service.delete_reflection(user.id, reflection.id)
         
         # Verify deletion was successful
         assert result is True
@@ -179,8 +185,9 @@ class TestTafakurService:
         ).all()
         assert len(tags) == 0
     
+    @pytest.mark.asyncio
     @pytest.mark.model
-    def test_get_reflection_streak(self, db_session, tafakur_service, test_user_with_momentum):
+    async def test_get_reflection_streak(self, db_session, tafakur_service, test_user_with_momentum):
         """Test getting reflection streak information"""
         # Create reflections for consecutive days
         today = date.today()
@@ -211,15 +218,16 @@ class TestTafakurService:
         db_session.commit()
         
         # Get streak
-        streak = tafakur_service.get_reflection_streak(test_user_with_momentum.id)
+        streak = await tafakur_service.get_reflection_streak(test_user_with_momentum.id)
         
         # Verify streak information
         assert streak.current_streak == 3
         assert streak.longest_streak == 3
         assert streak.last_reflection_date == today
     
+    @pytest.mark.asyncio
     @pytest.mark.model
-    def test_streak_broken(self, db_session, tafakur_service, test_user_with_momentum):
+    async def test_streak_broken(self, db_session, tafakur_service, test_user_with_momentum):
         """Test streak calculation when streak is broken"""
         # Create reflections with a gap
         today = date.today()
@@ -250,14 +258,15 @@ class TestTafakurService:
         db_session.commit()
         
         # Get streak
-        streak = tafakur_service.get_reflection_streak(test_user_with_momentum.id)
+        streak = await tafakur_service.get_reflection_streak(test_user_with_momentum.id)
         
         # Verify streak information
         assert streak.current_streak == 1  # Only today counts
         assert streak.longest_streak == 2  # Three and four days ago were consecutive
         assert streak.last_reflection_date == today
     
-    def test_get_insights(self, db_session, tafakur_service, test_user_with_momentum):
+    @pytest.mark.asyncio
+    async def test_get_insights(self, db_session, tafakur_service, test_user_with_momentum):
         """Test getting insights from reflections"""
         # Create several reflections with different moods and tags
         today = date.today()
@@ -305,7 +314,7 @@ class TestTafakurService:
         
         # Get insights for the last 7 days
         from_date = today - timedelta(days=6)
-        insights = tafakur_service.get_insights(
+        insights = await tafakur_service.get_insights(
             test_user_with_momentum.id,
             from_date=from_date
         )
@@ -337,6 +346,9 @@ class TestTafakurService:
         # Create the reflection
         await tafakur_service.create_reflection(test_user_with_momentum.id, reflection_data)
         
+        # The points are applied by the momentum outbox worker
+        await outbox.drain(db_session)
+        
         # Get updated user
         db_session.refresh(test_user_with_momentum)
         
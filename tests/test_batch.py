@@ -0,0 +1,184 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+from fastapi import status
+
+from app.models import PointsLedgerEntry, Task, TimeSlot, User
+from app.momentum import outbox
+from app.momentum.services import MomentumService
+from app.query_audit import capture_statements
+
+@pytest.fixture
+def achievement_checks(monkeypatch):
+    """Count MomentumService.check_achievements calls"""
+    calls = []
+    original = MomentumService.check_achievements
+
+    async def counting(self, user_id, event_types=None):
+        calls.append(user_id)
+        return await original(self, user_id, event_types)
+
+    monkeypatch.setattr(MomentumService, "check_achievements", counting)
+    return calls
+
+def _ledger(db_session, user_id):
+    return db_session.query(PointsLedgerEntry).filter(PointsLedgerEntry.user_id == user_id)\
+        .order_by(PointsLedgerEntry.id).all()
+
+@pytest.mark.api
+class TestBatchEndpoints:
+    """Tests for the task and time slot batch endpoints"""
+
+    def test_task_batch(self, authenticated_client, db_session, test_user_with_momentum, achievement_checks):
+        """Test that a task batch applies every operation and evaluates momentum once"""
+        user_id = test_user_with_momentum.id
+        done = Task(title="Done", owner_id=user_id, completed=True)
+        todo = [Task(title=f"Todo {i}", owner_id=user_id) for i in range(3)]
+        db_session.add_all([done, *todo])
+        test_user_with_momentum.total_points = test_user_with_momentum.weekly_points = test_user_with_momentum.monthly_points = 100
+        db_session.commit()
+
+        response = authenticated_client.post("/api/tasks/batch", json={
+            "create": [{"title": "New 1"}, {"title": "New 2"}],
+            "update": [{"id": todo[0].id, "title": "Renamed"}],
+            "complete": [todo[0].id, todo[1].id],
+            "delete": [done.id, todo[2].id]
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [task["title"] for task in data["created"]] == ["New 1", "New 2"]
+        assert sorted(data["deleted"]) == sorted([done.id, todo[2].id])
+        # Momentum is applied from the outbox, evaluated once for the batch
+        assert achievement_checks == []
+        asyncio.run(outbox.drain(db_session))
+        assert achievement_checks == [user_id]
+
+        db_session.expire_all()
+        titles = {task.title: task.completed for task in db_session.query(Task).filter(Task.owner_id == user_id)}
+        assert titles == {"Renamed": True, "Todo 1": True, "New 1": False, "New 2": False}
+        rows = _ledger(db_session, user_id)
+        assert [row.points < 0 for row in rows if row.event_type == "task_completion"].count(True) == 1
+        assert db_session.get(User, user_id).total_points == 100 + sum(row.points for row in rows)
+
+    def test_time_slot_batch(self, authenticated_client, db_session, test_user_with_momentum, achievement_checks):
+        """Test that completing many time slots in a batch evaluates momentum once"""
+        start = datetime(2024, 3, 1, 9, 0)
+        response = authenticated_client.post("/api/time_slots/batch", json={
+            "create": [
+                {"start_time": (start + timedelta(hours=i)).isoformat(), "end_time": (start + timedelta(hours=i, minutes=50)).isoformat()}
+                for i in range(4)
+            ]
+        })
+        assert response.status_code == status.HTTP_200_OK
+        slot_ids = [slot["id"] for slot in response.json()["created"]]
+        assert achievement_checks == []
+
+        response = authenticated_client.post("/api/time_slots/batch", json={
+            "complete": slot_ids[:3],
+            "update": [{"id": slot_ids[3], "description": "Planned"}]
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [slot["status"] for slot in data["updated"]] == ["completed"] * 3 + ["not_started"]
+        asyncio.run(outbox.drain(db_session))
+        assert achievement_checks == [test_user_with_momentum.id]
+        # Three time_slot_completion events at 7 points each, plus bonuses
+        completions = [row for row in _ledger(db_session, test_user_with_momentum.id) if row.event_type == "time_slot_completion"]
+        assert sorted(row.source_id for row in completions) == sorted(slot_ids[:3])
+        assert sum(row.points for row in completions) >= 3 * 7
+
+    def test_batch_is_all_or_nothing(self, authenticated_client, db_session, test_user_with_momentum, additional_users):
+        """Test that a batch touching another user's row applies nothing"""
+        other = TimeSlot(owner_id=additional_users[0].id, start_time=datetime(2024, 3, 1, 9), end_time=datetime(2024, 3, 1, 10))
+        db_session.add(other)
+        db_session.commit()
+
+        response = authenticated_client.post("/api/time_slots/batch", json={
+            "create": [{"start_time": "2024-03-02T09:00:00", "end_time": "2024-03-02T10:00:00"}],
+            "delete": [other.id]
+        })
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert db_session.query(TimeSlot).filter(TimeSlot.owner_id == test_user_with_momentum.id).count() == 0
+        assert db_session.get(TimeSlot, other.id) is not None
+
+    def test_batch_delete_after_single_completion(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that a batch delete reverts a completion still waiting in the outbox, after it is awarded"""
+        user_id = test_user_with_momentum.id
+        task = Task(title="Single", owner_id=user_id)
+        db_session.add(task)
+        db_session.commit()
+        before = test_user_with_momentum.total_points
+
+        response = authenticated_client.patch(f"/api/tasks/{task.id}", json={"completed": True})
+        assert response.status_code == status.HTTP_200_OK
+        response = authenticated_client.post("/api/tasks/batch", json={"delete": [task.id]})
+        assert response.status_code == status.HTTP_200_OK
+        asyncio.run(outbox.drain(db_session))
+
+        db_session.expire_all()
+        award, revert = [row for row in _ledger(db_session, user_id) if row.event_type == "task_completion"]
+        assert (award.source_id, revert.reverts_id, revert.points) == (task.id, award.id, -award.points)
+        # Bonuses (first task of the day, weekend) are not taken back by a delete
+        bonuses = sum(row.points for row in _ledger(db_session, user_id) if row.event_type != "task_completion")
+        assert db_session.get(User, user_id).total_points == before + bonuses
+
+    def test_batch_bonuses_name_their_source(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that early bird and first task bonuses of a batch name the slot or task they are for"""
+        user_id = test_user_with_momentum.id
+        # A timezone where it is early morning now, so each completed slot earns early_bird
+        test_user_with_momentum.timezone = next(
+            name for name in pytz.common_timezones
+            if 5 <= datetime.now(pytz.timezone(name)).hour < 9
+        )
+        slots = [TimeSlot(owner_id=user_id, start_time=datetime(2024, 3, 1, 9 + i), end_time=datetime(2024, 3, 1, 10 + i)) for i in range(2)]
+        task = Task(title="First", owner_id=user_id)
+        db_session.add_all([*slots, task])
+        db_session.commit()
+
+        assert authenticated_client.post("/api/time_slots/batch", json={"complete": [slot.id for slot in slots]}).status_code == 200
+        assert authenticated_client.post("/api/tasks/batch", json={"complete": [task.id]}).status_code == 200
+        asyncio.run(outbox.drain(db_session))
+
+        sources = {(row.event_type, row.source_type, row.source_id) for row in _ledger(db_session, user_id)}
+        assert {("early_bird", "time_slot", slot.id) for slot in slots} <= sources
+        assert ("first_task_of_day", "task", task.id) in sources
+
+    def test_first_task_of_day_is_awarded_once(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that two completions applied by one drain, and one more after it, earn one first task bonus"""
+        user_id = test_user_with_momentum.id
+        tasks = [Task(title=f"Task {i}", owner_id=user_id) for i in range(4)]
+        db_session.add_all(tasks)
+        db_session.commit()
+
+        for task in tasks[:2]:
+            assert authenticated_client.patch(f"/api/tasks/{task.id}", json={"completed": True}).status_code == 200
+        asyncio.run(outbox.drain(db_session))
+        assert authenticated_client.post("/api/tasks/batch", json={"complete": [task.id for task in tasks[2:]]}).status_code == 200
+        asyncio.run(outbox.drain(db_session))
+
+        rows = _ledger(db_session, user_id)
+        assert [row.source_id for row in rows if row.event_type == "first_task_of_day"] == [tasks[0].id]
+        assert len([row for row in rows if row.event_type == "task_completion"]) == 4
+
+    def test_batch_reads_the_user_once(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that applying a batch of awards and reverts loads the user once"""
+        user_id = test_user_with_momentum.id
+        tasks = [Task(title=f"Task {i}", owner_id=user_id, completed=i == 0) for i in range(4)]
+        db_session.add_all(tasks)
+        db_session.commit()
+        response = authenticated_client.post("/api/tasks/batch", json={
+            "complete": [task.id for task in tasks[1:]],
+            "delete": [tasks[0].id]
+        })
+        assert response.status_code == status.HTTP_200_OK
+
+        db_session.expire_all()
+        with capture_statements(db_session.get_bind()) as captured:
+            asyncio.run(outbox.drain(db_session))
+
+        assert len([statement for statement, _ in captured if " FROM users" in statement]) == 1
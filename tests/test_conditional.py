@@ -0,0 +1,77 @@
+import pytest
+from fastapi import status
+from starlette.requests import Request
+
+from app.conditional import data_version_etag
+from app.models import Goal, GoalStep, Task, User
+
+@pytest.mark.api
+class TestConditionalGet:
+    """Tests for ETag / If-None-Match on per-user read endpoints"""
+
+    @pytest.mark.parametrize("url", [
+        "/api/tasks/",
+        "/api/time_slots/",
+        "/api/momentum/streaks",
+        "/api/momentum/progress",
+    ])
+    def test_unchanged_data_is_not_modified(self, authenticated_client, url):
+        """Test that repeating a request with its ETag returns an empty 304 without querying the data"""
+        response = authenticated_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        etag = response.headers["ETag"]
+        assert response.headers["Cache-Control"] == "private, no-cache"
+
+        response = authenticated_client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+        # Only the current-user lookup ran
+        assert response.headers["X-DB-Queries"] == "1"
+
+    def test_write_changes_etag(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that writing one of the user's rows invalidates the ETag"""
+        etag = authenticated_client.get("/api/tasks/").headers["ETag"]
+
+        db_session.add(Task(title="New task", owner_id=test_user_with_momentum.id))
+        db_session.commit()
+
+        response = authenticated_client.get("/api/tasks/", headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+        assert [task["title"] for task in response.json()] == ["New task"]
+
+    def test_query_string_is_part_of_etag(self, authenticated_client):
+        """Test that different filters of the same list have different ETags"""
+        first = authenticated_client.get("/api/time_slots/").headers["ETag"]
+        second = authenticated_client.get("/api/time_slots/", params={"date": "2024-03-01"}).headers["ETag"]
+        assert first != second
+
+    def test_etag_follows_the_users_local_date(self):
+        """Test that the ETag changes with the user's local date, not the server's"""
+        request = Request({"type": "http", "method": "GET", "path": "/api/momentum/streaks", "query_string": b"", "headers": []})
+        # UTC+14 and UTC-11 are always on different dates
+        etags = [
+            data_version_etag(request, User(id=1, data_version=5, timezone=timezone_name))
+            for timezone_name in ["Pacific/Kiritimati", "Pacific/Pago_Pago"]
+        ]
+        assert etags[0] != etags[1]
+
+    def test_stats_are_not_conditional(self, authenticated_client):
+        """Test that stats, whose leaderboard position depends on other users, are never answered with 304"""
+        response = authenticated_client.get("/api/momentum/stats")
+        assert response.status_code == status.HTTP_200_OK
+        assert "ETag" not in response.headers
+
+    def test_child_rows_advance_owner_version(self, db_session, test_user_with_momentum):
+        """Test that rows owned through a parent row advance the owner's version"""
+        goal = Goal(title="Goal", owner_id=test_user_with_momentum.id)
+        db_session.add(goal)
+        db_session.commit()
+        before = db_session.get(User, test_user_with_momentum.id).data_version
+
+        db_session.add(GoalStep(title="Step", goal_id=goal.id))
+        db_session.commit()
+
+        assert db_session.get(User, test_user_with_momentum.id).data_version == before + 1
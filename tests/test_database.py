@@ -0,0 +1,171 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app import database, models
+from app.auth.services import create_access_token
+from app.database import (
+    Base, create_async_read_engine, create_async_write_engine, create_read_engine, create_write_engine,
+    install_sqlite_pragmas, sqlite_pragmas
+)
+from app.main import app
+from app.momentum.init_momentum import init_user_momentum
+
+@pytest.fixture
+def real_database(tmp_path, monkeypatch):
+    """
+    The session factories of app.database bound to engines on a temporary
+    database file, built the way app.database builds its own
+    """
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    async_url = f"sqlite+aiosqlite:///{tmp_path / 'app.db'}"
+    writer, reader = create_write_engine(url), create_read_engine(url)
+    async_writer, async_reader = create_async_write_engine(async_url), create_async_read_engine(async_url)
+    Base.metadata.create_all(bind=writer)
+    for factory, engine in [
+        (database.SessionLocal, writer),
+        (database.ReadSessionLocal, reader),
+        (database.AsyncSessionLocal, async_writer),
+        (database.AsyncReadSessionLocal, async_reader),
+    ]:
+        monkeypatch.setitem(factory.kw, "bind", engine)
+    yield writer
+    for engine in (writer, reader):
+        engine.dispose()
+    for engine in (async_writer, async_reader):
+        asyncio.run(engine.dispose())
+
+@pytest.fixture
+def real_client(real_database):
+    """A client signed in as a user of ``real_database``, with no dependency overrides"""
+    with real_database.begin() as conn:
+        conn.execute(models.User.__table__.insert().values(
+            id=1, email="real@example.com", username="real", hashed_password="", is_active=True
+        ))
+    app.dependency_overrides.clear()
+    with TestClient(app, headers={"Authorization": f"Bearer {create_access_token({'sub': 'real@example.com'})}"}) as client:
+        yield client
+
+@pytest.mark.model
+class TestSqliteProfile:
+    """Tests for the tuned SQLite profile and the read-only pool"""
+
+    @pytest.fixture
+    def engines(self, tmp_path):
+        url = f"sqlite:///{tmp_path / 'profile.db'}"
+        writer = create_engine(url, connect_args={"check_same_thread": False})
+        install_sqlite_pragmas(writer, sqlite_pragmas())
+        reader = create_engine(url, connect_args={"check_same_thread": False})
+        install_sqlite_pragmas(reader, sqlite_pragmas(read_only=True))
+        with writer.begin() as conn:
+            conn.execute(text("CREATE TABLE points (id INTEGER PRIMARY KEY, value INTEGER)"))
+            conn.execute(text("INSERT INTO points (id, value) VALUES (1, 10)"))
+        yield writer, reader
+        reader.dispose()
+        writer.dispose()
+
+    def test_writer_uses_wal(self, engines):
+        """Test that the writer connection runs with the configured journal mode"""
+        writer, _ = engines
+        with writer.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == "wal"
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+    def test_reader_is_query_only(self, engines):
+        """Test that read-only sessions reject writes"""
+        _, reader = engines
+        with reader.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("UPDATE points SET value = 0"))
+
+    def test_reads_do_not_wait_for_writer(self, engines):
+        """Test that a reader sees the last committed snapshot during an open write"""
+        writer, reader = engines
+        with writer.connect() as write_conn:
+            write_conn.execute(text("BEGIN IMMEDIATE"))
+            write_conn.execute(text("UPDATE points SET value = 20 WHERE id = 1"))
+
+            with reader.connect() as read_conn:
+                assert read_conn.execute(text("SELECT value FROM points WHERE id = 1")).scalar() == 10
+
+            write_conn.execute(text("COMMIT"))
+
+        with reader.connect() as read_conn:
+            assert read_conn.execute(text("SELECT value FROM points WHERE id = 1")).scalar() == 20
+
+@pytest.mark.api
+class TestReadPool:
+    """Tests for the GET routes on the real read-only pool of app.database"""
+
+    @pytest.fixture
+    def read_client(self, real_client):
+        """The signed-in client of ``real_client``, with its user's momentum initialized"""
+        with database.SessionLocal() as db:
+            asyncio.run(init_user_momentum(db, 1))
+        return real_client
+
+    def test_read_session_rejects_writes(self, real_client):
+        """Test that a session of the read pool cannot write"""
+        with database.ReadSessionLocal() as db:
+            with pytest.raises(OperationalError, match="readonly"):
+                db.execute(text("UPDATE users SET total_points = 0 WHERE id = 1"))
+
+    def test_async_read_session_rejects_writes(self, real_client):
+        """Test that a session of the async read pool cannot write"""
+        async def write():
+            async with database.AsyncReadSessionLocal() as db:
+                await db.execute(text("UPDATE users SET total_points = 0 WHERE id = 1"))
+
+        with pytest.raises(OperationalError, match="readonly"):
+            asyncio.run(write())
+
+    @pytest.mark.parametrize("url", [
+        "/api/tasks/",
+        "/api/goals/",
+        "/api/time_slots/",
+        "/api/momentum/progress",
+        "/api/momentum/leaderboard",
+        "/api/momentum/stats",
+        "/api/momentum/streaks",
+        "/api/momentum/levels",
+        "/api/tafakur/reflections",
+        "/api/tafakur/streak",
+        "/analytics/overview",
+    ])
+    def test_get_routes_work_on_the_read_pool(self, read_client, url):
+        """Test that the GET routes moved to the read pool answer from it"""
+        response = read_client.get(url)
+        assert response.status_code == 200, response.text
+
+@pytest.mark.api
+class TestRealSessions:
+    """Tests for routes running on the real sync and async session dependencies"""
+
+    SLOT = {"start_time": "2024-03-01T09:00:00", "end_time": "2024-03-01T10:00:00", "description": "Written"}
+
+    def test_sync_routes(self, real_client):
+        """Test that a route on get_db writes and a route on get_read_db reads it back"""
+        response = real_client.post("/api/time_slots/", json=self.SLOT)
+        assert response.status_code == 200, response.text
+
+        response = real_client.get("/api/time_slots/")
+        assert response.status_code == 200, response.text
+        assert [slot["description"] for slot in response.json()] == ["Written"]
+
+    def test_async_routes(self, real_client, real_database):
+        """Test that routes on get_async_db write, with their outbox events, and routes on get_async_read_db read"""
+        slot_id = real_client.post("/api/time_slots/", json=self.SLOT).json()["id"]
+
+        response = real_client.patch(f"/api/time_slots/{slot_id}", json={"status": "completed"})
+        assert response.status_code == 200, response.text
+        assert response.json()["status"] == "completed"
+        with real_database.connect() as conn:
+            pending = conn.execute(text("SELECT event_type FROM momentum_events WHERE status = 'pending'")).scalars().all()
+        assert "time_slot_completion" in pending
+
+        for url in ("/api/momentum/leaderboard", "/api/momentum/streaks", "/api/tafakur/reflections"):
+            response = real_client.get(url)
+            assert response.status_code == 200, f"{url}: {response.text}"
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+from fastapi import status
+
+from app import metrics
+from app.metrics import MetricsMiddleware, MetricsRegistry, collect, render
+
+@pytest.mark.api
+class TestMetrics:
+    """Tests for the Prometheus metrics subsystem"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that observations land in the right buckets and render cumulatively"""
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        registry.observe("GET", "/api/tasks/", 200, 0.05, False)
+        registry.observe("GET", "/api/tasks/", 200, 0.5, False)
+        registry.observe("GET", "/api/tasks/", 500, 2.0, True)
+
+        body = render(collect(registry.snapshot()))
+
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/api/tasks/",le="0.1"} 1' in body
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/api/tasks/",le="1.0"} 2' in body
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/api/tasks/",le="+Inf"} 3' in body
+        assert 'http_request_duration_seconds_count{method="GET",route="/api/tasks/"} 3' in body
+        assert 'http_requests_total{method="GET",route="/api/tasks/",status="500"} 1' in body
+        assert 'http_request_errors_total{method="GET",route="/api/tasks/"} 1' in body
+
+    def test_collect_merges_worker_snapshots(self, tmp_path):
+        """Test that counters of all workers are summed and gauges of dead workers dropped"""
+        registry = MetricsRegistry()
+        registry.observe("GET", "/api/momentum/progress", 200, 0.01, False)
+        registry.flush(str(tmp_path))
+
+        other = registry.snapshot()
+        # A pid that cannot exist, standing in for an exited worker
+        other["pid"] = 2 ** 22 + 1
+        other["in_flight"] = [["GET", "/api/momentum/progress", 3]]
+        with open(os.path.join(tmp_path, f"worker-{other['pid']}.json"), "w") as f:
+            json.dump(other, f)
+
+        merged = collect(registry.snapshot(), str(tmp_path))
+
+        assert merged["requests"][("GET", "/api/momentum/progress", "200")] == 2
+        assert ("GET", "/api/momentum/progress") not in merged["in_flight"]
+
+    def test_metrics_endpoint_uses_route_templates(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that /metrics reports requests under their route template"""
+        response = authenticated_client.delete("/api/time_slots/987654")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        response = authenticated_client.get("/metrics")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'route="/api/time_slots/{slot_id}"' in response.text
+        assert 'route="/api/time_slots/987654"' not in response.text
+        assert 'db_pool_checked_out{pool="write"}' in response.text
+
+    def test_middleware_writes_snapshots_off_the_event_loop(self, tmp_path, monkeypatch):
+        """Test that the middleware writes its snapshot in the threadpool, not on the event loop thread"""
+        writer_threads = []
+        write_snapshot = metrics.write_snapshot
+
+        def recording_write_snapshot(snapshot, directory):
+            writer_threads.append(threading.get_ident())
+            write_snapshot(snapshot, directory)
+
+        monkeypatch.setattr(metrics, "write_snapshot", recording_write_snapshot)
+
+        async def endpoint(scope, receive, send):
+            await send({"type": "http.response.start", "status": 204, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def noop(message):
+            pass
+
+        middleware = MetricsMiddleware(endpoint, MetricsRegistry(), directory=str(tmp_path), flush_interval=0)
+        asyncio.run(middleware({"type": "http", "method": "GET", "path": "/ping"}, None, noop))
+
+        assert writer_threads and writer_threads[0] != threading.get_ident()
+        with open(os.path.join(tmp_path, f"worker-{os.getpid()}.json")) as f:
+            assert json.load(f)["requests"] == [["GET", "unmatched", "204", 1]]
+        assert os.listdir(tmp_path) == [f"worker-{os.getpid()}.json"]
@@ -0,0 +1,273 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app.database import Base
+from app.migrations import KEYSET_INDEXES, MIGRATIONS, run_migrations
+from app.momentum.leaderboard import RANK_TREE_SIZE
+
+# Per-user hot queries from the services and the index each one should use
+HOT_QUERIES = [
+    (
+        "SELECT * FROM time_slots WHERE owner_id = 1 AND start_time >= '2024-01-01' AND start_time < '2024-01-02'",
+        "ix_time_slots_owner_start_time",
+    ),
+    (
+        "SELECT count(*) FROM time_slots WHERE owner_id = 1 AND status = 'completed'",
+        "ix_time_slots_owner_status",
+    ),
+    (
+        "SELECT count(*) FROM tasks WHERE owner_id = 1 AND completed = 1",
+        "ix_tasks_owner_completed",
+    ),
+    (
+        "SELECT * FROM reflections WHERE user_id = 1 AND reflection_date = '2024-01-01'",
+        "uq_reflections_user_reflection_date",
+    ),
+    (
+        "SELECT * FROM streaks WHERE user_id = 1 AND streak_type = 'daily_tasks'",
+        "uq_streaks_user_streak_type",
+    ),
+    (
+        "SELECT * FROM user_achievements WHERE user_id = 1 AND achievement_id = 3",
+        "uq_user_achievements_user_achievement",
+    ),
+    (
+        "SELECT * FROM tasks WHERE owner_id = 1 AND id > 20 ORDER BY id LIMIT 11",
+        "ix_tasks_owner_id",
+    ),
+    (
+        "SELECT * FROM goals WHERE owner_id = 1 AND id > 20 ORDER BY id LIMIT 11",
+        "ix_goals_owner_id",
+    ),
+    (
+        "SELECT * FROM time_slots WHERE owner_id = 1 AND (start_time, id) > ('2024-01-01', 7) "
+        "ORDER BY start_time, id LIMIT 11",
+        "ix_time_slots_owner_start_time",
+    ),
+]
+
+def _legacy_schema(engine):
+    """Create the schema as it was before the composite and keyset indexes"""
+    keyset_indexes = {index_name for index_name, _, _ in KEYSET_INDEXES}
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name.startswith(("uq_", "ix_")) and len(index.columns) > 1 or index.name in keyset_indexes:
+                    conn.execute(text(f"DROP INDEX {index.name}"))
+        conn.execute(text("CREATE INDEX ix_tasks_description ON tasks (description)"))
+        conn.execute(text("CREATE INDEX ix_time_slots_description ON time_slots (description)"))
+
+@pytest.mark.model
+class TestMigrations:
+    """Tests for the versioned migrations and the composite indexes"""
+
+    @pytest.fixture
+    def engine(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+        yield engine
+        engine.dispose()
+
+    def test_migrations_are_recorded_once(self, engine):
+        """Test that applied migrations are recorded and not re-run"""
+        Base.metadata.create_all(bind=engine)
+
+        applied = run_migrations(engine)
+        assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+        assert run_migrations(engine) == []
+
+        with engine.connect() as conn:
+            versions = conn.execute(text("SELECT version FROM schema_migrations")).scalars().all()
+        assert sorted(versions) == [m.version for m in MIGRATIONS]
+
+    def test_upgrades_legacy_schema(self, engine):
+        """Test that an existing database gets the composite indexes and loses the text ones"""
+        _legacy_schema(engine)
+        run_migrations(engine)
+
+        inspector = inspect(engine)
+        indexes = {
+            index["name"]: index
+            for table in ("tasks", "goals", "time_slots", "reflections", "streaks", "user_achievements")
+            for index in inspector.get_indexes(table)
+        }
+        assert "ix_tasks_description" not in indexes
+        assert "ix_time_slots_description" not in indexes
+        for _, index_name in HOT_QUERIES:
+            assert index_name in indexes
+        assert indexes["uq_streaks_user_streak_type"]["unique"]
+        assert indexes["uq_user_achievements_user_achievement"]["unique"]
+        assert indexes["uq_reflections_user_reflection_date"]["unique"]
+
+    def test_duplicate_rows_are_removed_before_unique_indexes(self, engine):
+        """Test that duplicate legacy rows are collapsed into the best one, so the uq_ indexes are UNIQUE"""
+        _legacy_schema(engine)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO user_achievements (id, user_id, achievement_id, progress, completed) "
+                "VALUES (1, 1, 3, 2, 0), (2, 1, 3, 5, 1), (3, 1, 3, 7, 0), (4, 1, 4, 1, 0)"
+            ))
+            conn.execute(text(
+                "INSERT INTO streaks (id, user_id, streak_type, current_count, longest_count, last_activity_date) "
+                "VALUES (1, 1, 'daily_tasks', 1, 9, '2024-03-01'), (2, 1, 'daily_tasks', 2, 2, '2024-03-04')"
+            ))
+            conn.execute(text(
+                "INSERT INTO reflections (id, user_id, reflection_date, updated_at) "
+                "VALUES (1, 1, '2024-03-04', '2024-03-04 08:00:00'), (2, 1, '2024-03-04', '2024-03-04 21:00:00')"
+            ))
+            conn.execute(text("INSERT INTO reflection_tags (reflection_id, tag_name) VALUES (1, 'kept')"))
+
+        run_migrations(engine)
+
+        inspector = inspect(engine)
+        for table, index_name in [
+            ("streaks", "uq_streaks_user_streak_type"),
+            ("user_achievements", "uq_user_achievements_user_achievement"),
+            ("reflections", "uq_reflections_user_reflection_date"),
+        ]:
+            assert {index["name"]: index for index in inspector.get_indexes(table)}[index_name]["unique"]
+        with engine.connect() as conn:
+            # The completed row wins over more progress
+            assert conn.execute(text("SELECT id FROM user_achievements ORDER BY id")).scalars().all() == [2, 4]
+            # The latest activity wins, keeping the longest streak seen
+            assert tuple(conn.execute(text("SELECT id, longest_count FROM streaks")).one()) == (2, 9)
+            assert conn.execute(text("SELECT id FROM reflections")).scalars().all() == [2]
+            assert conn.execute(text("SELECT reflection_id FROM reflection_tags")).scalars().all() == [2]
+
+    def test_plain_uq_indexes_are_made_unique(self, engine):
+        """Test that a database migrated with non-unique uq_ indexes gets them rebuilt as UNIQUE"""
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX uq_streaks_user_streak_type"))
+            conn.execute(text("CREATE INDEX uq_streaks_user_streak_type ON streaks (user_id, streak_type)"))
+            conn.execute(text(
+                "INSERT INTO streaks (user_id, streak_type, current_count, longest_count) "
+                "VALUES (1, 'daily_tasks', 0, 0), (1, 'daily_tasks', 2, 2)"
+            ))
+        run_migrations(engine)
+
+        indexes = {index["name"]: index for index in inspect(engine).get_indexes("streaks")}
+        assert indexes["uq_streaks_user_streak_type"]["unique"]
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT current_count FROM streaks")).scalars().all() == [2]
+
+    @pytest.mark.parametrize("query,index_name", HOT_QUERIES)
+    def test_query_plan_uses_composite_index(self, engine, query, index_name):
+        """Test that each per-user hot query is answered from its composite index"""
+        _legacy_schema(engine)
+        run_migrations(engine)
+
+        with engine.connect() as conn:
+            plan = " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {query}")))
+        assert plan.startswith("SEARCH")
+        assert f"INDEX {index_name}" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_adds_user_data_version(self, engine):
+        """Test that users created before data versions get the column, starting at 0"""
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE users DROP COLUMN data_version"))
+            conn.execute(text("INSERT INTO users (email, username) VALUES ('old@example.com', 'old')"))
+
+        run_migrations(engine)
+
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT data_version FROM users")).scalar_one() == 0
+
+    def test_builds_leaderboard(self, engine):
+        """Test that existing users get leaderboard entries"""
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE leaderboard_entries"))
+            conn.execute(text("DROP TABLE leaderboard_rank_nodes"))
+            conn.execute(text(
+                "INSERT INTO users (email, username, total_points, weekly_points, monthly_points) "
+                "VALUES ('old@example.com', 'old', 120, 20, 60)"
+            ))
+
+        run_migrations(engine)
+
+        with engine.connect() as conn:
+            row = conn.execute(text(
+                "SELECT username, level, weekly_points, monthly_points, total_points FROM leaderboard_entries"
+            )).one()
+            assert tuple(row) == ("old", 1, 20, 60, 120)
+            total = conn.execute(text(
+                "SELECT count FROM leaderboard_rank_nodes WHERE board = 'weekly' AND node = :root"
+            ), {"root": RANK_TREE_SIZE}).scalar_one()
+        assert total == 1
+
+    def test_builds_user_stats(self, engine):
+        """Test that existing activity is counted into user_stats"""
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE user_stats"))
+            conn.execute(text("INSERT INTO users (id, email, username) VALUES (1, 'old@example.com', 'old')"))
+            conn.execute(text(
+                "INSERT INTO tasks (owner_id, completed, time_spent) VALUES (1, 1, 1.5), (1, 1, 2.0), (1, 0, 4.0)"
+            ))
+            conn.execute(text(
+                "INSERT INTO reflections (user_id, reflection_date, gratitude, lessons) "
+                "VALUES (1, '2024-01-01', 'Good friends', 'Rest more'), (1, '2024-01-02', NULL, 'Plan ahead today')"
+            ))
+
+        run_migrations(engine)
+
+        with engine.connect() as conn:
+            row = conn.execute(text(
+                "SELECT completed_tasks, completed_task_hours, reflections, gratitude_entries, words_written "
+                "FROM user_stats WHERE user_id = 1"
+            )).one()
+        assert tuple(row) == (2, 3.5, 2, 1, 7)
+
+    def test_seeds_completion_hours(self, engine):
+        """Test that completed tasks and time slots are counted in the user's local hour"""
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE completion_hours"))
+            conn.execute(text(
+                "INSERT INTO users (id, email, username, timezone) VALUES (1, 'old@example.com', 'old', 'Asia/Kolkata')"
+            ))
+            conn.execute(text(
+                "INSERT INTO tasks (owner_id, completed, created_at) "
+                "VALUES (1, 1, '2024-03-04 02:00:00'), (1, 1, '2024-03-04 02:10:00'), (1, 0, '2024-03-04 02:00:00')"
+            ))
+            conn.execute(text(
+                "INSERT INTO time_slots (owner_id, status, start_time, end_time) "
+                "VALUES (1, 'completed', '2024-03-03 19:00:00', '2024-03-03 20:00:00')"
+            ))
+
+        run_migrations(engine)
+
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT kind, weekday, hour, count FROM completion_hours ORDER BY kind")).all()
+        # 02:00 UTC is 07:30 in Kolkata; 20:00 UTC on Sunday is 01:30 on Monday
+        assert [tuple(row) for row in rows] == [("task", 0, 7, 2), ("time_slot", 0, 1, 1)]
+
+    def test_opens_points_ledger(self, engine):
+        """Test that users with points get an opening balance and their current periods"""
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE points_ledger"))
+            conn.execute(text("ALTER TABLE users DROP COLUMN weekly_points_start"))
+            conn.execute(text("ALTER TABLE users DROP COLUMN monthly_points_start"))
+            conn.execute(text(
+                "INSERT INTO users (id, email, username, total_points, weekly_points, monthly_points) "
+                "VALUES (1, 'old@example.com', 'old', 120, 20, 60), (2, 'new@example.com', 'new', 0, 0, 0)"
+            ))
+
+        run_migrations(engine)
+
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT user_id, event_type, points FROM points_ledger")).all()
+            starts = conn.execute(text(
+                "SELECT weekly_points_start IS NOT NULL, monthly_points_start IS NOT NULL FROM users"
+            )).all()
+            plan = " ".join(str(row[-1]) for row in conn.execute(text(
+                "EXPLAIN QUERY PLAN SELECT sum(points) FROM points_ledger "
+                "WHERE user_id = 1 AND awarded_at >= '2024-01-01'"
+            )))
+        assert [tuple(row) for row in rows] == [(1, "opening_balance", 120)]
+        assert [tuple(row) for row in starts] == [(1, 1), (1, 1)]
+        assert "COVERING INDEX ix_points_ledger_user_awarded_at" in plan
@@ -0,0 +1,88 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import status
+
+from app.models import Goal, Reflection, Task, TimeSlot
+from app.pagination import NEXT_CURSOR_HEADER
+
+def _walk(client, url, limit):
+    """Follow X-Next-Cursor from the first page to the last, returning all pages"""
+    pages = []
+    response = client.get(url, params={"limit": limit})
+    while True:
+        assert response.status_code == status.HTTP_200_OK
+        pages.append(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+        response = client.get(url, params={"limit": limit, "cursor": cursor})
+
+@pytest.mark.api
+class TestPagination:
+    """Tests for keyset pagination of the list endpoints"""
+
+    def test_tasks_and_goals_pages(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that tasks and goals page in id order without gaps or repeats"""
+        user_id = test_user_with_momentum.id
+        db_session.add_all([Task(title=f"Task {i}", owner_id=user_id) for i in range(7)])
+        db_session.add_all([Goal(title=f"Goal {i}", owner_id=user_id) for i in range(5)])
+        db_session.commit()
+
+        for url, sizes in (("/api/tasks/", [3, 3, 1]), ("/api/goals/", [3, 2])):
+            response = authenticated_client.get(url)
+            assert NEXT_CURSOR_HEADER not in response.headers
+
+            pages = _walk(authenticated_client, url, limit=3)
+
+            assert [len(page) for page in pages] == sizes
+            ids = [item["id"] for page in pages for item in page]
+            assert ids == sorted(item["id"] for item in response.json())
+
+    def test_time_slots_pages_by_start_time(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that time slots page by (start_time, id), including slots with equal start times"""
+        start = datetime(2024, 3, 1, 9, 0)
+        db_session.add_all([
+            TimeSlot(
+                owner_id=test_user_with_momentum.id,
+                date=start.date(),
+                start_time=start + timedelta(hours=i // 2),
+                end_time=start + timedelta(hours=i // 2, minutes=30),
+                description=f"Slot {i}"
+            )
+            for i in range(6)
+        ])
+        db_session.commit()
+
+        pages = _walk(authenticated_client, "/api/time_slots/", limit=4)
+
+        assert [len(page) for page in pages] == [4, 2]
+        keys = [(slot["start_time"], slot["id"]) for page in pages for slot in page]
+        assert keys == sorted(keys)
+        assert len(set(keys)) == 6
+
+    def test_reflections_pages_newest_first(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that reflections page from the newest date backwards"""
+        today = date.today()
+        db_session.add_all([
+            Reflection(user_id=test_user_with_momentum.id, reflection_date=today - timedelta(days=i), mood="Good")
+            for i in range(5)
+        ])
+        db_session.commit()
+
+        pages = _walk(authenticated_client, "/api/tafakur/reflections", limit=2)
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        dates = [reflection["reflection_date"] for page in pages for reflection in page]
+        assert dates == [(today - timedelta(days=i)).isoformat() for i in range(5)]
+
+    def test_invalid_cursor(self, authenticated_client):
+        """Test that a malformed cursor is rejected"""
+        response = authenticated_client.get("/api/tasks/", params={"cursor": "not-a-cursor"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.parametrize("limit", [0, -1, 501])
+    def test_out_of_range_limit(self, authenticated_client, limit):
+        """Test that a page size outside 1..MAX_PAGE_SIZE is rejected, not a server error"""
+        response = authenticated_client.get("/api/tafakur/reflections", params={"limit": limit})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
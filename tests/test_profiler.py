@@ -0,0 +1,62 @@
+import time
+
+import pytest
+from fastapi import status
+
+from app.auth.services import create_access_token
+from app.config import settings
+from app.profiler import SamplingProfiler
+
+def _spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+@pytest.mark.api
+class TestProfiler:
+    """Tests for the on-demand request profiler"""
+
+    @pytest.fixture
+    def admin_settings(self, monkeypatch, tmp_path, test_user_with_momentum):
+        monkeypatch.setattr(settings, "ADMIN_EMAILS", [test_user_with_momentum.email])
+        monkeypatch.setattr(settings, "PROFILER_DIR", str(tmp_path))
+        return tmp_path
+
+    def test_sampling_profiler_collapses_stacks(self):
+        """Test that busy frames end up in the collapsed output"""
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        _spin(0.1)
+        profiler.stop()
+
+        lines = profiler.collapsed().splitlines()
+        assert any("_spin (test_profiler.py" in line for line in lines)
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    def test_admin_request_is_profiled(self, authenticated_client, test_user_with_momentum, admin_settings):
+        """Test that an admin's X-Profile request stores a profile that admins can download"""
+        token = create_access_token({"sub": test_user_with_momentum.email})
+        response = authenticated_client.get(
+            "/api/momentum/progress",
+            headers={"X-Profile": "1", "Authorization": f"Bearer {token}"}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        profile_id = response.headers["X-Profile-Id"]
+        assert (admin_settings / f"{profile_id}.collapsed").exists()
+
+        response = authenticated_client.get(f"/admin/profiles/{profile_id}")
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_non_admin_request_is_not_profiled(self, authenticated_client, test_user_with_momentum, monkeypatch):
+        """Test that the header is ignored for users who are not admins"""
+        monkeypatch.setattr(settings, "ADMIN_EMAILS", [])
+        token = create_access_token({"sub": test_user_with_momentum.email})
+        response = authenticated_client.get(
+            "/api/momentum/progress",
+            headers={"X-Profile": "1", "Authorization": f"Bearer {token}"}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert "X-Profile-Id" not in response.headers
+        assert authenticated_client.get("/admin/profiles/anything").status_code == status.HTTP_403_FORBIDDEN
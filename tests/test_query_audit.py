@@ -0,0 +1,57 @@
+import pytest
+
+from app.query_audit import flag_plan, format_report, run_audit
+
+@pytest.mark.model
+class TestQueryAudit:
+    """Tests for the service query-plan audit"""
+
+    def test_flags_full_scan_and_temp_btree(self):
+        """Test that unindexed scans and sorts are flagged"""
+        flags = flag_plan(
+            "SELECT users.id FROM users ORDER BY users.weekly_points DESC LIMIT ?",
+            ["SCAN users", "USE TEMP B-TREE FOR ORDER BY"],
+        )
+        assert flags == ["full-scan users", "temp-btree"]
+
+    def test_covering_index_is_not_flagged(self):
+        """Test that searches and covering scans pass"""
+        assert flag_plan(
+            "SELECT count(*) AS count_1 FROM tasks WHERE tasks.owner_id = ? AND tasks.completed = 1",
+            ["SEARCH tasks USING COVERING INDEX ix_tasks_owner_completed (owner_id=? AND completed=?)"],
+        ) == []
+
+    def test_flags_non_covering_aggregate(self):
+        """Test that aggregates reading table rows are flagged"""
+        assert flag_plan(
+            "SELECT sum(time_slots.report_minutes) AS sum_1 FROM time_slots WHERE time_slots.owner_id = ?",
+            ["SEARCH time_slots USING INDEX ix_time_slots_owner_start_time (owner_id=?)"],
+        ) == ["not-covering time_slots"]
+
+    def test_flags_function_wrapped_predicate(self):
+        """Test that func.date(column) filters are flagged even when another index is used"""
+        flags = flag_plan(
+            "SELECT count(*) AS count_1 FROM tasks WHERE tasks.owner_id = ? AND date(tasks.updated_at) = date(?)",
+            ["SEARCH tasks USING INDEX ix_tasks_owner_completed (owner_id=?)"],
+        )
+        assert "expr-predicate" in flags
+
+    def test_report_is_stable(self):
+        """Test that two audits of the same tree produce the same report"""
+        first = format_report(run_audit(users=3, rows_per_user=3))
+        second = format_report(run_audit(users=3, rows_per_user=3))
+
+        assert first == second
+        assert "## tasks.get_tasks" in first
+        assert "SEARCH tasks USING INDEX ix_tasks_owner_completed" in first
+        assert "## Summary" in first
+
+    def test_every_scenario_runs(self):
+        """Test that every service scenario runs to completion, so its plans are audited"""
+        results = run_audit(users=3, rows_per_user=3)
+
+        assert [(r.name, r.error) for r in results if r.error] == []
+        report = format_report(results)
+        assert "ERROR" not in report
+        assert "errors: 0" in report
+        assert "## goals.create_goal_step" in report
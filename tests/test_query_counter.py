@@ -0,0 +1,40 @@
+import pytest
+from fastapi import status
+
+from app.query_counter import RequestQueryStats, statement_shape
+
+@pytest.mark.api
+class TestQueryCounter:
+    """Tests for the per-request SQL counter and N+1 detector"""
+
+    def test_statement_shape_ignores_in_list_length(self):
+        """Test that IN lists of different lengths have the same shape"""
+        assert statement_shape("SELECT * FROM tasks WHERE id IN (?, ?)") == \
+            statement_shape("SELECT *\n FROM tasks WHERE id IN (?, ?, ?, ?)")
+
+    def test_repeated_shapes(self):
+        """Test that only shapes at or above the threshold are reported"""
+        stats = RequestQueryStats()
+        for _ in range(5):
+            stats.record("SELECT * FROM levels WHERE level_number = ?", 0.001)
+        stats.record("SELECT * FROM users WHERE id = ?", 0.001)
+
+        assert stats.count == 6
+        assert stats.repeated(5) == [("SELECT * FROM levels WHERE level_number = ?", 5)]
+
+    def test_headers_on_sync_route(self, authenticated_client):
+        """Test that statements run in the threadpool are counted"""
+        response = authenticated_client.get("/api/tasks/")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert int(response.headers["X-DB-Queries"]) >= 1
+        assert float(response.headers["X-DB-Time-ms"]) >= 0
+
+    def test_progress_has_no_fan_out(self, authenticated_client):
+        """Test that /momentum/progress no longer runs per-level/per-achievement loops"""
+        authenticated_client.get("/api/momentum/progress")
+        response = authenticated_client.get("/api/momentum/progress")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert "X-DB-N-Plus-One" not in response.headers
+        assert int(response.headers["X-DB-Queries"]) <= 10
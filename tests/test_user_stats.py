@@ -0,0 +1,120 @@
+from datetime import date, datetime
+
+import pytest
+from fastapi import status
+
+from app import user_stats
+from app.models import CompletionHour, Reflection, Task, TimeSlot
+from app.momentum import achievements
+from app.momentum.services import MomentumService
+
+class _MondayMorning(datetime):
+    """12:30 UTC on Monday 2024-03-04, 07:30 in New York"""
+    @classmethod
+    def utcnow(cls):
+        return datetime(2024, 3, 4, 12, 30)
+
+@pytest.fixture
+def monday_morning(monkeypatch):
+    monkeypatch.setattr(user_stats, "datetime", _MondayMorning)
+
+def _rebuild(db_session):
+    with db_session.get_bind().begin() as connection:
+        user_stats.rebuild(connection)
+
+@pytest.mark.model
+class TestUserStats:
+    """Tests for the per-user activity counters"""
+
+    @pytest.mark.asyncio
+    async def test_writes_keep_counters_equal_to_rebuild(self, db_session, test_user):
+        """Test that inserts, updates and deletes keep the counters equal to a rebuild"""
+        user_id = test_user.id
+        tasks = [Task(title=f"Task {i}", owner_id=user_id, completed=i < 2, time_spent=1.5) for i in range(3)]
+        slots = [
+            TimeSlot(owner_id=user_id, status="completed", start_time=datetime(2024, 3, 1, 9), end_time=datetime(2024, 3, 1, 11, 30)),
+            TimeSlot(owner_id=user_id, status="not_started", start_time=datetime(2024, 3, 1, 13), end_time=datetime(2024, 3, 1, 14)),
+        ]
+        reflection = Reflection(user_id=user_id, reflection_date=date(2024, 3, 1), gratitude="My family", lessons="Start early")
+        db_session.add_all([*tasks, *slots, reflection])
+        db_session.commit()
+
+        # Changed after commit, so the old values were never loaded
+        tasks[2].completed = True
+        slots[1].status = "completed"
+        reflection.gratitude = ""
+        db_session.delete(tasks[0])
+        db_session.commit()
+
+        maintained = await user_stats.get(db_session, user_id)
+        assert maintained == {
+            "completed_tasks": 2,
+            "completed_task_hours": 3.0,
+            "completed_time_slots": 2,
+            "focused_sessions": 1,
+            "focused_minutes": 150,
+            "reflections": 1,
+            "gratitude_entries": 0,
+            "words_written": 2,
+        }
+        _rebuild(db_session)
+        assert await user_stats.get(db_session, user_id) == maintained
+
+    @pytest.mark.asyncio
+    async def test_rollback_discards_counts(self, db_session, test_user):
+        """Test that the counters change in the same transaction as the rows"""
+        db_session.add(Task(title="Task", owner_id=test_user.id, completed=True))
+        db_session.flush()
+        assert (await user_stats.get(db_session, test_user.id))["completed_tasks"] == 1
+
+        db_session.rollback()
+
+        assert (await user_stats.get(db_session, test_user.id))["completed_tasks"] == 0
+
+    @pytest.mark.api
+    def test_momentum_stats_show_activity(self, authenticated_client, db_session, test_user_with_momentum):
+        """Test that the stats endpoint reads the counters"""
+        db_session.add(Reflection(user_id=test_user_with_momentum.id, reflection_date=date(2024, 3, 1), highlights="Shipped it"))
+        db_session.commit()
+
+        response = authenticated_client.get("/api/momentum/stats")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["activity"]["reflections"] == 1
+        assert response.json()["activity"]["words_written"] == 2
+
+    @pytest.mark.asyncio
+    async def test_completions_fill_local_hour_histogram(self, db_session, test_user, monday_morning):
+        """Test that completions are counted in the user's local weekday and hour"""
+        test_user.timezone = "America/New_York"
+        task = Task(title="Task", owner_id=test_user.id)
+        slot = TimeSlot(owner_id=test_user.id, start_time=datetime(2024, 3, 4, 7), end_time=datetime(2024, 3, 4, 8))
+        db_session.add_all([task, slot, Task(title="Done", owner_id=test_user.id, completed=True)])
+        db_session.commit()
+
+        task.completed = True
+        slot.status = "completed"
+        db_session.commit()
+        # Uncompleting keeps the recorded completion
+        task.completed = False
+        db_session.commit()
+
+        rows = db_session.query(CompletionHour.kind, CompletionHour.weekday, CompletionHour.hour, CompletionHour.count)\
+            .filter(CompletionHour.user_id == test_user.id).order_by(CompletionHour.kind).all()
+        assert [tuple(row) for row in rows] == [("task", 0, 7, 2), ("time_slot", 0, 7, 1)]
+        assert await achievements.COUNTERS["early_completed_tasks"](MomentumService(db_session), test_user.id, None) == 2
+
+    @pytest.mark.api
+    def test_completion_heatmap(self, authenticated_client, db_session, test_user_with_momentum, monday_morning):
+        """Test that the heatmap endpoint returns the histogram as a weekday by hour grid"""
+        test_user_with_momentum.timezone = "UTC"
+        db_session.add(TimeSlot(owner_id=test_user_with_momentum.id, status="completed"))
+        db_session.commit()
+
+        response = authenticated_client.get("/analytics/heatmap", params={"kind": "time_slot"})
+
+        assert response.status_code == status.HTTP_200_OK
+        counts = response.json()["counts"]
+        assert len(counts) == 7 and all(len(day) == 24 for day in counts)
+        assert counts[0][12] == 1
+        assert sum(map(sum, counts)) == 1